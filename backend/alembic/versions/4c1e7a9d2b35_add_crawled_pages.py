@@ -0,0 +1,45 @@
+"""add_crawled_pages
+
+Revision ID: 4c1e7a9d2b35
+Revises: dc827ab30bd4
+Create Date: 2026-10-17 10:12:31.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1e7a9d2b35'
+down_revision: Union[str, None] = 'dc827ab30bd4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Per-page validators of website knowledge sources for incremental re-crawls
+    op.create_table('crawled_pages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.UUID(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('etag', sa.String(), nullable=True),
+    sa.Column('last_modified', sa.String(), nullable=True),
+    sa.Column('content_hash', sa.String(), nullable=True),
+    sa.Column('links', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('organization_id', 'source', 'url', name='uq_crawled_pages_org_source_url')
+    )
+    op.create_index(op.f('ix_crawled_pages_id'), 'crawled_pages', ['id'], unique=False)
+    op.create_index('ix_crawled_pages_org_source', 'crawled_pages', ['organization_id', 'source'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_crawled_pages_org_source', table_name='crawled_pages')
+    op.drop_index(op.f('ix_crawled_pages_id'), table_name='crawled_pages')
+    op.drop_table('crawled_pages')
@@ -0,0 +1,52 @@
+"""add_knowledge_queue_leases
+
+Revision ID: 7d3f9b1c5e28
+Revises: 4c1e7a9d2b35
+Create Date: 2026-10-17 14:36:08.215904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3f9b1c5e28'
+down_revision: Union[str, None] = '4c1e7a9d2b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Worker leases for SKIP LOCKED claiming
+    op.add_column('knowledge_queue', sa.Column('locked_by', sa.String(), nullable=True))
+    op.add_column('knowledge_queue', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('knowledge_queue', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('knowledge_queue', sa.Column('attempts', sa.Integer(), server_default='0', nullable=True))
+    op.create_index('ix_knowledge_queue_status_id', 'knowledge_queue', ['status', 'id'], unique=False)
+
+    # Wake listening workers as soon as an item is queued
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_knowledge_queue() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('knowledge_queue', NEW.id::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER knowledge_queue_notify
+        AFTER INSERT ON knowledge_queue
+        FOR EACH ROW EXECUTE PROCEDURE notify_knowledge_queue()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS knowledge_queue_notify ON knowledge_queue")
+    op.execute("DROP FUNCTION IF EXISTS notify_knowledge_queue()")
+    op.drop_index('ix_knowledge_queue_status_id', table_name='knowledge_queue')
+    op.drop_column('knowledge_queue', 'attempts')
+    op.drop_column('knowledge_queue', 'heartbeat_at')
+    op.drop_column('knowledge_queue', 'lease_expires_at')
+    op.drop_column('knowledge_queue', 'locked_by')
@@ -0,0 +1,37 @@
+"""add_knowledge_queue_urls
+
+Revision ID: a52e8c0f6d41
+Revises: 7d3f9b1c5e28
+Create Date: 2026-10-17 16:05:47.390126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a52e8c0f6d41'
+down_revision: Union[str, None] = '7d3f9b1c5e28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Append-only crawl progress, replacing writes to knowledge_queue.crawled_urls
+    op.create_table('knowledge_queue_urls',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('queue_id', sa.Integer(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['queue_id'], ['knowledge_queue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('queue_id', 'url', name='uq_knowledge_queue_urls_queue_url')
+    )
+    op.create_index('ix_knowledge_queue_urls_queue_id_id', 'knowledge_queue_urls', ['queue_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_knowledge_queue_urls_queue_id_id', table_name='knowledge_queue_urls')
+    op.drop_table('knowledge_queue_urls')
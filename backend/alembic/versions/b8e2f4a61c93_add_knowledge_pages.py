@@ -0,0 +1,42 @@
+"""add_knowledge_pages
+
+Revision ID: b8e2f4a61c93
+Revises: a52e8c0f6d41
+Create Date: 2026-10-17 18:24:09.615302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2f4a61c93'
+down_revision: Union[str, None] = 'a52e8c0f6d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Subpage catalog of knowledge sources, so listings don't scan the vector tables
+    op.create_table('knowledge_pages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.UUID(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('subpage', sa.String(), nullable=False),
+    sa.Column('chunk_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('organization_id', 'source', 'subpage', name='uq_knowledge_pages_org_source_subpage')
+    )
+    op.create_index(op.f('ix_knowledge_pages_id'), 'knowledge_pages', ['id'], unique=False)
+    op.create_index('ix_knowledge_pages_org_source', 'knowledge_pages', ['organization_id', 'source'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_knowledge_pages_org_source', table_name='knowledge_pages')
+    op.drop_index(op.f('ix_knowledge_pages_id'), table_name='knowledge_pages')
+    op.drop_table('knowledge_pages')
@@ -0,0 +1,37 @@
+"""add_embedding_cache
+
+Revision ID: c41d7e9b2a58
+Revises: b8e2f4a61c93
+Create Date: 2026-10-17 19:02:41.208817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e9b2a58'
+down_revision: Union[str, None] = 'b8e2f4a61c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Chunk embeddings keyed by embedding model and content hash, reused across ingestions
+    op.create_table('embedding_cache',
+    sa.Column('model_id', sa.String(), nullable=False),
+    sa.Column('content_hash', sa.String(length=32), nullable=False),
+    sa.Column('dimensions', sa.Integer(), nullable=False),
+    sa.Column('embedding', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('model_id', 'content_hash')
+    )
+    op.create_index('ix_embedding_cache_last_used_at', 'embedding_cache', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_embedding_cache_last_used_at', table_name='embedding_cache')
+    op.drop_table('embedding_cache')
@@ -0,0 +1,32 @@
+"""add_mcp_tool_catalog
+
+Revision ID: d7a3c95e1f40
+Revises: c41d7e9b2a58
+Create Date: 2026-10-17 21:14:09.532417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3c95e1f40'
+down_revision: Union[str, None] = 'c41d7e9b2a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Cached tool list and schemas of each MCP server, keyed by a fingerprint of its config
+    op.add_column('mcp_tools', sa.Column('tool_catalog', postgresql.JSON(astext_type=sa.Text()), nullable=True))
+    op.add_column('mcp_tools', sa.Column('catalog_fingerprint', sa.String(length=32), nullable=True))
+    op.add_column('mcp_tools', sa.Column('catalog_refreshed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('mcp_tools', 'catalog_refreshed_at')
+    op.drop_column('mcp_tools', 'catalog_fingerprint')
+    op.drop_column('mcp_tools', 'tool_catalog')
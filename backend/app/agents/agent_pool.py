@@ -0,0 +1,259 @@
+"""
+ChatterMate - Chat Agent Pool
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Redis keys used to propagate invalidations to the other workers
+AGENT_VERSION_KEY = "agent_pool:version:agent:{}"
+ORG_VERSION_KEY = "agent_pool:version:org:{}"
+
+
+def _digest(value: Optional[str]) -> Optional[str]:
+    """Short stable digest so secrets and long prompts are not kept in pool keys"""
+    if value is None:
+        return None
+    return hashlib.sha256(str(value).encode()).hexdigest()[:16]
+
+
+class ChatAgentPool:
+    """
+    Process-wide registry of ChatAgent templates.
+
+    A template holds everything about a ChatAgent that does not depend on the chat
+    session (agent and integration config, system prompt, knowledge tool, storage) and
+    is built once per (agent, config version, model). Every chat message then only
+    pays for a cheap per-session ChatAgent bound to its session_id and customer_id.
+
+    Templates are dropped when the agent, its AI config or its integrations change.
+    Invalidations bump a version counter locally and in Redis (when enabled) so the
+    other workers stop using their copies on the next message.
+    """
+
+    def __init__(self, max_size: int = settings.AGENT_POOL_MAX_SIZE, ttl: int = settings.AGENT_POOL_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._templates: "OrderedDict[Tuple, object]" = OrderedDict()
+        self._build_locks: Dict[Tuple, asyncio.Lock] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _get_versions(self, agent_id: Optional[str], org_id: Optional[str]) -> Tuple:
+        """Get the (local, shared) config versions of an agent and its organization"""
+        agent_key = AGENT_VERSION_KEY.format(agent_id)
+        org_key = ORG_VERSION_KEY.format(org_id)
+        local = (self._versions.get(agent_key, 0), self._versions.get(org_key, 0))
+
+        shared = (None, None)
+        try:
+            from app.core.redis import get_redis
+            redis_client = get_redis()
+            if redis_client:
+                shared = tuple(redis_client.mget(agent_key, org_key))
+        except Exception as e:
+            logger.warning(f"Could not read agent pool versions from Redis: {str(e)}")
+
+        return local + shared
+
+    def _make_key(self, agent_id: Optional[str], org_id: Optional[str], versions: Tuple, model_type: str,
+                  model_name: str, api_key: str, source: Optional[str], custom_system_prompt: Optional[str],
+                  transfer_to_human: Optional[bool]) -> Tuple:
+        return (
+            str(agent_id) if agent_id else None,
+            str(org_id) if org_id else None,
+            versions,
+            str(model_type),
+            model_name,
+            _digest(api_key),
+            source,
+            _digest(custom_system_prompt),
+            transfer_to_human,
+        )
+
+    def _get_cached(self, key: Tuple):
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                return None
+            if time.monotonic() - template.created_at > self.ttl:
+                del self._templates[key]
+                return None
+            self._templates.move_to_end(key)
+            return template
+
+    def _store(self, key: Tuple, template) -> None:
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+
+    async def get_template(self, org_id: str, agent_id: str, session_id: str, model_type: str, model_name: str,
+                           api_key: str, source: str = None, custom_system_prompt: str = None,
+                           transfer_to_human: bool | None = None):
+        """Get the ChatAgentTemplate for an agent configuration, building it on a miss"""
+        from app.agents.chat_agent import ChatAgent
+
+        # The Redis lookup blocks, so it is kept off the event loop like the knowledge search cache's
+        versions = await asyncio.to_thread(self._get_versions, agent_id, org_id)
+        key = self._make_key(agent_id, org_id, versions, model_type, model_name, api_key, source,
+                             custom_system_prompt, transfer_to_human)
+
+        template = self._get_cached(key)
+        if template is not None:
+            self.hits += 1
+            return template
+
+        # Only one build per key, concurrent messages for the same agent wait for it
+        lock = self._build_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            template = self._get_cached(key)
+            if template is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                build_start = time.time()
+                template = await asyncio.to_thread(
+                    ChatAgent.build_template,
+                    org_id=org_id,
+                    agent_id=agent_id,
+                    session_id=session_id,
+                    custom_system_prompt=custom_system_prompt,
+                    transfer_to_human=transfer_to_human,
+                    source=source
+                )
+                self._store(key, template)
+                logger.debug(f"Built chat agent template for agent {agent_id} in {time.time() - build_start:.3f}s")
+
+        self._build_locks.pop(key, None)
+        return template
+
+    async def create_agent(self, api_key: str, model_name: str = "gpt-4o-mini", model_type: str = "OPENAI",
+                           org_id: str = None, agent_id: str = None, customer_id: str = None,
+                           session_id: str = None, custom_system_prompt: str = None,
+                           transfer_to_human: bool | None = None, source: str = None):
+        """
+        Create a ChatAgent for one session from the pooled template.
+        Drop-in replacement for ChatAgent.create_async.
+        """
+        from app.agents.chat_agent import ChatAgent
+
+        template = None
+        if settings.AGENT_POOL_ENABLED:
+            try:
+                template = await self.get_template(
+                    org_id=org_id,
+                    agent_id=agent_id,
+                    session_id=session_id,
+                    model_type=model_type,
+                    model_name=model_name,
+                    api_key=api_key,
+                    source=source,
+                    custom_system_prompt=custom_system_prompt,
+                    transfer_to_human=transfer_to_human
+                )
+            except Exception as e:
+                logger.error(f"Failed to get pooled chat agent template, building a fresh agent: {str(e)}")
+
+        return await ChatAgent.create_async(
+            api_key=api_key,
+            model_name=model_name,
+            model_type=model_type,
+            org_id=org_id,
+            agent_id=agent_id,
+            customer_id=customer_id,
+            session_id=session_id,
+            custom_system_prompt=custom_system_prompt,
+            transfer_to_human=transfer_to_human,
+            source=source,
+            template=template
+        )
+
+    def _bump_version(self, version_key: str) -> None:
+        with self._lock:
+            self._versions[version_key] = self._versions.get(version_key, 0) + 1
+        try:
+            from app.core.redis import get_redis
+            redis_client = get_redis()
+            if redis_client:
+                redis_client.incr(version_key)
+        except Exception as e:
+            logger.warning(f"Could not publish agent pool invalidation to Redis: {str(e)}")
+
+    def invalidate_agent(self, agent_id) -> None:
+        """Drop all templates of an agent, e.g. after its config or integrations changed"""
+        if not agent_id:
+            return
+        agent_id = str(agent_id)
+        self._bump_version(AGENT_VERSION_KEY.format(agent_id))
+        with self._lock:
+            for key in [k for k in self._templates if k[0] == agent_id]:
+                del self._templates[key]
+        self.invalidations += 1
+        logger.debug(f"Invalidated chat agent templates for agent {agent_id}")
+
+    def invalidate_organization(self, org_id) -> None:
+        """Drop all templates of an organization, e.g. after its AI config changed"""
+        if not org_id:
+            return
+        org_id = str(org_id)
+        self._bump_version(ORG_VERSION_KEY.format(org_id))
+        with self._lock:
+            for key in [k for k in self._templates if k[1] == org_id]:
+                del self._templates[key]
+        self.invalidations += 1
+        logger.debug(f"Invalidated chat agent templates for organization {org_id}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            size = len(self._templates)
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+agent_pool = ChatAgentPool()
+
+
+def invalidate_agent(agent_id) -> None:
+    """Invalidate pooled chat agents for an agent"""
+    agent_pool.invalidate_agent(agent_id)
+
+
+def invalidate_organization(org_id) -> None:
+    """Invalidate pooled chat agents for every agent of an organization"""
+    agent_pool.invalidate_organization(org_id)
@@ -0,0 +1,99 @@
+"""
+ChatterMate - Agent Session Storage
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import threading
+from typing import Optional
+from sqlalchemy import case, func, select
+from agno.storage.agent.postgres import PostgresAgentStorage
+from agno.storage.session.agent import AgentSession
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+AGENT_SESSIONS_TABLE = "agent_sessions"
+
+
+class WindowedPostgresAgentStorage(PostgresAgentStorage):
+    """
+    agent_sessions storage that only reads and writes the last `num_history_runs` runs.
+
+    agno keeps every run of a session in the memory blob and loads and rewrites all of it
+    on each message, although only the last few runs are added to the prompt. Reads slice
+    the runs array in Postgres and writes persist only the window, so a turn costs the
+    same however long the conversation gets. The full transcript stays in chat_history.
+    """
+
+    def __init__(self, *args, num_history_runs: int = settings.AGENT_HISTORY_RUNS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_history_runs = num_history_runs
+
+    def _trim(self, session):
+        """Keep only the last num_history_runs runs in the session memory"""
+        if session is None or self.num_history_runs <= 0:
+            return session
+        memory = getattr(session, "memory", None)
+        if isinstance(memory, dict) and len(memory.get("runs") or []) > self.num_history_runs:
+            session.memory = {**memory, "runs": memory["runs"][-self.num_history_runs:]}
+        return session
+
+    def _windowed_select(self, session_id: str, user_id: Optional[str] = None):
+        """Select the session row with memory.runs sliced to the window in the database"""
+        memory = self.table.c.memory
+        all_runs = memory.op("->")("runs")
+        runs = func.jsonb_path_query_array(all_runs, f"$[last - {self.num_history_runs - 1} to last]")
+        windowed_memory = case(
+            (func.jsonb_typeof(all_runs) == "array", memory.op("||")(func.jsonb_build_object("runs", runs))),
+            else_=memory
+        )
+        columns = [column for column in self.table.c if column.name != "memory"]
+        stmt = select(*columns, windowed_memory.label("memory")).where(self.table.c.session_id == session_id)
+        if user_id:
+            stmt = stmt.where(self.table.c.user_id == user_id)
+        return stmt
+
+    def read(self, session_id: str, user_id: Optional[str] = None):
+        if self.mode != "agent" or self.num_history_runs <= 0:
+            return super().read(session_id, user_id)
+        try:
+            with self.Session() as sess:
+                result = sess.execute(self._windowed_select(session_id, user_id)).fetchone()
+                return AgentSession.from_dict(dict(result._mapping)) if result is not None else None
+        except Exception as e:
+            # Missing table, old schema or pre-12 Postgres: agno's read handles those cases
+            logger.debug(f"Windowed agent session read failed, falling back to full read: {str(e)}")
+            return self._trim(super().read(session_id, user_id))
+
+    def upsert(self, session, create_and_retry: bool = True):
+        return super().upsert(self._trim(session), create_and_retry)
+
+
+_agent_storage: Optional[WindowedPostgresAgentStorage] = None
+_agent_storage_lock = threading.Lock()
+
+
+def get_agent_storage() -> WindowedPostgresAgentStorage:
+    """Process-wide agent_sessions storage, built once over the application's shared engine"""
+    global _agent_storage
+    if _agent_storage is None:
+        with _agent_storage_lock:
+            if _agent_storage is None:
+                from app.database import engine
+                _agent_storage = WindowedPostgresAgentStorage(table_name=AGENT_SESSIONS_TABLE, db_engine=engine)
+                logger.info("Created shared agent session storage")
+    return _agent_storage
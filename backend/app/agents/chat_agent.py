@@ -22,8 +22,10 @@ from app.utils.agno_utils import create_model
 from app.core.logger import get_logger
 from app.tools.knowledge_search_byagent import KnowledgeSearchByAgent
 from app.tools.mcp_manager import ChatAgentMCPMixin
+from app.agents.tool_calls import ToolCallLimiter, limit_tool_call
 from app.database import get_db, SessionLocal
 from agno.storage.agent.postgres import PostgresAgentStorage
+from app.agents.agent_storage import get_agent_storage
 from app.repositories.chat import ChatRepository
 from app.repositories.session_to_agent import SessionToAgentRepository
 from app.models.session_to_agent import SessionStatus
@@ -37,10 +39,15 @@ from datetime import datetime
 from app.repositories.jira import JiraRepository
 from app.tools.jira_toolkit import JiraTools
 from app.tools.shopify_toolkit import ShopifyTools
-from app.utils.response_parser import parse_response_content
+from app.utils.response_parser import parse_response_content, StreamingMessageExtractor
 from app.repositories.agent_shopify_config_repository import AgentShopifyConfigRepository
+from app.models.schemas.jira import AgentWithJiraConfig
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, Union
+from agno.run.response import RunResponseContentEvent
 import re
 import asyncio
+import time
 
 logger = get_logger(__name__)
 
@@ -53,57 +60,84 @@ def remove_urls_from_message(message: str) -> str:
     url_pattern = r'https?://[^\s\)\]"]+'
     return re.sub(url_pattern, '[link removed]', message)
 
+class StreamingUrlRemover:
+    """
+    remove_urls_from_message for streamed text. The text after the last character that can
+    end a URL is held back until a later delta shows where it ends, so a URL split across
+    deltas never reaches the widget in pieces.
+    """
+
+    URL_END_PATTERN = re.compile(r'[\s\)\]"]')
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, delta: str) -> str:
+        text = self.pending + delta
+        cut = 0
+        for match in self.URL_END_PATTERN.finditer(text):
+            cut = match.end()
+        self.pending = text[cut:]
+        return remove_urls_from_message(text[:cut])
+
+    def flush(self) -> str:
+        text, self.pending = self.pending, ""
+        return remove_urls_from_message(text)
+
+@dataclass
+class ChatAgentTemplate:
+    """
+    Session-independent parts of a ChatAgent: agent/integration config, the system prompt,
+    the knowledge search tool and the agent storage. Built once per agent configuration
+    and shared by every session, see app.agents.agent_pool.
+    """
+    agent_id: Optional[str]
+    org_id: Optional[str]
+    agent_data: Optional[AgentWithJiraConfig]
+    transfer_to_human: bool
+    shopify_enabled: bool
+    system_message: Union[str, List[str]]
+    knowledge_tool: Optional[KnowledgeSearchByAgent]
+    jira_instructions_added: bool = False
+    shopify_instructions_added: bool = False
+    storage: Optional[PostgresAgentStorage] = None
+    created_at: float = field(default_factory=time.monotonic)
+
+
 class ChatAgent(ChatAgentMCPMixin):
-    def __init__(self, api_key: str, model_name: str = "gpt-4o-mini", model_type: str = "OPENAI", org_id: str = None, agent_id: str = None, customer_id: str = None, session_id: str = None, custom_system_prompt: str = None, transfer_to_human: bool | None = None, mcp_tools: list = None, source: str = None):
-        # Initialize knowledge search tool if org_id and agent_id provided
+    def __init__(self, api_key: str, model_name: str = "gpt-4o-mini", model_type: str = "OPENAI", org_id: str = None, agent_id: str = None, customer_id: str = None, session_id: str = None, custom_system_prompt: str = None, transfer_to_human: bool | None = None, mcp_tools: list = None, source: str = None, template: Optional[ChatAgentTemplate] = None):
         logger.debug(f"Initializing chat agent for agent_id: {agent_id} and org_id: {org_id} and source: {source}")
-        tools = []
-        if org_id and agent_id:
-            logger.debug(f"Initializing knowledge search tool for agent_id: {agent_id} and org_id: {org_id} and source: {source}")
-            knowledge_tool = KnowledgeSearchByAgent(
-                agent_id=agent_id, org_id=org_id, source=source)
-            tools.append(knowledge_tool)
-            knowledge_tool_prompt = """
-            You have access to the knowledge search tool. You can use this tool to search for information about the customer's query on product, services, policies, etc. Only use the tool if required, dont use it for general greeting. Dont hallucinate information.
-            """
-            
 
-        # Get template instructions and Jira config in a single optimized query
-        # Use context manager for database operations
-        with SessionLocal() as db:
-            jira_repo = JiraRepository(db)
-            if agent_id:
-                self.agent_data = jira_repo.get_agent_with_jira_config(agent_id)
-            else:
-                self.agent_data = None
-            
-            # Check if Shopify is enabled for this agent while we have the db session
-            shopify_config = None
-            if agent_id and org_id and session_id:
-                try:
-                    shopify_config_repo = AgentShopifyConfigRepository(db)
-                    shopify_config = shopify_config_repo.get_agent_shopify_config(agent_id)
-                except Exception as e:
-                    logger.error(f"Failed to get Shopify config: {e}")
-                    shopify_config = None
-        
+        # Build the session-independent parts unless a pooled template was handed in
+        if template is None:
+            template = self.build_template(
+                org_id=org_id,
+                agent_id=agent_id,
+                session_id=session_id,
+                custom_system_prompt=custom_system_prompt,
+                transfer_to_human=transfer_to_human,
+                source=source
+            )
+
+        self.template = template
+        self.agent_data = template.agent_data
         self.api_key = api_key
         self.model_name = model_name
         self.model_type = model_type
-        self.jira_instructions_added = False
-        self.shopify_instructions_added = False
+        self.jira_instructions_added = template.jira_instructions_added
+        self.shopify_instructions_added = template.shopify_instructions_added
         self.mcp_instructions_added = False
         self.org_id = org_id
         self.agent_id = agent_id
         self.customer_id = customer_id
         self.session_id = session_id
         self.mcp_tools = mcp_tools or []
-        
-        # Determine transfer_to_human setting - use parameter if provided, otherwise use agent data
-        if transfer_to_human is not None:
-            self.transfer_to_human = transfer_to_human
-        else:
-            self.transfer_to_human = self.agent_data.transfer_to_human if self.agent_data else False
+        self.transfer_to_human = template.transfer_to_human
+        self.tool_call_limiter = ToolCallLimiter()
+
+        tools = []
+        if template.knowledge_tool:
+            tools.append(template.knowledge_tool)
 
         # Initialize tools
         self.tools = []
@@ -121,7 +155,7 @@ class ChatAgent(ChatAgentMCPMixin):
                 logger.error(f"Failed to initialize Jira tools: {e}")
         
         # Add Shopify tools if agent has Shopify enabled
-        if self.agent_id and self.org_id and self.session_id and not self.transfer_to_human and shopify_config and shopify_config.enabled:
+        if self.agent_id and self.org_id and self.session_id and not self.transfer_to_human and template.shopify_enabled:
             try:
                 self.shopify_tools = ShopifyTools(
                     agent_id=self.agent_id,
@@ -137,7 +171,108 @@ class ChatAgent(ChatAgentMCPMixin):
             self.tools.extend(self.mcp_tools)
             logger.debug(f"Added {len(self.mcp_tools)} MCP tools to agent")
 
-        if self.agent_data:
+        system_message = template.system_message
+
+        # Add MCP tools instructions if MCP tools are available
+        if self.agent_data and self.mcp_tools:
+            mcp_instructions = """
+            You have access to MCP (Model Context Protocol) tools that provide additional capabilities.
+            These tools allow you to interact with external systems and perform various operations.
+            Use these tools when they can help answer the customer's questions or solve their problems.
+            Always use the appropriate tool for the specific task at hand.
+            """
+            system_message += "\n\n" + mcp_instructions
+            self.mcp_instructions_added = True
+
+        # Initialize model with utility function
+        model = create_model(
+            model_type=model_type,
+            api_key=api_key,
+            model_name=model_name,
+            max_tokens=2000 if (self.shopify_instructions_added or self.mcp_instructions_added) else 1000,
+            # response_format={"type": "json_object"} if model_type.upper() != 'GROQ' else {"type": "text"}
+        )
+       
+        # Storage is fetched on first use so an invalid model fails before touching the database
+        if template.storage is None:
+            template.storage = get_agent_storage()
+
+        # Combine all tools
+        all_tools = tools.copy()
+        if hasattr(self, 'tools') and self.tools:
+           all_tools.extend(self.tools)
+
+        self.agent = Agent(
+           name=self.agent_data.name if self.agent_data else "Default Agent",
+           session_id=session_id,
+           model=model,
+           tools=all_tools,
+           instructions=system_message,
+           agent_id=str(agent_id),
+           storage=template.storage,
+           add_history_to_messages=True,
+           tool_call_limit=10,
+           tool_hooks=[limit_tool_call],
+           num_history_responses=settings.AGENT_HISTORY_RUNS,
+           read_chat_history=True,
+           markdown=False,
+           debug_mode=settings.ENVIRONMENT == "development",
+           user_id=str(customer_id),
+           session_state={"status": "active"},
+           response_model=ChatResponse,
+           structured_outputs=True,
+           system_message_role="system",
+           user_message_role="user",
+           show_tool_calls=settings.ENVIRONMENT == "development"
+          )
+
+    @staticmethod
+    def build_template(org_id: str = None, agent_id: str = None, session_id: str = None, custom_system_prompt: str = None, transfer_to_human: bool | None = None, source: str = None) -> ChatAgentTemplate:
+        """
+        Load the agent and integration config and build the system prompt, knowledge tool
+        and storage. Nothing here depends on the session or customer, so the result can be
+        cached and reused (see app.agents.agent_pool).
+        """
+        # Initialize knowledge search tool if org_id and agent_id provided
+        knowledge_tool = None
+        knowledge_tool_prompt = ""
+        if org_id and agent_id:
+            logger.debug(f"Initializing knowledge search tool for agent_id: {agent_id} and org_id: {org_id} and source: {source}")
+            knowledge_tool = KnowledgeSearchByAgent(
+                agent_id=agent_id, org_id=org_id, source=source)
+            knowledge_tool_prompt = """
+            You have access to the knowledge search tool. You can use this tool to search for information about the customer's query on product, services, policies, etc. Only use the tool if required, dont use it for general greeting. Dont hallucinate information.
+            """
+
+        # Get template instructions and Jira config in a single optimized query
+        # Use context manager for database operations
+        with SessionLocal() as db:
+            jira_repo = JiraRepository(db)
+            if agent_id:
+                agent_data = jira_repo.get_agent_with_jira_config(agent_id)
+            else:
+                agent_data = None
+            
+            # Check if Shopify is enabled for this agent while we have the db session
+            shopify_config = None
+            if agent_id and org_id and session_id:
+                try:
+                    shopify_config_repo = AgentShopifyConfigRepository(db)
+                    shopify_config = shopify_config_repo.get_agent_shopify_config(agent_id)
+                except Exception as e:
+                    logger.error(f"Failed to get Shopify config: {e}")
+                    shopify_config = None
+
+        shopify_enabled = bool(shopify_config and shopify_config.enabled)
+
+        # Determine transfer_to_human setting - use parameter if provided, otherwise use agent data
+        if transfer_to_human is None:
+            transfer_to_human = agent_data.transfer_to_human if agent_data else False
+
+        jira_instructions_added = False
+        shopify_instructions_added = False
+
+        if agent_data:
             # Define end chat instructions to avoid long lines
             end_chat_with_rating = (
                 "You should end the chat and request a rating ONLY when you are confident that: "
@@ -168,12 +303,12 @@ class ChatAgent(ChatAgentMCPMixin):
             if custom_system_prompt:
                 # Use custom system prompt from workflow
                 system_message = custom_system_prompt
-            elif self.agent_data.instructions:
-                system_message = "\n".join(self.agent_data.instructions) +  knowledge_tool_prompt
+            elif agent_data.instructions:
+                system_message = "\n".join(agent_data.instructions) +  knowledge_tool_prompt
 
             
             # Add transfer instructions if enabled
-            if self.transfer_to_human:
+            if transfer_to_human:
                 system_message += """
                 You have the ability to transfer this conversation to a human agent if needed. You should transfer the conversation if:
                 1. You are unable to answer the customer's question or solve their problem
@@ -187,13 +322,13 @@ class ChatAgent(ChatAgentMCPMixin):
                 """
             
             # Add end chat instructions
-            if self.agent_data.ask_for_rating:
+            if agent_data.ask_for_rating:
                 system_message += f"\n{end_chat_with_rating}"
             else:
                 system_message += f"\n{end_chat_without_rating}"
             
             # Add Jira instructions if Jira is enabled
-            if self.agent_data and self.agent_data.jira_enabled and not self.transfer_to_human:
+            if agent_data.jira_enabled and not transfer_to_human:
                 jira_instructions = """
                 You have access to Jira integration tools. You can use these tools to:
                 1. Create a Jira ticket for issues that need further attention
@@ -215,10 +350,10 @@ class ChatAgent(ChatAgentMCPMixin):
                 - No ticket already exists for this conversation
                 """
                 system_message += "\n\n" + jira_instructions
-                self.jira_instructions_added = True
+                jira_instructions_added = True
             
             # Add Shopify instructions if Shopify is enabled
-            if shopify_config and shopify_config.enabled and not self.transfer_to_human:
+            if shopify_enabled and not transfer_to_human:
                 # UPDATED Shopify Instructions (v3)
                 shopify_instructions = """
                 You have access to Shopify tools (`search_products`, `get_product`, `recommend_products`, etc.). 
@@ -279,63 +414,25 @@ class ChatAgent(ChatAgentMCPMixin):
                   ```
                 """
                 system_message += "\n\n" + shopify_instructions
-                self.shopify_instructions_added = True
-
-            # Add MCP tools instructions if MCP tools are available
-            if self.mcp_tools:
-                mcp_instructions = """
-                You have access to MCP (Model Context Protocol) tools that provide additional capabilities.
-                These tools allow you to interact with external systems and perform various operations.
-                Use these tools when they can help answer the customer's questions or solve their problems.
-                Always use the appropriate tool for the specific task at hand.
-                """
-                system_message += "\n\n" + mcp_instructions
-                self.mcp_instructions_added = True
+                shopify_instructions_added = True
+
         else:
             system_message = [
                 "You are a helpful customer service agent.",
             ]
 
-        # Initialize model with utility function
-        model = create_model(
-            model_type=model_type,
-            api_key=api_key,
-            model_name=model_name,
-            max_tokens=2000 if (self.shopify_instructions_added or self.mcp_instructions_added) else 1000,
-            # response_format={"type": "json_object"} if model_type.upper() != 'GROQ' else {"type": "text"}
+        return ChatAgentTemplate(
+            agent_id=agent_id,
+            org_id=org_id,
+            agent_data=agent_data,
+            transfer_to_human=transfer_to_human,
+            shopify_enabled=shopify_enabled,
+            system_message=system_message,
+            knowledge_tool=knowledge_tool,
+            jira_instructions_added=jira_instructions_added,
+            shopify_instructions_added=shopify_instructions_added
         )
 
-        storage = PostgresAgentStorage(table_name="agent_sessions", db_url=settings.DATABASE_URL)
-        
-       
-        # Combine all tools
-        all_tools = tools.copy()
-        if hasattr(self, 'tools') and self.tools:
-           all_tools.extend(self.tools)
-
-        self.agent = Agent(
-           name=self.agent_data.name if self.agent_data else "Default Agent",
-           session_id=session_id,
-           model=model,
-           tools=all_tools,
-           instructions=system_message,
-           agent_id=str(agent_id),
-           storage=storage,
-           add_history_to_messages=True,
-           tool_call_limit=10,
-           num_history_responses=10,
-           read_chat_history=True,
-           markdown=False,
-           debug_mode=settings.ENVIRONMENT == "development",
-           user_id=str(customer_id),
-           session_state={"status": "active"},
-           response_model=ChatResponse,
-           structured_outputs=True,
-           system_message_role="system",
-           user_message_role="user",
-           show_tool_calls=settings.ENVIRONMENT == "development"
-          )
-
     async def _get_llm_response_only(self, message: str, session_id: str = None, org_id: str = None, agent_id: str = None, customer_id: str = None) -> ChatResponse:
         """
         Get LLM response without storing messages in chat history.
@@ -353,6 +450,7 @@ class ChatAgent(ChatAgentMCPMixin):
                 self.customer_id = customer_id
                 
             self.agent.session_id = session_id
+            self.tool_call_limiter.activate()
 
             # Get AI response WITHOUT storing user message
             response = await self.agent.arun(
@@ -608,9 +706,52 @@ class ChatAgent(ChatAgentMCPMixin):
             transfer_group_id=transfer_group_id
         )
 
-    async def get_response(self, message: str, session_id: str = None, org_id: str = None, agent_id: str = None, customer_id: str = None) -> ChatResponse:
+    async def _arun_streaming(self, message: str, session_id: str, on_delta: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Run the agent with token streaming, passing the visible message text to on_delta
+        as it arrives. Returns the raw reply so it can be parsed like a non-streamed one.
+        """
+        extractor = StreamingMessageExtractor()
+        # Product URLs must stay out of Shopify replies, the final message has them removed too
+        url_remover = StreamingUrlRemover() if getattr(self, 'shopify_tools', None) else None
+        content = ""
+
+        async def send(delta: str):
+            if delta:
+                try:
+                    await on_delta(delta)
+                except Exception as e:
+                    logger.warning(f"Failed to send streamed response delta: {str(e)}")
+
+        # agno does not stream when it parses the response model itself, the JSON schema
+        # is still sent to the model and the raw reply is parsed by parse_response_content
+        parse_response = self.agent.parse_response
+        self.agent.parse_response = False
+        try:
+            response_stream = await self.agent.arun(
+                message=message,
+                session_id=session_id,
+                stream=True
+            )
+            async for event in response_stream:
+                if not isinstance(event, RunResponseContentEvent) or not isinstance(event.content, str):
+                    continue
+                content += event.content
+                delta = extractor.feed(event.content)
+                await send(url_remover.feed(delta) if url_remover else delta)
+        finally:
+            self.agent.parse_response = parse_response
+
+        if url_remover:
+            await send(url_remover.flush())
+
+        return content
+
+    async def get_response(self, message: str, session_id: str = None, org_id: str = None, agent_id: str = None, customer_id: str = None, on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> ChatResponse:
         """
         Get a response from the agent.
+        If on_delta is given the reply is streamed and on_delta receives the message text
+        as it is generated, the returned ChatResponse is still the full structured reply.
         """
         try:
             # Update session and IDs if provided
@@ -628,9 +769,10 @@ class ChatAgent(ChatAgentMCPMixin):
                 chat_repo = ChatRepository(db)
                 
                 self.agent.session_id = session_id
+                self.tool_call_limiter.activate()
 
                 # Create user message
-                chat_repo.create_message({
+                chat_repo.queue_message({
                     "message": message,
                     "message_type": "user",
                     "session_id": session_id,
@@ -641,12 +783,24 @@ class ChatAgent(ChatAgentMCPMixin):
                 })
 
                 
+                # Speculatively search the knowledge base for the message while the model takes its first step
+                prefetch = None
+                if settings.KNOWLEDGE_PREFETCH_ENABLED and self.template.knowledge_tool:
+                    prefetch = self.template.knowledge_tool.prefetch(message)
+
                 # Get AI response
-                response = await self.agent.arun(
-                    message=message,
-                    session_id=session_id,
-                    stream=False
-                )
+                try:
+                    if on_delta:
+                        response = await self._arun_streaming(message, session_id, on_delta)
+                    else:
+                        response = await self.agent.arun(
+                            message=message,
+                            session_id=session_id,
+                            stream=False
+                        )
+                finally:
+                    if prefetch:
+                        prefetch.finish()
 
                 # Use the utility function to parse the response
                 response_content = parse_response_content(response)
@@ -701,7 +855,7 @@ class ChatAgent(ChatAgentMCPMixin):
                     })
                 
                 
-                chat_repo.create_message({
+                chat_repo.queue_message({
                     "message": response_content.message,
                     "message_type": "bot",
                     "session_id": session_id,
@@ -736,7 +890,7 @@ class ChatAgent(ChatAgentMCPMixin):
             try:
                 with SessionLocal() as db:
                     chat_repo = ChatRepository(db)
-                    chat_repo.create_message({
+                    chat_repo.queue_message({
                         "message": error_message,
                         "message_type": "bot",
                         "session_id": session_id,
@@ -0,0 +1,65 @@
+"""
+ChatterMate - Tool Call Limiter
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ToolCallLimiter:
+    """
+    Cap and deadline for the tool calls of one chat agent.
+
+    agno's arun starts all tool calls of a model step together and hands their results back
+    in call order, so a step with several async tools costs about its slowest call. Under a
+    limiter at most max_concurrency of them execute at once, and a call still running after
+    timeout seconds is cancelled and answered with an error the model can act on, instead of
+    holding up the whole step.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_concurrency = max(1, max_concurrency or settings.AGENT_TOOL_CONCURRENCY)
+        self.timeout = timeout if timeout is not None else settings.AGENT_TOOL_TIMEOUT
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def activate(self) -> None:
+        """Route the tool calls of agent runs started from the current task through this limiter"""
+        _active_limiter.set(self)
+
+    async def run(self, function_name: str, function_call: Callable, arguments: Dict[str, Any]) -> Any:
+        async with self._semaphore:
+            try:
+                return await asyncio.wait_for(function_call(**arguments), timeout=self.timeout or None)
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool call {function_name} timed out after {self.timeout}s")
+                return f"Error: tool '{function_name}' did not respond within {self.timeout:g} seconds"
+
+
+# Toolkits (e.g. a pooled template's knowledge tool) are shared between agents and agno stores
+# the hooks on their functions, so the hook looks its limiter up in the run's context instead
+_active_limiter: ContextVar[Optional[ToolCallLimiter]] = ContextVar("tool_call_limiter", default=None)
+
+
+async def limit_tool_call(function_name: str, function_call: Callable, arguments: Dict[str, Any]) -> Any:
+    """agno tool hook: runs a tool call under the active limiter, or with just the default timeout"""
+    limiter = _active_limiter.get() or ToolCallLimiter()
+    return await limiter.run(function_name, function_call, arguments)
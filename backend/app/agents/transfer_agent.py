@@ -16,6 +16,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+import asyncio
 from typing import Dict, Any
 from datetime import datetime
 import pytz
@@ -154,17 +155,12 @@ class TransferResponseAgent:
             "transfer_to_human": is_business_hours and available_agents > 0
         }
 
-async def get_agent_availability_response(
-    agent,
-    customer_id: str,
-    chat_history: list,
-    db,
-    api_key: str,
-    model_name: str,
-    model_type: str,
-    session_id: str,
-    transfer_group_id: str = None
-) -> dict:
+def _load_transfer_availability(agent, customer_id: str, db, transfer_group_id: str = None):
+    """
+    Read the online users of the transfer groups, the customer email and the organization.
+    Uses the sync session, so it runs in asyncio.to_thread. Returns None when there is no
+    group to transfer to.
+    """
     customer_repo = CustomerRepository(db)
     group_repo = GroupRepository(db)
 
@@ -174,25 +170,16 @@ async def get_agent_availability_response(
         try:
             db_group = group_repo.get_group_with_users(transfer_group_id)
             if not db_group:
-                return {
-                    "message": "I apologize, but I'm unable to transfer the chat at this time.",
-                    "transfer_to_human": False
-                }
+                return None
             agent_groups = [db_group]
         except Exception as e:
             logger.error(f"Error getting transfer group {transfer_group_id}: {str(e)}")
-            return {
-                "message": "I apologize, but I'm unable to transfer the chat at this time.",
-                "transfer_to_human": False
-            }
+            return None
     else:
         # Check if agent has groups (normal transfer)
         agent_groups = agent.get("groups") if isinstance(agent, dict) else agent.groups
         if not agent or not agent_groups:
-            return {
-                "message": "I apologize, but I'm unable to transfer the chat at this time.",
-                "transfer_to_human": False
-            }
+            return None
 
     # Get customer email if customer_id provided
     customer_email = None
@@ -209,9 +196,31 @@ async def get_agent_availability_response(
                 if user.is_online and user.is_active:
                     available_users.append(user)
 
-    # Get organization's business hours
+    # Organization, for its business hours and timezone
     org = agent.get("organization") if isinstance(agent, dict) else getattr(agent, 'organization', None)
-    
+    return available_users, customer_email, org
+
+
+async def get_agent_availability_response(
+    agent,
+    customer_id: str,
+    chat_history: list,
+    db,
+    api_key: str,
+    model_name: str,
+    model_type: str,
+    session_id: str,
+    transfer_group_id: str = None
+) -> dict:
+    availability = await asyncio.to_thread(_load_transfer_availability, agent, customer_id, db, transfer_group_id)
+    if availability is None:
+        return {
+            "message": "I apologize, but I'm unable to transfer the chat at this time.",
+            "transfer_to_human": False
+        }
+    available_users, customer_email, org = availability
+
+    # Get organization's business hours
     business_hours = org.business_hours if org and hasattr(org, 'business_hours') else {
         'monday': {'start': '09:00', 'end': '17:00', 'enabled': True},
         'tuesday': {'start': '09:00', 'end': '17:00', 'enabled': True},
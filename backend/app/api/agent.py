@@ -24,6 +24,7 @@ from app.database import get_db
 from app.models.user import User, UserGroup
 from app.core.auth import get_current_user, require_permissions
 from app.repositories.agent import AgentRepository
+from app.agents.agent_pool import invalidate_agent
 from app.repositories.knowledge import KnowledgeRepository
 from app.models.schemas.agent import AgentUpdate, AgentResponse, AgentCreate, AgentWithCustomizationResponse
 from sqlalchemy.orm import Session
@@ -513,6 +514,7 @@ async def update_agent_groups(
         agent.groups = groups
         db.commit()
         db.refresh(agent)
+        invalidate_agent(agent_id)
 
         # Prepare response
         knowledge_repo = KnowledgeRepository(db)
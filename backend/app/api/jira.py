@@ -18,6 +18,7 @@ from app.core.config import settings
 from pydantic import BaseModel
 from typing import Optional, List
 from app.core.exceptions import JiraAuthError
+from app.agents.agent_pool import invalidate_agent, invalidate_organization
 
 router = APIRouter()
 jira_service = JiraService()
@@ -126,6 +127,7 @@ async def disconnect_jira(
         # Delete the Jira token
         db.delete(token)
         db.commit()
+        invalidate_organization(organization.id)
         
         logger.info(f"Jira disconnected for organization {organization.id} by user {current_user.id}. Deleted {config_count} agent configurations.")
     except Exception as e:
@@ -509,6 +511,7 @@ async def save_agent_jira_config(
         db.add(new_config)
     
     db.commit()
+    invalidate_agent(agent_id)
     
     return {"message": "Agent Jira configuration saved successfully"}
 
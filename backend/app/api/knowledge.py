@@ -18,22 +18,22 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 
 import traceback
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Body, Query, status
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.models.user import User
 from app.core.auth import get_current_user, require_permissions
 from app.core.logger import get_logger
-import json
 import os
 import asyncio
 from pydantic import BaseModel, field_validator
-from sqlalchemy import text
 from uuid import UUID
 from app.database import get_db
 from app.models.knowledge_to_agent import KnowledgeToAgent
 from app.repositories.knowledge import KnowledgeRepository
 from app.repositories.knowledge_to_agent import KnowledgeToAgentRepository
+from app.tools.knowledge_search_byagent import invalidate_agent_knowledge, invalidate_organization_knowledge
 from app.models.knowledge_queue import KnowledgeQueue, QueueStatus
 from app.repositories.knowledge_queue import KnowledgeQueueRepository
+from app.repositories.knowledge_page import KnowledgePageRepository
 from app.core.config import settings
 from sqlalchemy.orm import Session
 from app.core.s3 import upload_file_to_s3, get_s3_signed_url
@@ -333,44 +333,51 @@ async def add_explore_url(
 
 
 
-def _get_crawled_urls_info(crawled_urls):
-    """Get comprehensive information about crawled URLs"""
+def _get_legacy_crawled_urls(crawled_urls) -> List[str]:
+    """URLs from the crawled_urls JSON column of queue items processed before knowledge_queue_urls"""
     if not crawled_urls or not isinstance(crawled_urls, list):
-        return {
-            "latest_url": None,
-            "all_urls": [],
-            "count": 0
-        }
-    
+        return []
+
     all_urls = []
-    latest_url = None
-    
     try:
         for item in crawled_urls:
             if isinstance(item, str):
                 # New format: just URL strings
                 all_urls.append(item)
-                latest_url = item  # Keep updating to get the last one
             elif isinstance(item, dict) and "url" in item:
                 # Legacy format: objects with url, timestamp, status
                 all_urls.append(item["url"])
-                latest_url = item["url"]
     except (KeyError, TypeError) as e:
         logger.warning(f"Error processing crawled URLs: {str(e)}")
-    
+    return all_urls
+
+
+def _get_crawled_urls_info(queue_repo: KnowledgeQueueRepository, queue_item: KnowledgeQueue, offset: int = 0, limit: int = 100):
+    """Get the latest crawled URL, the total count and one page of the crawled URLs of a queue item"""
+    count = queue_repo.count_crawled_urls(queue_item.id)
+    if count:
+        return {
+            "latest_url": queue_repo.get_latest_crawled_url(queue_item.id),
+            "all_urls": queue_repo.get_crawled_urls(queue_item.id, offset=offset, limit=limit),
+            "count": count
+        }
+
+    legacy_urls = _get_legacy_crawled_urls(queue_item.crawled_urls)
     return {
-        "latest_url": latest_url,
-        "all_urls": all_urls,
-        "count": len(all_urls)
+        "latest_url": legacy_urls[-1] if legacy_urls else None,
+        "all_urls": legacy_urls[offset:offset + limit],
+        "count": len(legacy_urls)
     }
 
 
 @router.get("/explore/progress/{queue_id}")
 async def get_explore_progress(
     queue_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    """Get progress status for knowledge base processing"""
+    """Get progress status for knowledge base processing, with one page of the crawled URLs"""
     try:
         queue_repo = KnowledgeQueueRepository(db)
         queue_item = queue_repo.get_by_id(queue_id)
@@ -409,8 +416,6 @@ async def get_explore_progress(
             processing_stage_str = "COMPLETED"
         
         logger.debug(f"Queue {queue_id}: status='{status_str}', stage='{processing_stage_str}', progress={queue_item.progress_percentage}, is_complete={status_str.upper() in ['COMPLETED', 'FAILED']}")
-        logger.debug(f"Queue {queue_id}: crawled_urls count={len(queue_item.crawled_urls) if queue_item.crawled_urls else 0}")
-        logger.debug(f"Queue {queue_id}: crawled_urls raw value: {queue_item.crawled_urls}")
         
         current_stage = stage_info.get(processing_stage_str, 
                                      {"label": "Processing", "step": 1, "total": 4})
@@ -424,7 +429,7 @@ async def get_explore_progress(
             overall_progress = min(100, stage_weight + stage_progress)
         
         # Get crawled URLs information
-        crawled_urls_info = _get_crawled_urls_info(queue_item.crawled_urls)
+        crawled_urls_info = _get_crawled_urls_info(queue_repo, queue_item, offset=offset, limit=limit)
         
         return {
             "queue_id": queue_item.id,
@@ -441,6 +446,8 @@ async def get_explore_progress(
             "crawled_url": crawled_urls_info["latest_url"],
             "crawled_urls": crawled_urls_info["all_urls"],
             "crawled_count": crawled_urls_info["count"],
+            "crawled_urls_offset": offset,
+            "crawled_urls_limit": limit,
             "is_complete": status_str.upper() in ["COMPLETED", "FAILED"],
             "error_message": getattr(queue_item, 'error_message', None)
         }
@@ -585,45 +592,8 @@ async def link_knowledge_to_agent(
             agent_id=agent_uuid
         ))
 
-        # Update vector database filters to include the new agent_id
-        if knowledge.table_name and knowledge.schema:
-            # Get existing records for this knowledge source
-            query = text(f"""
-                SELECT DISTINCT name, filters 
-                FROM {knowledge.schema}."{knowledge.table_name}"
-                WHERE name = :source
-            """)
-
-            result = db.execute(query, {"source": knowledge.source}).first()
-
-            if result:
-                # Get current filters and update agent_ids
-                filters = result.filters if result.filters else {}
-                agent_ids = filters.get('agent_id', [])
-                if isinstance(agent_ids, list) and str(agent_uuid) not in agent_ids:
-                    agent_ids.append(str(agent_uuid))
-                else:
-                    agent_ids = [str(agent_uuid)]
-                
-                # Create new filters object with updated agent_ids
-                new_filters = {
-                    'name': knowledge.source,
-                    'org_id': str(knowledge.organization_id),
-                    'agent_id': agent_ids
-                }
-                
-                # Update the filters in the vector database using string concatenation for JSONB
-                update_query = text(f"""
-                    UPDATE {knowledge.schema}."{knowledge.table_name}"
-                    SET filters = '{json.dumps(new_filters)}'::jsonb
-                    WHERE name = :source
-                """)
-
-                db.execute(update_query, {
-                    "source": knowledge.source
-                })
-                db.commit()
-
+        # Search resolves visibility through knowledge_to_agent, so the vector rows are left untouched
+        invalidate_agent_knowledge(agent_uuid)
         return {"message": "Knowledge linked to agent successfully"}
 
     except HTTPException:
@@ -661,43 +631,8 @@ async def unlink_knowledge_from_agent(
         if not success:
             raise HTTPException(status_code=404, detail="Link not found")
 
-        # Update vector database filters to remove the agent_id
-        if knowledge.table_name and knowledge.schema:
-            # Get existing records for this knowledge source
-            query = text(f"""
-                SELECT DISTINCT name, filters 
-                FROM {knowledge.schema}."{knowledge.table_name}"
-                WHERE name = :source
-            """)
-
-            result = db.execute(query, {"source": knowledge.source}).first()
-
-            if result:
-                # Get current filters and remove agent_id
-                filters = result.filters if result.filters else {}
-                agent_ids = filters.get('agent_id', [])
-                if str(agent_uuid) in agent_ids:
-                    agent_ids.remove(str(agent_uuid))
-                
-                # Create new filters object with updated agent_ids
-                new_filters = {
-                    'name': knowledge.source,
-                    'org_id': str(knowledge.organization_id),
-                    'agent_id': agent_ids
-                }
-                
-                # Update the filters in the vector database using string concatenation for JSONB
-                update_query = text(f"""
-                    UPDATE {knowledge.schema}."{knowledge.table_name}"
-                    SET filters = '{json.dumps(new_filters)}'::jsonb
-                    WHERE name = :source
-                """)
-
-                db.execute(update_query, {
-                    "source": knowledge.source
-                })
-                db.commit()
-
+        # Search resolves visibility through knowledge_to_agent, so the vector rows are left untouched
+        invalidate_agent_knowledge(agent_uuid)
         return {"message": "Knowledge unlinked from agent successfully"}
 
     except HTTPException:
@@ -707,6 +642,44 @@ async def unlink_knowledge_from_agent(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _get_knowledge_pages(db: Session, knowledge_items) -> Dict[int, Dict[str, Any]]:
+    """
+    Subpages of each knowledge item from the knowledge_pages catalog, read with one query per
+    organization. Sources ingested before the catalog existed are catalogued from their vector
+    table on first listing.
+    """
+    page_repo = KnowledgePageRepository(db)
+    result = {}
+    items_by_org = {}
+    for k in knowledge_items:
+        items_by_org.setdefault(k.organization_id, []).append(k)
+
+    for org_id, items in items_by_org.items():
+        catalog = page_repo.get_by_sources(org_id, {k.source for k in items})
+        for k in items:
+            if k.source not in catalog and k.table_name and k.schema:
+                try:
+                    page_repo.refresh_source(org_id, k.source, k.schema, k.table_name)
+                    catalog.update(page_repo.get_by_sources(org_id, [k.source]))
+                except Exception as e:
+                    logger.error(f"Error cataloguing pages of {k.source} from {k.table_name}: {str(e)}")
+                    db.rollback()
+                    result[k.id] = {"error": f"Error accessing data: {str(e)}"}
+                    continue
+            result[k.id] = {
+                "pages": [
+                    {
+                        "subpage": page.subpage,
+                        "chunk_count": page.chunk_count,
+                        "created_at": page.created_at.isoformat() if page.created_at else None,
+                        "updated_at": page.updated_at.isoformat() if page.updated_at else None
+                    }
+                    for page in catalog.get(k.source, [])
+                ]
+            }
+    return result
+
+
 @router.get("/agent/{agent_id}")
 async def get_knowledge_by_agent(
     agent_id: str,
@@ -737,6 +710,7 @@ async def get_knowledge_by_agent(
         )
 
 
+        pages = _get_knowledge_pages(db, knowledge_items)
         result = []
         for k in knowledge_items:
             # Base knowledge data
@@ -747,43 +721,7 @@ async def get_knowledge_by_agent(
                 "pages": []
             }
 
-            # Query the actual data if table_name is specified
-            if k.table_name and k.schema:
-                try:
-                    # Create a safe query to get unique records with cleaned source
-                    query = text(f"""
-                        SELECT DISTINCT
-                            CASE
-                                WHEN id LIKE '%\\_%%' ESCAPE '\\'
-                                THEN substring(id, 1, length(id) - position('_' in reverse(id)))
-                                ELSE id
-                            END as subpage,
-                            id,
-                            created_at,
-                            updated_at
-                        FROM {k.schema}."{k.table_name}"
-                        WHERE name = :source
-                    """)
-
-                    # Execute query with parameters
-                    rows = db.execute(query, {"source": k.source})
-
-                    # Group pages by subpage
-                    pages_dict = {}
-                    for row in rows:
-                        subpage = row.subpage
-                        if subpage not in pages_dict:
-                            pages_dict[subpage] = {
-                                "subpage": subpage,
-                                "created_at": row.created_at.isoformat() if row.created_at else None,
-                                "updated_at": row.updated_at.isoformat() if row.updated_at else None
-                            }
-
-                    knowledge_data["pages"] = list(pages_dict.values())
-
-                except Exception as e:
-                    logger.error(f"Error querying table {k.table_name}: {str(e)}")
-                    knowledge_data["error"] = f"Error accessing data: {str(e)}"
+            knowledge_data.update(pages.get(k.id, {}))
 
             result.append(knowledge_data)
 
@@ -840,6 +778,7 @@ async def get_knowledge_by_organization(
         )
         logger.debug(f"Knowledge items for organization {org_uuid}: {knowledge_items}")
 
+        pages = _get_knowledge_pages(db, knowledge_items)
         result = []
         for k in knowledge_items:
             # Base knowledge data
@@ -850,43 +789,7 @@ async def get_knowledge_by_organization(
                 "pages": []
             }
 
-            # Query the actual data if table_name is specified
-            if k.table_name and k.schema:
-                try:
-                    # Create a safe query to get unique records with cleaned source
-                    query = text(f"""
-                        SELECT DISTINCT
-                            CASE
-                                WHEN id LIKE '%\\_%%' ESCAPE '\\'
-                                THEN substring(id, 1, length(id) - position('_' in reverse(id)))
-                                ELSE id
-                            END as subpage,
-                            id,
-                            created_at,
-                            updated_at
-                        FROM {k.schema}."{k.table_name}"
-                        WHERE name = :source
-                    """)
-
-                    # Execute query with parameters
-                    rows = db.execute(query, {"source": k.source})
-
-                    # Group pages by subpage
-                    pages_dict = {}
-                    for row in rows:
-                        subpage = row.subpage
-                        if subpage not in pages_dict:
-                            pages_dict[subpage] = {
-                                "subpage": subpage,
-                                "created_at": row.created_at.isoformat() if row.created_at else None,
-                                "updated_at": row.updated_at.isoformat() if row.updated_at else None
-                            }
-
-                    knowledge_data["pages"] = list(pages_dict.values())
-
-                except Exception as e:
-                    logger.error(f"Error querying table {k.table_name}: {str(e)}")
-                    knowledge_data["error"] = f"Error accessing data: {str(e)}"
+            knowledge_data.update(pages.get(k.id, {}))
 
             result.append(knowledge_data)
 
@@ -1014,6 +917,7 @@ async def delete_knowledge(
         success = knowledge_repo.delete_with_data(knowledge_id)
 
         if success:
+            invalidate_organization_knowledge(knowledge.organization_id)
             return {"message": "Knowledge source deleted successfully"}
         
         raise HTTPException(
@@ -40,6 +40,7 @@ from app.models.organization import Organization
 from app.repositories.widget import WidgetRepository
 from app.services.shopify import ShopifyService
 from app.repositories.knowledge import KnowledgeRepository
+from app.tools.knowledge_search_byagent import invalidate_agent_knowledge
 from app.repositories.knowledge_queue import KnowledgeQueueRepository
 from app.repositories.knowledge_to_agent import KnowledgeToAgentRepository
 from app.models.knowledge import SourceType
@@ -530,6 +531,7 @@ async def save_agent_shopify_config(
                             logger.info(f"Linking knowledge source {existing_knowledge.id} to agent {agent_id}...")
                             link = KnowledgeToAgent(knowledge_id=existing_knowledge.id, agent_id=agent_uuid)
                             link_repo.create(link)
+                            invalidate_agent_knowledge(agent_uuid)
                             # Optional: Could add vector DB filter update here later if needed
                             logger.info(f"Successfully linked knowledge source {existing_knowledge.id} to agent {agent_id}.")
                         else:
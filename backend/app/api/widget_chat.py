@@ -24,15 +24,17 @@ import re
 from fastapi import APIRouter
 from app.core.socketio import sio
 from app.core.logger import get_logger
+from app.core.config import settings
 import traceback
 from app.agents.chat_agent import ChatAgent, ChatResponse
+from app.agents.agent_pool import agent_pool
 from app.core.auth_utils import authenticate_socket, authenticate_socket_conversation_token
-from app.database import get_db
-from app.repositories.ai_config import AIConfigRepository
-from app.repositories.widget import WidgetRepository
+from app.database import SessionLocal, AsyncSessionLocal
+from app.repositories.ai_config import AsyncAIConfigRepository
+from app.repositories.widget import AsyncWidgetRepository
 from app.core.security import decrypt_api_key
-from app.repositories.session_to_agent import SessionToAgentRepository
-from app.repositories.chat import ChatRepository
+from app.repositories.session_to_agent import SessionToAgentRepository, AsyncSessionToAgentRepository
+from app.repositories.chat import ChatRepository, AsyncChatRepository
 from app.repositories.customer import CustomerRepository
 import uuid
 from app.services.socket_rate_limit import socket_rate_limit
@@ -40,7 +42,7 @@ from app.services.workflow_chat import WorkflowChatService
 
 from app.models.session_to_agent import SessionStatus
 from app.agents.transfer_agent import get_agent_availability_response
-from app.repositories.agent import AgentRepository
+from app.repositories.agent import AsyncAgentRepository
 from app.repositories.rating import RatingRepository
 from app.repositories.jira import JiraRepository
 from app.models.ai_config import AIModelType
@@ -141,8 +143,32 @@ def validate_form_data(form_fields: list, form_data: dict) -> list:
     
     return errors
 
+def update_generated_customer_email(db, customer_id: str, org_id: str, submitted_email: str) -> None:
+    """Replace a customer's generated @noemail.com email with one submitted in a workflow form"""
+    customer_repo = CustomerRepository(db)
+    customer = customer_repo.get_by_id(customer_id)
+    
+    if customer and customer.email and '@noemail.com' in customer.email:
+        # Customer has a generated @noemail.com email, update it with the real email
+        try:
+            # Check if the new email already exists for another customer in the same organization
+            existing_customer = customer_repo.get_customer_by_email(submitted_email, org_id)
+            if not existing_customer:
+                # Update customer email
+                old_email = customer.email
+                customer.email = submitted_email
+                db.commit()
+                logger.info(f"Updated customer {customer_id} email from {old_email} to {submitted_email}")
+            else:
+                logger.warning(f"Email {submitted_email} already exists for another customer, skipping update")
+        except Exception as e:
+            logger.error(f"Failed to update customer email: {str(e)}")
+            db.rollback()
+
+
 @sio.on('connect', namespace='/widget')
 async def widget_connect(sid, environ, auth):
+    db = AsyncSessionLocal()
     try:
        
         logger.info(f"Widget client connected: {auth}")
@@ -153,15 +179,14 @@ async def widget_connect(sid, environ, auth):
             raise ValueError("Widget authentication failed")
 
         # Get widget and verify it exists
-        db = next(get_db())
-        widget_repo = WidgetRepository(db)
-        widget = widget_repo.get_widget(widget_id)
+        widget_repo = AsyncWidgetRepository(db)
+        widget = await widget_repo.get_widget(widget_id)
         if not widget:
             raise ValueError("Invalid widget ID")
 
         # Get AI config for widget's organization
-        ai_config_repo = AIConfigRepository(db)
-        ai_config = ai_config_repo.get_active_config(org_id)
+        ai_config_repo = AsyncAIConfigRepository(db)
+        ai_config = await ai_config_repo.get_active_config(org_id)
         if not ai_config:
             await sio.emit('error', {
                 'error': 'AI configuration required',
@@ -172,14 +197,16 @@ async def widget_connect(sid, environ, auth):
         message_limit_reached = False
         # Check message limits if enterprise module is available
         if HAS_ENTERPRISE and ai_config.model_type == AIModelType.CHATTERMATE:
-            if not await check_message_limit(db, org_id, sid, sio):
-                message_limit_reached = True
+            # The enterprise message limit check works on a sync session
+            with SessionLocal() as sync_db:
+                if not await check_message_limit(sync_db, org_id, sid, sio):
+                    message_limit_reached = True
 
         
-        session_repo = SessionToAgentRepository(db)
+        session_repo = AsyncSessionToAgentRepository(db)
                 
         # Try to get existing active session
-        active_session = session_repo.get_active_customer_session(
+        active_session = await session_repo.get_active_customer_session(
             customer_id=customer_id,
             agent_id=widget.agent_id
         )
@@ -190,7 +217,7 @@ async def widget_connect(sid, environ, auth):
         else:
             # Create new session if none exists
             new_session_id = str(uuid.uuid4())
-            session_repo.create_session(
+            await session_repo.create_session(
                 session_id=new_session_id,
                 agent_id=widget.agent_id,
                 customer_id=customer_id,
@@ -203,8 +230,8 @@ async def widget_connect(sid, environ, auth):
         await sio.enter_room(sid, session_id, namespace='/widget')
         
         # Get agent to retrieve rate limiting settings
-        agent_repo = AgentRepository(db)
-        agent = agent_repo.get_agent(widget.agent_id)
+        agent_repo = AsyncAgentRepository(db)
+        agent = await agent_repo.get_agent(widget.agent_id)
         
         # Store session data including rate limiting settings
         enable_rate_limiting = agent.enable_rate_limiting if agent else False
@@ -258,12 +285,16 @@ async def widget_connect(sid, environ, auth):
             'type': 'connection_error'
         }, to=sid, namespace='/widget')
         return False
+    finally:
+        await db.close()
 
 
 @sio.on('chat', namespace='/widget')
 @socket_rate_limit(namespace='/widget')
 async def handle_widget_chat(sid, data):
     """Handle widget chat messages"""
+    db = AsyncSessionLocal()
+    sync_db = None  # Only opened for the workflow and transfer paths, whose sync services run their queries in threads
     try:
         # Authenticate using conversation token
         session = await sio.get_session(sid, namespace='/widget')
@@ -287,11 +318,10 @@ async def handle_widget_chat(sid, data):
             session['customer_id'] != customer_id):
             raise ValueError("Session mismatch")
 
-        db = next(get_db())
-        session_repo = SessionToAgentRepository(db)
+        session_repo = AsyncSessionToAgentRepository(db)
                 
         # Try to get existing active session
-        active_session = session_repo.get_active_customer_session(
+        active_session = await session_repo.get_active_customer_session(
             customer_id=customer_id,
             agent_id=session['agent_id']
         )
@@ -307,17 +337,17 @@ async def handle_widget_chat(sid, data):
 
         if not active_session:
             # Check if there's a closed session that can be reopened
-            latest_session = session_repo.get_latest_customer_session(
+            latest_session = await session_repo.get_latest_customer_session(
                 customer_id=customer_id
             )
             
             if latest_session and latest_session.status == SessionStatus.CLOSED:
                 # Reopen the closed session if it matches the current session ID
                 if str(latest_session.session_id) == session_id:
-                    success = session_repo.reopen_closed_session(session_id)
+                    success = await session_repo.reopen_closed_session(session_id)
                     if success:
                         # Refresh the session data
-                        active_session = session_repo.get_session(session_id)
+                        active_session = await session_repo.get_session(session_id)
                         logger.info(f"Reopened closed session {session_id} for customer {customer_id}")
                     else:
                         raise ValueError("Failed to reopen closed session")
@@ -332,9 +362,10 @@ async def handle_widget_chat(sid, data):
         # Check if agent uses workflow and no human agent has taken over
         if active_session.workflow_id and active_session.user_id is None:
             # Handle workflow chat using the dedicated service
-            workflow_chat_service = WorkflowChatService(db)
+            sync_db = SessionLocal()
+            workflow_chat_service = WorkflowChatService(sync_db)
             response = await workflow_chat_service.handle_workflow_chat(
-                active_session=active_session,
+                active_session=await asyncio.to_thread(SessionToAgentRepository(sync_db).get_session, session_id),
                 message=message,
                 session_id=session_id,
                 org_id=org_id,
@@ -363,8 +394,8 @@ async def handle_widget_chat(sid, data):
                 return
         elif active_session.status == SessionStatus.OPEN and active_session.user_id is None: # open and user has not taken over
             logger.debug(f"Initializing chat agent for model {session['ai_config'].model_type}")
-            # Initialize chat agent with async factory method for MCP tools support
-            chat_agent = await ChatAgent.create_async(
+            # Get a per-session chat agent from the pooled agent template (MCP tools are still attached per message)
+            chat_agent = await agent_pool.create_agent(
                 api_key=decrypt_api_key(session['ai_config'].encrypted_api_key),
                 model_name=session['ai_config'].model_name,
                 model_type=session['ai_config'].model_type,
@@ -374,14 +405,23 @@ async def handle_widget_chat(sid, data):
                 session_id=session_id,
                 source=session.get('source')
             )
+            async def emit_response_delta(delta: str):
+                await sio.emit('chat_response_delta', {
+                    'delta': delta,
+                    'type': 'chat_response_delta',
+                    'session_id': session_id
+                }, room=session_id, namespace='/widget')
+
             try:
                 # Get response from ai agent (this already handles end chat internally)
+                # When streaming, deltas are emitted as they arrive and the final chat_response below replaces them
                 response = await chat_agent.get_response(
                     message=message,
                     session_id=chat_agent.agent.session_id,
                     org_id=org_id,
                     agent_id=session['agent_id'],
-                    customer_id=customer_id)
+                    customer_id=customer_id,
+                    on_delta=emit_response_delta if settings.CHAT_STREAMING_ENABLED else None)
             finally:
                 # Clean up MCP tools
                 # Use asyncio.create_task to ensure cleanup doesn't block the main flow
@@ -395,8 +435,9 @@ async def handle_widget_chat(sid, data):
         elif active_session.status == SessionStatus.TRANSFERRED and active_session.user_id is None: # transferred and user has not taken over
             logger.debug(f"Transferring chat to human for session {session_id}")
             # Get response from agent transfer ai agent
-            chat_repo = ChatRepository(db)
-            chat_repo.create_message({
+            sync_db = SessionLocal()
+            chat_repo = ChatRepository(sync_db)
+            await asyncio.to_thread(chat_repo.create_message, {
                 "message": message,
                 "message_type": "user",
                 "session_id": session_id,
@@ -404,15 +445,14 @@ async def handle_widget_chat(sid, data):
                 "agent_id": session['agent_id'],
                 "customer_id": customer_id,
             })
-            chat_history = []
-            chat_history = chat_repo.get_session_history(session_id)
-            jira_repo = JiraRepository(db)
-            agent_data = jira_repo.get_agent_with_jira_config(session['agent_id']) if session['agent_id'] else None
+            chat_history = await asyncio.to_thread(chat_repo.get_session_history, session_id)
+            jira_repo = JiraRepository(sync_db)
+            agent_data = await asyncio.to_thread(jira_repo.get_agent_with_jira_config, session['agent_id']) if session['agent_id'] else None
             availability_response = await get_agent_availability_response(
                 agent=agent_data,
                 customer_id=customer_id,
                 chat_history=chat_history,
-                db=db,
+                db=sync_db,
                 api_key=decrypt_api_key(session['ai_config'].encrypted_api_key),
                 model_name=session['ai_config'].model_name,
                 model_type=session['ai_config'].model_type,
@@ -431,7 +471,7 @@ async def handle_widget_chat(sid, data):
             )
                 
             # Store AI response with transfer status
-            chat_repo.create_message({
+            await asyncio.to_thread(chat_repo.create_message, {
                 "message": response_content.message,
                 "message_type": "bot",
                 "session_id": session_id,
@@ -452,8 +492,8 @@ async def handle_widget_chat(sid, data):
             response = response_content
         elif active_session.workflow_id and active_session.user_id is not None:
             # Workflow session but human agent has taken over - handle like regular human takeover
-            chat_repo = ChatRepository(db)
-            chat_repo.create_message({
+            chat_repo = AsyncChatRepository(db)
+            await chat_repo.queue_message({
                 "message": message,
                 "message_type": "user",
                 "session_id": session_id,
@@ -463,7 +503,7 @@ async def handle_widget_chat(sid, data):
                 "user_id": active_session.user_id,
             })
             # Get session data to find assigned user
-            session_data = session_repo.get_session(session_id)
+            session_data = await session_repo.get_session(session_id)
             user_id = str(session_data.user_id) if session_data and session_data.user_id else None
             timestamp = format_datetime(datetime.datetime.now())
 
@@ -489,8 +529,8 @@ async def handle_widget_chat(sid, data):
 
             return # don't do anything further - human agent handles the conversation
         else:
-            chat_repo = ChatRepository(db)
-            chat_repo.create_message({
+            chat_repo = AsyncChatRepository(db)
+            await chat_repo.queue_message({
                 "message": message,
                 "message_type": "user",
                 "session_id": session_id,
@@ -500,7 +540,7 @@ async def handle_widget_chat(sid, data):
                 "user_id": active_session.user_id,
             })
             # Get session data to find assigned user
-            session_data = session_repo.get_session(session_id)
+            session_data = await session_repo.get_session(session_id)
             user_id = str(session_data.user_id) if session_data and session_data.user_id else None
             timestamp = format_datetime(datetime.datetime.now())
 
@@ -567,11 +607,16 @@ async def handle_widget_chat(sid, data):
             'error': 'Unable to process your request, please try again later.',
             'type': 'chat_error'
         }, to=sid, namespace='/widget')
+    finally:
+        await db.close()
+        if sync_db is not None:
+            sync_db.close()
 
 
 @sio.on('get_chat_history', namespace='/widget')
 @socket_rate_limit(namespace='/widget')
 async def get_widget_chat_history(sid):
+    db = AsyncSessionLocal()
     try:
         logger.info(f"Getting chat history for sid {sid}")
         # Get session data
@@ -591,11 +636,9 @@ async def get_widget_chat_history(sid):
             session['customer_id'] != customer_id):
             raise ValueError("Session mismatch")
         
-        db = next(get_db())
-        
         # Get active session using new repository
-        session_repo = SessionToAgentRepository(db)
-        active_session = session_repo.get_active_customer_session(
+        session_repo = AsyncSessionToAgentRepository(db)
+        active_session = await session_repo.get_active_customer_session(
             customer_id=customer_id,
             agent_id=session['agent_id']
         )
@@ -609,8 +652,8 @@ async def get_widget_chat_history(sid):
             return
 
         # Get chat history for active session
-        chat_repo = ChatRepository(db)
-        messages = chat_repo.get_session_history(
+        chat_repo = AsyncChatRepository(db)
+        messages = await chat_repo.get_session_history(
             session_id=active_session.session_id
         )
 
@@ -642,6 +685,8 @@ async def get_widget_chat_history(sid):
             'error': 'Failed to get chat history',
             'type': 'chat_history_error'
         }, to=sid, namespace='/widget')
+    finally:
+        await db.close()
 
 
 # Add connection handler for agent namespace
@@ -672,6 +717,7 @@ async def agent_connect(sid, environ, auth):
 # Add new socket event handler for agent messages
 @sio.on('agent_message', namespace='/agent')
 async def handle_agent_message(sid, data):
+    db = AsyncSessionLocal()
     try:
         session = await sio.get_session(sid, namespace='/agent')
         session_id = data['session_id']
@@ -680,12 +726,11 @@ async def handle_agent_message(sid, data):
         if not session_id:
             raise ValueError("No active session")
 
-        db = next(get_db())
-        session_repo = SessionToAgentRepository(db)
-        chat_repo = ChatRepository(db)
+        session_repo = AsyncSessionToAgentRepository(db)
+        chat_repo = AsyncChatRepository(db)
         
         # Verify session and agent permissions
-        session_data = session_repo.get_session(session_id)
+        session_data = await session_repo.get_session(session_id)
         if not session_data or str(session_data.user_id) != session.get('user_id'):
             raise ValueError("Unauthorized")
 
@@ -707,13 +752,13 @@ async def handle_agent_message(sid, data):
             }
         }
         
-        chat_repo.create_message(message)
+        await chat_repo.queue_message(message)
         
         # Check if this is an end chat message
         if data.get('end_chat') is True:
             logger.info(f"Agent ended chat session {session_id}")
             # Update session status to closed
-            session_repo.update_session_status(session_id, "CLOSED")
+            await session_repo.update_session_status(session_id, "CLOSED")
             
         
         # Emit to widget clients
@@ -751,10 +796,13 @@ async def handle_agent_message(sid, data):
             'error': 'Failed to send message',
             'type': 'message_error'
         }, to=sid, namespace='/agent')
+    finally:
+        await db.close()
 
 # Add handlers for room management
 @sio.on('join_room', namespace='/agent')
 async def handle_join_room(sid, data):
+    db = AsyncSessionLocal()
     try:
         session = await sio.get_session(sid, namespace='/agent')
         session_id = data.get('session_id')
@@ -771,9 +819,8 @@ async def handle_join_room(sid, data):
             return
 
         # Verify this agent has permission to join this room
-        db = next(get_db())
-        session_repo = SessionToAgentRepository(db)
-        session_data = session_repo.get_session(session_id)
+        session_repo = AsyncSessionToAgentRepository(db)
+        session_data = await session_repo.get_session(session_id)
         
         if not session_data:
             raise ValueError("Invalid session")
@@ -804,6 +851,8 @@ async def handle_join_room(sid, data):
             'error': 'Failed to join room',
             'type': 'room_error'
         }, to=sid, namespace='/agent')
+    finally:
+        await db.close()
 
 @sio.on('leave_room', namespace='/agent')
 async def handle_leave_room(sid, data):
@@ -843,6 +892,7 @@ async def handle_taken_over(sid, data):
 @socket_rate_limit(namespace='/widget')
 async def handle_rating_submission(sid, data):
     """Handle rating submission from widget"""
+    db = SessionLocal()
     try:
         # Get session data and authenticate
         session = await sio.get_session(sid, namespace='/widget')
@@ -867,18 +917,18 @@ async def handle_rating_submission(sid, data):
         if not rating or not isinstance(rating, int) or rating < 1 or rating > 5:
             raise ValueError("Invalid rating value")
 
-        db = next(get_db())
         
         # Get session details
         session_repo = SessionToAgentRepository(db)
-        session_data = session_repo.get_session(session_id)
+        session_data = await asyncio.to_thread(session_repo.get_session, session_id)
         
         if not session_data:
             raise ValueError("Session not found")
 
         # Create rating using repository
         rating_repo = RatingRepository(db)
-        rating_obj = rating_repo.create_rating(
+        rating_obj = await asyncio.to_thread(
+            rating_repo.create_rating,
             session_id=session_id,
             customer_id=customer_id,
             user_id=session_data.user_id,
@@ -916,12 +966,15 @@ async def handle_rating_submission(sid, data):
             'error': 'Failed to submit rating',
             'type': 'rating_error'
         }, to=sid, namespace='/widget')
+    finally:
+        db.close()
 
 
 @sio.on('get_workflow_state', namespace='/widget')
 @socket_rate_limit(namespace='/widget') 
 async def handle_get_workflow_state(sid):
     """Get current workflow state and execute next node if no chat history"""
+    db = SessionLocal()
     try:
         logger.info(f"Getting workflow state for sid {sid}")
         # Get session data and authenticate
@@ -940,12 +993,12 @@ async def handle_get_workflow_state(sid):
             session['customer_id'] != customer_id):
             raise ValueError("Session mismatch")
 
-        db = next(get_db())
         session_repo = SessionToAgentRepository(db)
         chat_repo = ChatRepository(db)
         
         # Get active session
-        active_session = session_repo.get_active_customer_session(
+        active_session = await asyncio.to_thread(
+            session_repo.get_active_customer_session,
             customer_id=customer_id
         )
         
@@ -953,7 +1006,7 @@ async def handle_get_workflow_state(sid):
             raise ValueError("No active session found")
 
         # Check if there's any chat history
-        chat_history = chat_repo.get_session_history(session_id)
+        chat_history = await asyncio.to_thread(chat_repo.get_session_history, session_id)
         has_history = len(chat_history) > 0
 
         # If agent uses workflow, handle workflow state
@@ -992,7 +1045,7 @@ async def handle_get_workflow_state(sid):
                             logger.debug(f"Emitting intermediate message: {intermediate_message}")
                             
                             # Store intermediate message in chat history
-                            chat_repo.create_message({
+                            await asyncio.to_thread(chat_repo.create_message, {
                                 "message": intermediate_message,
                                 "message_type": "bot",
                                 "session_id": session_id,
@@ -1039,7 +1092,7 @@ async def handle_get_workflow_state(sid):
                         
                     elif workflow_result.message:
                         # Store initial message and emit
-                        chat_repo.create_message({
+                        await asyncio.to_thread(chat_repo.create_message, {
                             "message": workflow_result.message,
                             "message_type": "bot",
                             "session_id": session_id,
@@ -1082,7 +1135,7 @@ async def handle_get_workflow_state(sid):
                 try:
                     from app.repositories.workflow import WorkflowRepository
                     workflow_repo = WorkflowRepository(db)
-                    workflow = workflow_repo.get_workflow_with_nodes_and_connections(active_session.workflow_id)
+                    workflow = await asyncio.to_thread(workflow_repo.get_workflow_with_nodes_and_connections, active_session.workflow_id)
                     
                     if workflow:
                         current_node = None
@@ -1179,12 +1232,15 @@ async def handle_get_workflow_state(sid):
             'error': 'Failed to get workflow state',
             'type': 'workflow_error'
         }, to=sid, namespace='/widget')
+    finally:
+        db.close()
 
 
 @sio.on('proceed_workflow', namespace='/widget')
 @socket_rate_limit(namespace='/widget')
 async def handle_proceed_workflow(sid, data):
     """Proceed to next workflow node after landing page interaction"""
+    db = SessionLocal()
     try:
         logger.info(f"Proceeding workflow for sid {sid}")
         # Get session data and authenticate
@@ -1203,12 +1259,12 @@ async def handle_proceed_workflow(sid, data):
             session['customer_id'] != customer_id):
             raise ValueError("Session mismatch")
 
-        db = next(get_db())
         session_repo = SessionToAgentRepository(db)
         chat_repo = ChatRepository(db)
         
         # Get active session
-        active_session = session_repo.get_active_customer_session(
+        active_session = await asyncio.to_thread(
+            session_repo.get_active_customer_session,
             customer_id=customer_id
         )
 
@@ -1221,7 +1277,7 @@ async def handle_proceed_workflow(sid, data):
         # Get current node and find next node
         from app.repositories.workflow import WorkflowRepository
         workflow_repo = WorkflowRepository(db)
-        workflow = workflow_repo.get_workflow_with_nodes_and_connections(active_session.workflow_id)
+        workflow = await asyncio.to_thread(workflow_repo.get_workflow_with_nodes_and_connections, active_session.workflow_id)
         
         if not workflow:
             raise ValueError("Workflow not found")
@@ -1236,9 +1292,10 @@ async def handle_proceed_workflow(sid, data):
         if not current_node:
             raise ValueError("Current node not found")
         
-        # Find next node
+        # Find next node (outgoing_connections is lazy loaded, so off the event loop)
         next_node_id = None
-        for connection in current_node.outgoing_connections:
+        outgoing_connections = await asyncio.to_thread(lambda: list(current_node.outgoing_connections))
+        for connection in outgoing_connections:
             next_node_id = connection.target_node_id
             break
         
@@ -1250,7 +1307,7 @@ async def handle_proceed_workflow(sid, data):
         logger.debug(f"Active session: {active_session}")
         logger.debug(f"Workflow state: {active_session.workflow_state}")
         # Update session with next node
-        session_repo.update_workflow_state(session_id, next_node_id, active_session.workflow_state or {})
+        await asyncio.to_thread(session_repo.update_workflow_state, session_id, next_node_id, active_session.workflow_state or {})
         
         # Execute the next workflow node
         workflow_result = await workflow_service.execute_workflow(
@@ -1278,7 +1335,7 @@ async def handle_proceed_workflow(sid, data):
                     logger.debug(f"Emitting intermediate message: {intermediate_message}")
                     
                     # Store intermediate message in chat history
-                    chat_repo.create_message({
+                    await asyncio.to_thread(chat_repo.create_message, {
                         "message": intermediate_message,
                         "message_type": "bot",
                         "session_id": session_id,
@@ -1313,7 +1370,7 @@ async def handle_proceed_workflow(sid, data):
                 
             elif workflow_result.message:
                 # Regular message node - store and emit
-                chat_repo.create_message({
+                await asyncio.to_thread(chat_repo.create_message, {
                     "message": workflow_result.message,
                     "message_type": "bot",
                     "session_id": session_id,
@@ -1358,12 +1415,15 @@ async def handle_proceed_workflow(sid, data):
             'error': 'Failed to proceed workflow',
             'type': 'workflow_error'
         }, to=sid, namespace='/widget')
+    finally:
+        db.close()
 
 
 @sio.on('submit_form', namespace='/widget')
 @socket_rate_limit(namespace='/widget')
 async def handle_form_submission(sid, data):
     """Handle form submission from widget"""
+    db = SessionLocal()
     try:
         logger.info(f"Submitting form for sid {sid}")
         # Get session data and authenticate
@@ -1387,11 +1447,11 @@ async def handle_form_submission(sid, data):
         if not form_data:
             raise ValueError("No form data provided")
 
-        db = next(get_db())
         session_repo = SessionToAgentRepository(db)
         
         # Get active session
-        active_session = session_repo.get_active_customer_session(
+        active_session = await asyncio.to_thread(
+            session_repo.get_active_customer_session,
             customer_id=customer_id
         )
 
@@ -1401,7 +1461,7 @@ async def handle_form_submission(sid, data):
         # Get the current form configuration for validation
         from app.repositories.workflow import WorkflowRepository
         workflow_repo = WorkflowRepository(db)
-        workflow = workflow_repo.get_workflow_with_nodes_and_connections(active_session.workflow_id)
+        workflow = await asyncio.to_thread(workflow_repo.get_workflow_with_nodes_and_connections, active_session.workflow_id)
         
         if not workflow:
             raise ValueError("Workflow not found")
@@ -1451,25 +1511,7 @@ async def handle_form_submission(sid, data):
             if 'email' in form_data and form_data['email']:
                 submitted_email = form_data['email'].strip()
                 if submitted_email:  # Only process if email is not empty
-                    customer_repo = CustomerRepository(db)
-                    customer = customer_repo.get_by_id(customer_id)
-                    
-                    if customer and customer.email and '@noemail.com' in customer.email:
-                        # Customer has a generated @noemail.com email, update it with the real email
-                        try:
-                            # Check if the new email already exists for another customer in the same organization
-                            existing_customer = customer_repo.get_customer_by_email(submitted_email, org_id)
-                            if not existing_customer:
-                                # Update customer email
-                                old_email = customer.email
-                                customer.email = submitted_email
-                                db.commit()
-                                logger.info(f"Updated customer {customer_id} email from {old_email} to {submitted_email}")
-                            else:
-                                logger.warning(f"Email {submitted_email} already exists for another customer, skipping update")
-                        except Exception as e:
-                            logger.error(f"Failed to update customer email: {str(e)}")
-                            db.rollback()
+                    await asyncio.to_thread(update_generated_customer_email, db, customer_id, org_id, submitted_email)
             
             # Store form submission in chat history
             chat_repo = ChatRepository(db)
@@ -1481,7 +1523,7 @@ async def handle_form_submission(sid, data):
                     logger.debug(f"Emitting intermediate message: {intermediate_message}")
                     
                     # Store intermediate message in chat history
-                    chat_repo.create_message({
+                    await asyncio.to_thread(chat_repo.create_message, {
                         "message": intermediate_message,
                         "message_type": "bot",
                         "session_id": session_id,
@@ -1509,7 +1551,7 @@ async def handle_form_submission(sid, data):
             # Check if there's a response message to send
             if workflow_result.message:
                 # Store workflow response
-                chat_repo.create_message({
+                await asyncio.to_thread(chat_repo.create_message, {
                     "message": workflow_result.message,
                     "message_type": "bot",
                     "session_id": session_id,
@@ -1561,4 +1603,6 @@ async def handle_form_submission(sid, data):
         await sio.emit('error', {
             'error': 'Failed to submit form',
             'type': 'form_error'
-        }, to=sid, namespace='/widget')
\ No newline at end of file
+        }, to=sid, namespace='/widget')
+    finally:
+        db.close()
@@ -16,6 +16,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+import asyncio
 from fastapi import FastAPI
 from app.core.logger import get_logger
 
@@ -38,4 +39,54 @@ def initialize_cors_listener():
         start_cors_listener(app)
         logger.info("CORS listener initialized")
     except Exception as e:
-        logger.error(f"Failed to initialize CORS listener: {str(e)}") 
\ No newline at end of file
+        logger.error(f"Failed to initialize CORS listener: {str(e)}") 
+
+
+@app.on_event("startup")
+async def warm_up_embedder():
+    """
+    Load the knowledge search embedding model in the background so the
+    first knowledge lookup of a worker does not pay for it
+    """
+    from app.core.config import settings
+    if not settings.EMBEDDER_WARMUP_ON_STARTUP:
+        return
+    from app.knowledge.embedder_registry import embedder_registry
+    asyncio.get_running_loop().run_in_executor(None, embedder_registry.warm_up)
+
+
+@app.on_event("shutdown")
+async def flush_chat_message_writer():
+    """
+    Write any chat messages still buffered by the write-behind writer
+    before the worker exits
+    """
+    try:
+        from app.services.chat_message_writer import chat_message_writer
+        await asyncio.to_thread(chat_message_writer.close)
+    except Exception as e:
+        logger.error(f"Failed to flush chat message writer: {str(e)}")
+
+
+@app.on_event("shutdown")
+async def close_mcp_sessions():
+    """
+    Stop the MCP server processes kept open by this worker's session pool
+    """
+    try:
+        from app.tools.mcp_manager import get_mcp_session_pool
+        await get_mcp_session_pool().close_all()
+    except Exception as e:
+        logger.error(f"Failed to close MCP sessions: {str(e)}")
+
+
+@app.on_event("shutdown")
+async def close_tool_http_client():
+    """
+    Close the keep-alive connections of the agent toolkits' HTTP client
+    """
+    try:
+        from app.core.http_client import close_http_client
+        await close_http_client()
+    except Exception as e:
+        logger.error(f"Failed to close HTTP client: {str(e)}")
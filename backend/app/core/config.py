@@ -108,17 +108,69 @@ class Settings(BaseSettings):
     KB_TIMEOUT: int = int(os.getenv("KB_TIMEOUT", "30"))
     KB_MAX_RETRIES: int = int(os.getenv("KB_MAX_RETRIES", "3"))
     KB_MAX_WORKERS: int = int(os.getenv("KB_MAX_WORKERS", "5"))
-    KB_BATCH_SIZE: int = int(os.getenv("KB_BATCH_SIZE", "5"))
+    KB_BATCH_SIZE: int = int(os.getenv("KB_BATCH_SIZE", "500"))
     KB_OPTIMIZE_ON: int = int(os.getenv("KB_OPTIMIZE_ON", "1000"))
+    KB_PER_HOST_CONCURRENCY: int = int(os.getenv("KB_PER_HOST_CONCURRENCY", "4"))
+    KB_HOST_DELAY: float = float(os.getenv("KB_HOST_DELAY", "0.5"))  # Minimum seconds between requests to one host
+    KB_MAX_FRONTIER: int = int(os.getenv("KB_MAX_FRONTIER", "1000"))  # Maximum URLs waiting to be crawled
+    KB_INCREMENTAL_RECRAWL: bool = os.getenv("KB_INCREMENTAL_RECRAWL", "true").lower() == "true"
+    # Crawled chunks whose estimated Jaccard similarity to a kept chunk reaches KB_DEDUP_THRESHOLD are dropped
+    KB_DEDUP_ENABLED: bool = os.getenv("KB_DEDUP_ENABLED", "true").lower() == "true"
+    KB_DEDUP_THRESHOLD: float = float(os.getenv("KB_DEDUP_THRESHOLD", "0.9"))
+    KB_DEDUP_NUM_PERM: int = int(os.getenv("KB_DEDUP_NUM_PERM", "128"))  # MinHash values per chunk
+    # PDF ingestion: pages are extracted in a process pool and OCR'd only when they have no text layer
+    PDF_PROCESS_WORKERS: int = int(os.getenv("PDF_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))  # <= 1 extracts inline
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+    PDF_OCR_MIN_TEXT_CHARS: int = int(os.getenv("PDF_OCR_MIN_TEXT_CHARS", "20"))  # Pages with less extracted text are OCR'd
+    # Vector loads of at least PGVECTOR_COPY_MIN_ROWS documents use binary COPY (0 disables)
+    PGVECTOR_COPY_MIN_ROWS: int = int(os.getenv("PGVECTOR_COPY_MIN_ROWS", "50"))
+    PGVECTOR_COPY_BATCH_SIZE: int = int(os.getenv("PGVECTOR_COPY_BATCH_SIZE", "5000"))  # Rows per COPY and merge
+    # Filtered vector searches: hnsw.ef_search = limit * PGVECTOR_EF_SEARCH_FACTOR, within [MIN, MAX]
+    PGVECTOR_EF_SEARCH_FACTOR: int = int(os.getenv("PGVECTOR_EF_SEARCH_FACTOR", "10"))
+    PGVECTOR_EF_SEARCH_MIN: int = int(os.getenv("PGVECTOR_EF_SEARCH_MIN", "40"))
+    PGVECTOR_EF_SEARCH_MAX: int = int(os.getenv("PGVECTOR_EF_SEARCH_MAX", "400"))
+    # hnsw.iterative_scan mode on pgvector 0.8+ (relaxed_order, strict_order or off)
+    PGVECTOR_ITERATIVE_SCAN: str = os.getenv("PGVECTOR_ITERATIVE_SCAN", "relaxed_order")
+    PGVECTOR_MAX_SCAN_TUPLES: int = int(os.getenv("PGVECTOR_MAX_SCAN_TUPLES", "20000"))
+    # Sources with at least this many rows get their own partial HNSW index (0 disables)
+    PGVECTOR_SOURCE_INDEX_MIN_ROWS: int = int(os.getenv("PGVECTOR_SOURCE_INDEX_MIN_ROWS", "20000"))
+    # Embedding storage of new vector tables (vector or halfvec), overridable per organization
+    # through organization.settings["vector_storage"]; scripts/migrate_vector_storage.py converts existing tables
+    PGVECTOR_STORAGE: str = os.getenv("PGVECTOR_STORAGE", "vector")
+    PGVECTOR_BINARY_INDEX: bool = os.getenv("PGVECTOR_BINARY_INDEX", "false").lower() == "true"
+    PGVECTOR_RESCORE_FACTOR: int = int(os.getenv("PGVECTOR_RESCORE_FACTOR", "4"))  # Binary index candidates per result
+    CRAWL_PROGRESS_FLUSH_SIZE: int = int(os.getenv("CRAWL_PROGRESS_FLUSH_SIZE", "25"))  # Crawled URLs written per batch
+    CRAWL_PROGRESS_FLUSH_INTERVAL: float = float(os.getenv("CRAWL_PROGRESS_FLUSH_INTERVAL", "2"))  # Max seconds a URL waits to be written
 
     # Embedding Model Configuration
     EMBEDDING_MODEL_ID: str = os.getenv("EMBEDDING_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2")
     EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_BATCH_WAIT: float = float(os.getenv("EMBEDDING_BATCH_WAIT", "0.1"))  # Seconds to wait for a batch to fill
     EMBEDDING_MAX_WORKERS: int = int(os.getenv("EMBEDDING_MAX_WORKERS", "4"))
+    # Chunk embeddings keyed by (model id, content hash), reused across sources and re-ingestions
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_MAX_ROWS: int = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "1000000"))  # Least recently used rows beyond are evicted
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))  # In-process LRU in front of the table
     
     # FastEmbed Configuration
     FASTEMBED_MODEL: str = os.getenv("FASTEMBED_MODEL", "BAAI/bge-small-en-v1.5")
+    EMBEDDER_WARMUP_ON_STARTUP: bool = os.getenv("EMBEDDER_WARMUP_ON_STARTUP", "true").lower() == "true"
     
+    # Knowledge search caches: query text -> embedding LRU and per-agent result TTL cache
+    KNOWLEDGE_QUERY_CACHE_SIZE: int = int(os.getenv("KNOWLEDGE_QUERY_CACHE_SIZE", "2048"))
+    KNOWLEDGE_RESULT_CACHE_SIZE: int = int(os.getenv("KNOWLEDGE_RESULT_CACHE_SIZE", "1024"))
+    KNOWLEDGE_RESULT_CACHE_TTL: int = int(os.getenv("KNOWLEDGE_RESULT_CACHE_TTL", "300"))  # Seconds
+    # Speculative search of the raw user message while the model takes its first step (opt-in)
+    KNOWLEDGE_PREFETCH_ENABLED: bool = os.getenv("KNOWLEDGE_PREFETCH_ENABLED", "false").lower() == "true"
+    KNOWLEDGE_PREFETCH_MIN_OVERLAP: float = float(os.getenv("KNOWLEDGE_PREFETCH_MIN_OVERLAP", "0.8"))  # Shared words to serve a tool query from it
+
+    # Knowledge queue workers: claimed items are leased and kept alive by heartbeats
+    KNOWLEDGE_WORKER_CONCURRENCY: int = int(os.getenv("KNOWLEDGE_WORKER_CONCURRENCY", "3"))  # Items processed at once per worker
+    KNOWLEDGE_QUEUE_LEASE_SECONDS: int = int(os.getenv("KNOWLEDGE_QUEUE_LEASE_SECONDS", "300"))
+    KNOWLEDGE_QUEUE_HEARTBEAT_INTERVAL: int = int(os.getenv("KNOWLEDGE_QUEUE_HEARTBEAT_INTERVAL", "30"))  # Seconds
+    KNOWLEDGE_QUEUE_POLL_INTERVAL: int = int(os.getenv("KNOWLEDGE_QUEUE_POLL_INTERVAL", "30"))  # Fallback when no NOTIFY arrives
+    KNOWLEDGE_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("KNOWLEDGE_QUEUE_MAX_ATTEMPTS", "3"))  # Claims before an expired item fails
+
     # Embedding Optimization Configuration
     ENABLE_IMMEDIATE_EMBEDDING: bool = os.getenv("ENABLE_IMMEDIATE_EMBEDDING", "true").lower() == "true"
     
@@ -126,6 +178,39 @@ class Settings(BaseSettings):
     EMBEDDING_SINGLE_THREADED: bool = os.getenv("EMBEDDING_SINGLE_THREADED", "true").lower() == "true"
     EMBEDDING_SEQUENTIAL_FALLBACK: bool = os.getenv("EMBEDDING_SEQUENTIAL_FALLBACK", "true").lower() == "true"
     
+    # Chat Agent Pool Configuration
+    AGENT_POOL_ENABLED: bool = os.getenv("AGENT_POOL_ENABLED", "true").lower() == "true"
+    AGENT_POOL_MAX_SIZE: int = int(os.getenv("AGENT_POOL_MAX_SIZE", "256"))
+    AGENT_POOL_TTL: int = int(os.getenv("AGENT_POOL_TTL", "900"))  # Seconds before a template is rebuilt
+    AGENT_HISTORY_RUNS: int = int(os.getenv("AGENT_HISTORY_RUNS", "10"))  # Runs added to the prompt and kept in agent_sessions
+    AGENT_TOOL_CONCURRENCY: int = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))  # Tool calls of one model step run at once
+    AGENT_TOOL_TIMEOUT: float = float(os.getenv("AGENT_TOOL_TIMEOUT", "30"))  # Seconds before a tool call is answered with a timeout error
+
+    # MCP session pool: connected MCP servers are kept per worker and lent to agent runs
+    MCP_POOL_ENABLED: bool = os.getenv("MCP_POOL_ENABLED", "true").lower() == "true"
+    MCP_POOL_MAX_SESSIONS: int = int(os.getenv("MCP_POOL_MAX_SESSIONS", "32"))
+    MCP_POOL_MAX_PER_TOOL: int = int(os.getenv("MCP_POOL_MAX_PER_TOOL", "4"))  # Concurrent runs served per MCP tool config
+    MCP_POOL_IDLE_TIMEOUT: int = int(os.getenv("MCP_POOL_IDLE_TIMEOUT", "300"))  # Seconds before an unused session is closed
+    MCP_POOL_HEALTH_CHECK_INTERVAL: int = int(os.getenv("MCP_POOL_HEALTH_CHECK_INTERVAL", "30"))  # Idle seconds before a ping
+    MCP_POOL_ACQUIRE_TIMEOUT: float = float(os.getenv("MCP_POOL_ACQUIRE_TIMEOUT", "5"))  # Wait for a free session
+    MCP_POOL_MAX_LEASE_SECONDS: int = int(os.getenv("MCP_POOL_MAX_LEASE_SECONDS", "600"))  # Leases never returned are reclaimed
+    MCP_CONNECT_TIMEOUT: float = float(os.getenv("MCP_CONNECT_TIMEOUT", "10"))
+    MCP_CATALOG_ENABLED: bool = os.getenv("MCP_CATALOG_ENABLED", "true").lower() == "true"  # Build agents from cached tool schemas
+    MCP_CATALOG_REFRESH_INTERVAL: int = int(os.getenv("MCP_CATALOG_REFRESH_INTERVAL", "3600"))  # Seconds before a background re-list
+
+    # Pooled async HTTP client of the agent toolkits (Shopify, Jira), one per event loop
+    TOOL_HTTP_TIMEOUT: float = float(os.getenv("TOOL_HTTP_TIMEOUT", "30"))
+    TOOL_HTTP_MAX_CONNECTIONS: int = int(os.getenv("TOOL_HTTP_MAX_CONNECTIONS", "100"))
+    TOOL_HTTP_MAX_KEEPALIVE: int = int(os.getenv("TOOL_HTTP_MAX_KEEPALIVE", "20"))
+    
+    # Stream widget replies as chat_response_delta events before the final chat_response
+    CHAT_STREAMING_ENABLED: bool = os.getenv("CHAT_STREAMING_ENABLED", "true").lower() == "true"
+    
+    # Write-behind buffering of chat_history inserts
+    CHAT_WRITE_BEHIND_ENABLED: bool = os.getenv("CHAT_WRITE_BEHIND_ENABLED", "false").lower() == "true"
+    CHAT_WRITE_BEHIND_BATCH_SIZE: int = int(os.getenv("CHAT_WRITE_BEHIND_BATCH_SIZE", "200"))
+    CHAT_WRITE_BEHIND_FLUSH_INTERVAL: float = float(os.getenv("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", "0.25"))  # Seconds
+    
     # Explore View Configuration
     EXPLORE_SOURCE_ORG_ID: str = os.getenv("EXPLORE_SOURCE_ORG_ID", "bab82aab-d095-46f8-bf16-da638671bcf4")
     EXPLORE_AGENT_ID: str = os.getenv("EXPLORE_AGENT_ID", "b20188ee-2800-41d0-8bf1-8fc291ab0076")
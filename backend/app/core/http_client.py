@@ -0,0 +1,51 @@
+"""
+ChatterMate - HTTP Client
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import asyncio
+import weakref
+import httpx
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# httpx clients (and their keep-alive connections) are bound to the loop they were first used on
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Pooled async HTTP client of the running event loop, shared by the agent toolkits"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=settings.TOOL_HTTP_TIMEOUT,
+            verify=settings.VERIFY_SSL_CERTIFICATES,
+            limits=httpx.Limits(
+                max_connections=settings.TOOL_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TOOL_HTTP_MAX_KEEPALIVE
+            )
+        )
+    return client
+
+
+async def close_http_client() -> None:
+    """Close the running event loop's client, if one was created"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
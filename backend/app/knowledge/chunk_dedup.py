@@ -0,0 +1,131 @@
+"""
+ChatterMate - Chunk Deduplication
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from agno.document import Document
+from app.core.config import settings
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_WORD = re.compile(r"\w+")
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows) splitting num_perm MinHash values for LSH. Two chunks of Jaccard similarity s
+    share a band with probability 1 - (1 - s^rows)^bands, which rises steeply around
+    (1 / bands)^(1 / rows); the most rows keeping that point at or below threshold are used,
+    so candidates are rarely missed and false ones are filtered by the signature comparison.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class ChunkDeduplicator:
+    """
+    Drops chunks of a crawl that are near-duplicates of a chunk already kept, before they are
+    embedded: navigation remnants, cookie banners and boilerplate repeated across pages.
+
+    Chunks are compared by the Jaccard similarity of their word shingles, estimated with
+    MinHash signatures and indexed with LSH bands, so each chunk is only compared with the
+    kept chunks it shares a band with. check() is called from the crawler threads.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_perm: Optional[int] = None,
+        shingle_size: int = 5,
+        embedding_bytes: int = 0,
+        seed: int = 1
+    ):
+        self.threshold = threshold if threshold is not None else settings.KB_DEDUP_THRESHOLD
+        self.num_perm = num_perm or settings.KB_DEDUP_NUM_PERM
+        self.shingle_size = shingle_size
+        # Bytes one stored embedding takes, to report the vector storage saved
+        self.embedding_bytes = embedding_bytes
+        self.bands, self.rows = lsh_bands(self.num_perm, self.threshold)
+
+        generator = np.random.RandomState(seed)
+        # a * h + b stays below 2^64 for 32-bit h, so the permutations don't overflow
+        self._a = generator.randint(1, 1 << 31, size=self.num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 31, size=self.num_perm, dtype=np.uint64)
+
+        self._signatures: List[np.ndarray] = []
+        self._kept_ids: List[str] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.duplicates = 0
+        self.bytes_saved = 0
+
+    def _shingles(self, content: str) -> List[str]:
+        words = _WORD.findall(content.lower())
+        if len(words) <= self.shingle_size:
+            return [" ".join(words)]
+        return [" ".join(words[i : i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+
+    def signature(self, content: str) -> np.ndarray:
+        """MinHash signature of content's word shingles"""
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) for shingle in set(self._shingles(content))),
+            dtype=np.uint64
+        )
+        permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows : (band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def check(self, document: Document) -> Optional[str]:
+        """Id of the kept chunk document near-duplicates, or None if document is kept"""
+        signature = self.signature(document.content or "")
+        keys = self._band_keys(signature)
+        with self._lock:
+            self.chunks += 1
+            candidates = {index for band, key in enumerate(keys) for index in self._buckets[band].get(key, ())}
+            for index in sorted(candidates):
+                if np.mean(self._signatures[index] == signature) >= self.threshold:
+                    self.duplicates += 1
+                    self.bytes_saved += len((document.content or "").encode())
+                    return self._kept_ids[index]
+
+            index = len(self._signatures)
+            self._signatures.append(signature)
+            self._kept_ids.append(document.id)
+            for band, key in enumerate(keys):
+                self._buckets[band].setdefault(key, []).append(index)
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chunks": self.chunks,
+                "duplicates": self.duplicates,
+                "embeddings_saved": self.duplicates,
+                "content_bytes_saved": self.bytes_saved,
+                "embedding_bytes_saved": self.duplicates * self.embedding_bytes
+            }
@@ -0,0 +1,67 @@
+"""
+ChatterMate - Crawl Progress
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import threading
+import time
+from typing import List, Optional
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.database import SessionLocal
+from app.repositories.knowledge_queue import KnowledgeQueueRepository
+
+logger = get_logger(__name__)
+
+
+class CrawledUrlBuffer:
+    """
+    Collects the URLs crawled for a queue item and appends them to knowledge_queue_urls in
+    batches: every `flush_size` URLs or `flush_interval` seconds, and on flush().
+
+    Crawler callbacks call add() from worker threads; each flush uses its own session.
+    """
+
+    def __init__(self, queue_id: int, flush_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.queue_id = queue_id
+        self.flush_size = flush_size or settings.CRAWL_PROGRESS_FLUSH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else settings.CRAWL_PROGRESS_FLUSH_INTERVAL
+        self._urls: List[str] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, url: str):
+        with self._lock:
+            self._urls.append(url)
+            due = len(self._urls) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write the buffered URLs; returns how many were written"""
+        with self._lock:
+            urls, self._urls = self._urls, []
+            self._last_flush = time.monotonic()
+        if not urls:
+            return 0
+
+        try:
+            with SessionLocal() as db:
+                return KnowledgeQueueRepository(db).add_crawled_urls(self.queue_id, urls)
+        except Exception as e:
+            # Progress is informational; losing a batch must not fail the crawl
+            logger.error(f"Failed to record {len(urls)} crawled URLs for queue {self.queue_id}: {str(e)}")
+            return 0
@@ -0,0 +1,204 @@
+"""
+ChatterMate - Embedder Registry
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from agno.document import Document
+from agno.embedder.base import Embedder
+from agno.embedder.fastembed import FastEmbedEmbedder
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.knowledge.embedding_cache import EmbeddingCache, content_hash
+
+logger = get_logger(__name__)
+
+
+def _rss_mb() -> Optional[float]:
+    """Resident memory of this process in MB, where /proc is available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class SharedFastEmbedEmbedder(FastEmbedEmbedder):
+    """FastEmbedEmbedder bound to an already loaded model.
+
+    agno's FastEmbedEmbedder builds a new TextEmbedding (ONNX session and tokenizer)
+    on every get_embedding call; this one reuses the model held by the registry.
+    """
+
+    model: Any = field(default=None, repr=False)
+    embeddings: int = 0
+
+    def get_embedding(self, text: str) -> List[float]:
+        self.embeddings += 1
+        embedding = next(iter(self.model.embed(text)))
+        return embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in one model call, so tokenization and inference run per batch"""
+        self.embeddings += len(texts)
+        return [
+            embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+            for embedding in self.model.embed(texts, batch_size=max(len(texts), 1))
+        ]
+
+    def __deepcopy__(self, memo):
+        # Agent/knowledge copies must share the loaded model rather than duplicate it
+        return self
+
+
+class EmbedderRegistry:
+    """
+    Process-wide FastEmbed models keyed by model id.
+
+    Models are loaded once (at worker startup via warm_up, or on first use) and the same
+    embedder is handed to KnowledgeManager for ingestion and to the knowledge search tool,
+    so queries are always embedded with the model the documents were stored with.
+    """
+
+    def __init__(self):
+        self._embedders: Dict[str, SharedFastEmbedEmbedder] = {}
+        self._load_stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_id: Optional[str] = None) -> SharedFastEmbedEmbedder:
+        model_id = model_id or settings.FASTEMBED_MODEL
+        embedder = self._embedders.get(model_id)
+        if embedder is None:
+            with self._lock:
+                embedder = self._embedders.get(model_id)
+                if embedder is None:
+                    embedder = self._load(model_id)
+                    self._embedders[model_id] = embedder
+        return embedder
+
+    def _load(self, model_id: str) -> SharedFastEmbedEmbedder:
+        from fastembed import TextEmbedding
+
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        model = TextEmbedding(model_name=model_id)
+        # The first embed initialises the ONNX session, so loading also warms the model
+        dimensions = len(next(iter(model.embed("warm up"))))
+        load_seconds = time.perf_counter() - start
+        rss_after = _rss_mb()
+
+        self._load_stats[model_id] = {
+            "dimensions": dimensions,
+            "load_seconds": round(load_seconds, 3),
+            "memory_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None
+        }
+        logger.info(f"Loaded embedding model {model_id} ({dimensions} dimensions) in {load_seconds:.2f}s")
+        return SharedFastEmbedEmbedder(id=model_id, dimensions=dimensions, model=model)
+
+    def warm_up(self, model_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Load the given models (default: FASTEMBED_MODEL) ahead of the first request"""
+        for model_id in model_ids or [settings.FASTEMBED_MODEL]:
+            try:
+                self.get(model_id)
+            except Exception as e:
+                logger.error(f"Failed to warm up embedding model {model_id}: {str(e)}")
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        rss_mb = _rss_mb()
+        return {
+            "models": {
+                model_id: {**self._load_stats.get(model_id, {}), "embeddings": embedder.embeddings}
+                for model_id, embedder in self._embedders.items()
+            },
+            "rss_mb": round(rss_mb, 1) if rss_mb is not None else None
+        }
+
+
+embedder_registry = EmbedderRegistry()
+
+
+def get_embedder(model_id: Optional[str] = None) -> SharedFastEmbedEmbedder:
+    """Shared embedder for model_id, defaulting to settings.FASTEMBED_MODEL"""
+    return embedder_registry.get(model_id)
+
+
+def _embed(documents: List[Document], embedder: Embedder) -> int:
+    """Embed documents with a single batch call when the embedder supports it and one call per document otherwise"""
+    if not documents:
+        return 0
+
+    get_embeddings = getattr(embedder, "get_embeddings", None)
+    if callable(get_embeddings):
+        try:
+            embeddings = get_embeddings([document.content for document in documents])
+            if isinstance(embeddings, list) and len(embeddings) == len(documents):
+                for document, embedding in zip(documents, embeddings):
+                    document.embedding, document.usage = embedding, None
+                return len(documents)
+            logger.warning(f"Batch embedding returned an unexpected result for {len(documents)} documents, embedding one by one")
+        except Exception as e:
+            logger.error(f"Batch embedding of {len(documents)} documents failed, embedding one by one: {str(e)}")
+
+    embedded = 0
+    for document in documents:
+        try:
+            document.embed(embedder=embedder)
+            embedded += 1
+        except Exception as e:
+            logger.error(f"Error embedding document {document.id}: {str(e)}")
+    return embedded
+
+
+def embed_documents(documents: List[Document], embedder: Embedder, cache: Optional[EmbeddingCache] = None) -> int:
+    """
+    Embed documents that have no embedding yet, in one batch call where the embedder supports it.
+    With a cache, chunks whose content was embedded before by the same model take the cached
+    embedding, identical chunks are embedded once and new embeddings are added to the cache.
+    Returns the number of documents given an embedding.
+    """
+    pending = [document for document in documents if document.embedding is None]
+    model_id = getattr(embedder, "id", None)
+    if cache is None or not model_id or not pending:
+        return _embed(pending, embedder)
+
+    by_hash: Dict[str, List[Document]] = {}
+    for document in pending:
+        by_hash.setdefault(content_hash(document.content), []).append(document)
+
+    cached = cache.get_many(model_id, by_hash)
+    for key, embedding in cached.items():
+        for document in by_hash[key]:
+            document.embedding, document.usage = embedding, None
+
+    missing = {key: group[0] for key, group in by_hash.items() if key not in cached}
+    _embed(list(missing.values()), embedder)
+    embedded = {}
+    for key, document in missing.items():
+        if document.embedding is not None:
+            embedded[key] = document.embedding
+            for duplicate in by_hash[key][1:]:
+                duplicate.embedding, duplicate.usage = document.embedding, document.usage
+    cache.put_many(model_id, embedded)
+
+    if cached:
+        logger.debug(f"Embedding cache: {sum(len(by_hash[key]) for key in cached)} of {len(pending)} chunks of {model_id} cached")
+    return sum(1 for document in pending if document.embedding is not None)
@@ -0,0 +1,142 @@
+"""
+ChatterMate - Embedding Cache
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+from hashlib import md5
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.database import SessionLocal
+from app.repositories.embedding_cache import EmbeddingCacheRepository
+
+logger = get_logger(__name__)
+
+
+def content_hash(content: str) -> str:
+    """md5 of a chunk's content, cleaned as OptimizedPgVector stores it (the vector tables' content_hash)"""
+    return md5(content.replace("\x00", "\ufffd").encode()).hexdigest()
+
+
+def _pack(embedding: List[float]) -> Tuple[int, bytes]:
+    return len(embedding), array("f", embedding).tobytes()
+
+
+def _unpack(dimensions: int, data: bytes) -> Optional[List[float]]:
+    values = array("f")
+    values.frombytes(data)
+    return values.tolist() if len(values) == dimensions else None
+
+
+class EmbeddingCache:
+    """
+    Embeddings of chunk contents keyed by (model id, content hash), so identical chunks are
+    embedded once: headers and footers repeated across pages, a PDF uploaded twice, sources
+    re-ingested or copied into another organization.
+
+    The embedding_cache table is shared by every worker; an in-process LRU of
+    EMBEDDING_CACHE_MEMORY_ITEMS sits in front of it. The table keeps at most
+    EMBEDDING_CACHE_MAX_ROWS rows, evicting the least recently used ones. The cache is an
+    optimization only: database errors are logged and the chunks embedded as if missing.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        max_rows: Optional[int] = None,
+        memory_items: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.max_rows = max_rows if max_rows is not None else settings.EMBEDDING_CACHE_MAX_ROWS
+        self.memory_items = memory_items if memory_items is not None else settings.EMBEDDING_CACHE_MEMORY_ITEMS
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stored_since_eviction = 0
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    def _remember(self, model_id: str, content_hash: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._memory[(model_id, content_hash)] = embedding
+            self._memory.move_to_end((model_id, content_hash))
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get_many(self, model_id: str, content_hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """Cached embeddings of model_id by content hash, for the hashes that have one"""
+        content_hashes = set(content_hashes)
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in content_hashes:
+                embedding = self._memory.get((model_id, key))
+                if embedding is not None:
+                    self._memory.move_to_end((model_id, key))
+                    found[key] = embedding
+
+        missing = content_hashes - found.keys()
+        if missing:
+            try:
+                with self.session_factory() as db:
+                    rows = EmbeddingCacheRepository(db).get_many(model_id, missing)
+                for key, (dimensions, data) in rows.items():
+                    embedding = _unpack(dimensions, data)
+                    if embedding is not None:
+                        found[key] = embedding
+                        self._remember(model_id, key, embedding)
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed, embedding {len(missing)} chunks: {str(e)}")
+
+        with self._lock:
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(content_hashes) - len(found)
+        return found
+
+    def put_many(self, model_id: str, embeddings: Dict[str, List[float]]) -> int:
+        """Cache new embeddings of model_id by content hash; returns how many rows were added"""
+        if not embeddings:
+            return 0
+        for key, embedding in embeddings.items():
+            self._remember(model_id, key, embedding)
+        try:
+            with self.session_factory() as db:
+                repo = EmbeddingCacheRepository(db)
+                stored = repo.put_many(model_id, {key: _pack(embedding) for key, embedding in embeddings.items()})
+                with self._lock:
+                    self._stats["stored"] += stored
+                    self._stored_since_eviction += stored
+                    # Evicting needs a sort over last_used_at, so it runs once per tenth of the capacity written
+                    evict = self._stored_since_eviction >= max(1, self.max_rows // 10)
+                    if evict:
+                        self._stored_since_eviction = 0
+                if evict:
+                    evicted = repo.evict(self.max_rows)
+                    with self._lock:
+                        self._stats["evicted"] += evicted
+                    if evicted:
+                        logger.info(f"Evicted {evicted} least recently used embeddings from the embedding cache")
+            return stored
+        except Exception as e:
+            logger.warning(f"Failed to cache {len(embeddings)} embeddings of {model_id}: {str(e)}")
+            return 0
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "memory_items": len(self._memory)}
+
+
+embedding_cache = EmbeddingCache()
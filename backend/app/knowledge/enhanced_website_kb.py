@@ -18,9 +18,11 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 
 from typing import Any, Dict, Iterator, List, Optional
 import time
+from dataclasses import asdict
 from datetime import datetime
+from uuid import UUID
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
+from queue import Empty, Queue
 import threading
 
 from agno.document import Document
@@ -29,9 +31,14 @@ from agno.embedder import Embedder
 from app.core.logger import get_logger
 from app.core.config import settings
 from app.models.knowledge_queue import ProcessingStage, QueueStatus
+from app.database import SessionLocal
+from app.repositories.crawled_page import CrawledPageRepository
 from pydantic import model_validator
 
-from app.knowledge.enhanced_website_reader import EnhancedWebsiteReader
+from app.knowledge.enhanced_website_reader import EnhancedWebsiteReader, IncrementalCrawl, PageState
+from app.knowledge.crawl_progress import CrawledUrlBuffer
+from app.knowledge.embedder_registry import embed_documents
+from app.knowledge.chunk_dedup import ChunkDeduplicator
 
 # Initialize logger for this module
 logger = get_logger(__name__)
@@ -52,6 +59,11 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
     max_workers: int = settings.KB_MAX_WORKERS
     batch_size: int = settings.KB_BATCH_SIZE
     optimize_on: Optional[int] = settings.KB_OPTIMIZE_ON
+    # Re-crawls send conditional requests and only re-embed new or changed pages
+    incremental: bool = False
+    # Near-duplicate chunks of a crawl are dropped before embedding
+    deduplicate: bool = settings.KB_DEDUP_ENABLED
+    dedup_threshold: float = settings.KB_DEDUP_THRESHOLD
     
     # These are not part of the model schema, but added as instance attributes
     _queue_item = None
@@ -60,6 +72,10 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
     _embedding_executor = None
     _embedding_results = None
     _embedding_lock = None
+    _embedding_stats = None
+    _incremental_crawls = None
+    _crawled_urls = None
+    _deduplicator = None
     
     @property
     def queue_item(self):
@@ -88,7 +104,10 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
                 min_content_length=self.min_content_length,
                 timeout=self.timeout,
                 max_retries=self.max_retries,
-                max_workers=self.max_workers
+                max_workers=self.max_workers,
+                per_host_concurrency=settings.KB_PER_HOST_CONCURRENCY,
+                host_delay=settings.KB_HOST_DELAY,
+                max_frontier=settings.KB_MAX_FRONTIER
             )
         return self
 
@@ -102,6 +121,7 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             self._embedding_queue = Queue()
             self._embedding_results = []
             self._embedding_lock = threading.Lock()
+            self._embedding_stats = {"batches": 0, "documents": 0, "seconds": 0.0}
             self._embedding_executor = ThreadPoolExecutor(
                 max_workers=settings.EMBEDDING_MAX_WORKERS,
                 thread_name_prefix="EmbeddingWorker"
@@ -127,6 +147,7 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             self._embedding_executor = None
             self._embedding_results = None
             self._embedding_lock = None
+            self._embedding_stats = None
             
         except Exception as e:
             logger.error(f"Error during embedding system shutdown: {type(e).__name__}: {str(e)}")
@@ -134,48 +155,61 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             if self._embedding_executor:
                 self._embedding_executor.shutdown(wait=False)
 
+    def _next_embedding_batch(self):
+        """
+        Collect up to EMBEDDING_BATCH_SIZE documents from the embedding queue, waiting at most
+        EMBEDDING_BATCH_WAIT seconds for the batch to fill once the first document arrived.
+        Returns the documents and whether a stop sentinel was received.
+        """
+        batch = []
+        try:
+            document = self._embedding_queue.get(timeout=2.0)
+        except Empty:
+            return batch, False
+        if document is None:
+            self._embedding_queue.task_done()
+            return batch, True
+        batch.append(document)
+
+        deadline = time.monotonic() + settings.EMBEDDING_BATCH_WAIT
+        while len(batch) < settings.EMBEDDING_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                document = self._embedding_queue.get(timeout=remaining) if remaining > 0 else self._embedding_queue.get_nowait()
+            except Empty:
+                break
+            if document is None:
+                self._embedding_queue.task_done()
+                return batch, True
+            batch.append(document)
+        return batch, False
+
     def _embedding_worker(self):
-        """Worker function that processes documents from the embedding queue"""
+        """Worker function that embeds documents from the embedding queue in micro-batches"""
         worker_id = threading.current_thread().name
         
         while True:
-            document = None
-            try:
-                document = self._embedding_queue.get(timeout=2.0)  # Increased timeout slightly
-                
-                if document is None:  # Sentinel value to stop worker
-                    self._embedding_queue.task_done()
-                    break
-                
-                # Process the document
-                if hasattr(document, 'embedding') and document.embedding is None:
-                    document.embed(embedder=self.vector_db.embedder)
+            batch, stop = self._next_embedding_batch()
+            if batch:
+                try:
+                    batch_start_time = time.time()
+                    documents = [doc for doc in batch if hasattr(doc, 'embedding') and doc.embedding is None]
+                    embedded = embed_documents(documents, self.vector_db.embedder, getattr(self.vector_db, "embedding_cache", None))
+                    batch_duration = time.time() - batch_start_time
                     with self._embedding_lock:
-                        self._embedding_results.append(document.id)
-                
-                self._embedding_queue.task_done()
-                
-            except Exception as e:
-                # Handle timeouts gracefully (expected when queue is empty)
-                error_msg = str(e).lower()
-                if "timeout" in error_msg or "empty" in error_msg:
-                    # Timeout is normal when waiting for work - continue looping
-                    continue
-                else:
-                    # Log actual errors with full details
+                        self._embedding_results.extend(doc.id for doc in documents if doc.embedding is not None)
+                        self._embedding_stats["batches"] += 1
+                        self._embedding_stats["documents"] += embedded
+                        self._embedding_stats["seconds"] += batch_duration
+                except Exception as e:
                     logger.error(f"Error in embedding worker {worker_id}: {type(e).__name__}: {str(e)}")
-                    if document and hasattr(document, 'id'):
-                        logger.error(f"Failed to embed document: {document.id}")
-                    
-                    # Mark task as done even if failed to prevent queue blocking
-                    if document is not None:
-                        try:
-                            self._embedding_queue.task_done()
-                        except ValueError:
-                            # task_done called too many times - ignore
-                            pass
-        
-
+                    logger.error(f"Failed to embed documents: {[doc.id for doc in batch]}")
+                finally:
+                    # Mark every document as done, even if embedding failed, to prevent queue blocking
+                    for _ in batch:
+                        self._embedding_queue.task_done()
+            if stop:
+                break
 
     def _process_url(self, url: str) -> List[Document]:
         """Process a single URL and return its documents with immediate embedding"""
@@ -186,25 +220,24 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             # Create a callback for URL crawling progress tracking
             def on_url_crawled_callback(crawled_url: str):
                 """Callback to track each URL as it's crawled"""
-                try:
-                    if self.queue_item and self.queue_repo:
-                        logger.debug(f"🌐 Tracking crawled URL: {crawled_url}")
-                        # Only add the crawled URL, don't update the processing stage
-                        success = self.queue_repo.update_progress(
-                            self.queue_item.id,
-                            crawled_url=crawled_url
-                        )
-                        if success:
-                            logger.debug(f"✅ Successfully tracked crawled URL: {crawled_url}")
-                        else:
-                            logger.warning(f"❌ Failed to track crawled URL: {crawled_url}")
-                except Exception as e:
-                    logger.error(f"Error tracking crawled URL {crawled_url}: {str(e)}")
+                if self._crawled_urls is not None:
+                    logger.debug(f"🌐 Tracking crawled URL: {crawled_url}")
+                    self._crawled_urls.add(crawled_url)
             
+            duplicates = set()
+
             # Create a callback for immediate document processing
             def on_document_callback(document: Document):
                 """Callback to queue documents for embedding"""
                 try:
+                    # Near-duplicates of a chunk already kept are never embedded
+                    if self._deduplicator is not None:
+                        kept_id = self._deduplicator.check(document)
+                        if kept_id is not None:
+                            logger.debug(f"Dropping {document.id}, a near-duplicate of {kept_id}")
+                            duplicates.add(id(document))
+                            return
+
                     # Queue document for embedding if immediate embedding is enabled
                     if (settings.ENABLE_IMMEDIATE_EMBEDDING and 
                         self._embedding_queue is not None and 
@@ -214,12 +247,30 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
                 except Exception as e:
                     logger.error(f"Error in document callback for {document.id}: {str(e)}")
             
+            # Page states of the previous crawl when re-crawling incrementally
+            read_kwargs = {}
+            if self._incremental_crawls and url in self._incremental_crawls:
+                read_kwargs["incremental"] = self._incremental_crawls[url]
+
             # Get documents from the reader with both callbacks
             documents = self.reader.read(
                 url=url, 
                 vector_db_callback=on_document_callback,
-                url_crawled_callback=on_url_crawled_callback
+                url_crawled_callback=on_url_crawled_callback,
+                **read_kwargs
             )
+            if duplicates:
+                dropped = [doc for doc in documents if id(doc) in duplicates]
+                documents = [doc for doc in documents if id(doc) not in duplicates]
+                if "incremental" in read_kwargs:
+                    # A dropped page has no vectors of its own. Without a stored state the next
+                    # crawl reads it again instead of skipping it as unchanged, so its content
+                    # comes back if the page it duplicated changes or is removed.
+                    incremental = read_kwargs["incremental"]
+                    for doc in dropped:
+                        page_url = (doc.meta_data or {}).get('url') or doc.id
+                        incremental.pages.pop(page_url, None)
+                        incremental.unchanged.discard(page_url)
             
             url_end_time = time.time()
             url_duration = url_end_time - url_start_time
@@ -243,10 +294,10 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             logger.error(f"Error embedding document '{document.id}': {str(e)}")
             raise
 
-    def _process_document_batch(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+    def _process_document_batch(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> bool:
         """Process a batch of documents by inserting them into the vector database"""
         if not documents or not self.vector_db:
-            return
+            return True
 
         try:
             batch_start_time = time.time()
@@ -256,8 +307,84 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             
             batch_end_time = time.time()
             batch_duration = batch_end_time - batch_start_time
+            return True
         except Exception as e:
             logger.error(f"Error processing document batch: {str(e)}")
+            return False
+
+    def _create_deduplicator(self) -> Optional[ChunkDeduplicator]:
+        if not self.deduplicate:
+            return None
+        # Stored bytes per embedding: 4 per dimension for vector columns, 2 for halfvec
+        dimensions = getattr(self.vector_db, "dimensions", None) or 0
+        bytes_per_dimension = 2 if getattr(self.vector_db, "storage", "vector") == "halfvec" else 4
+        return ChunkDeduplicator(threshold=self.dedup_threshold, embedding_bytes=int(dimensions) * bytes_per_dimension)
+
+    def _report_deduplication(self) -> None:
+        """Log the chunks, embeddings and bytes deduplication saved, and keep them on the queue item"""
+        if self._deduplicator is None:
+            return
+        stats = self._deduplicator.get_stats()
+        logger.info(
+            f"Deduplication dropped {stats['duplicates']} of {stats['chunks']} chunks "
+            f"(threshold {self.dedup_threshold}): {stats['embeddings_saved']} embeddings, "
+            f"{stats['content_bytes_saved']} content bytes and {stats['embedding_bytes_saved']} vector bytes saved"
+        )
+        if self.queue_item and self.queue_repo:
+            try:
+                self.queue_repo.update_metadata(self.queue_item.id, {"deduplication": stats})
+            except Exception as e:
+                logger.error(f"Error recording deduplication stats: {str(e)}")
+
+    def _start_incremental_crawl(self, url: str, filters: Optional[Dict[str, Any]], recreate: bool) -> IncrementalCrawl:
+        """Load the page states of the previous crawl of url, if its documents are still in the vector db"""
+        previous = {}
+        org_id = (filters or {}).get("org_id")
+        if org_id and not recreate:
+            try:
+                if self.vector_db.name_exists(name=url):
+                    with SessionLocal() as db:
+                        pages = CrawledPageRepository(db).get_by_source(UUID(str(org_id)), url)
+                    previous = {
+                        page.url: PageState(
+                            etag=page.etag,
+                            last_modified=page.last_modified,
+                            content_hash=page.content_hash,
+                            links=page.links or []
+                        )
+                        for page in pages
+                    }
+            except Exception as e:
+                logger.error(f"Error loading crawled pages of {url}, crawling all pages: {str(e)}")
+                previous = {}
+        if previous:
+            logger.info(f"Incremental re-crawl of {url} against {len(previous)} known pages")
+        return IncrementalCrawl(previous=previous)
+
+    def _finish_incremental_crawls(self, filters: Optional[Dict[str, Any]]) -> None:
+        """Delete the documents of removed pages and store the page states for the next crawl"""
+        org_id = (filters or {}).get("org_id")
+        if not org_id or not self._incremental_crawls:
+            return
+
+        for source, crawl in self._incremental_crawls.items():
+            try:
+                removed_urls = crawl.removed_urls
+                if removed_urls and hasattr(self.vector_db, 'delete_documents'):
+                    self.vector_db.delete_documents(name=source, ids=removed_urls)
+                with SessionLocal() as db:
+                    CrawledPageRepository(db).save_pages(
+                        UUID(str(org_id)),
+                        source,
+                        {url: asdict(state) for url, state in crawl.pages.items()},
+                        removed_urls
+                    )
+                logger.info(
+                    f"Incremental crawl of {source}: {len(crawl.pages) - len(crawl.unchanged)} new or changed pages, "
+                    f"{len(crawl.unchanged)} unchanged, {len(removed_urls)} removed"
+                )
+            except Exception as e:
+                logger.error(f"Error saving crawled pages of {source}: {str(e)}")
 
     @property
     def document_lists(self) -> Iterator[List[Document]]:
@@ -338,9 +465,12 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             for i in range(settings.EMBEDDING_MAX_WORKERS):
                 self._embedding_executor.submit(self._embedding_worker)
 
-        # Check if URLs exist in vector db
+        # Check if URLs exist in vector db; incremental re-crawls revisit them instead
         urls_to_read = self.urls.copy()
-        if not recreate and skip_existing:
+        self._incremental_crawls = None
+        if self.incremental:
+            self._incremental_crawls = {url: self._start_incremental_crawl(url, filters, recreate) for url in urls_to_read}
+        elif not recreate and skip_existing:
             try:
                 urls_to_read = [url for url in self.urls if not self.vector_db.name_exists(name=url)]
                 skipped = len(self.urls) - len(urls_to_read)
@@ -350,12 +480,15 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
                 logger.error(f"Error checking existing URLs: {str(e)}")
                 urls_to_read = self.urls.copy()
 
+        self._deduplicator = self._create_deduplicator()
+
         # Process URLs in parallel with batched vector DB insertion
         total_documents = 0
         completed_urls = 0
         total_urls = len(urls_to_read)
         
         # Initialize progress tracking if we have queue context
+        self._crawled_urls = CrawledUrlBuffer(self.queue_item.id) if self.queue_item else None
         if self.queue_item and self.queue_repo:
             self.queue_repo.update_progress(
                 self.queue_item.id,
@@ -403,6 +536,11 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
                     logger.error(f"Error processing URL {url}: {str(e)}")
                     completed_urls += 1  # Count failed URLs too
         
+        if self._crawled_urls is not None:
+            self._crawled_urls.flush()
+        self._report_deduplication()
+        self._deduplicator = None
+
         crawl_end_time = time.time()
         crawl_duration = crawl_end_time - crawl_start_time
         logger.info(f"Crawling completed - {len(urls_to_read)} URLs, {total_documents} documents, {crawl_duration:.2f}s")
@@ -416,16 +554,26 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
                 force_stage_update=True
             )
         
-        # Get embedding results count before shutdown
+        # Wait for queued documents, then read the results before shutdown clears them
         embedded_count = 0
-        if self._embedding_results:
+        embedding_stats = None
+        if self._embedding_queue is not None:
+            self._embedding_queue.join()
             with self._embedding_lock:
                 embedded_count = len(self._embedding_results)
+                embedding_stats = dict(self._embedding_stats)
         
         # Shutdown the embedding system (includes waiting for completion)
         self._shutdown_embedding_system()
         
-        logger.info(f"Embedding completed - {embedded_count} documents embedded")
+        if embedding_stats and embedding_stats["seconds"] > 0:
+            docs_per_sec = embedding_stats["documents"] / embedding_stats["seconds"]
+            logger.info(
+                f"Embedding completed - {embedded_count} documents embedded in {embedding_stats['batches']} batches "
+                f"({docs_per_sec:.1f} docs/sec)"
+            )
+        else:
+            logger.info(f"Embedding completed - {embedded_count} documents embedded")
         
         # Update embedding progress
         if self.queue_item and self.queue_repo:
@@ -441,18 +589,15 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
         if unembedded_count > 0:
             logger.warning(f"Found {unembedded_count} unembedded documents, embedding them now")
             if self.vector_db and hasattr(self.vector_db, 'embedder'):
-                # Embed remaining documents immediately without parallel processing
-                # to avoid multiple model loading
-                for doc in all_documents:
-                    if doc.embedding is None:
-                        try:
-                            doc.embed(embedder=self.vector_db.embedder)
-                        except Exception as e:
-                            logger.error(f"Error embedding document {doc.id}: {str(e)}")
+                # Embed remaining documents in the calling thread, in batches of EMBEDDING_BATCH_SIZE
+                unembedded = [doc for doc in all_documents if doc.embedding is None]
+                for batch_start in range(0, len(unembedded), settings.EMBEDDING_BATCH_SIZE):
+                    embed_documents(unembedded[batch_start:batch_start + settings.EMBEDDING_BATCH_SIZE], self.vector_db.embedder)
             else:
                 logger.error(f"Cannot embed {unembedded_count} documents - no embedder available")
         
         # Process all documents in optimally sized batches
+        upserted = True
         if all_documents and upsert:
             logger.info(f"Inserting {len(all_documents)} documents into vector database")
             
@@ -469,7 +614,7 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
             total_batches = (len(all_documents) + self.batch_size - 1) // self.batch_size
             for i, batch_start in enumerate(range(0, len(all_documents), self.batch_size)):
                 batch = all_documents[batch_start:batch_start + self.batch_size]
-                self._process_document_batch(batch, filters)
+                upserted = self._process_document_batch(batch, filters) and upserted
                 
                 # Update progress during DB operations
                 if self.queue_item and self.queue_repo and total_batches > 1:
@@ -481,6 +626,10 @@ class EnhancedWebsiteKnowledgeBase(AgentKnowledge):
                         processed_items=processed_docs
                     )
             
+        # Page states are only kept once the changed pages are stored, so failed upserts are retried next time
+        if self._incremental_crawls and upsert and upserted:
+            self._finish_incremental_crawls(filters)
+            
         # Optimize vector db if needed
         if self.optimize_on is not None and total_documents > self.optimize_on and hasattr(self.vector_db, 'optimize'):
             logger.info("Optimizing vector database...")
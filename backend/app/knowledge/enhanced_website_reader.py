@@ -16,15 +16,17 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
-import random
+import asyncio
+import importlib.util
 import re
 import time
+from contextlib import asynccontextmanager
+from hashlib import md5
 from datetime import datetime
 from dataclasses import dataclass, field
 from typing import Dict, List, Set, Tuple, Optional, Callable
 from urllib.parse import urljoin, urlparse
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 from bs4 import BeautifulSoup, Tag
 import httpx
@@ -36,6 +38,70 @@ from app.core.logger import get_logger
 # Initialize logger for this module
 logger = get_logger(__name__)
 
+# httpx only speaks HTTP/2 when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class HostLimiter:
+    """Per-host concurrency and politeness limits for the requests of one crawl"""
+
+    def __init__(self, concurrency: int, delay: float):
+        self.concurrency = max(concurrency, 1)
+        self.delay = max(delay, 0.0)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._next_request: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """Hold one of the host's request slots, starting at least `delay` seconds after the previous request"""
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        async with semaphore:
+            now = time.monotonic()
+            start = max(now, self._next_request.get(host, now))
+            self._next_request[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+@dataclass
+class PageState:
+    """HTTP validators, extracted text hash and links of a crawled page"""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    links: List[str] = field(default_factory=list)
+
+
+@dataclass
+class IncrementalCrawl:
+    """
+    Page states of the previous crawl of a source (input) and of this crawl (output).
+
+    Pages answering 304 Not Modified, or whose extracted text hashes the same as before,
+    are reported as unchanged and produce no document; the crawl continues through the
+    links stored for them.
+    """
+    previous: Dict[str, PageState] = field(default_factory=dict)
+    pages: Dict[str, PageState] = field(default_factory=dict)
+    unchanged: Set[str] = field(default_factory=set)
+    gone: Set[str] = field(default_factory=set)  # 404/410 responses
+    failed: Set[str] = field(default_factory=set)
+    truncated: bool = False  # max_links or the frontier limit stopped the crawl early
+
+    @property
+    def removed_urls(self) -> List[str]:
+        """Previously crawled pages that no longer exist on the website"""
+        if self.truncated:
+            # Pages not reached may still exist, only trust explicit 404/410 answers
+            return sorted(url for url in self.previous if url in self.gone)
+        return sorted(
+            url for url in self.previous
+            if url not in self.pages and (url in self.gone or url not in self.failed)
+        )
+
 
 @dataclass
 class EnhancedWebsiteReader(WebsiteReader):
@@ -70,6 +136,10 @@ class EnhancedWebsiteReader(WebsiteReader):
     max_retries: int = 3  # Maximum number of retries for failed requests
     respect_robots_txt: bool = True  # Whether to respect robots.txt
     max_workers: int = 10  # Maximum number of parallel workers for crawling
+    per_host_concurrency: int = 4  # Maximum concurrent requests to one host
+    host_delay: float = 0.5  # Minimum seconds between the starts of requests to one host
+    max_frontier: int = 1000  # Maximum number of discovered URLs waiting to be crawled
+    http2: bool = True  # Use HTTP/2 where the server and the h2 package allow it
     
     # Track crawling statistics
     _crawled_pages_count: int = 0
@@ -244,14 +314,87 @@ class EnhancedWebsiteReader(WebsiteReader):
         # If no good parent found, just concatenate the good paragraphs
         return " ".join([self._get_clean_text(p) for p in good_paragraphs])
 
-    def _process_url(self, url_info: Tuple[str, int], primary_domain: str) -> Optional[Tuple[str, str, List[str]]]:
+    def _create_client(self) -> httpx.AsyncClient:
+        """
+        Create the HTTP client shared by all requests of one crawl.
+        Connections are kept alive and reused, over HTTP/2 when the h2 package is installed.
+        """
+        connections = max(self.max_workers, 1)
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers=self.headers,
+            http2=self.http2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        )
+
+    async def _fetch(
+        self,
+        client: httpx.AsyncClient,
+        host_limiter: "HostLimiter",
+        url: str,
+        previous: Optional[PageState] = None
+    ) -> Optional[httpx.Response]:
+        """
+        Fetch a page with retries and exponential backoff.
+        The host slot is released while backing off, so other pages of the host can proceed.
+        With the previous state of the page the request is conditional.
+
+        :return: The response (2xx, 304 or 404/410) or None if all retries failed.
+        """
+        host = urlparse(url).netloc
+        headers = {}
+        if previous and previous.etag:
+            headers['If-None-Match'] = previous.etag
+        if previous and previous.last_modified:
+            headers['If-Modified-Since'] = previous.last_modified
+
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with host_limiter.slot(host):
+                    response = await client.get(url, headers=headers) if headers else await client.get(url)
+                if (response.status_code == 304 and previous) or response.status_code in (404, 410):
+                    return response
+                response.raise_for_status()
+                return response
+            except Exception as e:
+                last_error = str(e)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(2 ** attempt)
+        logger.warning(f"Failed to fetch {url} after {self.max_retries} attempts: {last_error}")
+        return None
+
+    def _parse_page(self, html: str, current_url: str, current_depth: int) -> Tuple[str, List[str]]:
+        """
+        Extract the main content and, below max depth, the links of a page.
+
+        :return: Tuple of (content, links)
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        content = self._extract_main_content(soup)
+        links = []
+        if content and len(content) >= self.min_content_length and current_depth < self.max_depth:
+            links = self._extract_links(soup, current_url)
+        return content, links
+
+    async def _process_url(
+        self,
+        client: httpx.AsyncClient,
+        host_limiter: "HostLimiter",
+        url_info: Tuple[str, int],
+        primary_domain: str,
+        incremental: Optional[IncrementalCrawl] = None
+    ) -> Optional[Tuple[str, Optional[str], List[Tuple[str, int]]]]:
         """
         Process a single URL - fetch content and extract links.
-        This is used for parallel processing of URLs.
         
+        :param client: HTTP client shared by the crawl
+        :param host_limiter: Per-host limits of the crawl
         :param url_info: Tuple of (URL, depth)
         :param primary_domain: Primary domain to filter links
-        :return: Tuple of (URL, content, new_links) or None if failed
+        :param incremental: Previous page states, and the collected states of this crawl
+        :return: Tuple of (URL, content, new_links), content None for unchanged pages, or None if failed
         """
         current_url, current_depth = url_info
         
@@ -268,76 +411,164 @@ class EnhancedWebsiteReader(WebsiteReader):
         # Mark as visited before processing
         self._visited.add(current_url)
         
-        self.delay()
-        
         # Increment crawled pages counter
         self._crawled_pages_count += 1
+        page_number = self._crawled_pages_count
         page_start_time = time.time()
-        logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Crawling page {self._crawled_pages_count}: {current_url} (depth: {current_depth})")
+        logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Crawling page {page_number}: {current_url} (depth: {current_depth})")
 
-        # Try to get content from URL with retries
-        content = None
-        new_links = []
-        retry_count = 0
-        last_error = None
-        
-        while retry_count < self.max_retries and content is None:
-            try:
-                # Make the request
-                with httpx.Client(
-                    timeout=self.timeout, 
-                    follow_redirects=True, 
-                    headers=self.headers
-                ) as client:
-                    response = client.get(current_url)
-                    response.raise_for_status()
-                    
-                # Parse HTML with BeautifulSoup
-                soup = BeautifulSoup(response.text, 'html.parser')
-                content = self._extract_main_content(soup)
-                
-                # Check content quality
-                if not content or len(content) < self.min_content_length:
-                    self._failed_crawls += 1
-                    return None
-                
-                self._successful_crawls += 1
-                logger.info(f"✓ Successfully extracted {len(content)} chars from {current_url}")
-                
-                # Extract new links if not at max depth
-                if current_depth < self.max_depth:
-                    links = self._extract_links(soup, current_url)
-                    
-                    next_depth = current_depth + 1
-                    new_links = [(link, next_depth) for link in links 
-                                if link not in self._visited]
-                    
-            except Exception as e:
-                retry_count += 1
-                last_error = str(e)
-                # Exponential backoff
-                if retry_count < self.max_retries:
-                    time.sleep(2 ** retry_count)
-        
-        # Log failure if all retries failed
-        if content is None:
+        previous = incremental.previous.get(current_url) if incremental else None
+        response = await self._fetch(client, host_limiter, current_url, previous)
+        if response is None or response.status_code in (404, 410):
             self._failed_crawls += 1
+            if incremental:
+                incremental.failed.add(current_url)
+                if response is not None:
+                    incremental.gone.add(current_url)
             return None
+
+        if response.status_code == 304:
+            # Not modified: nothing to extract, keep crawling through the links seen last time
+            content = None
+            links = previous.links if current_depth < self.max_depth else []
+            state = previous
+        else:
+            # Parse off the event loop so other pages keep downloading meanwhile
+            content, links = await asyncio.to_thread(self._parse_page, response.text, current_url, current_depth)
+
+            # Check content quality
+            if not content or len(content) < self.min_content_length:
+                self._failed_crawls += 1
+                if incremental:
+                    incremental.failed.add(current_url)
+                return None
+
+            state = PageState(
+                etag=response.headers.get('etag'),
+                last_modified=response.headers.get('last-modified'),
+                content_hash=md5(content.encode()).hexdigest(),
+                links=links
+            )
+            if previous and previous.content_hash == state.content_hash:
+                content = None
+
+        self._successful_crawls += 1
+        if incremental:
+            incremental.pages[current_url] = state
+            if content is None:
+                incremental.unchanged.add(current_url)
+        if content is None:
+            logger.info(f"✓ Unchanged since last crawl: {current_url}")
+        else:
+            logger.info(f"✓ Successfully extracted {len(content)} chars from {current_url}")
+
+        next_depth = current_depth + 1
+        new_links = [(link, next_depth) for link in links if link not in self._visited]
         
         page_end_time = time.time()
         page_duration = page_end_time - page_start_time
-        logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Completed crawling page {self._crawled_pages_count} (Time taken: {page_duration:.2f}s)")
+        logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Completed crawling page {page_number} (Time taken: {page_duration:.2f}s)")
         
         return (current_url, content, new_links)
 
-    def crawl(self, url: str, starting_depth: int = 1, on_document_callback: Optional[Callable[[str, str], None]] = None, on_url_crawled_callback: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+    async def _crawl_async(
+        self,
+        url: str,
+        starting_depth: int,
+        on_document_callback: Optional[Callable[[str, str], None]],
+        on_url_crawled_callback: Optional[Callable[[str], None]],
+        incremental: Optional[IncrementalCrawl] = None
+    ) -> Dict[str, str]:
+        """
+        Crawl with max_workers concurrent workers sharing one HTTP client and a bounded frontier.
+        Callbacks run on the event loop thread, i.e. the thread that called crawl().
+        Unchanged pages of an incremental crawl count towards max_links but are not returned.
         """
-        Enhanced crawl method with parallel processing and immediate vector DB insertion.
+        crawler_result: Dict[str, str] = {}
+        unchanged_pages: Set[str] = set()
+        primary_domain = self._get_primary_domain(url)
+        host_limiter = HostLimiter(self.per_host_concurrency, self.host_delay)
+
+        frontier: asyncio.Queue = asyncio.Queue()
+        queued: Set[str] = {url}
+        dropped_links = 0
+        frontier.put_nowait((url, starting_depth))
+        logger.info(f"Added starting URL to crawl queue: {url} (depth: {starting_depth})")
+
+        async def worker(client: httpx.AsyncClient):
+            nonlocal dropped_links
+            while True:
+                url_info = await frontier.get()
+                try:
+                    # Once max_links is reached the remaining frontier is drained without fetching
+                    if len(crawler_result) + len(unchanged_pages) >= self.max_links:
+                        continue
+
+                    result = await self._process_url(client, host_limiter, url_info, primary_domain, incremental)
+                    if not result or len(crawler_result) + len(unchanged_pages) >= self.max_links:
+                        continue
+
+                    processed_url, content, new_links = result
+
+                    # Add the content to our results
+                    if content is None:
+                        unchanged_pages.add(processed_url)
+                    else:
+                        crawler_result[processed_url] = content
+
+                    # Call the URL crawled callback first (for progress tracking)
+                    if on_url_crawled_callback:
+                        logger.debug(f"📞 Calling URL crawled callback for: {processed_url}")
+                        on_url_crawled_callback(processed_url)
+
+                    # Call the callback for immediate processing if provided
+                    if on_document_callback and content is not None:
+                        on_document_callback(processed_url, content)
+
+                    if len(crawler_result) + len(unchanged_pages) >= self.max_links:
+                        logger.info(f"Reached maximum number of links ({self.max_links}), stopping further crawling")
+                        continue
+
+                    # Add new links to the frontier, dropping them once it is full
+                    for new_link, depth in new_links:
+                        if new_link in queued or new_link in self._visited:
+                            continue
+                        if frontier.qsize() >= self.max_frontier:
+                            dropped_links += 1
+                            continue
+                        queued.add(new_link)
+                        frontier.put_nowait((new_link, depth))
+                except Exception as exc:
+                    logger.error(f"URL {url_info[0]} generated an exception: {exc}")
+                    self._failed_crawls += 1
+                finally:
+                    frontier.task_done()
+
+        async with self._create_client() as client:
+            workers = [asyncio.create_task(worker(client)) for _ in range(max(self.max_workers, 1))]
+            try:
+                await frontier.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        if dropped_links:
+            logger.info(f"Frontier limit ({self.max_frontier}) reached, skipped {dropped_links} links")
+        if incremental:
+            incremental.truncated = bool(dropped_links) or len(crawler_result) + len(unchanged_pages) >= self.max_links
+            logger.info(f"Incremental crawl: {len(crawler_result)} new or changed pages, {len(unchanged_pages)} unchanged, {len(incremental.removed_urls)} removed")
+        return crawler_result
+
+    def crawl(self, url: str, starting_depth: int = 1, on_document_callback: Optional[Callable[[str, str], None]] = None, on_url_crawled_callback: Optional[Callable[[str], None]] = None, incremental: Optional[IncrementalCrawl] = None) -> Dict[str, str]:
+        """
+        Enhanced crawl method with concurrent fetching and immediate vector DB insertion.
         
         :param url: The URL to crawl.
         :param starting_depth: The starting depth level for the crawl.
         :param on_document_callback: Callback function that receives (url, content) for immediate processing
         :param on_url_crawled_callback: Callback function that receives (url) when a page is successfully crawled
+        :param incremental: Page states of the previous crawl; unchanged pages are then skipped
         :return: Dictionary of URLs and their corresponding content.
         """
         # Reset visited and urls_to_crawl for fresh crawl
@@ -352,63 +583,15 @@ class EnhancedWebsiteReader(WebsiteReader):
         crawl_start_time = time.time()
         logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting parallel crawl of {url} with max_depth={self.max_depth}, max_links={self.max_links}, and max_workers={self.max_workers}")
         
-        crawler_result: Dict[str, str] = {}
-        primary_domain = self._get_primary_domain(url)
-        
-        # Add starting URL with its depth to the queue
-        urls_to_process = [(url, starting_depth)]
-        logger.info(f"Added starting URL to crawl queue: {url} (depth: {starting_depth})")
-        
-        # Use ThreadPoolExecutor for parallel processing
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Process URLs in batches until no more URLs or max_links reached
-            while urls_to_process and len(crawler_result) < self.max_links:
-                # Take a batch of URLs to process
-                batch_size = min(self.max_workers, len(urls_to_process))
-                current_batch = urls_to_process[:batch_size]
-                urls_to_process = urls_to_process[batch_size:]
-                
-
-                
-                # Submit all URLs in the current batch for parallel processing
-                future_to_url = {
-                    executor.submit(self._process_url, url_info, primary_domain): url_info[0]
-                    for url_info in current_batch
-                }
-                
-                # Process completed futures as they finish
-                for future in as_completed(future_to_url):
-                    url = future_to_url[future]
-                    try:
-                        result = future.result()
-                        if result:
-                            processed_url, content, new_links = result
-                            
-                            # Add the content to our results
-                            crawler_result[processed_url] = content
-                            
-                            # Call the URL crawled callback first (for progress tracking)
-                            if on_url_crawled_callback:
-                                logger.debug(f"📞 Calling URL crawled callback for: {processed_url}")
-                                on_url_crawled_callback(processed_url)
-                            
-                            # Call the callback for immediate processing if provided
-                            if on_document_callback:
-                                on_document_callback(processed_url, content)
-                            
-                            # Add new links to the processing queue
-                            for new_link, depth in new_links:
-                                if new_link not in self._visited and (new_link, depth) not in urls_to_process:
-                                    urls_to_process.append((new_link, depth))
-                            
-                            # If we've reached max_links, break early
-                            if len(crawler_result) >= self.max_links:
-                                logger.info(f"Reached maximum number of links ({self.max_links}), stopping further crawling")
-                                break
-                                
-                    except Exception as exc:
-                        logger.error(f"URL {url} generated an exception: {exc}")
-                        self._failed_crawls += 1
+        crawl = self._crawl_async(url, starting_depth, on_document_callback, on_url_crawled_callback, incremental)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            crawler_result = asyncio.run(crawl)
+        else:
+            # Called from a thread with a running event loop: crawl on a fresh loop in a helper thread
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                crawler_result = executor.submit(asyncio.run, crawl).result()
 
         # Log crawling summary
         crawl_end_time = time.time()
@@ -515,7 +698,7 @@ class EnhancedWebsiteReader(WebsiteReader):
         
         return document
 
-    def read(self, url: str, vector_db_callback: Optional[Callable[[Document], None]] = None, url_crawled_callback: Optional[Callable[[str], None]] = None) -> List[Document]:
+    def read(self, url: str, vector_db_callback: Optional[Callable[[Document], None]] = None, url_crawled_callback: Optional[Callable[[str], None]] = None, incremental: Optional[IncrementalCrawl] = None) -> List[Document]:
         """
         Read content from a URL, crawl related pages, and convert the content into Documents.
         Optionally sends documents to vector DB as they are created.
@@ -523,6 +706,7 @@ class EnhancedWebsiteReader(WebsiteReader):
         :param url: The URL to read from.
         :param vector_db_callback: Optional callback to send documents to vector DB as they're created
         :param url_crawled_callback: Optional callback called when each URL is successfully crawled
+        :param incremental: Page states of the previous crawl; only new and changed pages become Documents
         :return: A list of Document objects.
         """
         # Get timestamp for tracking
@@ -546,7 +730,7 @@ class EnhancedWebsiteReader(WebsiteReader):
                     logger.error(f"Error sending document {document.id} to vector DB: {str(e)}")
         
         # Crawl website with the callback for immediate document processing
-        self.crawl(url, on_document_callback=on_document_created, on_url_crawled_callback=url_crawled_callback)
+        self.crawl(url, on_document_callback=on_document_created, on_url_crawled_callback=url_crawled_callback, incremental=incremental)
         
         end_time = time.time()
         duration = end_time - start_time
@@ -20,6 +20,8 @@ from agno.knowledge.pdf import PDFKnowledgeBase, PDFImageReader, PDFReader
 from agno.knowledge.pdf_url import PDFUrlKnowledgeBase
 from agno.vectordb.pgvector import PgVector, SearchType
 from app.knowledge.optimized_pgvector import OptimizedPgVector
+from app.knowledge.vector_index import vector_index_manager
+from app.knowledge.vector_storage import get_organization_storage_options
 from app.core.config import settings
 from app.core.logger import get_logger
 from app.knowledge.enhanced_website_kb import EnhancedWebsiteKnowledgeBase
@@ -31,6 +33,7 @@ from app.database import SessionLocal
 from app.repositories.knowledge_to_agent import KnowledgeToAgentRepository
 from app.repositories.knowledge import KnowledgeRepository
 from app.repositories.knowledge_queue import KnowledgeQueueRepository
+from app.repositories.knowledge_page import KnowledgePageRepository
 from typing import List, Optional, Dict, Union
 import os
 import tempfile
@@ -38,7 +41,9 @@ import requests
 import asyncio
 from urllib.parse import urlparse
 from uuid import UUID
-from agno.embedder.fastembed import FastEmbedEmbedder
+from app.knowledge.embedder_registry import get_embedder
+from app.knowledge.embedding_cache import embedding_cache
+from app.knowledge.pdf_ingest import ingest_pdf
 
 # Try to import enterprise modules
 try:
@@ -59,15 +64,14 @@ class KnowledgeManager:
         with SessionLocal() as db:
             ai_config_repo = AIConfigRepository(db)
             ai_config = ai_config_repo.get_active_config(org_id)
+            storage_options = get_organization_storage_options(db, org_id)
         
         # Default to SentenceTransformer embedder if no AI config is found
         embedder = None
         table_name = f"d_{org_id}"
         
-        # Use FastEmbedEmbedder instead of SentenceTransformerEmbedder
-        embedder = FastEmbedEmbedder(
-            id=settings.FASTEMBED_MODEL
-        )
+        # Shared FastEmbed model for settings.FASTEMBED_MODEL, loaded once per process
+        embedder = get_embedder()
         
         # Dimensions will be automatically set by the model
 
@@ -77,7 +81,10 @@ class KnowledgeManager:
             schema="ai",
             search_type=SearchType.vector,
             embedder=embedder,
-            auto_upgrade_schema=True
+            auto_upgrade_schema=True,
+            # Shared by all organizations: identical chunks are embedded once per model
+            embedding_cache=embedding_cache if settings.EMBEDDING_CACHE_ENABLED else None,
+            **storage_options
         )
 
     def _add_knowledge_source(self, source: str, source_type: SourceType):
@@ -105,7 +112,24 @@ class KnowledgeManager:
                 )
                 link_repo.create(link)
 
-            return knowledge
+            # Catalog the source's subpages for the knowledge listings
+            try:
+                KnowledgePageRepository(db).refresh_source(
+                    self.org_id, source, self.vector_db.schema, self.vector_db.table_name
+                )
+            except Exception as e:
+                logger.error(f"Error cataloguing pages of {source}: {str(e)}")
+
+        # New documents or a new link change what searches of the agent (or org) return
+        self._invalidate_search_cache()
+        return knowledge
+
+    def _invalidate_search_cache(self):
+        from app.tools.knowledge_search_byagent import invalidate_agent_knowledge, invalidate_organization_knowledge
+        if self.agent_id:
+            invalidate_agent_knowledge(self.agent_id)
+        else:
+            invalidate_organization_knowledge(self.org_id)
 
     async def add_pdf_urls(self, urls: List[str]) -> bool:
         """Add knowledge from PDF URLs"""
@@ -243,6 +267,7 @@ class KnowledgeManager:
                         timeout=settings.KB_TIMEOUT,
                         max_retries=settings.KB_MAX_RETRIES,
                         max_workers=min(settings.KB_MAX_WORKERS, settings.EMBEDDING_MAX_WORKERS),  # Use the smaller of the two
+                        incremental=settings.KB_INCREMENTAL_RECRAWL,
                         vector_db=self.vector_db
                     )
                 else:
@@ -255,6 +280,7 @@ class KnowledgeManager:
                         timeout=settings.KB_TIMEOUT,  # Use config for timeout
                         max_retries=settings.KB_MAX_RETRIES,  # Use config for retries
                         max_workers=min(settings.KB_MAX_WORKERS, settings.EMBEDDING_MAX_WORKERS),  # Use the smaller of the two
+                        incremental=settings.KB_INCREMENTAL_RECRAWL,
                         vector_db=self.vector_db
                     )
                     
@@ -273,72 +299,47 @@ class KnowledgeManager:
             return False
 
     async def add_pdf_files(self, files: List[str], chunk: bool = True, reader: Optional[Union[PDFReader, PDFImageReader]] = None, filename: Optional[str] = None) -> bool:
-        """Add knowledge from PDF files"""
+        """
+        Add knowledge from PDF files. Pages are extracted in a process pool, OCR'd only when they
+        have no text layer, and their chunks embedded and stored as the pages finish. A reader,
+        if given, reads each file whole through agno's PDFKnowledgeBase instead.
+        """
         try:
-            # Process each file individually since PDFKnowledgeBase expects a single path
             for file_path in files:
-                temp_file = None
-                path_to_use = file_path
-                
-                
-                try:
-                    # First try with regular PDFReader
-                    try:
-                        knowledge_base = PDFKnowledgeBase(
-                            path=path_to_use,
-                            vector_db=self.vector_db,
-                            reader=PDFReader(chunk=chunk) if not reader else reader
-                        )
-                        if filename is None:
-                            filename = os.path.splitext(os.path.basename(file_path))[0]
-                            
-                        # Convert agent_id to string if it exists
-                        agent_id_filter = [str(self.agent_id)] if self.agent_id else []
-                        logger.info(f"Adding PDF knowledge source: {filename}")
-                        filters = {
-                            "name": filename,
-                            "agent_id": agent_id_filter,
-                            "org_id": str(self.org_id)
-                        }
-                        # Run PDF processing in thread pool to avoid blocking other APIs
-                        await asyncio.to_thread(
-                            knowledge_base.load,
-                            recreate=False,
-                            upsert=True,
-                            filters=filters
-                        )
-                    except Exception as e:
-                        logger.warning(f"Regular PDFReader failed for {path_to_use}, trying PDFImageReader: {str(e)}")
-                        # Fallback to PDFImageReader if PDFReader fails
-                        knowledge_base = PDFKnowledgeBase(
-                            path=path_to_use,
-                            vector_db=self.vector_db,
-                            reader=PDFImageReader(chunk=chunk)
-                        )
-                        if filename is None:
-                            filename = os.path.splitext(os.path.basename(file_path))[0]
-                        
-                        # Convert agent_id to string if it exists
-                        agent_id_filter = [str(self.agent_id)] if self.agent_id else []
-                        filters = {
-                            "name": filename,
-                            "agent_id": agent_id_filter,
-                            "org_id": str(self.org_id)
-                        }
-                        # Run PDF processing in thread pool to avoid blocking other APIs
-                        await asyncio.to_thread(
-                            knowledge_base.load,
-                            recreate=False,
-                            upsert=True,
-                            filters=filters
-                        )
-                    
-                    self._add_knowledge_source(filename, SourceType.FILE)
-                finally:
-                    # Clean up temp file if we created one
-                    if temp_file and os.path.exists(temp_file.name):
-                        os.unlink(temp_file.name)
-                        
+                name = filename or os.path.splitext(os.path.basename(file_path))[0]
+
+                # Convert agent_id to string if it exists
+                agent_id_filter = [str(self.agent_id)] if self.agent_id else []
+                logger.info(f"Adding PDF knowledge source: {name}")
+                filters = {
+                    "name": name,
+                    "agent_id": agent_id_filter,
+                    "org_id": str(self.org_id)
+                }
+
+                # Run PDF processing in thread pool to avoid blocking other APIs
+                if reader is not None:
+                    knowledge_base = PDFKnowledgeBase(path=file_path, vector_db=self.vector_db, reader=reader)
+                    await asyncio.to_thread(
+                        knowledge_base.load,
+                        recreate=False,
+                        upsert=True,
+                        filters=filters
+                    )
+                else:
+                    if not await asyncio.to_thread(self.vector_db.exists):
+                        await asyncio.to_thread(self.vector_db.create)
+                    await asyncio.to_thread(
+                        ingest_pdf,
+                        file_path,
+                        name,
+                        self.vector_db,
+                        filters,
+                        PDFReader(chunk=True) if chunk else None
+                    )
+
+                self._add_knowledge_source(name, SourceType.FILE)
+
             return True
         except Exception as e:
             logger.error(f"Error adding PDF files: {str(e)}")
@@ -448,6 +449,7 @@ class KnowledgeManager:
                     knowledge_base = EnhancedWebsiteKnowledgeBase(
                         urls=[queue_item.source],
                         max_links=max_links,
+                        incremental=settings.KB_INCREMENTAL_RECRAWL,
                         vector_db=self.vector_db
                     )
                     # Add queue_item and repo for URL tracking
@@ -483,6 +485,10 @@ class KnowledgeManager:
                 if not success:
                     raise Exception("Failed to process knowledge source")
 
+                # Build the indexes the table (and the crawled site) have grown into
+                index_source = queue_item.source if queue_item.source_type == 'website' else None
+                await asyncio.to_thread(vector_index_manager.ensure_indexes, self.vector_db, index_source)
+
                 return success
 
         except Exception as e:
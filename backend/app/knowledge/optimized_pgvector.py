@@ -27,7 +27,23 @@ from agno.vectordb.pgvector.pgvector import PgVector
 from agno.vectordb.distance import Distance
 from agno.vectordb.pgvector.index import HNSW, Ivfflat
 from agno.vectordb.search import SearchType
+from sqlalchemy import Column, Float, bindparam, cast, desc, func, select, text, union
 from sqlalchemy.engine import Engine
+from pgvector import HalfVector, Vector
+from pgvector.sqlalchemy import BIT, HALFVEC
+from pgvector.psycopg import register_vector
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from app.core.config import settings
+from app.knowledge.embedder_registry import embed_documents
+from app.knowledge.embedding_cache import EmbeddingCache
+from app.knowledge.vector_index import index_expression, vector_index_manager
+
+# Columns written by bulk loads and their Postgres types for binary COPY
+COPY_COLUMNS = ("id", "name", "meta_data", "filters", "content", "embedding", "usage", "content_hash")
+COPY_TYPES = ("text", "text", "jsonb", "jsonb", "text", "vector", "jsonb", "text")
+# Embedding column types: float32 vector or float16 halfvec (half the storage and index size)
+STORAGE_TYPES = ("vector", "halfvec")
 
 
 class OptimizedPgVector(PgVector):
@@ -38,6 +54,11 @@ class OptimizedPgVector(PgVector):
     This class optimizes the workflow for web crawling by allowing embeddings
     to be generated during the crawling phase, and then preserved during insertion
     into the database.
+
+    Embeddings are stored as `vector` or, with storage="halfvec", as half precision
+    `halfvec`. With binary_index, the HNSW index is built over binary-quantized
+    embeddings instead, and searches rescore its top candidates with the stored
+    embeddings, trading a small amount of recall for a much smaller index.
     """
 
     def __init__(
@@ -56,8 +77,20 @@ class OptimizedPgVector(PgVector):
         schema_version: int = 1,
         auto_upgrade_schema: bool = False,
         reranker: Optional[Reranker] = None,
+        storage: str = "vector",
+        binary_index: bool = False,
+        embedding_cache: Optional[EmbeddingCache] = None,
     ):
-        """Initialize the OptimizedPgVector with the same parameters as PgVector."""
+        """
+        Initialize the OptimizedPgVector with the same parameters as PgVector, plus the embedding storage
+        and an optional cache of chunk embeddings consulted before the embedder.
+        """
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unsupported vector storage '{storage}', expected one of {STORAGE_TYPES}")
+        # Read by get_table, which PgVector.__init__ calls
+        self.storage = storage
+        self.binary_index = binary_index
+        self.embedding_cache = embedding_cache
         super().__init__(
             table_name=table_name,
             schema=schema,
@@ -75,6 +108,56 @@ class OptimizedPgVector(PgVector):
             reranker=reranker,
         )
 
+    def get_table_v1(self):
+        table = super().get_table_v1()
+        if self.storage == "halfvec":
+            table.append_column(Column("embedding", HALFVEC(self.dimensions)), replace_existing=True)
+        return table
+
+    def _create_hnsw_index(self, sess, table_fullname: str, index_distance: str) -> None:
+        """Create the table's HNSW index over the embeddings, or over their binary quantization"""
+        log_debug(f"Creating HNSW index '{self.vector_index.name}' on table '{table_fullname}' with {index_expression(self)}")
+        sess.execute(
+            text(
+                f'CREATE INDEX "{self.vector_index.name}" ON {table_fullname} '
+                f"USING hnsw ({index_expression(self)}) "
+                f"WITH (m = :m, ef_construction = :ef_construction);"
+            ),
+            {"m": self.vector_index.m, "ef_construction": self.vector_index.ef_construction}
+        )
+
+    def _create_ivfflat_index(self, sess, table_fullname: str, index_distance: str) -> None:
+        super()._create_ivfflat_index(sess, table_fullname, index_distance.replace("vector_", f"{self.storage}_", 1))
+
+    def _build_record(self, doc: Document, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Row values of an embedded document"""
+        # Merge filters into document metadata for searchability
+        merged_meta_data = doc.meta_data.copy() if doc.meta_data else {}
+        if filters:
+            merged_meta_data.update(filters)
+            logger.debug(f"Merged filters into meta_data: {filters}")
+
+        cleaned_content = self._clean_content(doc.content)
+        content_hash = md5(cleaned_content.encode()).hexdigest()
+        return {
+            "id": doc.id or content_hash,
+            "name": doc.name,
+            "meta_data": merged_meta_data,  # Use merged metadata
+            "filters": filters,
+            "content": cleaned_content,
+            "embedding": doc.embedding,
+            "usage": doc.usage,
+            "content_hash": content_hash,
+        }
+
+    def _use_copy(self, documents: List[Document]) -> bool:
+        """Bulk loads go through binary COPY when they are large enough and the engine uses psycopg 3"""
+        return (
+            settings.PGVECTOR_COPY_MIN_ROWS > 0
+            and len(documents) >= settings.PGVECTOR_COPY_MIN_ROWS
+            and self.db_engine.dialect.driver == "psycopg"
+        )
+
     def insert(
         self,
         documents: List[Document],
@@ -89,44 +172,28 @@ class OptimizedPgVector(PgVector):
             filters (Optional[Dict[str, Any]]): Filters to apply to the documents.
             batch_size (int): Number of documents to insert in each batch.
         """
+        if self._use_copy(documents):
+            try:
+                self.bulk_load(documents, filters, upsert=False)
+                return
+            except Exception as e:
+                logger.warning(f"COPY bulk load failed, falling back to batched inserts: {e}")
         try:
             with self.Session() as sess:
                 for i in range(0, len(documents), batch_size):
                     batch_docs = documents[i : i + batch_size]
                     try:
+                        # Embed documents not embedded yet (should be rare), from the cache where possible
+                        if self.embedder is not None:
+                            embed_documents(batch_docs, self.embedder, self.embedding_cache)
                         # Prepare documents for insertion
                         batch_records = []
                         for doc in batch_docs:
                             try:
-                                # Embed document only if not already embedded (should be rare)
                                 if doc.embedding is None:
-                                    if self.embedder is not None:
-                                        doc.embed(embedder=self.embedder)
-                                        logger.debug(f"Document embedding done for {doc.name}")
-                                    else:
-                                        logger.warning(f"Document '{doc.name}' has no embedding and no embedder available - skipping")
-                                        continue
-                                
-                                # Merge filters into document metadata for searchability
-                                merged_meta_data = doc.meta_data.copy() if doc.meta_data else {}
-                                if filters:
-                                    merged_meta_data.update(filters)
-                                    logger.debug(f"Merged filters into meta_data: {filters}")
-                                
-                                cleaned_content = self._clean_content(doc.content)
-                                content_hash = md5(cleaned_content.encode()).hexdigest()
-                                _id = doc.id or content_hash
-                                record = {
-                                    "id": _id,
-                                    "name": doc.name,
-                                    "meta_data": merged_meta_data,  # Use merged metadata
-                                    "filters": filters,
-                                    "content": cleaned_content,
-                                    "embedding": doc.embedding,
-                                    "usage": doc.usage,
-                                    "content_hash": content_hash,
-                                }
-                                batch_records.append(record)
+                                    logger.warning(f"Document '{doc.name}' has no embedding - skipping")
+                                    continue
+                                batch_records.append(self._build_record(doc, filters))
                             except Exception as e:
                                 logger.error(f"Error processing document '{doc.name}': {e}")
 
@@ -157,39 +224,28 @@ class OptimizedPgVector(PgVector):
             filters (Optional[Dict[str, Any]]): Filters to apply to the documents.
             batch_size (int): Number of documents to upsert in each batch.
         """
+        if self._use_copy(documents):
+            try:
+                self.bulk_load(documents, filters, upsert=True)
+                return
+            except Exception as e:
+                logger.warning(f"COPY bulk load failed, falling back to batched upserts: {e}")
         try:
             with self.Session() as sess:
                 for i in range(0, len(documents), batch_size):
                     batch_docs = documents[i : i + batch_size]
                     try:
+                        # Embed documents without an embedding, from the cache where possible
+                        if self.embedder is not None:
+                            embed_documents(batch_docs, self.embedder, self.embedding_cache)
                         # Prepare documents for upserting
                         batch_records = []
                         for doc in batch_docs:
                             try:
-                                # Skip embedding if the document already has an embedding
                                 if doc.embedding is None:
-                                    doc.embed(embedder=self.embedder)
-                                
-                                # Merge filters into document metadata for searchability
-                                merged_meta_data = doc.meta_data.copy() if doc.meta_data else {}
-                                if filters:
-                                    merged_meta_data.update(filters)
-                                    logger.debug(f"Merged filters into meta_data: {filters}")
-                                    
-                                cleaned_content = self._clean_content(doc.content)
-                                content_hash = md5(cleaned_content.encode()).hexdigest()
-                                _id = doc.id or content_hash
-                                record = {
-                                    "id": _id,
-                                    "name": doc.name,
-                                    "meta_data": merged_meta_data,  # Use merged metadata
-                                    "filters": filters,
-                                    "content": cleaned_content,
-                                    "embedding": doc.embedding,
-                                    "usage": doc.usage,
-                                    "content_hash": content_hash,
-                                }
-                                batch_records.append(record)
+                                    logger.warning(f"Document '{doc.name}' has no embedding - skipping")
+                                    continue
+                                batch_records.append(self._build_record(doc, filters))
                             except Exception as e:
                                 logger.error(f"Error processing document '{doc.name}': {e}")
 
@@ -216,4 +272,263 @@ class OptimizedPgVector(PgVector):
                         raise
         except Exception as e:
             logger.error(f"Error upserting documents: {e}")
-            raise 
\ No newline at end of file
+            raise 
+
+    def bulk_load(
+        self,
+        documents: List[Document],
+        filters: Optional[Dict[str, Any]] = None,
+        upsert: bool = True,
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """
+        Load documents with binary COPY into a temporary staging table and merge them into the
+        table with one INSERT ... SELECT per batch (ON CONFLICT (id) DO UPDATE when upserting).
+
+        Requires the psycopg 3 driver. Documents without embeddings are embedded in batches first,
+        from the embedding cache where it has them.
+
+        Args:
+            documents (List[Document]): Documents to load.
+            filters (Optional[Dict[str, Any]]): Filters to apply to the documents.
+            upsert (bool): Update rows whose id already exists instead of failing.
+            batch_size (Optional[int]): Rows per COPY and merge, defaults to PGVECTOR_COPY_BATCH_SIZE.
+
+        Returns:
+            int: Number of rows written.
+        """
+        if self.embedder is not None:
+            embed_documents(documents, self.embedder, self.embedding_cache)
+
+        # Later documents win, as they would with batched upserts; one merge can't touch a row twice
+        records: Dict[str, Dict[str, Any]] = {}
+        for doc in documents:
+            if doc.embedding is None:
+                logger.warning(f"Document '{doc.name}' has no embedding - skipping")
+                continue
+            try:
+                record = self._build_record(doc, filters)
+                records[record["id"]] = record
+            except Exception as e:
+                logger.error(f"Error processing document '{doc.name}': {e}")
+
+        rows = list(records.values())
+        batch_size = batch_size or settings.PGVECTOR_COPY_BATCH_SIZE
+        written = 0
+        with self.Session() as sess:
+            try:
+                connection = sess.connection().connection.driver_connection
+                register_vector(connection)
+                with connection.cursor() as cur:
+                    cur.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+                        self._staging_identifier(), self._table_identifier()
+                    ))
+                    for i in range(0, len(rows), batch_size):
+                        written += self._copy_and_merge(cur, rows[i : i + batch_size], upsert)
+                # One transaction for the whole load, so a failure leaves nothing half written
+                sess.commit()
+            except Exception as e:
+                logger.error(f"Error bulk loading documents: {e}")
+                sess.rollback()
+                raise
+        log_debug(f"Bulk loaded {written} documents into {self.table.name}")
+        return written
+
+    def _table_identifier(self) -> sql.Identifier:
+        if self.table.schema:
+            return sql.Identifier(self.table.schema, self.table.name)
+        return sql.Identifier(self.table.name)
+
+    def _staging_identifier(self) -> sql.Identifier:
+        return sql.Identifier(f"{self.table.name}_staging")
+
+    def _copy_and_merge(self, cur, rows: List[Dict[str, Any]], upsert: bool) -> int:
+        """COPY rows into the staging table, merge them into the table and empty the staging table"""
+        staging = self._staging_identifier()
+        columns = sql.SQL(", ").join(sql.Identifier(column) for column in COPY_COLUMNS)
+
+        def jsonb(value):
+            return Jsonb(value) if value is not None else None
+
+        with cur.copy(sql.SQL("COPY {} ({}) FROM STDIN (FORMAT BINARY)").format(staging, columns)) as copy:
+            copy.set_types(COPY_TYPES[:5] + (self.storage,) + COPY_TYPES[6:])
+            for row in rows:
+                copy.write_row((
+                    row["id"],
+                    row["name"],
+                    jsonb(row["meta_data"]),
+                    jsonb(row["filters"]),
+                    row["content"],
+                    HalfVector(row["embedding"]) if self.storage == "halfvec" else Vector(row["embedding"]),
+                    jsonb(row["usage"]),
+                    row["content_hash"],
+                ))
+
+        merge = sql.SQL("INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}").format(
+            table=self._table_identifier(), columns=columns, staging=staging
+        )
+        if upsert:
+            merge += sql.SQL(" ON CONFLICT (id) DO UPDATE SET ") + sql.SQL(", ").join(
+                sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in COPY_COLUMNS[1:]
+            )
+        cur.execute(merge)
+        merged = cur.rowcount
+        cur.execute(sql.SQL("TRUNCATE {}").format(staging))
+        return merged
+
+    def delete_documents(self, name: str, ids: List[str]) -> int:
+        """
+        Delete the rows with the given ids of one source (document name).
+
+        Args:
+            name (str): Name of the source the documents belong to.
+            ids (List[str]): Ids of the documents to delete.
+
+        Returns:
+            int: Number of deleted rows.
+        """
+        if not ids:
+            return 0
+        from sqlalchemy import delete
+        try:
+            with self.Session() as sess:
+                result = sess.execute(
+                    delete(self.table).where(self.table.c.name == name, self.table.c.id.in_(ids))
+                )
+                sess.commit()
+                log_debug(f"Deleted {result.rowcount} documents of {name}")
+                return result.rowcount
+        except Exception as e:
+            logger.error(f"Error deleting documents of {name}: {e}")
+            raise
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        Search like PgVector, except that a list under filters["name"] restricts the search
+        to those sources with an IN on the indexed name column instead of a meta_data match.
+
+        Agent visibility is resolved from knowledge_to_agent into the agent's linked sources,
+        so linking a source to an agent never has to rewrite its vector rows.
+        """
+        sources = (filters or {}).get("name")
+        if not isinstance(sources, (list, tuple, set)):
+            return super().search(query=query, limit=limit, filters=filters)
+        if not sources:
+            return []
+        meta_filters = {key: value for key, value in filters.items() if key != "name"} or None
+
+        try:
+            query_embedding = None
+            if self.search_type != SearchType.keyword:
+                query_embedding = self.embedder.get_embedding(query)
+                if query_embedding is None:
+                    logger.error(f"Error getting embedding for Query: {query}")
+                    return []
+            stmt = self.build_search_statement(query, query_embedding, limit, list(sources), meta_filters)
+            if stmt is None:
+                return []
+            log_debug(f"Source search query: {stmt}")
+
+            with self.Session() as sess, sess.begin():
+                if query_embedding is not None:
+                    for statement in vector_index_manager.search_settings(self, limit):
+                        sess.execute(text(statement))
+                results = sess.execute(stmt).fetchall()
+        except Exception as e:
+            logger.error(f"Error searching sources {list(sources)}: {e}")
+            return []
+
+        search_results = [
+            Document(
+                id=result.id,
+                name=result.name,
+                meta_data=result.meta_data,
+                content=result.content,
+                embedder=self.embedder,
+                embedding=result.embedding,
+                usage=result.usage,
+            )
+            for result in results
+        ]
+        if self.reranker:
+            search_results = self.reranker.rerank(query=query, documents=search_results)
+
+        log_info(f"Found {len(search_results)} documents")
+        return search_results
+
+    def build_search_statement(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]],
+        limit: int,
+        sources: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        SELECT for the configured search type, scored the same way as PgVector's vector,
+        keyword and hybrid searches, over the rows of the given sources only.
+
+        Vector and hybrid searches first pick candidate ids with an ORDER BY distance LIMIT
+        subquery the HNSW index (table-wide, or the source's partial index) can answer;
+        hybrid adds the best full-text matches. Only the candidates are then scored, so a
+        search never computes distances for every row of a large tenant.
+        """
+        table = self.table
+        columns = [table.c.id, table.c.name, table.c.meta_data, table.c.content, table.c.embedding, table.c.usage]
+        # Sources are inlined so the planner can match them against partial index predicates
+        conditions = [table.c.name.in_(bindparam("sources", list(sources), expanding=True, literal_execute=True))]
+        if filters:
+            conditions.append(table.c.meta_data.contains(filters))
+
+        ts_vector = func.to_tsvector(self.content_language, table.c.content)
+        processed_query = self.enable_prefix_matching(query) if self.prefix_match else query
+        ts_query = func.websearch_to_tsquery(self.content_language, bindparam("query", value=processed_query))
+        text_rank = func.ts_rank_cd(ts_vector, ts_query)
+
+        if self.search_type == SearchType.keyword:
+            return select(*columns).where(*conditions).order_by(text_rank.desc()).limit(limit)
+
+        if self.distance == Distance.l2:
+            vector_distance = table.c.embedding.l2_distance(query_embedding)
+        elif self.distance == Distance.cosine:
+            vector_distance = table.c.embedding.cosine_distance(query_embedding)
+        elif self.distance == Distance.max_inner_product:
+            vector_distance = table.c.embedding.max_inner_product(query_embedding)
+        else:
+            logger.error(f"Unknown distance metric: {self.distance}")
+            return None
+
+        # The index orders candidates by float distance, or by the Hamming distance of the binary quantizations
+        index_order = vector_distance
+        if self.binary_index:
+            query_vector = cast(bindparam("query_vector", query_embedding, type_=table.c.embedding.type), table.c.embedding.type)
+            index_order = cast(func.binary_quantize(table.c.embedding), BIT(self.dimensions)).op("<~>", return_type=Float)(
+                func.binary_quantize(query_vector)
+            )
+        candidate_limit = vector_index_manager.candidate_limit(self, limit)
+
+        if self.search_type == SearchType.vector:
+            candidates = select(table.c.id).where(*conditions).order_by(index_order).limit(candidate_limit).correlate(None)
+            # Candidates are rescored with the stored embeddings: iterative scans in relaxed order may return them
+            # slightly out of order, and binary quantized distances only approximate the real ones
+            return select(*columns).where(table.c.id.in_(candidates)).order_by(vector_distance).limit(limit)
+
+        if not 0 <= self.vector_score_weight <= 1:
+            raise ValueError("vector_score_weight must be between 0 and 1")
+        if self.distance == Distance.max_inner_product:
+            vector_score = (vector_distance + 1) / 2
+        else:
+            vector_score = 1 / (1 + vector_distance)
+        hybrid_score = self.vector_score_weight * vector_score + (1 - self.vector_score_weight) * text_rank
+
+        candidates = union(
+            select(table.c.id).where(*conditions).order_by(index_order).limit(candidate_limit),
+            select(table.c.id).where(*conditions, ts_vector.op("@@")(ts_query))
+            .order_by(text_rank.desc()).limit(candidate_limit)
+        )
+        return (
+            select(*columns, hybrid_score.label("hybrid_score"))
+            .where(table.c.id.in_(select(candidates.subquery().c.id).correlate(None)))
+            .order_by(desc("hybrid_score"))
+            .limit(limit)
+        )
@@ -0,0 +1,181 @@
+"""
+ChatterMate - PDF Ingestion
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from agno.document import Document
+from agno.document.reader.base import Reader
+from pypdf import PdfReader
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (page number, text, whether the text came from OCR)
+PageText = Tuple[int, str, bool]
+
+_ocr_engine = None  # RapidOCR of this process, loaded on its first scanned page
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _open(path: str, password: Optional[str] = None) -> PdfReader:
+    reader = PdfReader(path)
+    if reader.is_encrypted and not reader.decrypt(password or ""):
+        raise ValueError(f"PDF {path} is password protected")
+    return reader
+
+
+def _ocr_page(page) -> str:
+    """Text of the images of a page"""
+    global _ocr_engine
+    if _ocr_engine is None:
+        import rapidocr_onnxruntime as rapidocr
+        _ocr_engine = rapidocr.RapidOCR()
+    lines = []
+    for image in page.images:
+        result, _ = _ocr_engine(image.data)
+        lines += [item[1] for item in result] if result else []
+    return "\n".join(lines)
+
+
+def extract_pages(path: str, page_indexes: List[int], min_text_chars: int, password: Optional[str] = None) -> List[PageText]:
+    """
+    Text of the given pages (0-based indexes) of a PDF. Pages with less than min_text_chars of
+    extractable text, i.e. scans, are OCR'd. Runs in the PDF process pool.
+    """
+    reader = _open(path, password)
+    pages = []
+    for index in page_indexes:
+        text, ocr = "", False
+        try:
+            page = reader.pages[index]
+            text = page.extract_text() or ""
+            if len(text.strip()) < min_text_chars:
+                image_text = _ocr_page(page)
+                if image_text.strip():
+                    text, ocr = f"{text.strip()}\n{image_text}".strip(), True
+        except Exception as e:
+            logger.error(f"Error extracting page {index + 1} of {path}: {str(e)}")
+        pages.append((index + 1, text, ocr))
+    return pages
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Process pool shared by this worker's PDF ingestions"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked: the parent runs threads (embedding, DB pools) a fork could deadlock on
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def iter_pages(path: str, password: Optional[str] = None, executor: Optional[Executor] = None) -> Iterator[List[PageText]]:
+    """
+    Yield the pages of a PDF in batches of PDF_PAGES_PER_TASK as they are extracted, in completion
+    order. At most two batches per worker are in flight, so memory stays bounded for long files.
+    Without a process pool (PDF_PROCESS_WORKERS <= 1) pages are extracted inline.
+    """
+    total = len(_open(path, password).pages)
+    per_task = max(1, settings.PDF_PAGES_PER_TASK)
+    tasks = [list(range(start, min(start + per_task, total))) for start in range(0, total, per_task)]
+    min_text_chars = settings.PDF_OCR_MIN_TEXT_CHARS
+
+    if executor is None and settings.PDF_PROCESS_WORKERS <= 1:
+        for task in tasks:
+            yield extract_pages(path, task, min_text_chars, password)
+        return
+
+    pool = executor or _get_executor()
+    max_in_flight = max(1, settings.PDF_PROCESS_WORKERS) * 2
+    pending = iter(tasks)
+    in_flight = set()
+    try:
+        while True:
+            for task in pending:
+                in_flight.add(pool.submit(extract_pages, path, task, min_text_chars, password))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    except BrokenProcessPool:
+        # A crashed worker (e.g. OCR running out of memory) breaks the pool; the next file gets a new one
+        if executor is None:
+            _reset_executor()
+        raise
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def ingest_pdf(
+    path: str,
+    name: str,
+    vector_db,
+    filters: Optional[Dict[str, Any]] = None,
+    chunker: Optional[Reader] = None,
+    executor: Optional[Executor] = None
+) -> Dict[str, Any]:
+    """
+    Extract, chunk, embed and upsert a PDF page batch by page batch, so chunks are stored as soon
+    as their pages are read and the whole document is never held in memory.
+
+    Documents are named after the knowledge source, with ids "<name>_<page>" (chunked to
+    "<name>_<page>_<chunk>") and the page number in meta_data, as agno's PDFReader names them.
+    """
+    start = time.perf_counter()
+    stats = {"pages": 0, "ocr_pages": 0, "empty_pages": 0, "chunks": 0}
+    for pages in iter_pages(path, executor=executor):
+        documents: List[Document] = []
+        for page_number, text, ocr in pages:
+            stats["pages"] += 1
+            stats["ocr_pages"] += int(ocr)
+            if not text.strip():
+                stats["empty_pages"] += 1
+                continue
+            page = Document(name=name, id=f"{name}_{page_number}", meta_data={"page": page_number}, content=text)
+            documents.extend(chunker.chunk_document(page) if chunker is not None else [page])
+        if documents:
+            vector_db.upsert(documents=documents, filters=filters)
+            stats["chunks"] += len(documents)
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(
+        f"Ingested PDF {name}: {stats['pages']} pages ({stats['ocr_pages']} OCR'd, {stats['empty_pages']} empty), "
+        f"{stats['chunks']} chunks in {stats['seconds']:.2f}s"
+    )
+    return stats
@@ -0,0 +1,246 @@
+"""
+ChatterMate - Vector Index Manager
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import threading
+import time
+from hashlib import md5
+from typing import Any, Dict, List, Optional
+from agno.vectordb.distance import Distance
+from agno.vectordb.pgvector.index import HNSW, Ivfflat
+from agno.vectordb.search import SearchType
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_OPS = {
+    Distance.l2: "l2_ops",
+    Distance.max_inner_product: "ip_ops",
+    Distance.cosine: "cosine_ops",
+}
+
+
+def source_index_name(table_name: str, source: str) -> str:
+    """Name of the partial HNSW index over the rows of one source (fits Postgres' 63 characters)"""
+    return f"idx_{table_name[:36]}_src_{md5(source.encode()).hexdigest()[:12]}"
+
+
+def index_expression(vector_db) -> str:
+    """Indexed expression and operator class of the vector db's HNSW indexes"""
+    if getattr(vector_db, "binary_index", False):
+        return f"(binary_quantize(embedding)::bit({int(vector_db.dimensions)})) bit_hamming_ops"
+    storage = getattr(vector_db, "storage", "vector")
+    return f"embedding {storage}_{INDEX_OPS.get(vector_db.distance, 'cosine_ops')}"
+
+
+def _version_tuple(version: str) -> tuple:
+    return tuple(int(part) for part in version.split(".") if part.isdigit())
+
+
+class VectorIndexManager:
+    """
+    Index strategy for the per-organization vector tables.
+
+    Searches are restricted to an agent's linked sources, which HNSW can only apply after
+    the graph walk. To keep top-k recall under that filter:
+    - the table-wide HNSW and full-text indexes are built once a table is large enough,
+    - sources with at least PGVECTOR_SOURCE_INDEX_MIN_ROWS rows get their own partial
+      HNSW index, which the planner uses for searches of that source alone,
+    - queries raise hnsw.ef_search with the number of results asked for and, on
+      pgvector 0.8+, enable hnsw.iterative_scan so filtered scans keep walking the graph
+      until the limit is filled instead of under-returning.
+    Build times and index sizes are kept for get_stats.
+    """
+
+    def __init__(self):
+        self._pgvector_versions: Dict[str, Optional[str]] = {}
+        self._builds: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def ef_search(self, limit: int) -> int:
+        """hnsw.ef_search for a query returning limit rows"""
+        return max(
+            settings.PGVECTOR_EF_SEARCH_MIN,
+            min(limit * settings.PGVECTOR_EF_SEARCH_FACTOR, settings.PGVECTOR_EF_SEARCH_MAX)
+        )
+
+    def candidate_limit(self, vector_db, limit: int) -> int:
+        """Rows an index scan hands to rescoring: binary quantized indexes over-fetch PGVECTOR_RESCORE_FACTOR times"""
+        candidates = self.ef_search(limit) if vector_db.search_type == SearchType.hybrid else limit
+        if getattr(vector_db, "binary_index", False):
+            candidates = max(candidates, limit * settings.PGVECTOR_RESCORE_FACTOR)
+        return candidates
+
+    def pgvector_version(self, vector_db) -> Optional[str]:
+        """Installed pgvector version of the vector db's database, looked up once per engine"""
+        key = str(vector_db.db_engine.url)
+        if key not in self._pgvector_versions:
+            version = None
+            try:
+                with vector_db.db_engine.connect() as conn:
+                    version = conn.execute(
+                        text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                    ).scalar()
+            except Exception as e:
+                logger.warning(f"Could not read the pgvector version: {str(e)}")
+            with self._lock:
+                self._pgvector_versions[key] = version
+        return self._pgvector_versions[key]
+
+    def supports_iterative_scan(self, vector_db) -> bool:
+        version = self.pgvector_version(vector_db)
+        return bool(version) and _version_tuple(version) >= (0, 8)
+
+    def supports_quantization(self, vector_db) -> bool:
+        """halfvec columns and binary_quantize need pgvector 0.7+"""
+        version = self.pgvector_version(vector_db)
+        return bool(version) and _version_tuple(version) >= (0, 7)
+
+    def search_settings(self, vector_db, limit: int, filtered: bool = True) -> List[str]:
+        """SET LOCAL statements to run in the search's transaction"""
+        vector_index = vector_db.vector_index
+        if isinstance(vector_index, Ivfflat):
+            return [f"SET LOCAL ivfflat.probes = {int(vector_index.probes)}"]
+        if not isinstance(vector_index, HNSW):
+            return []
+
+        # An HNSW scan returns at most ef_search rows, so it must cover the candidates to rescore
+        statements = [f"SET LOCAL hnsw.ef_search = {max(self.ef_search(limit), self.candidate_limit(vector_db, limit))}"]
+        iterative_scan = settings.PGVECTOR_ITERATIVE_SCAN
+        if filtered and iterative_scan in ("relaxed_order", "strict_order") and self.supports_iterative_scan(vector_db):
+            statements.append(f"SET LOCAL hnsw.iterative_scan = {iterative_scan}")
+            statements.append(f"SET LOCAL hnsw.max_scan_tuples = {int(settings.PGVECTOR_MAX_SCAN_TUPLES)}")
+        return statements
+
+    def ensure_indexes(self, vector_db, source: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the indexes the table (and source, if given) have grown into.
+        Returns the table's index stats, or an empty dict if nothing could be checked.
+        """
+        try:
+            if not vector_db.table_exists():
+                return {}
+            rows = vector_db.get_count()
+
+            index = vector_db.vector_index
+            if isinstance(index, (HNSW, Ivfflat)) and rows >= settings.KB_OPTIMIZE_ON:
+                index_type = "ivfflat" if isinstance(index, Ivfflat) else "hnsw"
+                index_name = index.name or f"{vector_db.table_name}_{index_type}_index"
+                if not vector_db._index_exists(index_name):
+                    start = time.perf_counter()
+                    vector_db.optimize()
+                    self._record_build(vector_db, index_name, rows, time.perf_counter() - start)
+
+            if source and settings.PGVECTOR_SOURCE_INDEX_MIN_ROWS > 0 and isinstance(index, HNSW):
+                self.ensure_source_index(vector_db, source)
+
+            return self.get_stats(vector_db)
+        except Exception as e:
+            logger.error(f"Error ensuring indexes of {vector_db.table_name}: {str(e)}")
+            return {}
+
+    def ensure_source_index(self, vector_db, source: str) -> bool:
+        """Build a partial HNSW index over source's rows once it has PGVECTOR_SOURCE_INDEX_MIN_ROWS; True if built"""
+        index_name = source_index_name(vector_db.table_name, source)
+        with vector_db.db_engine.connect() as conn:
+            rows = conn.execute(
+                text(f'SELECT count(*) FROM {vector_db.schema}."{vector_db.table_name}" WHERE name = :source'),
+                {"source": source}
+            ).scalar() or 0
+        if rows < settings.PGVECTOR_SOURCE_INDEX_MIN_ROWS or vector_db._index_exists(index_name):
+            return False
+
+        index = vector_db.vector_index
+        # CREATE INDEX takes no bind parameters, so the source is inlined as an escaped literal
+        predicate = source.replace("'", "''")
+        create_sql = (
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" '
+            f'ON {vector_db.schema}."{vector_db.table_name}" '
+            f"USING hnsw ({index_expression(vector_db)}) "
+            f"WITH (m = {int(index.m)}, ef_construction = {int(index.ef_construction)}) "
+            f"WHERE name = '{predicate}'"
+        )
+
+        start = time.perf_counter()
+        # CONCURRENTLY keeps the table writable during the build but cannot run in a transaction
+        with vector_db.db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            try:
+                conn.execute(text(create_sql))
+            except Exception:
+                # A failed concurrent build leaves an invalid index behind
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {vector_db.schema}."{index_name}"'))
+                raise
+        self._record_build(vector_db, index_name, rows, time.perf_counter() - start, source=source)
+        return True
+
+    def _record_build(self, vector_db, index_name: str, rows: int, seconds: float, source: Optional[str] = None) -> None:
+        build = {
+            "table": f"{vector_db.schema}.{vector_db.table_name}",
+            "source": source,
+            "rows": rows,
+            "build_seconds": round(seconds, 3),
+            "built_at": time.time()
+        }
+        with self._lock:
+            self._builds[index_name] = build
+        logger.info(f"Built vector index {index_name} over {rows} rows in {seconds:.2f}s")
+
+    def get_stats(self, vector_db) -> Dict[str, Any]:
+        """Row estimate, sizes and scan counts of the table's indexes, plus the builds done by this process"""
+        with vector_db.db_engine.connect() as conn:
+            table = f'{vector_db.schema}."{vector_db.table_name}"'
+            table_row = conn.execute(
+                text(
+                    "SELECT c.reltuples::bigint AS rows, pg_total_relation_size(c.oid) AS total_bytes "
+                    "FROM pg_class c WHERE c.oid = CAST(:table AS regclass)"
+                ),
+                {"table": table}
+            ).first()
+            index_rows = conn.execute(
+                text(
+                    "SELECT c.relname AS name, pg_relation_size(c.oid) AS size_bytes, "
+                    "s.idx_scan AS scans, pg_get_indexdef(c.oid) AS definition "
+                    "FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.indexrelid "
+                    "WHERE i.indrelid = CAST(:table AS regclass) "
+                    "ORDER BY c.relname"
+                ),
+                {"table": table}
+            ).fetchall()
+
+        return {
+            "table": f"{vector_db.schema}.{vector_db.table_name}",
+            "rows": table_row.rows if table_row else None,
+            "total_bytes": table_row.total_bytes if table_row else None,
+            "pgvector_version": self.pgvector_version(vector_db),
+            "indexes": [
+                {
+                    "name": row.name,
+                    "size_bytes": row.size_bytes,
+                    "scans": row.scans,
+                    "definition": row.definition,
+                    "build": self._builds.get(row.name)
+                }
+                for row in index_rows
+            ]
+        }
+
+
+vector_index_manager = VectorIndexManager()
@@ -0,0 +1,195 @@
+"""
+ChatterMate - Vector Storage
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import time
+from statistics import median
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from agno.vectordb.search import SearchType
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.knowledge.optimized_pgvector import STORAGE_TYPES
+from app.knowledge.vector_index import vector_index_manager
+from app.models.organization import Organization
+
+logger = get_logger(__name__)
+
+
+def get_storage_options(organization_settings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    OptimizedPgVector storage options from an organization's settings, e.g.
+    {"vector_storage": {"type": "halfvec", "binary_index": true}}, over the configured defaults.
+    """
+    options = organization_settings.get("vector_storage") if isinstance(organization_settings, dict) else None
+    if not isinstance(options, dict):
+        options = {}
+    storage = options.get("type", settings.PGVECTOR_STORAGE)
+    if storage not in STORAGE_TYPES:
+        logger.warning(f"Unknown vector storage '{storage}', using vector")
+        storage = "vector"
+    return {
+        "storage": storage,
+        "binary_index": bool(options.get("binary_index", settings.PGVECTOR_BINARY_INDEX))
+    }
+
+
+def get_organization_storage_options(db: Session, org_id: UUID) -> Dict[str, Any]:
+    organization_settings = db.query(Organization.settings).filter(Organization.id == org_id).scalar()
+    return get_storage_options(organization_settings)
+
+
+def _vector_index_names(conn, vector_db) -> List[str]:
+    rows = conn.execute(
+        text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = :schema AND tablename = :table "
+            "AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')"
+        ),
+        {"schema": vector_db.schema, "table": vector_db.table_name}
+    ).fetchall()
+    return [row.indexname for row in rows]
+
+
+def migrate_table(vector_db, storage: str, binary_index: bool) -> Dict[str, Any]:
+    """
+    Convert an existing vector table to storage (vector or halfvec) and rebuild its vector indexes,
+    over the binary quantized embeddings if binary_index. The table is locked while the column is
+    rewritten; the indexes are rebuilt afterwards.
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unsupported vector storage '{storage}', expected one of {STORAGE_TYPES}")
+    if (storage == "halfvec" or binary_index) and not vector_index_manager.supports_quantization(vector_db):
+        raise ValueError(
+            f"halfvec and binary quantization need pgvector 0.7 or newer, found {vector_index_manager.pgvector_version(vector_db)}"
+        )
+
+    table = f'{vector_db.schema}."{vector_db.table_name}"'
+    dimensions = int(vector_db.dimensions)
+    start = time.perf_counter()
+    with vector_db.db_engine.begin() as conn:
+        size_before = conn.execute(text("SELECT pg_total_relation_size(CAST(:table AS regclass))"), {"table": table}).scalar()
+        dropped = _vector_index_names(conn, vector_db)
+        # Operator classes are tied to the column type, so the vector indexes can't survive the rewrite
+        for index_name in dropped:
+            conn.execute(text(f'DROP INDEX IF EXISTS {vector_db.schema}."{index_name}"'))
+        conn.execute(text(
+            f"ALTER TABLE {table} ALTER COLUMN embedding TYPE {storage}({dimensions}) "
+            f"USING embedding::{storage}({dimensions})"
+        ))
+
+    vector_db.storage = storage
+    vector_db.binary_index = binary_index
+    vector_db.table = vector_db.get_table()
+    if dropped and vector_db.vector_index is not None:
+        vector_db.vector_index.name = None
+        vector_db._create_vector_index()
+        with vector_db.db_engine.connect() as conn:
+            sources = conn.execute(
+                text(f"SELECT name FROM {table} GROUP BY name HAVING count(*) >= :rows"),
+                {"rows": settings.PGVECTOR_SOURCE_INDEX_MIN_ROWS}
+            ).scalars().all() if settings.PGVECTOR_SOURCE_INDEX_MIN_ROWS > 0 else []
+        for source in sources:
+            vector_index_manager.ensure_source_index(vector_db, source)
+
+    with vector_db.db_engine.connect() as conn:
+        size_after = conn.execute(text("SELECT pg_total_relation_size(CAST(:table AS regclass))"), {"table": table}).scalar()
+    seconds = time.perf_counter() - start
+    logger.info(f"Migrated {table} to {storage} (binary index: {binary_index}) in {seconds:.2f}s")
+    return {
+        "table": f"{vector_db.schema}.{vector_db.table_name}",
+        "storage": storage,
+        "binary_index": binary_index,
+        "rebuilt_indexes": len(dropped),
+        "seconds": round(seconds, 3),
+        "size_before_bytes": size_before,
+        "size_after_bytes": size_after
+    }
+
+
+def sample_queries(vector_db, sample_size: int) -> List[Tuple[str, List[float]]]:
+    """(source, embedding) of random rows, used as query vectors for recall measurements"""
+    with vector_db.db_engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                f'SELECT name, embedding::vector::text AS embedding FROM {vector_db.schema}."{vector_db.table_name}" '
+                "WHERE embedding IS NOT NULL ORDER BY random() LIMIT :limit"
+            ),
+            {"limit": sample_size}
+        ).fetchall()
+    return [(row.name, [float(value) for value in row.embedding.strip("[]").split(",")]) for row in rows]
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50": round(median(ordered), 2) if ordered else 0.0,
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2) if ordered else 0.0
+    }
+
+
+def exact_top_k(vector_db, queries: List[Tuple[str, List[float]]], k: int) -> Tuple[List[List[str]], Dict[str, float]]:
+    """Exact float32 top-k ids of each query within its source, with index scans disabled"""
+    operator = {"l2": "<->", "max_inner_product": "<#>"}.get(getattr(vector_db.distance, "value", ""), "<=>")
+    dimensions = int(vector_db.dimensions)
+    results, latencies = [], []
+    with vector_db.db_engine.connect() as conn:
+        for source, embedding in queries:
+            with conn.begin():
+                conn.execute(text("SET LOCAL enable_indexscan = off"))
+                started = time.perf_counter()
+                rows = conn.execute(
+                    text(
+                        f'SELECT id FROM {vector_db.schema}."{vector_db.table_name}" WHERE name = :source '
+                        f"ORDER BY embedding::vector({dimensions}) {operator} CAST(:query AS vector({dimensions})) LIMIT :k"
+                    ),
+                    {"source": source, "query": str(embedding), "k": k}
+                ).fetchall()
+                latencies.append((time.perf_counter() - started) * 1000)
+            results.append([row.id for row in rows])
+    return results, _percentiles(latencies)
+
+
+def evaluate_search(vector_db, queries: List[Tuple[str, List[float]]], truth: List[List[str]], k: int) -> Dict[str, Any]:
+    """Recall@k and latency of the vector db's indexed source search against exact top-k ids"""
+    search_type = vector_db.search_type
+    vector_db.search_type = SearchType.vector
+    recalls, latencies = [], []
+    try:
+        with vector_db.db_engine.connect() as conn:
+            for (source, embedding), expected in zip(queries, truth):
+                stmt = vector_db.build_search_statement("", embedding, k, [source])
+                with conn.begin():
+                    for statement in vector_index_manager.search_settings(vector_db, k):
+                        conn.execute(text(statement))
+                    started = time.perf_counter()
+                    found = [row.id for row in conn.execute(stmt).fetchall()]
+                    latencies.append((time.perf_counter() - started) * 1000)
+                if expected:
+                    recalls.append(len(set(found) & set(expected)) / len(expected))
+    finally:
+        vector_db.search_type = search_type
+
+    return {
+        "storage": vector_db.storage,
+        "binary_index": vector_db.binary_index,
+        "queries": len(queries),
+        "k": k,
+        "recall_at_k": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "latency_ms": _percentiles(latencies)
+    }
@@ -26,6 +26,9 @@ from .ai_config import AIConfig, AIModelType
 from .agent import Agent
 from .knowledge_to_agent import KnowledgeToAgent
 from .knowledge import Knowledge
+from .crawled_page import CrawledPage
+from .knowledge_page import KnowledgePage
+from .embedding_cache import EmbeddingCacheEntry
 from .chat_history import ChatHistory
 from .session_to_agent import SessionToAgent, SessionStatus
 from .rating import Rating
@@ -50,6 +53,9 @@ __all__ = [
     "Agent",
     "KnowledgeToAgent",
     "Knowledge",
+    "CrawledPage",
+    "KnowledgePage",
+    "EmbeddingCacheEntry",
     "ChatHistory",
     "SessionToAgent",
     "SessionStatus",
@@ -0,0 +1,42 @@
+"""
+ChatterMate - Crawled Page
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, UniqueConstraint, Index, func
+from app.database import Base
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class CrawledPage(Base):
+    """HTTP validators and content hash of a page of a website knowledge source, used for incremental re-crawls"""
+    __tablename__ = "crawled_pages"
+    __table_args__ = (
+        UniqueConstraint("organization_id", "source", "url", name="uq_crawled_pages_org_source_url"),
+        Index("ix_crawled_pages_org_source", "organization_id", "source"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey(
+        "organizations.id"), nullable=False)
+    source = Column(String, nullable=False)  # Website knowledge source the page was crawled for
+    url = Column(String, nullable=False)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)  # md5 of the extracted text
+    links = Column(JSON, default=lambda: [])  # Links found on the page, to continue crawling past unchanged pages
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,35 @@
+"""
+ChatterMate - Embedding Cache Entry Model
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Index, func
+from app.database import Base
+
+
+class EmbeddingCacheEntry(Base):
+    """Embedding of a chunk's content by one model, shared by every source and organization that ingests that content"""
+    __tablename__ = "embedding_cache"
+    __table_args__ = (
+        Index("ix_embedding_cache_last_used_at", "last_used_at"),
+    )
+
+    model_id = Column(String, primary_key=True)
+    content_hash = Column(String(32), primary_key=True)  # md5 of the chunk content, as in the vector tables
+    dimensions = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 values
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())  # Least recently used rows are evicted first
@@ -0,0 +1,39 @@
+"""
+ChatterMate - Knowledge Page
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, Index
+from app.database import Base
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class KnowledgePage(Base):
+    """Catalog of the subpages of a knowledge source and their chunk counts, kept up to date at ingest time"""
+    __tablename__ = "knowledge_pages"
+    __table_args__ = (
+        UniqueConstraint("organization_id", "source", "subpage", name="uq_knowledge_pages_org_source_subpage"),
+        Index("ix_knowledge_pages_org_source", "organization_id", "source"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey(
+        "organizations.id"), nullable=False)
+    source = Column(String, nullable=False)  # Knowledge source, the name of its vector rows
+    subpage = Column(String, nullable=False)  # Vector row id without its chunk suffix
+    chunk_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), nullable=True)  # Earliest chunk of the subpage
+    updated_at = Column(DateTime(timezone=True), nullable=True)  # Latest chunk update of the subpage
@@ -16,7 +16,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Enum, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Enum, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -36,8 +36,15 @@ class ProcessingStage(str, enum.Enum):
     COMPLETED = "completed"
 
 
+# Postgres NOTIFY channel an insert trigger signals new queue items on (see migration 7d3f9b1c5e28)
+KNOWLEDGE_QUEUE_CHANNEL = "knowledge_queue"
+
+
 class KnowledgeQueue(Base):
     __tablename__ = "knowledge_queue"
+    __table_args__ = (
+        Index('ix_knowledge_queue_status_id', 'status', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     organization_id = Column(UUID(as_uuid=True), nullable=False)
@@ -55,9 +62,28 @@ class KnowledgeQueue(Base):
     progress_percentage = Column(Float, default=0.0)
     total_items = Column(Integer, default=0)
     processed_items = Column(Integer, default=0)
-    crawled_urls = Column(JSON, default=lambda: [])
+    crawled_urls = Column(JSON, default=lambda: [])  # Legacy: crawled URLs now go to knowledge_queue_urls
+    # Worker lease: set when a worker claims the item, renewed by its heartbeats
+    locked_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    attempts = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Add relationship
-    user = relationship("User", back_populates="knowledge_queue_items")
\ No newline at end of file
+    user = relationship("User", back_populates="knowledge_queue_items")
+
+
+class KnowledgeQueueUrl(Base):
+    """A URL crawled while processing a queue item; rows are only ever appended"""
+    __tablename__ = "knowledge_queue_urls"
+    __table_args__ = (
+        UniqueConstraint("queue_id", "url", name="uq_knowledge_queue_urls_queue_url"),
+        Index("ix_knowledge_queue_urls_queue_id_id", "queue_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    queue_id = Column(Integer, ForeignKey("knowledge_queue.id", ondelete="CASCADE"), nullable=False)
+    url = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -48,6 +48,12 @@ class MCPTool(Base):
     timeout = Column(Integer)  # Connection timeout in seconds
     sse_read_timeout = Column(Integer)  # SSE read timeout in seconds
     terminate_on_close = Column(Boolean, default=True)  # For HTTP transport
+
+    # Tool names, descriptions and input schemas last listed from the server, so agents can be
+    # assembled without connecting to it; valid while catalog_fingerprint matches the config
+    tool_catalog = Column(JSON)
+    catalog_fingerprint = Column(String(32))
+    catalog_refreshed_at = Column(DateTime(timezone=True))
     
     # Relationships
     organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
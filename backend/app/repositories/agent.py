@@ -16,13 +16,16 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.models.agent import Agent, AgentType
 import json
 from sqlalchemy.orm import joinedload
 from uuid import UUID
 from app.core.logger import get_logger
+from app.agents.agent_pool import invalidate_agent
 
 logger = get_logger(__name__)
 
@@ -121,6 +124,7 @@ class AgentRepository:
 
         self.db.commit()
         self.db.refresh(agent)
+        invalidate_agent(agent_id)
         return agent
 
     def delete_agent(self, agent_id: str) -> bool:
@@ -131,6 +135,7 @@ class AgentRepository:
 
         template.is_active = False
         self.db.commit()
+        invalidate_agent(agent_id)
         return True
 
     def get_active_agents(self, org_id: UUID) -> List[Agent]:
@@ -170,3 +175,16 @@ class AgentRepository:
         return self.db.query(func.count(Agent.id))\
             .filter(Agent.organization_id == org_id)\
             .scalar() or 0
+
+
+class AsyncAgentRepository:
+    """Async variant of AgentRepository for code running on the event loop"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_agent(self, agent_id: UUID) -> Optional[Agent]:
+        """Get template by ID"""
+        result = await self.db.execute(select(Agent).filter(Agent.id == agent_id))
+        # Agent.groups is eager loaded with a join, so rows need de-duplicating
+        return result.unique().scalars().first()
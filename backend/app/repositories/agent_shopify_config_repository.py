@@ -17,6 +17,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
 import uuid
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from app.models.shopify.agent_shopify_config import AgentShopifyConfig
@@ -25,7 +26,8 @@ from app.models.schemas.shopify.agent_shopify_config import (
     AgentShopifyConfigUpdate
 )
 from app.core.logger import get_logger
-from sqlalchemy import cast, String
+from app.agents.agent_pool import invalidate_agent
+from sqlalchemy import cast, select, String
 
 logger = get_logger(__name__)
 
@@ -73,6 +75,7 @@ class AgentShopifyConfigRepository:
         self.db.add(db_config)
         self.db.commit()
         self.db.refresh(db_config)
+        invalidate_agent(config.agent_id)
         return db_config
     
     def update_agent_shopify_config(self, agent_id: str, config: AgentShopifyConfigUpdate) -> Optional[AgentShopifyConfig]:
@@ -86,6 +89,7 @@ class AgentShopifyConfigRepository:
         
         self.db.commit()
         self.db.refresh(db_config)
+        invalidate_agent(agent_id)
         return db_config
     
     def delete_agent_shopify_config(self, agent_id: str) -> bool:
@@ -96,4 +100,19 @@ class AgentShopifyConfigRepository:
         
         self.db.delete(db_config)
         self.db.commit()
-        return True 
\ No newline at end of file
+        invalidate_agent(agent_id)
+        return True
+
+
+class AsyncAgentShopifyConfigRepository:
+    """Async variant of AgentShopifyConfigRepository for code running on the event loop"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_agent_shopify_config(self, agent_id: str) -> Optional[AgentShopifyConfig]:
+        """Get Shopify configuration for an agent."""
+        result = await self.db.execute(
+            select(AgentShopifyConfig).filter(AgentShopifyConfig.agent_id == agent_id)
+        )
+        return result.scalars().first()
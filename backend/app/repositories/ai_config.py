@@ -16,7 +16,9 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.ai_config import AIConfig, AIModelType
 from app.core.security import encrypt_api_key, decrypt_api_key
 from typing import Optional
@@ -98,3 +100,20 @@ class AIConfigRepository:
         config.is_active = False
         self.db.commit()
         return True
+
+
+class AsyncAIConfigRepository:
+    """Async variant of AIConfigRepository for code running on the event loop"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_active_config(self, org_id: str) -> Optional[AIConfig]:
+        """Get active AI configuration for an organization"""
+        result = await self.db.execute(
+            select(AIConfig).filter(
+                AIConfig.organization_id == org_id,
+                AIConfig.is_active == True
+            )
+        )
+        return result.scalars().first()
@@ -16,7 +16,9 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+import asyncio
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 from app.models.chat_history import ChatHistory
 from app.models.customer import Customer
@@ -30,9 +32,35 @@ from app.models.user import User
 from sqlalchemy.orm import joinedload
 from datetime import datetime
 from pydantic import BaseModel
+from app.services.chat_message_writer import chat_message_writer
 
 logger = get_logger(__name__)
 
+def build_chat_message(message_data: Dict[str, Any]) -> ChatHistory:
+    """Build a ChatHistory row from message data, serializing Pydantic attributes and string UUIDs"""
+    # Convert any Pydantic models in attributes to dict
+    if 'attributes' in message_data:
+        attributes = message_data['attributes']
+        if 'shopify_output' in attributes and attributes['shopify_output'] is not None:
+            if isinstance(attributes['shopify_output'], BaseModel):
+                attributes['shopify_output'] = attributes['shopify_output'].dict()
+            elif isinstance(attributes['shopify_output'], dict):
+                # If it's already a dict, ensure all nested objects are serialized
+                if 'products' in attributes['shopify_output']:
+                    products = attributes['shopify_output']['products']
+                    attributes['shopify_output']['products'] = [
+                        p.dict() if isinstance(p, BaseModel) else p 
+                        for p in products
+                    ]
+    
+    # Convert string UUIDs to UUID objects
+    for field in ['organization_id', 'user_id', 'customer_id', 'agent_id', 'session_id']:
+        if field in message_data and message_data[field] is not None:
+            if isinstance(message_data[field], str):
+                message_data[field] = UUID(message_data[field])
+
+    return ChatHistory(**message_data)
+
 class ChatRepository:
     def __init__(self, db: Session):
         self.db = db
@@ -82,28 +110,11 @@ class ChatRepository:
     def create_message(self, message_data: Dict[str, Any]) -> ChatHistory:
         """Create a new chat message."""
         try:
-            # Convert any Pydantic models in attributes to dict
-            if 'attributes' in message_data:
-                attributes = message_data['attributes']
-                if 'shopify_output' in attributes and attributes['shopify_output'] is not None:
-                    if isinstance(attributes['shopify_output'], BaseModel):
-                        attributes['shopify_output'] = attributes['shopify_output'].dict()
-                    elif isinstance(attributes['shopify_output'], dict):
-                        # If it's already a dict, ensure all nested objects are serialized
-                        if 'products' in attributes['shopify_output']:
-                            products = attributes['shopify_output']['products']
-                            attributes['shopify_output']['products'] = [
-                                p.dict() if isinstance(p, BaseModel) else p 
-                                for p in products
-                            ]
-            
-            # Convert string UUIDs to UUID objects
-            for field in ['organization_id', 'user_id', 'customer_id', 'agent_id', 'session_id']:
-                if field in message_data and message_data[field] is not None:
-                    if isinstance(message_data[field], str):
-                        message_data[field] = UUID(message_data[field])
-
-            message = ChatHistory(**message_data)
+            # Keep the session's messages in order behind anything still buffered
+            chat_message_writer.flush_session(message_data.get('session_id'))
+            message = build_chat_message(message_data)
+            if chat_message_writer.enabled:
+                message.created_at = chat_message_writer.next_timestamp()
             self.db.add(message)
             self.db.commit()
             self.db.refresh(message)
@@ -113,8 +124,16 @@ class ChatRepository:
             self.db.rollback()
             raise
 
+    def queue_message(self, message_data: Dict[str, Any]) -> ChatHistory:
+        """Save a chat message through the write-behind writer when enabled, else insert it now.
+        The returned message has no id when it was buffered."""
+        if chat_message_writer.enabled:
+            return chat_message_writer.enqueue(message_data)
+        return self.create_message(message_data)
+
     def get_session_history(self, session_id: str | UUID) -> List[ChatHistory]:
         """Get chat history for a session with joined relationships"""
+        chat_message_writer.flush_session(session_id)
         if isinstance(session_id, str):
             session_id = UUID(session_id)
         
@@ -283,6 +302,7 @@ class ChatRepository:
         org_id: str | UUID
     ) -> Optional[dict]:
         """Get detailed chat information for a session"""
+        await asyncio.to_thread(chat_message_writer.flush_session, session_id)
         if isinstance(session_id, str):
             session_id = UUID(session_id)
         if isinstance(org_id, str):
@@ -363,3 +383,55 @@ class ChatRepository:
                 for msg in messages
             ]
         }
+
+
+class AsyncChatRepository:
+    """Async variant of ChatRepository for code running on the event loop"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_message(self, message_data: Dict[str, Any]) -> ChatHistory:
+        """Create a new chat message."""
+        try:
+            await self._flush_buffered(message_data.get('session_id'))
+            message = build_chat_message(message_data)
+            if chat_message_writer.enabled:
+                message.created_at = chat_message_writer.next_timestamp()
+            self.db.add(message)
+            await self.db.commit()
+            await self.db.refresh(message)
+            return message
+        except Exception as e:
+            logger.error(f"Error creating message: {str(e)}")
+            await self.db.rollback()
+            raise
+
+    async def queue_message(self, message_data: Dict[str, Any]) -> ChatHistory:
+        """Save a chat message through the write-behind writer when enabled, else insert it now.
+        The returned message has no id when it was buffered."""
+        if chat_message_writer.enabled:
+            return chat_message_writer.enqueue(message_data)
+        return await self.create_message(message_data)
+
+    async def _flush_buffered(self, session_id):
+        """Write the session's buffered messages first, off the event loop"""
+        if chat_message_writer.has_pending(session_id):
+            await asyncio.to_thread(chat_message_writer.flush_session, session_id)
+
+    async def get_session_history(self, session_id: str | UUID) -> List[ChatHistory]:
+        """Get chat history for a session with joined relationships"""
+        await self._flush_buffered(session_id)
+        if isinstance(session_id, str):
+            session_id = UUID(session_id)
+        
+        result = await self.db.execute(
+            select(ChatHistory)
+            .options(
+                joinedload(ChatHistory.user),
+                joinedload(ChatHistory.agent)
+            )
+            .filter(ChatHistory.session_id == session_id)
+            .order_by(ChatHistory.created_at.asc())
+        )
+        return result.unique().scalars().all()
@@ -0,0 +1,77 @@
+"""
+ChatterMate - Crawled Page Repository
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from typing import Dict, Iterable, List
+from uuid import UUID
+from sqlalchemy.orm import Session
+from app.models.crawled_page import CrawledPage
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CrawledPageRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_by_source(self, org_id: UUID, source: str) -> List[CrawledPage]:
+        """Get the pages recorded for a website knowledge source"""
+        return self.db.query(CrawledPage)\
+            .filter(
+                CrawledPage.organization_id == org_id,
+                CrawledPage.source == source
+            ).all()
+
+    def save_pages(self, org_id: UUID, source: str, pages: Dict[str, Dict], removed_urls: Iterable[str] = ()) -> None:
+        """
+        Record the validators of the crawled pages of a source and forget removed pages.
+
+        :param pages: url -> dict with etag, last_modified, content_hash and links
+        :param removed_urls: Pages that no longer exist on the website
+        """
+        try:
+            existing = {page.url: page for page in self.get_by_source(org_id, source)}
+            for url, values in pages.items():
+                page = existing.get(url)
+                if page is None:
+                    page = CrawledPage(organization_id=org_id, source=source, url=url)
+                    self.db.add(page)
+                page.etag = values.get("etag")
+                page.last_modified = values.get("last_modified")
+                page.content_hash = values.get("content_hash")
+                page.links = values.get("links") or []
+
+            for url in removed_urls:
+                if url in existing and url not in pages:
+                    self.db.delete(existing[url])
+
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error saving crawled pages for {source}: {str(e)}")
+            raise
+
+    def delete_by_source(self, org_id: UUID, source: str) -> int:
+        """Forget all pages of a source, e.g. when the knowledge source is deleted"""
+        count = self.db.query(CrawledPage)\
+            .filter(
+                CrawledPage.organization_id == org_id,
+                CrawledPage.source == source
+            ).delete(synchronize_session=False)
+        self.db.commit()
+        return count
@@ -0,0 +1,87 @@
+"""
+ChatterMate - Crawled Page Repository
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from typing import Dict, Iterable, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.embedding_cache import EmbeddingCacheEntry
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmbeddingCacheRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_many(self, model_id: str, content_hashes: Iterable[str]) -> Dict[str, Tuple[int, bytes]]:
+        """Cached (dimensions, float32 bytes) by content hash; the rows found are marked as used"""
+        content_hashes = list(set(content_hashes))
+        if not content_hashes:
+            return {}
+        rows = self.db.query(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.dimensions, EmbeddingCacheEntry.embedding)\
+            .filter(
+                EmbeddingCacheEntry.model_id == model_id,
+                EmbeddingCacheEntry.content_hash.in_(content_hashes)
+            ).all()
+        found = {row.content_hash: (row.dimensions, row.embedding) for row in rows}
+        if found:
+            self.db.query(EmbeddingCacheEntry)\
+                .filter(
+                    EmbeddingCacheEntry.model_id == model_id,
+                    EmbeddingCacheEntry.content_hash.in_(list(found))
+                ).update({EmbeddingCacheEntry.last_used_at: func.now()}, synchronize_session=False)
+            self.db.commit()
+        return found
+
+    def put_many(self, model_id: str, embeddings: Dict[str, Tuple[int, bytes]]) -> int:
+        """Store (dimensions, float32 bytes) by content hash, keeping rows another writer stored first"""
+        if not embeddings:
+            return 0
+        if self.db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(EmbeddingCacheEntry).values([
+            {"model_id": model_id, "content_hash": content_hash, "dimensions": dimensions, "embedding": embedding}
+            for content_hash, (dimensions, embedding) in embeddings.items()
+        ]).on_conflict_do_nothing(index_elements=["model_id", "content_hash"])
+        try:
+            result = self.db.execute(stmt)
+            self.db.commit()
+            return result.rowcount
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error caching {len(embeddings)} embeddings of {model_id}: {str(e)}")
+            raise
+
+    def count(self) -> int:
+        return self.db.query(func.count()).select_from(EmbeddingCacheEntry).scalar() or 0
+
+    def evict(self, max_rows: int) -> int:
+        """Delete the rows used before the max_rows most recently used ones; returns how many were deleted"""
+        cutoff = self.db.query(EmbeddingCacheEntry.last_used_at)\
+            .order_by(EmbeddingCacheEntry.last_used_at.desc())\
+            .offset(max(max_rows, 1) - 1).limit(1).scalar()
+        if cutoff is None:
+            return 0
+        count = self.db.query(EmbeddingCacheEntry)\
+            .filter(EmbeddingCacheEntry.last_used_at < cutoff)\
+            .delete(synchronize_session=False)
+        self.db.commit()
+        return count
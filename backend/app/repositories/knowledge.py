@@ -24,6 +24,9 @@ from sqlalchemy.sql import text
 import logging
 from uuid import UUID
 from app.models.knowledge_to_agent import KnowledgeToAgent
+from app.models.crawled_page import CrawledPage
+from app.models.knowledge_page import KnowledgePage
+from app.knowledge.vector_index import source_index_name
 
 logger = logging.getLogger(__name__)
 
@@ -156,11 +159,27 @@ class KnowledgeRepository:
                         text(f'DELETE FROM {knowledge.schema}."{ knowledge.table_name}" WHERE name = :source'),
                         {"source": knowledge.source}
                     )
+                    # Drop the source's partial HNSW index, if it grew large enough to get one
+                    self.db.execute(text(
+                        f'DROP INDEX IF EXISTS {knowledge.schema}."{source_index_name(knowledge.table_name, knowledge.source)}"'
+                    ))
                 except Exception as e:
                     logger.error(f"Error deleting data from {
                                  knowledge.table_name}: {str(e)}")
                     # Continue with knowledge deletion even if data deletion fails
 
+            # Forget crawl validators so re-adding the source crawls every page again
+            self.db.query(CrawledPage)\
+                .filter(
+                    CrawledPage.organization_id == knowledge.organization_id,
+                    CrawledPage.source == knowledge.source
+                ).delete(synchronize_session=False)
+            self.db.query(KnowledgePage)\
+                .filter(
+                    KnowledgePage.organization_id == knowledge.organization_id,
+                    KnowledgePage.source == knowledge.source
+                ).delete(synchronize_session=False)
+
             # Delete the knowledge entry
             self.db.delete(knowledge)
             self.db.commit()
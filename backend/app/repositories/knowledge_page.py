@@ -0,0 +1,112 @@
+"""
+ChatterMate - Knowledge Page Repository
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.models.knowledge_page import KnowledgePage
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def subpage_of(chunk_id: str) -> str:
+    """Subpage a vector row belongs to: its id without the trailing _<chunk> suffix"""
+    return chunk_id.rsplit("_", 1)[0] if "_" in chunk_id else chunk_id
+
+
+class KnowledgePageRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_by_sources(self, org_id: UUID, sources: Iterable[str]) -> Dict[str, List[KnowledgePage]]:
+        """Catalogued subpages of the given sources, in one query; sources without pages are absent"""
+        sources = list(sources)
+        pages: Dict[str, List[KnowledgePage]] = defaultdict(list)
+        if not sources:
+            return pages
+        rows = self.db.query(KnowledgePage)\
+            .filter(
+                KnowledgePage.organization_id == org_id,
+                KnowledgePage.source.in_(sources)
+            )\
+            .order_by(KnowledgePage.source, KnowledgePage.subpage)\
+            .all()
+        for page in rows:
+            pages[page.source].append(page)
+        return pages
+
+    def replace_source(
+        self,
+        org_id: UUID,
+        source: str,
+        chunks: Iterable[Tuple[str, Optional[datetime], Optional[datetime]]]
+    ) -> int:
+        """
+        Rebuild the catalog of a source from its vector rows.
+
+        :param chunks: (id, created_at, updated_at) of every vector row of the source
+        :return: Number of subpages
+        """
+        subpages: Dict[str, Dict] = {}
+        for chunk_id, created_at, updated_at in chunks:
+            subpage = subpages.setdefault(subpage_of(chunk_id), {"chunk_count": 0, "created_at": None, "updated_at": None})
+            subpage["chunk_count"] += 1
+            if created_at and (subpage["created_at"] is None or created_at < subpage["created_at"]):
+                subpage["created_at"] = created_at
+            changed_at = updated_at or created_at
+            if changed_at and (subpage["updated_at"] is None or changed_at > subpage["updated_at"]):
+                subpage["updated_at"] = changed_at
+
+        try:
+            self.db.query(KnowledgePage)\
+                .filter(
+                    KnowledgePage.organization_id == org_id,
+                    KnowledgePage.source == source
+                ).delete(synchronize_session=False)
+            self.db.add_all([
+                KnowledgePage(organization_id=org_id, source=source, subpage=subpage, **values)
+                for subpage, values in subpages.items()
+            ])
+            self.db.commit()
+            return len(subpages)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error cataloguing pages of {source}: {str(e)}")
+            raise
+
+    def refresh_source(self, org_id: UUID, source: str, schema: str, table_name: str) -> int:
+        """Rebuild the catalog of a source from its vector table; reads ids and timestamps only, via the name index"""
+        rows = self.db.execute(
+            text(f'SELECT id, created_at, updated_at FROM {schema}."{table_name}" WHERE name = :source'),
+            {"source": source}
+        )
+        return self.replace_source(org_id, source, ((row.id, row.created_at, row.updated_at) for row in rows))
+
+    def delete_by_source(self, org_id: UUID, source: str) -> int:
+        """Forget the pages of a source, e.g. when the knowledge source is deleted"""
+        count = self.db.query(KnowledgePage)\
+            .filter(
+                KnowledgePage.organization_id == org_id,
+                KnowledgePage.source == source
+            ).delete(synchronize_session=False)
+        self.db.commit()
+        return count
@@ -16,10 +16,11 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
-from app.models.knowledge_queue import KnowledgeQueue, QueueStatus
-from typing import List, Optional
-from datetime import datetime
+from app.models.knowledge_queue import KnowledgeQueue, KnowledgeQueueUrl, QueueStatus, ProcessingStage
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
 from app.core.logger import get_logger
 from app.core.logger import get_logger
 
@@ -48,6 +49,97 @@ class KnowledgeQueueRepository:
             .filter(KnowledgeQueue.status == QueueStatus.PENDING)\
             .all()
 
+    def claim(
+        self,
+        worker_id: str,
+        lease_seconds: int,
+        limit: int = 1,
+        queue_id: Optional[int] = None,
+        max_attempts: Optional[int] = None
+    ) -> List[KnowledgeQueue]:
+        """
+        Claim up to `limit` pending items (or items whose worker lease expired) for worker_id.
+
+        Rows are locked with FOR UPDATE SKIP LOCKED, so concurrent workers each get different
+        items without waiting on one another. Expired items that were already claimed
+        max_attempts times are marked failed instead of being handed out again.
+        """
+        now = datetime.now(timezone.utc)
+        query = self.db.query(KnowledgeQueue).filter(
+            or_(
+                KnowledgeQueue.status == QueueStatus.PENDING,
+                and_(
+                    KnowledgeQueue.status == QueueStatus.PROCESSING,
+                    KnowledgeQueue.lease_expires_at < now
+                )
+            )
+        )
+        if queue_id is not None:
+            query = query.filter(KnowledgeQueue.id == queue_id)
+        items = query.order_by(KnowledgeQueue.id)\
+            .limit(limit)\
+            .with_for_update(skip_locked=True)\
+            .all()
+
+        claimed = []
+        for item in items:
+            if item.status == QueueStatus.PROCESSING:
+                logger.warning(f"Lease of queue item {item.id} held by {item.locked_by} expired")
+                if max_attempts and (item.attempts or 0) >= max_attempts:
+                    item.status = QueueStatus.FAILED
+                    item.error = f"Worker lease expired after {item.attempts} attempts"
+                    item.locked_by = None
+                    item.lease_expires_at = None
+                    continue
+            item.status = QueueStatus.PROCESSING
+            item.processing_stage = ProcessingStage.NOT_STARTED
+            item.progress_percentage = 0.0
+            item.locked_by = worker_id
+            item.heartbeat_at = now
+            item.lease_expires_at = now + timedelta(seconds=lease_seconds)
+            item.attempts = (item.attempts or 0) + 1
+            claimed.append(item)
+
+        self.db.commit()
+        return claimed
+
+    def heartbeat(self, queue_id: int, worker_id: str, lease_seconds: int) -> bool:
+        """
+        Extend worker_id's lease on an item; False if the item is no longer leased to it.
+
+        The status is not checked: processing marks an item completed before its indexes are
+        built, and the lease must outlive that until release() clears it.
+        """
+        now = datetime.now(timezone.utc)
+        updated = self.db.query(KnowledgeQueue).filter(
+            KnowledgeQueue.id == queue_id,
+            KnowledgeQueue.locked_by == worker_id
+        ).update({
+            KnowledgeQueue.heartbeat_at: now,
+            KnowledgeQueue.lease_expires_at: now + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        self.db.commit()
+        return updated > 0
+
+    def release(self, queue_id: int, worker_id: str, status: QueueStatus, error: Optional[str] = None) -> bool:
+        """
+        Set the final status of an item and clear its lease, but only while worker_id holds it.
+
+        Returns False when the lease expired and another worker reclaimed the item, whose
+        state must then be left alone.
+        """
+        updated = self.db.query(KnowledgeQueue).filter(
+            KnowledgeQueue.id == queue_id,
+            KnowledgeQueue.locked_by == worker_id
+        ).update({
+            KnowledgeQueue.status: status,
+            KnowledgeQueue.error: error,
+            KnowledgeQueue.locked_by: None,
+            KnowledgeQueue.lease_expires_at: None
+        }, synchronize_session=False)
+        self.db.commit()
+        return updated > 0
+
     def update_status(self, queue_id: int, status: QueueStatus, error: Optional[str] = None) -> bool:
         item = self.db.query(KnowledgeQueue).filter(
             KnowledgeQueue.id == queue_id).first()
@@ -102,39 +194,68 @@ class KnowledgeQueueRepository:
             if processed_items is not None:
                 item.processed_items = processed_items
             
-            # Add crawled URL to the list if provided (store only URL strings)
-            if crawled_url:
-                if not item.crawled_urls:
-                    item.crawled_urls = []
-                # Store only the URL string, no timestamp or status
-                if crawled_url not in item.crawled_urls:
-                    # Create a new list to ensure SQLAlchemy detects the change
-                    new_crawled_urls = list(item.crawled_urls) if item.crawled_urls else []
-                    new_crawled_urls.append(crawled_url)
-                    item.crawled_urls = new_crawled_urls
-                    
-                    # Mark the attribute as modified to ensure SQLAlchemy commits the change
-                    from sqlalchemy.orm.attributes import flag_modified
-                    flag_modified(item, 'crawled_urls')
-                    
-                    from app.core.logger import get_logger
-                    logger = get_logger(__name__)
-                    logger.debug(f"📝 Added crawled URL to queue {queue_id}: {crawled_url} (total: {len(item.crawled_urls)})")
-                    
-                else:
-                    from app.core.logger import get_logger
-                    logger = get_logger(__name__)
-                    logger.debug(f"🔄 URL already in list for queue {queue_id}: {crawled_url}")
-                    
-            # Commit changes and verify
+            # Commit changes
             self.db.commit()
-            
-            # If we added a crawled URL, verify it was saved
+
+            # Crawled URLs are appended to knowledge_queue_urls rather than rewriting the JSON column
             if crawled_url:
-                self.db.refresh(item)
-                from app.core.logger import get_logger
-                logger = get_logger(__name__)
-                logger.debug(f"🔍 After commit - queue {queue_id} crawled_urls count: {len(item.crawled_urls) if item.crawled_urls else 0}")
+                self.add_crawled_urls(queue_id, [crawled_url])
             
             return True
-        return False
\ No newline at end of file
+        return False
+
+    def update_metadata(self, queue_id: int, values: Dict[str, Any]) -> bool:
+        """Merge values into the queue item's queue_metadata"""
+        item = self.db.query(KnowledgeQueue).filter(
+            KnowledgeQueue.id == queue_id).first()
+        if item:
+            # Reassigned rather than mutated, so the JSON column is flagged as changed
+            item.queue_metadata = {**(item.queue_metadata or {}), **values}
+            self.db.commit()
+            return True
+        return False
+
+    def add_crawled_urls(self, queue_id: int, urls: List[str]) -> int:
+        """Append crawled URLs to the queue item's progress; URLs already recorded are ignored"""
+        urls = list(dict.fromkeys(url for url in urls if url))
+        if not urls:
+            return 0
+        if self.db.get_bind().dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        try:
+            stmt = insert(KnowledgeQueueUrl).values(
+                [{"queue_id": queue_id, "url": url} for url in urls]
+            ).on_conflict_do_nothing(index_elements=["queue_id", "url"])
+            self.db.execute(stmt)
+            self.db.commit()
+            logger.debug(f"Recorded {len(urls)} crawled URLs for queue {queue_id}")
+            return len(urls)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error recording crawled URLs for queue {queue_id}: {str(e)}")
+            raise
+
+    def get_crawled_urls(self, queue_id: int, offset: int = 0, limit: int = 100) -> List[str]:
+        """Crawled URLs of a queue item in crawl order"""
+        rows = self.db.query(KnowledgeQueueUrl.url)\
+            .filter(KnowledgeQueueUrl.queue_id == queue_id)\
+            .order_by(KnowledgeQueueUrl.id)\
+            .offset(offset)\
+            .limit(limit)\
+            .all()
+        return [row.url for row in rows]
+
+    def get_latest_crawled_url(self, queue_id: int) -> Optional[str]:
+        row = self.db.query(KnowledgeQueueUrl.url)\
+            .filter(KnowledgeQueueUrl.queue_id == queue_id)\
+            .order_by(KnowledgeQueueUrl.id.desc())\
+            .first()
+        return row.url if row else None
+
+    def count_crawled_urls(self, queue_id: int) -> int:
+        return self.db.query(func.count(KnowledgeQueueUrl.id))\
+            .filter(KnowledgeQueueUrl.queue_id == queue_id)\
+            .scalar() or 0
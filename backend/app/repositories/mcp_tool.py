@@ -17,14 +17,26 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.models.mcp_tool import MCPTool, MCPToolToAgent, MCPTransportType
 from uuid import UUID
+from datetime import datetime, timezone
+from hashlib import md5
+import json
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+def mcp_tool_fingerprint(mcp_tool: MCPTool) -> str:
+    """Hash of the settings that decide which server an MCP tool connects to and what it exposes"""
+    transport_type = getattr(mcp_tool.transport_type, "value", mcp_tool.transport_type)
+    connection = [
+        transport_type, mcp_tool.command, mcp_tool.args, mcp_tool.env_vars, mcp_tool.url, mcp_tool.headers
+    ]
+    return md5(json.dumps(connection, sort_keys=True, default=str).encode()).hexdigest()
+
+
 class MCPToolRepository:
     def __init__(self, db: Session):
         self.db = db
@@ -77,6 +89,23 @@ class MCPToolRepository:
         self.db.refresh(mcp_tool)
         return mcp_tool
 
+    def save_tool_catalog(self, mcp_tool_id: int, catalog: List[Dict[str, Any]], fingerprint: str) -> bool:
+        """
+        Store the tool list and schemas listed from an MCP server for the config with the given fingerprint.
+        updated_at is left untouched, as it versions the config itself.
+        """
+        updated = self.db.query(MCPTool).filter(MCPTool.id == mcp_tool_id).update(
+            {
+                MCPTool.tool_catalog: catalog,
+                MCPTool.catalog_fingerprint: fingerprint,
+                MCPTool.catalog_refreshed_at: datetime.now(timezone.utc),
+                MCPTool.updated_at: MCPTool.updated_at
+            },
+            synchronize_session=False
+        )
+        self.db.commit()
+        return bool(updated)
+
     def delete_mcp_tool(self, mcp_tool_id: int) -> bool:
         """Delete an MCP tool"""
         mcp_tool = self.get_mcp_tool(mcp_tool_id)
@@ -17,12 +17,13 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.models.session_to_agent import SessionToAgent, SessionStatus
 from uuid import UUID
 from datetime import datetime
 from app.core.logger import get_logger
-from sqlalchemy import or_
+from sqlalchemy import or_, select
 
 from app.models.user import User
 
@@ -409,3 +410,155 @@ class SessionToAgentRepository:
         except Exception as e:
             logger.error(f"Error getting workflow history: {str(e)}")
             return []
+
+
+class AsyncSessionToAgentRepository:
+    """Async variant of SessionToAgentRepository for code running on the event loop"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_session(self, session_id: UUID | str, agent_id: UUID | str = None, customer_id: UUID | str = None, user_id: UUID | str = None, organization_id: UUID | str = None) -> SessionToAgent:
+        """Create a new session assignment"""
+        try:
+            workflow_id = None
+            
+            # Check if agent has an active workflow (only if agent_id is provided)
+            if agent_id is not None:
+                from app.models.agent import Agent
+                result = await self.db.execute(select(Agent).filter(Agent.id == agent_id))
+                agent = result.unique().scalars().first()
+                
+                if agent:
+                    logger.info(f"Agent {agent_id} has use_workflow: {agent.use_workflow} and active_workflow_id: {agent.active_workflow_id}")
+                    if agent.use_workflow and agent.active_workflow_id:
+                        workflow_id = agent.active_workflow_id
+                        logger.info(f"Agent {agent_id} has active workflow {workflow_id}, adding to session")
+            
+            session = SessionToAgent(
+                session_id=session_id,
+                agent_id=agent_id,
+                customer_id=customer_id,
+                user_id=user_id,
+                organization_id=organization_id,
+                status=SessionStatus.OPEN,
+                workflow_id=workflow_id
+            )
+            self.db.add(session)
+            await self.db.commit()
+            await self.db.refresh(session)
+            return session
+        except Exception as e:
+            logger.error(f"Error creating session: {str(e)}")
+            await self.db.rollback()
+            raise
+
+    async def get_session(self, session_id: UUID | str) -> Optional[SessionToAgent]:
+        """Get session by ID"""
+        try:
+            if isinstance(session_id, str):
+                session_id = UUID(session_id)
+            result = await self.db.execute(
+                select(SessionToAgent).filter(SessionToAgent.session_id == session_id)
+            )
+            return result.scalars().first()
+        except Exception as e:
+            logger.error(f"Error getting session: {str(e)}")
+            return None
+
+    async def get_active_customer_session(self, customer_id: UUID | str, agent_id: UUID | str = None) -> Optional[SessionToAgent]:
+        """Get active session for a customer"""
+        try:
+            query = select(SessionToAgent).filter(
+                SessionToAgent.customer_id == customer_id,
+                or_(
+                    SessionToAgent.status == SessionStatus.OPEN,
+                    SessionToAgent.status == SessionStatus.TRANSFERRED
+                )
+            )
+            if agent_id:
+                query = query.filter(SessionToAgent.agent_id == agent_id)
+            
+            result = await self.db.execute(query.order_by(SessionToAgent.assigned_at.desc()).limit(1))
+            return result.scalars().first()
+        except Exception as e:
+            logger.error(f"Error getting active customer session: {str(e)}")
+            return None
+
+    async def get_latest_customer_session(self, customer_id: UUID | str, agent_id: UUID | str = None) -> Optional[SessionToAgent]:
+        """Get the latest session for a customer regardless of status"""
+        try:
+            query = select(SessionToAgent).filter(
+                SessionToAgent.customer_id == customer_id
+            )
+            if agent_id:
+                query = query.filter(SessionToAgent.agent_id == agent_id)
+            
+            result = await self.db.execute(query.order_by(SessionToAgent.assigned_at.desc()).limit(1))
+            return result.scalars().first()
+        except Exception as e:
+            logger.error(f"Error getting latest customer session: {str(e)}")
+            return None
+
+    async def reopen_closed_session(self, session_id: UUID | str) -> bool:
+        """Reopen a closed session"""
+        try:
+            session = await self.get_session(session_id)
+            if not session:
+                return False
+            
+            if session.status == SessionStatus.CLOSED:
+                session.status = SessionStatus.OPEN
+                await self.db.commit()
+                return True
+            return False  # Session was not closed
+        except Exception as e:
+            logger.error(f"Error reopening session: {str(e)}")
+            await self.db.rollback()
+            return False
+
+    async def update_session(self, session_id: UUID | str, data: dict) -> bool:
+        """Update a session"""
+        try:
+            session = await self.get_session(session_id)
+            if not session:
+                logger.error(f"Session {session_id} not found for update")
+                return False
+
+            for key, value in data.items():
+                setattr(session, key, value)
+
+            await self.db.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error updating session: {str(e)}")
+            await self.db.rollback()
+            return False
+
+    async def update_session_status(self, session_id: UUID | str, status: str) -> Optional[SessionToAgent]:
+        """Update the status of a session"""
+        try:
+            session = await self.get_session(session_id)
+            if not session:
+                logger.error(f"Session {session_id} not found")
+                return None
+                
+            # Convert string status to enum if needed
+            if isinstance(status, str):
+                try:
+                    status = SessionStatus[status]
+                except KeyError:
+                    logger.error(f"Invalid session status: {status}")
+                    return None
+            
+            session.status = status
+            session.updated_at = datetime.utcnow()
+            
+            await self.db.commit()
+            await self.db.refresh(session)
+            logger.info(f"Updated session {session_id} status to {status}")
+            return session
+        except Exception as e:
+            logger.error(f"Error updating session status: {str(e)}")
+            await self.db.rollback()
+            return None
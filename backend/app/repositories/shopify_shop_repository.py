@@ -18,6 +18,8 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 
 from typing import List, Optional, Union
 import uuid
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.shopify.shopify_shop import ShopifyShop
 from app.models.schemas.shopify import ShopifyShopCreate, ShopifyShopUpdate
@@ -124,4 +126,18 @@ class ShopifyShopRepository:
         
         self.db.delete(db_shop)
         self.db.commit()
-        return True 
\ No newline at end of file
+        return True
+
+
+class AsyncShopifyShopRepository:
+    """Async variant of ShopifyShopRepository for code running on the event loop"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_shop(self, shop_id: str) -> Optional[ShopifyShop]:
+        """
+        Get a shop by ID
+        """
+        result = await self.db.execute(select(ShopifyShop).filter(ShopifyShop.id == shop_id))
+        return result.scalars().first()
@@ -16,7 +16,9 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.widget import Widget
 from app.models.schemas.widget import WidgetCreate
 
@@ -60,3 +62,14 @@ class WidgetRepository:
     def delete_widget(self, widget_id: str) -> None:
         self.db.query(Widget).filter(Widget.id == widget_id).delete()
         self.db.commit()
+
+
+class AsyncWidgetRepository:
+    """Async variant of WidgetRepository for code running on the event loop"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_widget(self, widget_id: str) -> Widget:
+        result = await self.db.execute(select(Widget).filter(Widget.id == widget_id))
+        return result.scalars().first()
@@ -0,0 +1,243 @@
+"""
+ChatterMate - Chat Message Writer
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import atexit
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import insert
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Columns written for every buffered row, so each flush is a single multi-row INSERT
+ROW_COLUMNS = (
+    'organization_id', 'user_id', 'customer_id', 'agent_id', 'session_id',
+    'message', 'message_type', 'attributes', 'created_at', 'updated_at'
+)
+
+
+class ChatMessageWriter:
+    """
+    Write-behind buffer for chat_history inserts.
+
+    Messages are stamped with a strictly increasing created_at when they are queued and
+    written by a background thread in multi-row INSERTs, once the batch size is reached
+    or the flush interval elapses. Batches are written in queue order and only removed
+    once committed, so messages of a session are never reordered or lost on a failed
+    flush. Callers needing read-your-writes (history reads, direct inserts) flush just
+    their session first, best-effort, and whatever is still queued is flushed on shutdown.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL,
+        max_retries: int = 3,
+        session_factory: Optional[Callable] = None
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._session_factory = session_factory
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_sessions: Counter = Counter()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._failures = 0
+        self._last_timestamp: Optional[datetime] = None
+        self.flushed = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.CHAT_WRITE_BEHIND_ENABLED and not self._stopped
+
+    def next_timestamp(self) -> datetime:
+        """Client-side created_at, strictly increasing so queue order survives batching.
+        Direct inserts use it too while the writer is enabled, so both share one clock."""
+        with self._cond:
+            now = datetime.now(timezone.utc)
+            if self._last_timestamp and now <= self._last_timestamp:
+                now = self._last_timestamp + timedelta(microseconds=1)
+            self._last_timestamp = now
+            return now
+
+    def enqueue(self, message_data: Dict[str, Any]):
+        """Queue a chat message and return the unsaved ChatHistory built from it"""
+        from app.repositories.chat import build_chat_message
+
+        message = build_chat_message(message_data)
+        with self._cond:
+            timestamp = self.next_timestamp()
+            message.created_at = message.updated_at = timestamp
+            row = {column: message_data.get(column) for column in ROW_COLUMNS}
+            row.update(created_at=timestamp, updated_at=timestamp, attributes=message_data.get('attributes') or {})
+            self._pending.append(row)
+            self._pending_sessions[str(row['session_id'])] += 1
+            self._ensure_started()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return message
+
+    def has_pending(self, session_id=None) -> bool:
+        """Whether messages (of a session, if given) are still waiting to be written"""
+        with self._cond:
+            if session_id is None:
+                return bool(self._pending)
+            return self._pending_sessions.get(str(session_id), 0) > 0
+
+    def flush_session(self, session_id) -> int:
+        """
+        Best-effort flush of one session's queued messages, for read-your-writes callers.
+
+        Only that session's rows are written. A failed write is logged and its rows stay
+        queued for the flusher thread to retry, so the caller's read or insert still goes
+        ahead. Returns the number of rows written.
+        """
+        if not self.has_pending(session_id):
+            return 0
+
+        key = str(session_id)
+        written = 0
+        with self._flush_lock:
+            with self._cond:
+                rows = [row for row in self._pending if str(row['session_id']) == key]
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.warning(f"Flushing chat messages of session {key} failed, leaving them to the background flush: {str(e)}")
+                    break
+                self._remove(batch)
+                written += len(batch)
+                self.flushed += len(batch)
+        return written
+
+    def flush(self) -> int:
+        """Write everything queued so far, in order. Returns the number of rows written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.batch_size]
+                if not batch:
+                    return written
+
+                try:
+                    self._write(batch)
+                    self._failures = 0
+                except Exception as e:
+                    self._failures += 1
+                    if self._failures < self.max_retries:
+                        logger.error(f"Chat message flush failed ({self._failures}/{self.max_retries}), will retry: {str(e)}")
+                        raise
+                    # Give up on the batch as a whole so one bad row cannot stall every session
+                    logger.error(f"Chat message flush failed {self._failures} times, writing rows individually: {str(e)}")
+                    self._write_individually(batch)
+                    self._failures = 0
+
+                self._remove(batch)
+                written += len(batch)
+                self.flushed += len(batch)
+
+    def _remove(self, batch: List[Dict[str, Any]]):
+        """Drop written rows from the queue (called with the flush lock held)"""
+        written = {id(row) for row in batch}
+        with self._cond:
+            self._pending = [row for row in self._pending if id(row) not in written]
+            for row in batch:
+                key = str(row['session_id'])
+                self._pending_sessions[key] -= 1
+                if self._pending_sessions[key] <= 0:
+                    del self._pending_sessions[key]
+
+    def _get_session(self):
+        if self._session_factory:
+            return self._session_factory()
+        from app.database import SessionLocal
+        return SessionLocal()
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        from app.models.chat_history import ChatHistory
+
+        with self._get_session() as db:
+            try:
+                db.execute(insert(ChatHistory), rows)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+    def _write_individually(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            try:
+                self._write([row])
+            except Exception as e:
+                self.dropped += 1
+                logger.error(f"Dropping chat message for session {row['session_id']}: {str(e)}")
+
+    def _ensure_started(self):
+        """Start the flusher thread on first use (called with the condition held)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="chat-message-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Rows stay queued; back off for an interval before retrying
+                with self._cond:
+                    self._cond.wait(self.flush_interval)
+
+    def close(self):
+        """Stop the flusher thread and write whatever is still queued"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is None:
+            return
+        self._thread.join(timeout=10)
+        while self.has_pending():
+            try:
+                self.flush()
+            except Exception:
+                # flush() only raises before max_retries; keep going until rows are written or dropped
+                continue
+        logger.info(f"Chat message writer stopped, {self.flushed} messages written, {self.dropped} dropped")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            pending = len(self._pending)
+        return {"pending": pending, "flushed": self.flushed, "dropped": self.dropped}
+
+
+chat_message_writer = ChatMessageWriter()
+atexit.register(chat_message_writer.close)
@@ -29,7 +29,7 @@ logger = get_logger(__name__)
 
 
 class WorkflowChatService:
-    """Service for handling workflow-based chat processing"""
+    """Service for handling workflow-based chat processing; its sync repository calls run in asyncio.to_thread"""
     
     def __init__(self, db):
         self.db = db
@@ -67,7 +67,7 @@ class WorkflowChatService:
         """
         
         # Store user message in chat history
-        self.chat_repo.create_message({
+        await asyncio.to_thread(self.chat_repo.queue_message, {
             "message": message,
             "message_type": "user",
             "session_id": session_id,
@@ -156,8 +156,8 @@ class WorkflowChatService:
         
         # Only store message if there's actual content
         if workflow_result.message:
-            self._store_workflow_response(
-                response, session_id, org_id, session, customer_id, 
+            await asyncio.to_thread(
+                self._store_workflow_response, response, session_id, org_id, session, customer_id, 
                 active_session, workflow_result
             )
         
@@ -182,7 +182,7 @@ class WorkflowChatService:
             logger.debug(f"Emitting intermediate message: {intermediate_message}")
             
             # Store intermediate message in chat history
-            self.chat_repo.create_message({
+            await asyncio.to_thread(self.chat_repo.queue_message, {
                 "message": intermediate_message,
                 "message_type": "bot",
                 "session_id": session_id,
@@ -286,7 +286,7 @@ class WorkflowChatService:
         else:
             # Fallback: just update session status without specific group
             logger.warning(f"No transfer_group_id provided for workflow transfer in session {session_id}")
-            self.session_repo.update_session_status(session_id, "TRANSFERRED")
+            await asyncio.to_thread(self.session_repo.update_session_status, session_id, "TRANSFERRED")
             return response
     
     async def _handle_workflow_end_chat(
@@ -339,7 +339,7 @@ class WorkflowChatService:
     ):
         """Store workflow response in chat history"""
         
-        self.chat_repo.create_message({
+        self.chat_repo.queue_message({
             "message": response.message,
             "message_type": "bot",
             "session_id": session_id,
@@ -379,7 +379,7 @@ class WorkflowChatService:
         )
         
         # Store error response in chat history
-        self.chat_repo.create_message({
+        await asyncio.to_thread(self.chat_repo.queue_message, {
             "message": response.message,
             "message_type": "bot",
             "session_id": session_id,
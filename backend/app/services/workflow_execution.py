@@ -60,7 +60,10 @@ class WorkflowExecutionResult:
 
 
 class WorkflowExecutionService:
-    """Service for executing workflows in chat sessions"""
+    """
+    Service for executing workflows in chat sessions.
+    Repository calls go through asyncio.to_thread, so a slow query does not stall the socket handlers.
+    """
     
     def __init__(self, db: Session):
         self.db = db
@@ -110,7 +113,7 @@ class WorkflowExecutionService:
             logger.debug(f"Is initial execution: {is_initial_execution}")
 
             # Get workflow with nodes and connections
-            workflow = self.workflow_repo.get_workflow_with_nodes_and_connections(workflow_id)
+            workflow = await asyncio.to_thread(self.workflow_repo.get_workflow_with_nodes_and_connections, workflow_id)
             logger.debug(f"Workflow ID: {workflow.id}, Name: {workflow.name}, Status: {workflow.status}")
             logger.debug(f"Nodes count: {len(workflow.nodes)}")
 
@@ -236,14 +239,14 @@ class WorkflowExecutionService:
                 (current_node and current_node.node_type == NodeType.USER_INPUT and not final_result.should_continue) or
                 (current_node and current_node.node_type == NodeType.LLM and not final_result.should_continue and not final_result.transfer_to_human and not final_result.end_chat)):
                 # We're displaying a landing page, form, waiting for user input, or staying on LLM node - stay on current node
-                self._update_session_workflow_state(session_id, current_node.id if current_node else None, workflow_state)
+                await asyncio.to_thread(self._update_session_workflow_state, session_id, current_node.id if current_node else None, workflow_state)
             elif final_result.transfer_to_human:
                 # Transfer to human requested - stay on current node and let the chat handler manage the transfer
-                self._update_session_workflow_state(session_id, current_node.id if current_node else None, workflow_state)
+                await asyncio.to_thread(self._update_session_workflow_state, session_id, current_node.id if current_node else None, workflow_state)
                 logger.info(f"Transfer to human requested from node {current_node.id if current_node else 'unknown'}, staying on current node")
             else:
                 # Normal flow - move to next node (or end workflow if end_chat)
-                self._update_session_workflow_state(session_id, final_result.next_node_id, workflow_state)
+                await asyncio.to_thread(self._update_session_workflow_state, session_id, final_result.next_node_id, workflow_state)
             
             return WorkflowExecutionResult(
                 success=final_result.success,
@@ -311,7 +314,7 @@ class WorkflowExecutionService:
             logger.debug(f"Customer ID: {customer_id}")
             logger.debug(f"API key: {api_key}")
             # Get current session state
-            session = self.session_repo.get_session(session_id)
+            session = await asyncio.to_thread(self.session_repo.get_session, session_id)
             if not session:
                 return WorkflowExecutionResult(
                     success=False,
@@ -412,7 +415,7 @@ class WorkflowExecutionService:
                 return self._execute_condition_node(node, workflow, workflow_state)
             
             elif node.node_type == NodeType.FORM:
-                return self._execute_form_node(node, workflow_state, user_message, session_id)
+                return await asyncio.to_thread(self._execute_form_node, node, workflow_state, user_message, session_id)
             
             elif node.node_type == NodeType.LANDING_PAGE:
                 return self._execute_landing_page_node(node, workflow_state)
@@ -430,7 +433,7 @@ class WorkflowExecutionService:
                 return self._execute_end_node(node, workflow_state)
             
             elif node.node_type == NodeType.USER_INPUT:
-                return self._execute_user_input_node(node, workflow_state, user_message, session_id)
+                return await asyncio.to_thread(self._execute_user_input_node, node, workflow_state, user_message, session_id)
             
             else:
                 return WorkflowExecutionResult(
@@ -486,8 +489,8 @@ class WorkflowExecutionService:
             if not user_message or user_message.strip() == "":
                 # Check if there's any meaningful chat history or workflow history
                 chat_repo = ChatRepository(self.db)
-                chat_history = chat_repo.get_session_history(session_id)
-                workflow_history = self.session_repo.get_workflow_history(session_id)
+                chat_history = await asyncio.to_thread(chat_repo.get_session_history, session_id)
+                workflow_history = await asyncio.to_thread(self.session_repo.get_workflow_history, session_id)
                 
                 # If both message and history are empty, skip LLM execution
                 if (not chat_history or len(chat_history) == 0) and (not workflow_history or len(workflow_history) == 0):
@@ -546,7 +549,7 @@ class WorkflowExecutionService:
             # Handle empty or null user message by creating structured context
             processed_user_message = user_message
             if not user_message or user_message.strip() == "":
-                processed_user_message = self._build_context_message(session_id, workflow_state)
+                processed_user_message = await asyncio.to_thread(self._build_context_message, session_id, workflow_state)
             
             # Create chat agent with custom system prompt
             chat_agent = await ChatAgent.create_async(
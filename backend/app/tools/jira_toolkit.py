@@ -16,15 +16,23 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+
+import json
+import os
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
+import httpx
 from agno.tools import Toolkit
+from sqlalchemy import select
+from app.core.http_client import get_http_client
 from app.core.logger import get_logger
 from app.services.jira import JiraService
-from app.repositories.session_to_agent import SessionToAgentRepository
+from app.repositories.session_to_agent import AsyncSessionToAgentRepository
 from app.api.jira import CreateJiraIssueModel
-from app.database import SessionLocal
+from app.database import AsyncSessionLocal
 from app.models.organization import Organization
 from app.models.agent import Agent
+from app.models.jira import AgentJiraConfig, JiraToken
 from uuid import UUID
 
 logger = get_logger(__name__)
@@ -41,8 +49,105 @@ class JiraTools(Toolkit):
         self.register(self.create_jira_ticket)
         self.register(self.get_ticket_status)
         self.register(self.check_existing_ticket)
+
+    async def _refresh_token(self, db, token: JiraToken) -> Optional[str]:
+        """
+        Refresh the Jira token if it is no longer valid.
+        Returns a JSON error response if it could not be refreshed, None otherwise.
+        """
+        if self.jira_service.validate_token(token):
+            return None
+        try:
+            # Get client credentials from environment
+            client_id = os.getenv("JIRA_CLIENT_ID")
+            client_secret = os.getenv("JIRA_CLIENT_SECRET")
+            
+            if not client_id or not client_secret:
+                return json.dumps({
+                    "success": False,
+                    "message": "Jira client credentials not configured"
+                })
+            
+            refresh_data = {
+                "grant_type": "refresh_token",
+                "client_id": client_id,
+                "client_secret": client_secret,
+                "refresh_token": token.refresh_token
+            }
+            
+            refresh_response = await get_http_client().post(
+                "https://auth.atlassian.com/oauth/token",
+                data=refresh_data
+            )
+            
+            if refresh_response.status_code != 200:
+                logger.error(f"Failed to refresh token: {refresh_response.text}")
+                return json.dumps({
+                    "success": False,
+                    "message": f"Failed to refresh Jira token: {refresh_response.text}"
+                })
+            
+            # Parse response and update token
+            token_data = refresh_response.json()
+            
+            # Update token in database
+            token.access_token = token_data["access_token"]
+            token.refresh_token = token_data.get("refresh_token", token.refresh_token)
+            token.token_type = token_data["token_type"]
+            token.expires_at = datetime.utcnow() + timedelta(seconds=token_data["expires_in"])
+            
+            await db.commit()
+            logger.info("Successfully refreshed Jira token")
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error refreshing Jira token: {e}")
+            return json.dumps({
+                "success": False,
+                "message": f"Error refreshing Jira token: {str(e)}"
+            })
+
+    async def _get_ticket_url(self, token: JiraToken, organization: Organization, ticket_key: str) -> str:
+        """Browse URL of a ticket, from the token's site URL or domain, or the cloud resources"""
+        # Get the site URL from the token
+        site_url = token.site_url
+        if not site_url:
+            # Try to get the domain from the token
+            domain = token.domain
+            if domain:
+                site_url = f"https://{domain}.atlassian.net"
+            else:
+                # Try to get the site URL from the cloud resources
+                try:
+                    resources_url = "https://api.atlassian.com/oauth/token/accessible-resources"
+                    resources_response = await get_http_client().get(resources_url, headers={
+                        "Authorization": f"Bearer {token.access_token}",
+                        "Accept": "application/json"
+                    })
+                    
+                    if resources_response.status_code == 200:
+                        resources = resources_response.json()
+                        for resource in resources:
+                            if resource.get("id") == str(token.cloud_id):
+                                site_url = resource.get("url", "")
+                                break
+                except Exception as e:
+                    logger.warning(f"Failed to get site URL from resources: {e}")
+        
+        if site_url:
+            # Remove trailing slash if present
+            if site_url.endswith("/"):
+                site_url = site_url[:-1]
+            
+            # Construct the URL using the site URL
+            return f"{site_url}/browse/{ticket_key}"
+        
+        # Get the organization name for the URL
+        org_name = organization.name.lower().replace(" ", "-") if organization.name else "organization"
+        # Use the Atlassian Cloud URL format
+        return f"https://{org_name}.atlassian.net/browse/{ticket_key}"
     
-    def create_jira_ticket(
+    async def create_jira_ticket(
         self, 
         summary: str, 
         description: str, 
@@ -59,28 +164,24 @@ class JiraTools(Toolkit):
         Returns:
             str: JSON string with information about the created or updated ticket including ticket ID and status.
         """
+        is_update = False
         try:
-            import json
-            import requests
-            from datetime import datetime, timedelta
-            
             # Check if a ticket already exists for this session
-            existing_ticket_str = self.check_existing_ticket()
+            existing_ticket_str = await self.check_existing_ticket()
             existing_ticket = json.loads(existing_ticket_str)
             existing_ticket_id = None
-            is_update = False
             
             if existing_ticket.get("exists", False):
                 existing_ticket_id = existing_ticket.get("ticket_id")
                 is_update = True
                 logger.info(f"Found existing ticket {existing_ticket_id} for session {self.session_id}, will update it")
             
-            # Use context manager for database operations
-            with SessionLocal() as db:
+            async with AsyncSessionLocal() as db:
                 # Get the agent's Jira configuration
                 try:
                     agent_uuid = UUID(str(self.agent_id))
-                    agent = db.query(Agent).filter(Agent.id == agent_uuid).first()
+                    result = await db.execute(select(Agent).filter(Agent.id == agent_uuid))
+                    agent = result.unique().scalars().first()
                 except (ValueError, TypeError) as e:
                     logger.error(f"Invalid agent ID format: {e}")
                     return json.dumps({
@@ -97,16 +198,14 @@ class JiraTools(Toolkit):
                 # Get the organization
                 try:
                     org_uuid = UUID(str(self.org_id))
-                    organization = db.query(Organization).filter(
-                            Organization.id == org_uuid
-                    ).first()
+                    result = await db.execute(select(Organization).filter(Organization.id == org_uuid))
+                    organization = result.unique().scalars().first()
                 except (ValueError, TypeError) as e:
                     logger.error(f"Invalid organization ID format: {e}")
                     return json.dumps({
                         "success": False,
                         "message": f"Invalid organization ID format: {str(e)}"
                     })
-            
                 
                 if not organization:
                     return json.dumps({
@@ -115,10 +214,10 @@ class JiraTools(Toolkit):
                     })
                 
                 # Get the agent's Jira configuration
-                from app.models.jira import AgentJiraConfig
-                jira_config = db.query(AgentJiraConfig).filter(
-                    AgentJiraConfig.agent_id == str(self.agent_id)
-                ).first()
+                result = await db.execute(
+                    select(AgentJiraConfig).filter(AgentJiraConfig.agent_id == str(self.agent_id))
+                )
+                jira_config = result.scalars().first()
                 
                 if not jira_config or not jira_config.enabled:
                     return json.dumps({
@@ -137,10 +236,8 @@ class JiraTools(Toolkit):
                 )
                 
                 # Get the Jira token
-                from app.models.jira import JiraToken
-                token = db.query(JiraToken).filter(
-                    JiraToken.organization_id == organization.id
-                ).first()
+                result = await db.execute(select(JiraToken).filter(JiraToken.organization_id == organization.id))
+                token = result.scalars().first()
                 
                 if not token:
                     return json.dumps({
@@ -148,60 +245,12 @@ class JiraTools(Toolkit):
                         "message": "No Jira connection found"
                     })
             
-            # Check if token is valid and refresh if needed
-            is_valid = self.jira_service.validate_token(token)
-            if not is_valid:
-                # Implement synchronous token refresh
-                try:
-                    # Get client credentials from environment
-                    import os
-                    client_id = os.getenv("JIRA_CLIENT_ID")
-                    client_secret = os.getenv("JIRA_CLIENT_SECRET")
-                    
-                    if not client_id or not client_secret:
-                        return json.dumps({
-                            "success": False,
-                            "message": "Jira client credentials not configured"
-                        })
-                    
-                    # Refresh token using requests
-                    refresh_data = {
-                        "grant_type": "refresh_token",
-                        "client_id": client_id,
-                        "client_secret": client_secret,
-                        "refresh_token": token.refresh_token
-                    }
-                    
-                    refresh_response = requests.post(
-                        "https://auth.atlassian.com/oauth/token",
-                        data=refresh_data
-                    )
-                    
-                    if refresh_response.status_code != 200:
-                        logger.error(f"Failed to refresh token: {refresh_response.text}")
-                        return json.dumps({
-                            "success": False,
-                            "message": f"Failed to refresh Jira token: {refresh_response.text}"
-                        })
-                    
-                    # Parse response and update token
-                    token_data = refresh_response.json()
-                    
-                    # Update token in database
-                    token.access_token = token_data["access_token"]
-                    token.refresh_token = token_data.get("refresh_token", token.refresh_token)
-                    token.token_type = token_data["token_type"]
-                    token.expires_at = datetime.utcnow() + timedelta(seconds=token_data["expires_in"])
-                    
-                    db.commit()
-                    logger.info("Successfully refreshed Jira token")
-                    
-                except Exception as e:
-                    logger.error(f"Error refreshing Jira token: {e}")
-                    return json.dumps({
-                        "success": False,
-                        "message": f"Error refreshing Jira token: {str(e)}"
-                    })
+                # Check if token is valid and refresh if needed
+                refresh_error = await self._refresh_token(db, token)
+                if refresh_error:
+                    return refresh_error
+            
+            http_client = get_http_client()
             
             # Create the issue directly using the REST API
             headers = {
@@ -215,7 +264,7 @@ class JiraTools(Toolkit):
             try:
                 # Get the create metadata to check available fields
                 create_meta_url = f"https://api.atlassian.com/ex/jira/{str(token.cloud_id)}/rest/api/3/issue/createmeta?projectKeys={issue_data.projectKey}&issuetypeIds={issue_data.issueTypeId}&expand=projects.issuetypes.fields"
-                meta_response = requests.get(create_meta_url, headers=headers)
+                meta_response = await http_client.get(create_meta_url, headers=headers)
                 
                 if meta_response.status_code == 200:
                     meta_data = meta_response.json()
@@ -274,11 +323,13 @@ class JiraTools(Toolkit):
             else:
                 logger.info("Priority field is not available or not provided, skipping")
             
+            # Use the combined description for updates, or just the new description for new tickets
+            final_description = description
             try:
                 if is_update:
                     # Get the existing ticket details first to get the current description
                     existing_ticket_url = f"https://api.atlassian.com/ex/jira/{str(token.cloud_id)}/rest/api/3/issue/{existing_ticket_id}"
-                    existing_ticket_response = requests.get(existing_ticket_url, headers=headers)
+                    existing_ticket_response = await http_client.get(existing_ticket_url, headers=headers)
                     
                     if existing_ticket_response.status_code == 200:
                         existing_ticket_data = existing_ticket_response.json()
@@ -303,6 +354,7 @@ class JiraTools(Toolkit):
                         if combined_description:
                             combined_description += "\n\n--- Update " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + " ---\n\n"
                         combined_description += description
+                        final_description = combined_description
                         
                         # Update the description in the API data
                         api_data["fields"]["description"] = {
@@ -332,7 +384,7 @@ class JiraTools(Toolkit):
                     
                     # Update existing ticket
                     url = f"https://api.atlassian.com/ex/jira/{str(token.cloud_id)}/rest/api/3/issue/{existing_ticket_id}"
-                    response = requests.put(url, headers=headers, json=api_data)
+                    response = await http_client.put(url, headers=headers, json=api_data)
                     
                     if response.status_code not in (200, 204):
                         return json.dumps({
@@ -341,7 +393,7 @@ class JiraTools(Toolkit):
                         })
                     
                     # Get updated ticket details
-                    get_response = requests.get(url, headers=headers)
+                    get_response = await http_client.get(url, headers=headers)
                     if get_response.status_code != 200:
                         logger.warning(f"Failed to get updated ticket details: {get_response.text}")
                         issue_result = {"key": existing_ticket_id}
@@ -352,7 +404,7 @@ class JiraTools(Toolkit):
                 else:
                     # Create new ticket
                     url = f"https://api.atlassian.com/ex/jira/{str(token.cloud_id)}/rest/api/3/issue"
-                    response = requests.post(url, headers=headers, json=api_data)
+                    response = await http_client.post(url, headers=headers, json=api_data)
                     
                     if response.status_code not in (200, 201):
                         return json.dumps({
@@ -363,64 +415,25 @@ class JiraTools(Toolkit):
                     issue_result = response.json()
                     action_message = "created"
                 
-                # Get the site URL from the token
-                site_url = token.site_url
-                if not site_url:
-                    # Try to get the domain from the token
-                    domain = token.domain
-                    if domain:
-                        site_url = f"https://{domain}.atlassian.net"
-                    else:
-                        # Try to get the site URL from the cloud resources
-                        try:
-                            resources_url = "https://api.atlassian.com/oauth/token/accessible-resources"
-                            resources_response = requests.get(resources_url, headers={
-                                "Authorization": f"Bearer {token.access_token}",
-                                "Accept": "application/json"
-                            })
-                            
-                            if resources_response.status_code == 200:
-                                resources = resources_response.json()
-                                for resource in resources:
-                                    if resource.get("id") == str(token.cloud_id):
-                                        site_url = resource.get("url", "")
-                                        break
-                        except Exception as e:
-                            logger.warning(f"Failed to get site URL from resources: {e}")
-                
                 # Construct the ticket URL
-                ticket_key = issue_result["key"]
-                if site_url:
-                    # Remove trailing slash if present
-                    if site_url.endswith("/"):
-                        site_url = site_url[:-1]
-                    
-                    # Construct the URL using the site URL
-                    ticket_url = f"{site_url}/browse/{ticket_key}"
-                else:
-                    # Get the organization name for the URL
-                    org_name = organization.name.lower().replace(" ", "-") if organization.name else "organization"
-                    # Use the Atlassian Cloud URL format
-                    ticket_url = f"https://{org_name}.atlassian.net/browse/{ticket_key}"
+                ticket_url = await self._get_ticket_url(token, organization, issue_result["key"])
                 
                 # Update the session with ticket information
-                session_repo = SessionToAgentRepository(db)
                 try:
-                    # Use the combined description for updates, or just the new description for new tickets
-                    final_description = combined_description if is_update and 'combined_description' in locals() else description
-                    
-                    session_repo.update_session(
+                    async with AsyncSessionLocal() as db:
+                        session_repo = AsyncSessionToAgentRepository(db)
+                        await session_repo.update_session(
                             str(self.session_id),  # Ensure session_id is a string
-                        {
-                            "ticket_id": issue_result["key"],
+                            {
+                                "ticket_id": issue_result["key"],
                                 "ticket_status": "Updated" if is_update else "Created",
-                            "ticket_summary": summary,
+                                "ticket_summary": summary,
                                 "ticket_description": final_description,
-                            "integration_type": "JIRA",
+                                "integration_type": "JIRA",
                                 "ticket_priority": priority if priority_available else None,
                                 "ticket_url": ticket_url
-                        }
-                    )
+                            }
+                        )
                 except Exception as e:
                     logger.error(f"Failed to update session with ticket information: {e}")
                     # Continue since the ticket was created/updated successfully
@@ -433,7 +446,7 @@ class JiraTools(Toolkit):
                     "was_updated": is_update
                 })
                 
-            except requests.exceptions.RequestException as e:
+            except httpx.HTTPError as e:
                 logger.error(f"Request error {'updating' if is_update else 'creating'} Jira ticket: {e}")
                 return json.dumps({
                     "success": False,
@@ -441,13 +454,13 @@ class JiraTools(Toolkit):
                 })
                 
         except Exception as e:
-            logger.error(f"Error {'updating' if 'is_update' in locals() and is_update else 'creating'} Jira ticket: {str(e)}")
+            logger.error(f"Error {'updating' if is_update else 'creating'} Jira ticket: {str(e)}")
             return json.dumps({
                 "success": False,
-                "message": f"Error {'updating' if 'is_update' in locals() and is_update else 'creating'} Jira ticket: {str(e)}"
+                "message": f"Error {'updating' if is_update else 'creating'} Jira ticket: {str(e)}"
             })
     
-    def get_ticket_status(self, ticket_id: Optional[str] = None) -> str:
+    async def get_ticket_status(self, ticket_id: Optional[str] = None) -> str:
         """
         Get the status of a Jira ticket.
         
@@ -458,17 +471,12 @@ class JiraTools(Toolkit):
             str: JSON string with information about the ticket including its status.
         """
         try:
-            import json
-            import requests
-            from datetime import datetime, timedelta
-            
-            # Use context manager for database operations
-            with SessionLocal() as db:
+            async with AsyncSessionLocal() as db:
                 # If no ticket ID is provided, check if there's a ticket for this session
                 if not ticket_id:
-                    session_repo = SessionToAgentRepository(db)
+                    session_repo = AsyncSessionToAgentRepository(db)
                     try:
-                        session = session_repo.get_session(str(self.session_id))
+                        session = await session_repo.get_session(str(self.session_id))
                     except Exception as e:
                         logger.error(f"Failed to get session: {e}")
                         return json.dumps({
@@ -487,9 +495,8 @@ class JiraTools(Toolkit):
                 # Get the organization
                 try:
                     org_uuid = UUID(str(self.org_id))
-                    organization = db.query(Organization).filter(
-                            Organization.id == org_uuid
-                    ).first()
+                    result = await db.execute(select(Organization).filter(Organization.id == org_uuid))
+                    organization = result.unique().scalars().first()
                 except (ValueError, TypeError) as e:
                     logger.error(f"Invalid organization ID format: {e}")
                     return json.dumps({
@@ -504,10 +511,8 @@ class JiraTools(Toolkit):
                     })
                 
                 # Get the ticket status from Jira
-                from app.models.jira import JiraToken
-                token = db.query(JiraToken).filter(
-                    JiraToken.organization_id == organization.id
-                ).first()
+                result = await db.execute(select(JiraToken).filter(JiraToken.organization_id == organization.id))
+                token = result.scalars().first()
                 
                 if not token:
                     return json.dumps({
@@ -515,60 +520,10 @@ class JiraTools(Toolkit):
                         "message": "No Jira connection found"
                     })
             
-            # Check if token is valid and refresh if needed
-            is_valid = self.jira_service.validate_token(token)
-            if not is_valid:
-                # Implement synchronous token refresh
-                try:
-                    # Get client credentials from environment
-                    import os
-                    client_id = os.getenv("JIRA_CLIENT_ID")
-                    client_secret = os.getenv("JIRA_CLIENT_SECRET")
-                    
-                    if not client_id or not client_secret:
-                        return json.dumps({
-                            "success": False,
-                            "message": "Jira client credentials not configured"
-                        })
-                    
-                    # Refresh token using requests
-                    refresh_data = {
-                        "grant_type": "refresh_token",
-                        "client_id": client_id,
-                        "client_secret": client_secret,
-                        "refresh_token": token.refresh_token
-                    }
-                    
-                    refresh_response = requests.post(
-                        "https://auth.atlassian.com/oauth/token",
-                        data=refresh_data
-                    )
-                    
-                    if refresh_response.status_code != 200:
-                        logger.error(f"Failed to refresh token: {refresh_response.text}")
-                        return json.dumps({
-                            "success": False,
-                            "message": f"Failed to refresh Jira token: {refresh_response.text}"
-                        })
-                    
-                    # Parse response and update token
-                    token_data = refresh_response.json()
-                    
-                    # Update token in database
-                    token.access_token = token_data["access_token"]
-                    token.refresh_token = token_data.get("refresh_token", token.refresh_token)
-                    token.token_type = token_data["token_type"]
-                    token.expires_at = datetime.utcnow() + timedelta(seconds=token_data["expires_in"])
-                    
-                    db.commit()
-                    logger.info("Successfully refreshed Jira token")
-                    
-                except Exception as e:
-                    logger.error(f"Error refreshing Jira token: {e}")
-                    return json.dumps({
-                        "success": False,
-                        "message": f"Error refreshing Jira token: {str(e)}"
-                    })
+                # Check if token is valid and refresh if needed
+                refresh_error = await self._refresh_token(db, token)
+                if refresh_error:
+                    return refresh_error
             
             # Get the issue
             headers = {
@@ -582,8 +537,8 @@ class JiraTools(Toolkit):
             url = f"https://api.atlassian.com/ex/jira/{str(token.cloud_id)}/rest/api/3/issue/{ticket_id_str}"
             
             try:
-                response = requests.get(url, headers=headers)
-            except requests.exceptions.RequestException as e:
+                response = await get_http_client().get(url, headers=headers)
+            except httpx.HTTPError as e:
                 logger.error(f"Failed to make request to Jira API: {e}")
                 return json.dumps({
                     "success": False,
@@ -605,44 +560,8 @@ class JiraTools(Toolkit):
                     "message": f"Failed to parse Jira response: {str(e)}"
                 })
             
-            # Get the site URL from the token
-            site_url = token.site_url
-            if not site_url:
-                # Try to get the domain from the token
-                domain = token.domain
-                if domain:
-                    site_url = f"https://{domain}.atlassian.net"
-                else:
-                    # Try to get the site URL from the cloud resources
-                    try:
-                        resources_url = "https://api.atlassian.com/oauth/token/accessible-resources"
-                        resources_response = requests.get(resources_url, headers={
-                            "Authorization": f"Bearer {token.access_token}",
-                            "Accept": "application/json"
-                        })
-                        
-                        if resources_response.status_code == 200:
-                            resources = resources_response.json()
-                            for resource in resources:
-                                if resource.get("id") == str(token.cloud_id):
-                                    site_url = resource.get("url", "")
-                                    break
-                    except Exception as e:
-                        logger.warning(f"Failed to get site URL from resources: {e}")
-            
             # Construct the ticket URL
-            if site_url:
-                # Remove trailing slash if present
-                if site_url.endswith("/"):
-                    site_url = site_url[:-1]
-                
-                # Construct the URL using the site URL
-                ticket_url = f"{site_url}/browse/{ticket_id_str}"
-            else:
-                # Get the organization name for the URL
-                org_name = organization.name.lower().replace(" ", "-") if organization.name else "organization"
-                # Use the Atlassian Cloud URL format
-                ticket_url = f"https://{org_name}.atlassian.net/browse/{ticket_id_str}"
+            ticket_url = await self._get_ticket_url(token, organization, ticket_id_str)
             
             return json.dumps({
                 "success": True,
@@ -660,7 +579,7 @@ class JiraTools(Toolkit):
                 "message": f"Error getting Jira ticket status: {str(e)}"
             })
     
-    def check_existing_ticket(self) -> str:
+    async def check_existing_ticket(self) -> str:
         """
         Check if a Jira ticket already exists for the current session.
         
@@ -668,14 +587,11 @@ class JiraTools(Toolkit):
             str: JSON string with information about whether a ticket exists.
         """
         try:
-            import json
-            
-            # Use context manager for database operations
-            with SessionLocal() as db:
+            async with AsyncSessionLocal() as db:
                 # Get the session
-                session_repo = SessionToAgentRepository(db)
+                session_repo = AsyncSessionToAgentRepository(db)
                 try:
-                    session = session_repo.get_session(str(self.session_id))
+                    session = await session_repo.get_session(str(self.session_id))
                 except Exception as e:
                     logger.error(f"Failed to get session: {e}")
                     return json.dumps({
@@ -690,7 +606,7 @@ class JiraTools(Toolkit):
                     })
                 
             # Get the ticket status
-            ticket_status_str = self.get_ticket_status(session.ticket_id)
+            ticket_status_str = await self.get_ticket_status(session.ticket_id)
             ticket_status = json.loads(ticket_status_str)
             
             if not ticket_status.get("success", False):
@@ -720,7 +636,3 @@ class JiraTools(Toolkit):
                 "exists": False,
                 "message": f"Error checking existing ticket: {str(e)}"
             })
-    
-    # Private async methods that will be called by the public synchronous methods
-    
-    # Note: We've removed the async _check_existing_ticket method and replaced it with a synchronous implementation 
\ No newline at end of file
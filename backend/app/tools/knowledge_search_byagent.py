@@ -16,21 +16,326 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
-from typing import List
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from agno.embedder.base import Embedder
 from agno.tools import Toolkit
 from agno.utils.log import logger
-from app.database import SessionLocal
-from app.core.config import settings
+from app.database import SessionLocal, engine
 from app.repositories.knowledge_to_agent import KnowledgeToAgentRepository
 from app.repositories.knowledge import KnowledgeRepository
 from app.repositories.ai_config import AIConfigRepository
 from app.core.security import decrypt_api_key
 from agno.knowledge.agent import AgentKnowledge
-from agno.vectordb.pgvector import PgVector, SearchType
-from agno.embedder.fastembed import FastEmbedEmbedder
+from agno.vectordb.pgvector import SearchType
+from app.knowledge.optimized_pgvector import OptimizedPgVector
+from app.knowledge.vector_storage import get_organization_storage_options
+from app.knowledge.embedder_registry import get_embedder
+from app.core.config import settings
 from uuid import UUID
 import os
 
+# Redis keys used to propagate search cache invalidations to the other workers
+SEARCH_AGENT_VERSION_KEY = "knowledge_search:version:agent:{}"
+SEARCH_ORG_VERSION_KEY = "knowledge_search:version:org:{}"
+
+SEARCH_ERROR_MESSAGE = "Error searching knowledge base."
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace insensitive form of a query, used as cache key"""
+    return " ".join(query.lower().split())
+
+
+def query_overlap(first: str, second: str) -> float:
+    """Share of the shorter query's words that also occur in the other one, from 0 to 1"""
+    first_words = set(re.findall(r"\w+", first.lower()))
+    second_words = set(re.findall(r"\w+", second.lower()))
+    if not first_words or not second_words:
+        return 0.0
+    return len(first_words & second_words) / min(len(first_words), len(second_words))
+
+
+class KnowledgeSearchCache:
+    """
+    Two-level cache for knowledge base searches.
+
+    Level one is an LRU of normalized query text -> embedding, shared by all agents using
+    the same embedding model. Level two is a TTL cache of
+    (org, agent, source filter, query) -> formatted results. Level two entries are keyed
+    by the agent's and organization's knowledge version, which KnowledgeManager and the
+    knowledge endpoints bump (locally and in Redis) when knowledge is ingested, linked,
+    unlinked or deleted.
+    """
+
+    def __init__(self, max_queries: int = settings.KNOWLEDGE_QUERY_CACHE_SIZE,
+                 max_results: int = settings.KNOWLEDGE_RESULT_CACHE_SIZE,
+                 ttl: int = settings.KNOWLEDGE_RESULT_CACHE_TTL):
+        self.max_queries = max_queries
+        self.max_results = max_results
+        self.ttl = ttl
+        self._embeddings: "OrderedDict[Tuple, List[float]]" = OrderedDict()
+        self._results: "OrderedDict[Tuple, Tuple[float, str]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+        self.invalidations = 0
+
+    def get_query_embedding(self, embedder: Embedder, query: str) -> List[float]:
+        key = (getattr(embedder, "id", None), normalize_query(query))
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is not None:
+                self._embeddings.move_to_end(key)
+                self.embedding_hits += 1
+                return embedding
+            self.embedding_misses += 1
+
+        embedding = embedder.get_embedding(query)
+        if embedding:
+            with self._lock:
+                self._embeddings[key] = embedding
+                while len(self._embeddings) > self.max_queries:
+                    self._embeddings.popitem(last=False)
+        return embedding
+
+    def _get_versions(self, agent_id: Optional[str], org_id: Optional[str]) -> Tuple:
+        """Get the (local, shared) knowledge versions of an agent and its organization"""
+        agent_key = SEARCH_AGENT_VERSION_KEY.format(agent_id)
+        org_key = SEARCH_ORG_VERSION_KEY.format(org_id)
+        local = (self._versions.get(agent_key, 0), self._versions.get(org_key, 0))
+
+        shared = (None, None)
+        try:
+            from app.core.redis import get_redis
+            redis_client = get_redis()
+            if redis_client:
+                shared = tuple(redis_client.mget(agent_key, org_key))
+        except Exception as e:
+            logger.warning(f"Could not read knowledge search versions from Redis: {str(e)}")
+
+        return local + shared
+
+    def result_key(self, org_id, agent_id, source: Optional[str], query: str) -> Tuple:
+        org_id = str(org_id) if org_id else None
+        agent_id = str(agent_id) if agent_id else None
+        return (org_id, agent_id, self._get_versions(agent_id, org_id), source, normalize_query(query))
+
+    def get_results(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._results.move_to_end(key)
+                self.result_hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._results[key]
+            self.result_misses += 1
+            return None
+
+    def set_results(self, key: Tuple, results: str) -> None:
+        with self._lock:
+            self._results[key] = (time.monotonic(), results)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def _bump_version(self, version_key: str) -> None:
+        with self._lock:
+            self._versions[version_key] = self._versions.get(version_key, 0) + 1
+            self.invalidations += 1
+        try:
+            from app.core.redis import get_redis
+            redis_client = get_redis()
+            if redis_client:
+                redis_client.incr(version_key)
+        except Exception as e:
+            logger.warning(f"Could not publish knowledge search invalidation to Redis: {str(e)}")
+
+    def invalidate_agent(self, agent_id) -> None:
+        """Drop cached results of an agent, e.g. after knowledge was linked to or unlinked from it"""
+        if not agent_id:
+            return
+        agent_id = str(agent_id)
+        self._bump_version(SEARCH_AGENT_VERSION_KEY.format(agent_id))
+        with self._lock:
+            for key in [k for k in self._results if k[1] == agent_id]:
+                del self._results[key]
+
+    def invalidate_organization(self, org_id) -> None:
+        """Drop cached results of every agent of an organization, e.g. after knowledge was deleted"""
+        if not org_id:
+            return
+        org_id = str(org_id)
+        self._bump_version(SEARCH_ORG_VERSION_KEY.format(org_id))
+        with self._lock:
+            for key in [k for k in self._results if k[0] == org_id]:
+                del self._results[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "embedding_cache_size": len(self._embeddings),
+                "embedding_hits": self.embedding_hits,
+                "embedding_misses": self.embedding_misses,
+                "result_cache_size": len(self._results),
+                "result_hits": self.result_hits,
+                "result_misses": self.result_misses,
+                "invalidations": self.invalidations,
+            }
+
+
+knowledge_search_cache = KnowledgeSearchCache()
+
+
+def invalidate_agent_knowledge(agent_id) -> None:
+    """Drop cached knowledge search results of an agent"""
+    try:
+        knowledge_search_cache.invalidate_agent(agent_id)
+    except Exception as e:
+        logger.error(f"Failed to invalidate knowledge search cache for agent {agent_id}: {str(e)}")
+
+
+def invalidate_organization_knowledge(org_id) -> None:
+    """Drop cached knowledge search results of all agents of an organization"""
+    try:
+        knowledge_search_cache.invalidate_organization(org_id)
+    except Exception as e:
+        logger.error(f"Failed to invalidate knowledge search cache for organization {org_id}: {str(e)}")
+
+
+@dataclass
+class CachedQueryEmbedder(Embedder):
+    """Embedder front for search that answers repeated queries from the query embedding cache"""
+
+    embedder: Optional[Embedder] = None
+
+    def __post_init__(self):
+        self.id = getattr(self.embedder, "id", None)
+        self.dimensions = self.embedder.dimensions
+
+    def get_embedding(self, text: str) -> List[float]:
+        return knowledge_search_cache.get_query_embedding(self.embedder, text)
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return self.get_embedding(text), None
+
+
+class KnowledgePrefetchStats:
+    """Process-wide outcomes of speculative knowledge searches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prefetches = 0
+        self.hits = 0
+        self.misses = 0
+        self.unused = 0
+        self.saved_ms = 0.0
+
+    def record(self, outcome: str, saved_ms: float) -> None:
+        """Count a finished prefetch; outcome is hit, miss or unused"""
+        counter = {"hit": "hits", "miss": "misses", "unused": "unused"}[outcome]
+        with self._lock:
+            self.prefetches += 1
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.saved_ms += saved_ms
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "prefetches": self.prefetches,
+                "hits": self.hits,
+                "misses": self.misses,
+                "unused": self.unused,
+                "hit_rate": self.hits / self.prefetches if self.prefetches else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+            }
+
+
+knowledge_prefetch_stats = KnowledgePrefetchStats()
+
+
+class KnowledgePrefetch:
+    """
+    Knowledge search for a user message, started before the model asks for one.
+
+    While it is active, a search_knowledge_base call of the same tool with a query sharing at
+    least KNOWLEDGE_PREFETCH_MIN_OVERLAP of its words with the message is answered from it
+    instead of searching again. finish() cancels the search if the run did not use it and
+    records whether it was a hit, a miss (the model searched something else) or unused.
+    """
+
+    def __init__(self, tool: "KnowledgeSearchByAgent", query: str):
+        self.tool = tool
+        self.query = query
+        self.started_at = time.perf_counter()
+        self.search_ms: Optional[float] = None
+        self.hit = False
+        self.missed = False
+        self.saved_ms = 0.0
+        self._task = asyncio.create_task(self._search())
+        self._token = _active_prefetch.set(self)
+
+    async def _search(self) -> str:
+        try:
+            return await asyncio.to_thread(self.tool._cached_search, self.query)
+        finally:
+            self.search_ms = (time.perf_counter() - self.started_at) * 1000
+
+    def matches(self, tool: "KnowledgeSearchByAgent", query: str) -> bool:
+        return tool is self.tool and query_overlap(self.query, query) >= settings.KNOWLEDGE_PREFETCH_MIN_OVERLAP
+
+    async def get_results(self) -> Optional[str]:
+        """The prefetched results once the search is done, None if it failed"""
+        requested_at = time.perf_counter()
+        results = await asyncio.shield(self._task)
+        if results == SEARCH_ERROR_MESSAGE:
+            return None
+        # A search started now would have taken as long as the prefetch, minus what was still left of it
+        self.saved_ms += max(0.0, self.search_ms - (time.perf_counter() - requested_at) * 1000)
+        self.hit = True
+        return results
+
+    def finish(self) -> None:
+        """End the prefetch with its agent run: cancel it if still running and log the outcome"""
+        try:
+            _active_prefetch.reset(self._token)
+        except ValueError:
+            _active_prefetch.set(None)
+        if not self._task.done():
+            # The worker thread's search still completes (and fills the result cache), its result is dropped
+            self._task.cancel()
+        elif not self._task.cancelled():
+            self._task.exception()
+
+        outcome = "hit" if self.hit else "miss" if self.missed else "unused"
+        knowledge_prefetch_stats.record(outcome, self.saved_ms)
+        stats = knowledge_prefetch_stats.get_stats()
+        logger.info(
+            f"Knowledge prefetch for agent {self.tool.agent_id}: {outcome}, "
+            f"saved {self.saved_ms:.0f}ms (hit rate {stats['hit_rate']:.0%} of {stats['prefetches']}, "
+            f"{stats['saved_ms']:.0f}ms saved in total)"
+        )
+
+
+# Prefetch of the agent run in progress; tool calls run in tasks copied from the run's context
+_active_prefetch: ContextVar[Optional[KnowledgePrefetch]] = ContextVar("knowledge_prefetch", default=None)
+
+
 class KnowledgeSearchByAgent(Toolkit):
     def __init__(self, agent_id: str, org_id: UUID, source: str = None):
         super().__init__(name="knowledge_search_by_agent")
@@ -51,12 +356,45 @@ class KnowledgeSearchByAgent(Toolkit):
         self.agent_knowledge = None
         self.register(self.search_knowledge_base)
 
-    def search_knowledge_base(self, query: str) -> str:
+    async def search_knowledge_base(self, query: str) -> str:
         """Use this function to search the knowledge base for information about a query.
 
         Args:
             query: The query to search for.
         """
+        prefetch = _active_prefetch.get()
+        if prefetch is not None and prefetch.matches(self, query):
+            results = await prefetch.get_results()
+            if results is not None:
+                return results
+        elif prefetch is not None and prefetch.tool is self:
+            prefetch.missed = True
+
+        # The vector search and the cache's Redis version lookup block, so they run in a worker thread
+        return await asyncio.to_thread(self._cached_search, query)
+
+    def prefetch(self, message: str) -> KnowledgePrefetch:
+        """
+        Start searching for a user message right away, for the agent run about to answer it.
+        Must be called from the task that runs the agent, and finished once the run is over.
+        """
+        return KnowledgePrefetch(self, message)
+
+    def _cached_search(self, query: str) -> str:
+        try:
+            cache_key = knowledge_search_cache.result_key(self.org_id, self.agent_id, self.source, query)
+        except Exception as e:
+            logger.warning(f"Knowledge search cache unavailable: {str(e)}")
+            return self._search_knowledge_base(query)
+
+        results = knowledge_search_cache.get_results(cache_key)
+        if results is None:
+            results = self._search_knowledge_base(query)
+            if results != SEARCH_ERROR_MESSAGE:
+                knowledge_search_cache.set_results(cache_key, results)
+        return results
+
+    def _search_knowledge_base(self, query: str) -> str:
         try:
             logger.debug(f"Searching knowledge base for query: {query}")
             
@@ -73,28 +411,29 @@ class KnowledgeSearchByAgent(Toolkit):
                 if self.agent_knowledge is None:
                     # Use the first knowledge source's table and schema since they should all be in the same table
                     source = knowledge_sources[0]
-                    embedder = FastEmbedEmbedder(
-                         # Use configurable model ID from settings
-                    )
-                    # Updated dimensions for the model (all-MiniLM-L6-v2 uses 384 dimensions)
+                    # Same shared, already loaded model that KnowledgeManager embeds documents with
+                    embedder = CachedQueryEmbedder(embedder=get_embedder())
                     
                     # Initialize vector db with simpler search type to avoid connection issues
-                    vector_db = PgVector(
+                    vector_db = OptimizedPgVector(
                         table_name=source.table_name,
-                        db_url=settings.DATABASE_URL,
+                        db_engine=engine,
                         schema=source.schema,
                         search_type=SearchType.hybrid,
-                        embedder=embedder
+                        embedder=embedder,
+                        **get_organization_storage_options(db, self.org_id)
                     )
                     logger.debug(f"Vector db initialized: {source.table_name}")
 
                     # Create AgentKnowledge instance
                     self.agent_knowledge = AgentKnowledge(vector_db=vector_db)
 
-                # Convert UUID to string in filters
-                filters = {"agent_id": [str(self.agent_id)]}
-                if self.source:
-                    filters["name"] = self.source
+                # Visibility comes from the agent's knowledge links: search only the linked sources
+                sources = [source.source for source in knowledge_sources
+                           if not self.source or source.source == self.source]
+                if not sources:
+                    return "No relevant information found in the knowledge base."
+                filters = {"name": sources}
                 logger.debug(f"Search filters: {filters}")
 
                 # Search with filters
@@ -138,4 +477,4 @@ class KnowledgeSearchByAgent(Toolkit):
             logger.error(f"Error searching knowledge base: {str(e)}")
             import traceback
             logger.error(f"Full traceback: {traceback.format_exc()}")
-            return "Error searching knowledge base."
+            return SEARCH_ERROR_MESSAGE
@@ -17,26 +17,471 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
 import asyncio
-from typing import List, Optional
+import time
+import weakref
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from agno.tools import Toolkit
+from agno.tools.function import Function
 from agno.tools.mcp import MCPTools
+from app.core.config import settings
 from app.database import SessionLocal
-from app.repositories.mcp_tool import MCPToolRepository
+from app.repositories.mcp_tool import MCPToolRepository, mcp_tool_fingerprint
 from app.models.mcp_tool import MCPTransportType
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+def _stdio_command(mcp_tool_config) -> Optional[Tuple[str, Optional[Dict[str, str]]]]:
+    """Command line and environment of a STDIO MCP tool, or None if its config can't be started"""
+    if not (mcp_tool_config.command and mcp_tool_config.args):
+        logger.warning(f"STDIO MCP tool {mcp_tool_config.name} missing command or args")
+        return None
+
+    # For filesystem MCP server, ensure we have proper directory arguments
+    command_parts = [mcp_tool_config.command] + mcp_tool_config.args
+
+    # Check if we need to add directories from env_vars
+    if "@modelcontextprotocol/server-filesystem" in str(mcp_tool_config.args):
+        # Check if there are directory arguments after the package name
+        args_after_package = []
+        package_found = False
+        for arg in mcp_tool_config.args:
+            if package_found:
+                args_after_package.append(arg)
+            elif arg == "@modelcontextprotocol/server-filesystem":
+                package_found = True
+
+        # If no directories in args, check env_vars
+        if not args_after_package and mcp_tool_config.env_vars:
+            allowed_dirs_env = mcp_tool_config.env_vars.get("ALLOWED_DIRECTORIES")
+            if allowed_dirs_env:
+                # Parse comma-separated directories from env_vars
+                directories = [dir.strip() for dir in allowed_dirs_env.split(",") if dir.strip()]
+                if directories:
+                    command_parts.extend(directories)
+                    logger.debug(f"Added directories from env_vars: {directories}")
+                else:
+                    logger.warning(f"Filesystem MCP tool {mcp_tool_config.name} has empty ALLOWED_DIRECTORIES, skipping")
+                    return None
+            else:
+                logger.warning(f"Filesystem MCP tool {mcp_tool_config.name} missing ALLOWED_DIRECTORIES in env_vars, skipping")
+                return None
+        elif not args_after_package:
+            logger.warning(f"Filesystem MCP tool {mcp_tool_config.name} missing directory arguments, skipping")
+            return None
+
+    # Special handling for uvx commands with Python packages
+    if mcp_tool_config.command == "uvx":
+        # For uvx, we might need to handle Python MCP servers differently
+        logger.debug(f"Using uvx command for MCP tool: {mcp_tool_config.name}")
+
+    command_str = " ".join(command_parts)
+    logger.debug(f"Creating STDIO MCP tool with command: {command_str}")
+
+    # Prepare environment variables if provided (excluding ALLOWED_DIRECTORIES which we handled above)
+    env_vars_for_process = None
+    if mcp_tool_config.env_vars:
+        env_vars_for_process = {k: v for k, v in mcp_tool_config.env_vars.items() if k != "ALLOWED_DIRECTORIES"}
+        if env_vars_for_process:
+            logger.debug(f"Environment variables configured: {env_vars_for_process}")
+    return command_str, env_vars_for_process
+
+
+def mcp_session_key(mcp_tool_config) -> Tuple[Any, str]:
+    """Pool key of an MCP tool config: its id and connection fingerprint, so edited configs get new sessions"""
+    return mcp_tool_config.id, mcp_tool_fingerprint(mcp_tool_config)
+
+
+class PooledMCPSession:
+    """
+    A connected MCPTools kept by MCPSessionPool.
+
+    The MCP client's context (subprocess, streams and task group) must be entered and exited by
+    the same task, so a dedicated owner task enters it and holds it open until the session is
+    closed; agent runs on other tasks only call tools over the connected session.
+    """
+
+    def __init__(self, pool: "MCPSessionPool", key: Tuple[Any, str], name: str, tools: MCPTools):
+        self.pool = pool
+        self.key = key
+        self.name = name
+        self.tools = tools
+        self.in_use = False
+        self.retired = False  # Closed when returned, e.g. when its config changed while lent
+        now = time.monotonic()
+        self.created_at = now
+        self.last_used = now
+        self.last_checked = now
+        self.leased_at = now
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._closing = asyncio.Event()
+
+    @property
+    def alive(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, timeout: float) -> None:
+        """Connect the session, raising if it can't connect within timeout or exposes no functions"""
+        self._ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session-{self.name}")
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), timeout=timeout)
+        except BaseException:
+            await self.close()
+            raise
+        if not getattr(self.tools, "functions", None):
+            await self.close()
+            raise ValueError("no functions available after connection")
+
+    async def _run(self) -> None:
+        try:
+            async with self.tools:
+                if not self._ready.done():
+                    self._ready.set_result(None)
+                await self._closing.wait()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            elif "cancel scope" not in str(e) and "different task" not in str(e):
+                logger.warning(f"MCP session {self.name} ended with an error: {e}")
+        finally:
+            if not self._ready.done():
+                self._ready.set_exception(ConnectionError(f"MCP session {self.name} closed while connecting"))
+
+    async def ping(self, timeout: float = 5.0) -> bool:
+        """Health check: the owner task is running and the server answers an MCP ping"""
+        if not self.alive:
+            return False
+        session = getattr(self.tools, "session", None)
+        if session is None:
+            return True
+        try:
+            await asyncio.wait_for(session.send_ping(), timeout=timeout)
+            self.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.warning(f"MCP session {self.name} failed its health check: {e}")
+            return False
+
+    async def close(self, timeout: float = 5.0) -> None:
+        self._closing.set()
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout closing MCP session {self.name}, cancelling it")
+            self._task.cancel()
+        except Exception as e:
+            logger.debug(f"MCP session {self.name} close warning (non-critical): {e}")
+
+
+class MCPSessionPool:
+    """
+    Long-lived MCP sessions of one event loop, keyed by MCP tool config id and version.
+
+    acquire() lends a connected session exclusively to one agent run until release(); idle
+    sessions are reused (after a ping once idle for MCP_POOL_HEALTH_CHECK_INTERVAL), new ones
+    are connected up to MCP_POOL_MAX_PER_TOOL per config and MCP_POOL_MAX_SESSIONS in total,
+    evicting the least recently used idle session of another config when full. Sessions idle
+    for MCP_POOL_IDLE_TIMEOUT, dead ones, superseded config versions and leases held longer
+    than MCP_POOL_MAX_LEASE_SECONDS are closed as the pool is used.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        max_per_tool: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        health_check_interval: Optional[float] = None,
+        acquire_timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        max_lease_seconds: Optional[float] = None
+    ):
+        self.max_sessions = max_sessions or settings.MCP_POOL_MAX_SESSIONS
+        self.max_per_tool = max_per_tool or settings.MCP_POOL_MAX_PER_TOOL
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.MCP_POOL_IDLE_TIMEOUT
+        self.health_check_interval = health_check_interval if health_check_interval is not None else settings.MCP_POOL_HEALTH_CHECK_INTERVAL
+        self.acquire_timeout = acquire_timeout if acquire_timeout is not None else settings.MCP_POOL_ACQUIRE_TIMEOUT
+        self.connect_timeout = connect_timeout if connect_timeout is not None else settings.MCP_CONNECT_TIMEOUT
+        self.max_lease_seconds = max_lease_seconds if max_lease_seconds is not None else settings.MCP_POOL_MAX_LEASE_SECONDS
+        self._sessions: List[PooledMCPSession] = []
+        self._connecting: Dict[Tuple[Any, str], int] = {}
+        self._condition = asyncio.Condition()
+        self._stats = {"connects": 0, "reuses": 0, "evictions": 0, "health_check_failures": 0, "timeouts": 0}
+
+    def _count(self, key: Tuple[Any, str]) -> int:
+        return sum(1 for session in self._sessions if session.key == key) + self._connecting.get(key, 0)
+
+    def _expired(self, key: Tuple[Any, str]) -> List[PooledMCPSession]:
+        """Remove the sessions that should be closed now; in-use ones are retired on release instead"""
+        now = time.monotonic()
+        expired = []
+        for session in list(self._sessions):
+            superseded = session.key[0] == key[0] and session.key != key
+            leaked = session.in_use and now - session.leased_at > self.max_lease_seconds
+            if session.in_use and not leaked:
+                session.retired = session.retired or superseded
+                continue
+            if leaked or superseded or not session.alive or now - session.last_used > self.idle_timeout:
+                if leaked:
+                    logger.warning(f"Reclaiming MCP session {session.name}, lent for over {self.max_lease_seconds}s")
+                self._sessions.remove(session)
+                expired.append(session)
+        self._stats["evictions"] += len(expired)
+        return expired
+
+    async def _close_all(self, sessions: List[PooledMCPSession]) -> None:
+        if sessions:
+            await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+
+    async def acquire(
+        self,
+        key: Tuple[Any, str],
+        name: str,
+        factory: Callable[[], MCPTools]
+    ) -> Optional[PooledMCPSession]:
+        """Lend a connected session for key, connecting one with factory if needed; None if none could be had"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.acquire_timeout
+        while True:
+            session, connect, expired = None, False, []
+            async with self._condition:
+                while True:
+                    expired += self._expired(key)
+                    idle = [s for s in self._sessions if s.key == key and not s.in_use and not s.retired]
+                    if idle:
+                        session = max(idle, key=lambda s: s.last_used)
+                        session.in_use, session.leased_at = True, time.monotonic()
+                        break
+                    if self._count(key) < self.max_per_tool:
+                        if len(self._sessions) + sum(self._connecting.values()) >= self.max_sessions:
+                            others = [s for s in self._sessions if not s.in_use]
+                            if others:
+                                victim = min(others, key=lambda s: s.last_used)
+                                self._sessions.remove(victim)
+                                expired.append(victim)
+                                self._stats["evictions"] += 1
+                        if len(self._sessions) + sum(self._connecting.values()) < self.max_sessions:
+                            self._connecting[key] = self._connecting.get(key, 0) + 1
+                            connect = True
+                            break
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        break
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            await self._close_all(expired)
+
+            if session is not None:
+                if time.monotonic() - session.last_checked >= self.health_check_interval and not await session.ping():
+                    self._stats["health_check_failures"] += 1
+                    await self.release(session, healthy=False)
+                    continue
+                self._stats["reuses"] += 1
+                logger.debug(f"Reusing pooled MCP session {name}")
+                return session
+
+            if not connect:
+                logger.warning(f"No MCP session of {name} available within {self.acquire_timeout}s, running without it")
+                return None
+
+            session = PooledMCPSession(self, key, name, factory())
+            try:
+                await session.start(self.connect_timeout)
+            except BaseException as e:
+                async with self._condition:
+                    self._connecting[key] -= 1
+                    self._condition.notify_all()
+                if isinstance(e, asyncio.TimeoutError):
+                    logger.error(f"Timeout connecting to MCP tool {name}")
+                elif isinstance(e, Exception):
+                    logger.error(f"Failed to connect MCP tool {name}: {e}")
+                else:
+                    raise
+                return None
+
+            async with self._condition:
+                self._connecting[key] -= 1
+                session.in_use, session.leased_at = True, time.monotonic()
+                self._sessions.append(session)
+            self._stats["connects"] += 1
+            logger.debug(f"MCP tool {name} loaded functions: {list(session.tools.functions.keys())}")
+            return session
+
+    async def release(self, session: PooledMCPSession, healthy: bool = True) -> None:
+        """Return a lent session; it is closed instead if unhealthy, dead or retired"""
+        async with self._condition:
+            session.in_use = False
+            session.last_used = time.monotonic()
+            close = not healthy or session.retired or not session.alive or session not in self._sessions
+            if close and session in self._sessions:
+                self._sessions.remove(session)
+            self._condition.notify_all()
+        if close:
+            await session.close()
+
+    async def close_all(self) -> None:
+        async with self._condition:
+            sessions, self._sessions = self._sessions, []
+            self._condition.notify_all()
+        await self._close_all(sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "sessions": len(self._sessions),
+            "in_use": sum(1 for session in self._sessions if session.in_use),
+        }
+
+
+# One pool per event loop: sessions are bound to the loop their owner task runs on
+_session_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, MCPSessionPool]" = weakref.WeakKeyDictionary()
+
+
+def get_mcp_session_pool() -> MCPSessionPool:
+    """MCP session pool of the running event loop"""
+    loop = asyncio.get_running_loop()
+    pool = _session_pools.get(loop)
+    if pool is None:
+        pool = _session_pools[loop] = MCPSessionPool()
+    return pool
+
+
+def tools_catalog(tools: MCPTools) -> List[Dict[str, Any]]:
+    """Names, descriptions and input schemas of a connected MCP toolkit's functions"""
+    return [
+        {"name": function.name, "description": function.description, "parameters": function.parameters}
+        for function in tools.functions.values()
+    ]
+
+
+def _save_tool_catalog(mcp_tool_id, catalog: List[Dict[str, Any]], fingerprint: str) -> None:
+    try:
+        with SessionLocal() as db:
+            MCPToolRepository(db).save_tool_catalog(mcp_tool_id, catalog, fingerprint)
+    except Exception as e:
+        logger.warning(f"Failed to store the tool catalog of MCP tool {mcp_tool_id}: {e}")
+
+
+def cached_catalog(mcp_tool_config) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+    """The config's stored tool catalog, if it was listed for the current config, and whether it is due a refresh"""
+    catalog = mcp_tool_config.tool_catalog
+    if not isinstance(catalog, list) or not catalog or mcp_tool_config.catalog_fingerprint != mcp_tool_fingerprint(mcp_tool_config):
+        return None, True
+    refreshed_at = mcp_tool_config.catalog_refreshed_at
+    if not isinstance(refreshed_at, datetime):
+        return catalog, True
+    if refreshed_at.tzinfo is None:
+        refreshed_at = refreshed_at.replace(tzinfo=timezone.utc)
+    age = (datetime.now(timezone.utc) - refreshed_at).total_seconds()
+    return catalog, age >= settings.MCP_CATALOG_REFRESH_INTERVAL
+
+
+class CatalogMCPTools(Toolkit):
+    """
+    MCP toolkit assembled from a cached tool catalog, so an agent can be built without talking
+    to the MCP server. A session is only leased, through connect, when the model calls a tool.
+    """
+
+    def __init__(self, name: str, catalog: List[Dict[str, Any]], connect: Callable[[], Awaitable[Optional[MCPTools]]]):
+        super().__init__(name=name)
+        self._connect = connect
+        for entry in catalog:
+            tool_name = entry.get("name")
+            if not tool_name:
+                continue
+            self.functions[tool_name] = Function(
+                name=tool_name,
+                description=entry.get("description"),
+                parameters=entry.get("parameters") or {"type": "object", "properties": {}},
+                entrypoint=partial(self._call_tool, tool_name=tool_name),
+                skip_entrypoint_processing=True,
+            )
+
+    async def _call_tool(self, agent, tool_name: str, **kwargs) -> str:
+        tools = await self._connect()
+        function = tools.functions.get(tool_name) if tools is not None else None
+        if function is None:
+            return f"Error: MCP tool '{tool_name}' is not available right now"
+        return await function.entrypoint(agent=agent, **kwargs)
+
+
+# Background catalog refreshes in flight, by session key (tasks are kept referenced until done)
+_catalog_refreshes: Dict[Tuple[Any, str], asyncio.Task] = {}
+
+
+async def refresh_tool_catalog(pool: "MCPSessionPool", key: Tuple[Any, str], name: str, factory: Callable[[], MCPTools]) -> Optional[List[Dict[str, Any]]]:
+    """Re-list an MCP server's tools over a pooled session and store them as its config's catalog"""
+    session = await pool.acquire(key, name, factory)
+    if session is None:
+        return None
+    healthy = True
+    try:
+        listed = await asyncio.wait_for(session.tools.session.list_tools(), timeout=settings.MCP_CONNECT_TIMEOUT)
+        catalog = [
+            {"name": tool.name, "description": tool.description, "parameters": tool.inputSchema}
+            for tool in listed.tools
+        ]
+    except Exception as e:
+        logger.warning(f"Failed to refresh the tool catalog of MCP tool {name}: {e}")
+        healthy = False
+        return None
+    finally:
+        await pool.release(session, healthy=healthy)
+    await asyncio.to_thread(_save_tool_catalog, key[0], catalog, key[1])
+    logger.debug(f"Refreshed tool catalog of MCP tool {name}: {len(catalog)} tools")
+    return catalog
+
+
+def schedule_catalog_refresh(pool: "MCPSessionPool", key: Tuple[Any, str], name: str, factory: Callable[[], MCPTools]) -> None:
+    """Stale-while-revalidate: refresh a catalog in the background, at most once at a time per config"""
+    if key in _catalog_refreshes:
+        return
+    task = asyncio.create_task(refresh_tool_catalog(pool, key, name, factory))
+    _catalog_refreshes[key] = task
+    task.add_done_callback(lambda _: _catalog_refreshes.pop(key, None))
+
+
 class MCPToolsManager:
     """Manager class for handling MCP tools initialization and cleanup"""
     
-    def __init__(self):
+    def __init__(self, pool: Optional[MCPSessionPool] = None):
         self.mcp_tools: List[MCPTools] = []
+        self.pool = pool
+        self._sessions: List[PooledMCPSession] = []
+        self._leases: Dict[Tuple[Any, str], asyncio.Future] = {}
+
+    async def _lease(self, key: Tuple[Any, str], name: str, factory: Callable[[], MCPTools]) -> Optional[MCPTools]:
+        """Connected tools of key for this manager's run, leased from the pool on first use"""
+        lease = self._leases.get(key)
+        if lease is None:
+            lease = self._leases[key] = asyncio.ensure_future(self.pool.acquire(key, name, factory))
+        try:
+            session = await asyncio.shield(lease)
+        except Exception:
+            session = None
+        if session is None:
+            # Let a later tool call try again
+            if self._leases.get(key) is lease:
+                del self._leases[key]
+            return None
+        if session not in self._sessions:
+            self._sessions.append(session)
+        return session.tools
     
     async def initialize_mcp_tools(self, agent_id: str, org_id: str) -> List[MCPTools]:
         """
         Initialize MCP tools for an agent asynchronously.
-        Returns a list of connected MCPTools instances.
+        Returns a list of connected MCPTools instances, lent from the MCP session pool
+        unless MCP_POOL_ENABLED is off.
         """
         if not agent_id or not org_id:
             return []
@@ -46,6 +491,8 @@ class MCPToolsManager:
             with SessionLocal() as db:
                 mcp_tool_repo = MCPToolRepository(db)
                 agent_mcp_tools = mcp_tool_repo.get_agent_mcp_tools(agent_id)
+
+            pool = self.pool or (get_mcp_session_pool() if settings.MCP_POOL_ENABLED else None)
                 
             # Initialize each MCP tool asynchronously
             for mcp_tool_config in agent_mcp_tools:
@@ -53,103 +500,77 @@ class MCPToolsManager:
                     logger.debug(f"Initializing MCP tool: {mcp_tool_config.name}")
                     
                     if mcp_tool_config.transport_type == MCPTransportType.STDIO:
-                        # Build command string for STDIO transport
-                        if mcp_tool_config.command and mcp_tool_config.args:
-                            # For filesystem MCP server, ensure we have proper directory arguments
-                            command_parts = [mcp_tool_config.command] + mcp_tool_config.args
-                            
-                            # Check if we need to add directories from env_vars
-                            if "@modelcontextprotocol/server-filesystem" in str(mcp_tool_config.args):
-                                # Check if there are directory arguments after the package name
-                                args_after_package = []
-                                package_found = False
-                                for arg in mcp_tool_config.args:
-                                    if package_found:
-                                        args_after_package.append(arg)
-                                    elif arg == "@modelcontextprotocol/server-filesystem":
-                                        package_found = True
-                                
-                                # If no directories in args, check env_vars
-                                if not args_after_package and mcp_tool_config.env_vars:
-                                    allowed_dirs_env = mcp_tool_config.env_vars.get("ALLOWED_DIRECTORIES")
-                                    if allowed_dirs_env:
-                                        # Parse comma-separated directories from env_vars
-                                        directories = [dir.strip() for dir in allowed_dirs_env.split(",") if dir.strip()]
-                                        if directories:
-                                            command_parts.extend(directories)
-                                            logger.debug(f"Added directories from env_vars: {directories}")
-                                        else:
-                                            logger.warning(f"Filesystem MCP tool {mcp_tool_config.name} has empty ALLOWED_DIRECTORIES, skipping")
-                                            continue
-                                    else:
-                                        logger.warning(f"Filesystem MCP tool {mcp_tool_config.name} missing ALLOWED_DIRECTORIES in env_vars, skipping")
-                                        continue
-                                elif not args_after_package:
-                                    logger.warning(f"Filesystem MCP tool {mcp_tool_config.name} missing directory arguments, skipping")
-                                    continue
-                            
-                            # Special handling for uvx commands with Python packages
-                            if mcp_tool_config.command == "uvx":
-                                # For uvx, we might need to handle Python MCP servers differently
-                                logger.debug(f"Using uvx command for MCP tool: {mcp_tool_config.name}")
-                            
-                            command_str = " ".join(command_parts)
-                            logger.debug(f"Creating STDIO MCP tool with command: {command_str}")
-                            
-                            # Prepare environment variables if provided (excluding ALLOWED_DIRECTORIES which we handled above)
-                            env_vars_for_process = None
-                            if mcp_tool_config.env_vars:
-                                env_vars_for_process = {k: v for k, v in mcp_tool_config.env_vars.items() if k != "ALLOWED_DIRECTORIES"}
-                                if env_vars_for_process:
-                                    logger.debug(f"Environment variables configured: {env_vars_for_process}")
-                                
-                            # Create MCPTools instance with environment variables
-                            mcp_tool = MCPTools(command_str, env=env_vars_for_process)
-                            
-                            # Connect the tool asynchronously with timeout
-                            connected = False
-                            try:
-                                # Try to initialize the MCP tool using context manager
-                                await asyncio.wait_for(mcp_tool.__aenter__(), timeout=10.0)
-                                connected = True
-                                logger.debug(f"Entered MCP tool context: {mcp_tool_config.name}")
-                            except asyncio.TimeoutError:
-                                logger.error(f"Timeout connecting to MCP tool {mcp_tool_config.name}")
-                                # Try to cleanup the failed tool
-                                try:
-                                    await asyncio.wait_for(mcp_tool.__aexit__(None, None, None), timeout=2.0)
-                                except:
-                                    pass
-                                continue
-                            except Exception as e:
-                                logger.error(f"Failed to connect MCP tool {mcp_tool_config.name}: {e}")
-                                # For package not found errors (like Git server), skip silently after first error
-                                if "404" in str(e) or "not found" in str(e).lower() or "no such package" in str(e).lower():
-                                    logger.warning(f"MCP tool package not found, skipping: {mcp_tool_config.name}")
-                                # Try to cleanup the failed tool
-                                try:
-                                    await asyncio.wait_for(mcp_tool.__aexit__(None, None, None), timeout=2.0)
-                                except:
-                                    pass
+                        stdio_command = _stdio_command(mcp_tool_config)
+                        if stdio_command is None:
+                            continue
+                        command_str, env_vars_for_process = stdio_command
+
+                        if pool is not None:
+                            self.pool = pool
+                            key = mcp_session_key(mcp_tool_config)
+                            factory = partial(MCPTools, command_str, env=env_vars_for_process)
+
+                            catalog, refresh = cached_catalog(mcp_tool_config) if settings.MCP_CATALOG_ENABLED else (None, False)
+                            if catalog:
+                                # Serve the cached schemas now and connect on the first tool call
+                                self.mcp_tools.append(CatalogMCPTools(
+                                    mcp_tool_config.name, catalog, partial(self._lease, key, mcp_tool_config.name, factory)
+                                ))
+                                if refresh:
+                                    schedule_catalog_refresh(pool, key, mcp_tool_config.name, factory)
                                 continue
+
+                            tools = await self._lease(key, mcp_tool_config.name, factory)
+                            if tools is not None:
+                                self.mcp_tools.append(tools)
+                                if settings.MCP_CATALOG_ENABLED:
+                                    await asyncio.to_thread(_save_tool_catalog, mcp_tool_config.id, tools_catalog(tools), key[1])
+                            continue
                             
-                            # Verify functions are loaded after connection
-                            if connected and hasattr(mcp_tool, 'functions') and mcp_tool.functions:
-                                logger.debug(f"MCP tool {mcp_tool_config.name} loaded functions: {list(mcp_tool.functions.keys())}")
-                                self.mcp_tools.append(mcp_tool)
-                            else:
-                                logger.warning(f"MCP tool {mcp_tool_config.name} has no functions available after connection")
-                                # Try to cleanup the failed tool
-                                try:
-                                    if hasattr(mcp_tool, 'disconnect'):
-                                        await mcp_tool.disconnect()
-                                    elif hasattr(mcp_tool, '__aexit__'):
-                                        await mcp_tool.__aexit__(None, None, None)
-                                except:
-                                    pass  # Ignore cleanup errors for failed tools
-                                
+                        # Create MCPTools instance with environment variables
+                        mcp_tool = MCPTools(command_str, env=env_vars_for_process)
+                        
+                        # Connect the tool asynchronously with timeout
+                        connected = False
+                        try:
+                            # Try to initialize the MCP tool using context manager
+                            await asyncio.wait_for(mcp_tool.__aenter__(), timeout=settings.MCP_CONNECT_TIMEOUT)
+                            connected = True
+                            logger.debug(f"Entered MCP tool context: {mcp_tool_config.name}")
+                        except asyncio.TimeoutError:
+                            logger.error(f"Timeout connecting to MCP tool {mcp_tool_config.name}")
+                            # Try to cleanup the failed tool
+                            try:
+                                await asyncio.wait_for(mcp_tool.__aexit__(None, None, None), timeout=2.0)
+                            except:
+                                pass
+                            continue
+                        except Exception as e:
+                            logger.error(f"Failed to connect MCP tool {mcp_tool_config.name}: {e}")
+                            # For package not found errors (like Git server), skip silently after first error
+                            if "404" in str(e) or "not found" in str(e).lower() or "no such package" in str(e).lower():
+                                logger.warning(f"MCP tool package not found, skipping: {mcp_tool_config.name}")
+                            # Try to cleanup the failed tool
+                            try:
+                                await asyncio.wait_for(mcp_tool.__aexit__(None, None, None), timeout=2.0)
+                            except:
+                                pass
+                            continue
+                        
+                        # Verify functions are loaded after connection
+                        if connected and hasattr(mcp_tool, 'functions') and mcp_tool.functions:
+                            logger.debug(f"MCP tool {mcp_tool_config.name} loaded functions: {list(mcp_tool.functions.keys())}")
+                            self.mcp_tools.append(mcp_tool)
                         else:
-                            logger.warning(f"STDIO MCP tool {mcp_tool_config.name} missing command or args")
+                            logger.warning(f"MCP tool {mcp_tool_config.name} has no functions available after connection")
+                            # Try to cleanup the failed tool
+                            try:
+                                if hasattr(mcp_tool, 'disconnect'):
+                                    await mcp_tool.disconnect()
+                                elif hasattr(mcp_tool, '__aexit__'):
+                                    await mcp_tool.__aexit__(None, None, None)
+                            except:
+                                pass  # Ignore cleanup errors for failed tools
                             
                     elif mcp_tool_config.transport_type in [MCPTransportType.SSE, MCPTransportType.HTTP]:
                         # For SSE/HTTP transports, we would need different initialization
@@ -169,8 +590,27 @@ class MCPToolsManager:
     
     async def cleanup_mcp_tools(self):
         """
-        Clean up MCP tools by properly disconnecting them.
+        Clean up MCP tools: pooled sessions go back to their pool, others are disconnected.
         """
+        for lease in self._leases.values():
+            if not lease.done():
+                lease.cancel()
+            elif not lease.cancelled() and lease.exception() is None and lease.result() is not None:
+                if lease.result() not in self._sessions:
+                    self._sessions.append(lease.result())
+        self._leases.clear()
+        if self._sessions:
+            pooled = {id(session.tools) for session in self._sessions}
+            for session in self._sessions:
+                try:
+                    await session.pool.release(session)
+                except Exception as e:
+                    logger.warning(f"Error returning MCP session {session.name} to the pool: {e}")
+            self._sessions.clear()
+            self.mcp_tools = [mcp_tool for mcp_tool in self.mcp_tools if id(mcp_tool) not in pooled]
+        # Catalog toolkits own no connection of their own
+        self.mcp_tools = [mcp_tool for mcp_tool in self.mcp_tools if not isinstance(mcp_tool, CatalogMCPTools)]
+
         if not self.mcp_tools:
             logger.debug("No MCP tools to clean up")
             return
@@ -262,9 +702,10 @@ class ChatAgentMCPMixin:
     async def create_async(cls, api_key: str, model_name: str = "gpt-4o-mini", model_type: str = "OPENAI", 
                           org_id: str = None, agent_id: str = None, customer_id: str = None, 
                           session_id: str = None, custom_system_prompt: str = None, 
-                          transfer_to_human: bool | None = None, source: str = None):
+                          transfer_to_human: bool | None = None, source: str = None, template=None):
         """
         Async factory method to create a ChatAgent with MCP tools initialized.
+        An optional pooled ChatAgentTemplate skips rebuilding the session-independent parts.
         """
         # Initialize MCP tools asynchronously if agent_id and org_id are provided
         mcp_tools = []
@@ -288,7 +729,8 @@ class ChatAgentMCPMixin:
             custom_system_prompt=custom_system_prompt,
             transfer_to_human=transfer_to_human,
             mcp_tools=mcp_tools,
-            source=source
+            source=source,
+            template=template
         )
         
         # Attach the MCP manager to the instance for cleanup
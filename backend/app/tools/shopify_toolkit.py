@@ -16,17 +16,19 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+import asyncio
 from typing import Optional, Dict, Any, List
 from agno.tools import Toolkit
+from app.core.http_client import get_http_client
 from app.core.logger import get_logger
 from app.services.shopify import ShopifyService
 from app.repositories.session_to_agent import SessionToAgentRepository
-from app.database import SessionLocal
+from app.database import SessionLocal, AsyncSessionLocal
 from app.models.organization import Organization
 from app.models.agent import Agent
 from app.models.shopify import AgentShopifyConfig, ShopifyShop
-from app.repositories.shopify_shop_repository import ShopifyShopRepository
-from app.repositories.agent_shopify_config_repository import AgentShopifyConfigRepository
+from app.repositories.shopify_shop_repository import AsyncShopifyShopRepository
+from app.repositories.agent_shopify_config_repository import AsyncAgentShopifyConfigRepository
 from uuid import UUID
 import json
 import traceback
@@ -49,7 +51,7 @@ class ShopifyTools(Toolkit):
         self.register(self.get_order_status)
         self.register(self.recommend_products)
     
-    def _get_shop_for_agent(self) -> Optional[ShopifyShop]:
+    async def _get_shop_for_agent(self) -> Optional[ShopifyShop]:
         """
         Helper method to get the Shopify shop associated with the agent.
         
@@ -59,18 +61,18 @@ class ShopifyTools(Toolkit):
         try:
             logger.debug(f"Getting shop for agent {self.agent_id}")
             
-            with SessionLocal() as db:
+            async with AsyncSessionLocal() as db:
                 # Get the agent's Shopify configuration
-                agent_shopify_config_repo = AgentShopifyConfigRepository(db)
-                shopify_config = agent_shopify_config_repo.get_agent_shopify_config(str(self.agent_id))
+                agent_shopify_config_repo = AsyncAgentShopifyConfigRepository(db)
+                shopify_config = await agent_shopify_config_repo.get_agent_shopify_config(str(self.agent_id))
                 
                 if not shopify_config or not shopify_config.enabled or not shopify_config.shop_id:
                     logger.warning("Shopify integration is not enabled for this agent")
                     return None
                     
                 # Get the shop
-                shopify_repo = ShopifyShopRepository(db)
-                shop = shopify_repo.get_shop(shopify_config.shop_id)
+                shopify_repo = AsyncShopifyShopRepository(db)
+                shop = await shopify_repo.get_shop(shopify_config.shop_id)
                 
                 if not shop or not shop.is_installed:
                     logger.warning("Shopify shop not found or not installed")
@@ -88,7 +90,12 @@ class ShopifyTools(Toolkit):
             logger.error(f"Error getting shop for agent: {str(e)}")
             return None
     
-    def list_products(self, limit: int = 10) -> str:
+    def _run_service(self, method: str, *args) -> Dict[str, Any]:
+        """Call a ShopifyService method with its own database session"""
+        with SessionLocal() as db:
+            return getattr(ShopifyService(db), method)(*args)
+    
+    async def list_products(self, limit: int = 10) -> str:
         """
         List products from the Shopify store.
         
@@ -100,7 +107,7 @@ class ShopifyTools(Toolkit):
         """
         try:
             # Get the Shopify shop for this agent
-            shop = self._get_shop_for_agent()
+            shop = await self._get_shop_for_agent()
             
             if not shop:
                 return json.dumps({
@@ -108,11 +115,9 @@ class ShopifyTools(Toolkit):
                     "message": "Shopify integration is not enabled for this agent or shop not found"
                 })
                 
-            # List products using context manager for database operations
-            with SessionLocal() as db:
-                shopify_service = ShopifyService(db)
-                result = shopify_service.get_products(shop, limit)
-                return json.dumps(result)
+            # ShopifyService is synchronous, so it runs in a worker thread
+            result = await asyncio.to_thread(self._run_service, "get_products", shop, limit)
+            return json.dumps(result)
             
         except Exception as e:
             logger.error(f"Error listing products: {str(e)}")
@@ -121,7 +126,7 @@ class ShopifyTools(Toolkit):
                 "message": f"Error listing products: {str(e)}"
             })
     
-    def get_product(self, product_id: str) -> str:
+    async def get_product(self, product_id: str) -> str:
         """
         Get a specific product from the Shopify store.
         
@@ -133,7 +138,7 @@ class ShopifyTools(Toolkit):
         """
         try:
             # Get the Shopify shop for this agent
-            shop = self._get_shop_for_agent()
+            shop = await self._get_shop_for_agent()
             
             if not shop:
                 return json.dumps({
@@ -141,10 +146,8 @@ class ShopifyTools(Toolkit):
                     "message": "Shopify integration is not enabled for this agent or shop not found"
                 })
                 
-            # Get the product using context manager for database operations
-            with SessionLocal() as db:
-                shopify_service = ShopifyService(db)
-                result = shopify_service.get_product(shop, product_id)
+            # ShopifyService is synchronous, so it runs in a worker thread
+            result = await asyncio.to_thread(self._run_service, "get_product", shop, product_id)
             
             # Check if product was found
             if result.get("success", False) and result.get("product"):
@@ -165,7 +168,7 @@ class ShopifyTools(Toolkit):
                 "message": f"Error getting product: {str(e)}"
             })
     
-    def search_products(self, query: str, limit: int = 5, cursor: Optional[str] = None) -> str:
+    async def search_products(self, query: str, limit: int = 5, cursor: Optional[str] = None) -> str:
         """
         Search for products in the Shopify store using a query string with GraphQL.
         Supports Shopify's search syntax including field specifiers (e.g., 'title:snowboard', 'tag:beginner', 'product_type:skate'),
@@ -183,7 +186,7 @@ class ShopifyTools(Toolkit):
         """
         try:
             # Get the Shopify shop for this agent
-            shop = self._get_shop_for_agent()
+            shop = await self._get_shop_for_agent()
             
             if not shop:
                 return json.dumps({
@@ -254,9 +257,7 @@ class ShopifyTools(Toolkit):
                 "variables": variables
             }
             
-            import requests
-            verify_ssl = settings.VERIFY_SSL_CERTIFICATES
-            response = requests.post(url, headers=headers, json=payload, verify=verify_ssl)
+            response = await get_http_client().post(url, headers=headers, json=payload)
             
             if response.status_code != 200:
                 logger.error(f"Failed to search products: {response.text}")
@@ -348,7 +349,7 @@ class ShopifyTools(Toolkit):
             })
     
    
-    def search_orders(self, query: str = None, customer_email: str = None, order_number: str = None, limit: int = 10) -> str:
+    async def search_orders(self, query: str = None, customer_email: str = None, order_number: str = None, limit: int = 10) -> str:
         """
         Search for orders in the Shopify store using GraphQL API.
         
@@ -363,7 +364,7 @@ class ShopifyTools(Toolkit):
         """
         try:
             # Get the Shopify shop for this agent
-            shop = self._get_shop_for_agent()
+            shop = await self._get_shop_for_agent()
             
             if not shop:
                 return json.dumps({
@@ -485,9 +486,7 @@ class ShopifyTools(Toolkit):
                 "variables": variables
             }
             
-            import requests
-            verify_ssl = settings.VERIFY_SSL_CERTIFICATES
-            response = requests.post(url, headers=headers, json=payload, verify=verify_ssl)
+            response = await get_http_client().post(url, headers=headers, json=payload)
             
             if response.status_code != 200:
                 logger.error(f"Failed to search orders: {response.text}")
@@ -604,7 +603,7 @@ class ShopifyTools(Toolkit):
                 "message": f"Error searching orders: {str(e)}"
             })
     
-    def get_order_status(self, order_id: str) -> str:
+    async def get_order_status(self, order_id: str) -> str:
         """
         Get the status of a specific order from the Shopify store.
         
@@ -616,7 +615,7 @@ class ShopifyTools(Toolkit):
         """
         try:
             # Get the Shopify shop for this agent
-            shop = self._get_shop_for_agent()
+            shop = await self._get_shop_for_agent()
             
             if not shop:
                 return json.dumps({
@@ -624,10 +623,8 @@ class ShopifyTools(Toolkit):
                     "message": "Shopify integration is not enabled for this agent or shop not found"
                 })
                 
-            # Get order details using context manager for database operations
-            with SessionLocal() as db:
-                shopify_service = ShopifyService(db)
-                result = shopify_service.get_order(shop, order_id)
+            # ShopifyService is synchronous, so it runs in a worker thread
+            result = await asyncio.to_thread(self._run_service, "get_order", shop, order_id)
             
             # If successful, extract relevant order status information
             if result.get("success", False) and result.get("order"):
@@ -671,7 +668,7 @@ class ShopifyTools(Toolkit):
                 "message": f"Error getting order status: {str(e)}"
             })
     
-    def recommend_products(self, product_id: Optional[str] = None, product_type: Optional[str] = None, tags: Optional[str] = None, limit: int = 3, cursor: Optional[str] = None) -> str:
+    async def recommend_products(self, product_id: Optional[str] = None, product_type: Optional[str] = None, tags: Optional[str] = None, limit: int = 3, cursor: Optional[str] = None) -> str:
         """
         Recommend products based on similarity to a reference product ID, product type, or tags.
         Constructs a Shopify search query based on the provided criteria using GraphQL. Supports pagination.
@@ -692,7 +689,7 @@ class ShopifyTools(Toolkit):
                  On error, returns an error message.
         """
         try:
-            shop = self._get_shop_for_agent()
+            shop = await self._get_shop_for_agent()
             if not shop:
                 return json.dumps({"success": False, "message": "Shopify integration is not enabled for this agent or shop not found"})
 
@@ -731,9 +728,7 @@ class ShopifyTools(Toolkit):
                     "variables": variables
                 }
                 
-                import requests
-                verify_ssl = settings.VERIFY_SSL_CERTIFICATES
-                response = requests.post(url, headers=headers, json=payload, verify=verify_ssl)
+                response = await get_http_client().post(url, headers=headers, json=payload)
                 
                 if response.status_code == 200:
                     result = response.json()
@@ -898,9 +893,7 @@ class ShopifyTools(Toolkit):
                 "variables": variables
             }
             
-            import requests
-            verify_ssl = settings.VERIFY_SSL_CERTIFICATES
-            response = requests.post(url, headers=headers, json=payload, verify=verify_ssl)
+            response = await get_http_client().post(url, headers=headers, json=payload)
             
             if response.status_code != 200:
                 logger.error(f"Failed to get recommendations: {response.text}")
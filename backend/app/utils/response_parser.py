@@ -283,4 +283,79 @@ def create_basic_chat_response(message: str) -> ChatResponse:
         transfer_description=None,
         request_rating=False,
         create_ticket=False
-    ) 
\ No newline at end of file
+    )
+
+
+class StreamingMessageExtractor:
+    """
+    Incrementally extract the `message` field from a ChatResponse JSON that is still
+    being streamed by the LLM, so the visible text can be sent to the widget token by
+    token. Replies that are not JSON at all are passed through as plain text.
+    """
+
+    MESSAGE_KEY_PATTERN = re.compile(r'"message"\s*:\s*"')
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = None  # Index in buffer of the next undecoded message character
+        self.plain_text = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a streamed chunk and return the newly available message text.
+        
+        Args:
+            chunk: The raw content delta from the LLM
+            
+        Returns:
+            str: The message text decoded since the previous call (may be empty)
+        """
+        if not chunk or self.done:
+            return ""
+
+        if self.plain_text:
+            return chunk
+
+        self.buffer += chunk
+
+        if self.position is None:
+            stripped = self.buffer.lstrip()
+            if stripped and stripped[0] not in '{`':
+                self.plain_text = True
+                return self.buffer
+            match = self.MESSAGE_KEY_PATTERN.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        decoded = []
+        i = self.position
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == '"':
+                self.done = True
+                break
+            if char == '\\':
+                # Wait for the rest of an escape sequence that is split across chunks
+                if i + 1 >= len(self.buffer):
+                    break
+                escape = self.buffer[i + 1]
+                if escape == 'u':
+                    if i + 6 > len(self.buffer):
+                        break
+                    try:
+                        decoded.append(chr(int(self.buffer[i + 2:i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                decoded.append(self.ESCAPES.get(escape, escape))
+                i += 2
+                continue
+            decoded.append(char)
+            i += 1
+
+        self.position = i
+        return "".join(decoded)
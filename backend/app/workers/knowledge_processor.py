@@ -17,10 +17,14 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
 import asyncio
+import socket
+from typing import List, Optional, Set
+from sqlalchemy.engine import make_url
 from app.database import SessionLocal
 from app.repositories.knowledge_queue import KnowledgeQueueRepository
 from app.knowledge.knowledge_base import KnowledgeManager
-from app.models.knowledge_queue import QueueStatus, ProcessingStage
+from app.models.knowledge_queue import QueueStatus, KNOWLEDGE_QUEUE_CHANNEL
+from app.core.config import settings
 from app.core.logger import get_logger
 import os
 from app.core.processor import PROCESSOR_STATUS
@@ -31,9 +35,64 @@ from app.services.user import send_fcm_notification
 logger = get_logger(__name__)
 
 
-async def process_queue_item(queue_item_id: int):
-    """Process a single queue item"""
+def get_worker_id() -> str:
+    """Identifier stored on claimed queue items, unique per worker process"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _renew_lease(queue_item_id: int, worker_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return KnowledgeQueueRepository(db).heartbeat(
+            queue_item_id, worker_id, settings.KNOWLEDGE_QUEUE_LEASE_SECONDS)
+    finally:
+        db.close()
+
+
+async def keep_lease(queue_item_id: int, worker_id: str, processing: Optional[asyncio.Task] = None) -> bool:
+    """
+    Heartbeat the item's lease while it is processed, so other workers don't reclaim it.
+
+    Once the lease is lost - another worker took it over, or renewals kept failing until it
+    expired - the processing task is cancelled and True is returned, so this worker neither
+    finalises the item nor notifies about it. Cancelling does not stop work already handed to
+    a thread (loading the source, building indexes); that keeps running until it returns.
+    """
+    loop = asyncio.get_running_loop()
+    renewed_at = loop.time()
+    while True:
+        await asyncio.sleep(settings.KNOWLEDGE_QUEUE_HEARTBEAT_INTERVAL)
+        try:
+            if await asyncio.to_thread(_renew_lease, queue_item_id, worker_id):
+                renewed_at = loop.time()
+                continue
+            logger.warning(f"Worker {worker_id} lost the lease on queue item {queue_item_id}")
+        except Exception as e:
+            logger.warning(f"Heartbeat for queue item {queue_item_id} failed: {str(e)}")
+            if loop.time() - renewed_at < settings.KNOWLEDGE_QUEUE_LEASE_SECONDS:
+                continue
+            logger.warning(f"Lease of worker {worker_id} on queue item {queue_item_id} expired")
+
+        if processing is not None:
+            processing.cancel()
+        return True
+
+
+def _lease_lost(heartbeat: Optional[asyncio.Task]) -> bool:
+    return heartbeat is not None and heartbeat.done() and not heartbeat.cancelled() and heartbeat.result()
+
+
+async def process_queue_item(queue_item_id: int, worker_id: Optional[str] = None):
+    """
+    Process a single queue item.
+
+    Queue consumers pass the worker_id they claimed the item with. Without one (e.g. the API
+    starting an upload right away) the item is claimed here, so a consumer woken by the same
+    insert cannot process it a second time.
+    """
     db = None
+    queue_item = None
+    heartbeat = None
     try:
         db = SessionLocal()
         queue_repo = KnowledgeQueueRepository(db)
@@ -43,44 +102,53 @@ async def process_queue_item(queue_item_id: int):
             logger.error(f"Queue item {queue_item_id} not found")
             return
 
+        if worker_id is None:
+            worker_id = get_worker_id()
+            if not queue_repo.claim(worker_id, settings.KNOWLEDGE_QUEUE_LEASE_SECONDS, queue_id=queue_item_id):
+                logger.info(f"Queue item {queue_item_id} is already being processed")
+                return
+        elif queue_item.locked_by != worker_id:
+            logger.warning(f"Queue item {queue_item_id} is not leased to worker {worker_id}, skipping")
+            return
+
         # Get knowledge manager instance
         knowledge = KnowledgeManager(
             org_id=queue_item.organization_id,
             agent_id=queue_item.agent_id
         )
 
-        # Process if status is pending
-        if queue_item.status == QueueStatus.PENDING:
-            # Update to processing
-            queue_item.status = QueueStatus.PROCESSING
-            queue_item.processing_stage = ProcessingStage.NOT_STARTED
-            queue_item.progress_percentage = 0.0
-            db.commit()
-
-            await knowledge.process_knowledge(queue_item)
-
-            # Create notification for successful processing
-            notification = Notification(
-                user_id=queue_item.user_id,
-                type=NotificationType.KNOWLEDGE_PROCESSED,
-                title="Knowledge Processing Complete",
-                message=f"Successfully processed {queue_item.source}",
-                metadata={"queue_id": queue_item.id}
-            )
-            db.add(notification)
-            db.commit()
+        processing = asyncio.create_task(knowledge.process_knowledge(queue_item))
+        heartbeat = asyncio.create_task(keep_lease(queue_item_id, worker_id, processing))
+        try:
+            await processing
+        except asyncio.CancelledError:
+            if not _lease_lost(heartbeat):
+                raise
+            logger.warning(f"Stopped processing queue item {queue_item_id}, worker {worker_id} lost its lease")
+            return
 
-            # Send FCM notification
-            await send_fcm_notification(queue_item.user_id, notification, db)
+        # The item may have been reclaimed meanwhile; its new owner's state is left alone
+        if not queue_repo.release(queue_item_id, worker_id, QueueStatus.COMPLETED):
+            logger.warning(f"Queue item {queue_item_id} is no longer leased to worker {worker_id}, not completing it")
+            return
 
-        queue_item.status = QueueStatus.COMPLETED
+        # Create notification for successful processing
+        notification = Notification(
+            user_id=queue_item.user_id,
+            type=NotificationType.KNOWLEDGE_PROCESSED,
+            title="Knowledge Processing Complete",
+            message=f"Successfully processed {queue_item.source}",
+            metadata={"queue_id": queue_item.id}
+        )
+        db.add(notification)
         db.commit()
 
+        # Send FCM notification
+        await send_fcm_notification(queue_item.user_id, notification, db)
+
     except Exception as e:
         logger.error(f"Error processing queue item {queue_item_id}: {str(e)}")
-        if db:
-            queue_item.status = QueueStatus.FAILED
-
+        if db and queue_item and queue_repo.release(queue_item_id, worker_id, QueueStatus.FAILED, error=str(e)):
             # Create notification for failed processing
             notification = Notification(
                 user_id=queue_item.user_id,
@@ -97,9 +165,15 @@ async def process_queue_item(queue_item_id: int):
 
         raise
 
+    finally:
+        if heartbeat:
+            heartbeat.cancel()
+        if db:
+            db.close()
+
 
 async def run_processor():
-    """Single run of the processor"""
+    """Single run of the processor: claim a batch of items and process them"""
     db = None
     try:
         PROCESSOR_STATUS["is_running"] = True
@@ -107,18 +181,16 @@ async def run_processor():
 
         db = SessionLocal()
         queue_repo = KnowledgeQueueRepository(db)
-        pending_items = queue_repo.get_pending()
-
-        if pending_items:
-            # Create semaphore to limit concurrent processing to 3
-            semaphore = asyncio.Semaphore(3)
-
-            async def process_with_semaphore(item_id):
-                async with semaphore:
-                    await process_queue_item(item_id)
+        worker_id = get_worker_id()
+        claimed_items = queue_repo.claim(
+            worker_id,
+            settings.KNOWLEDGE_QUEUE_LEASE_SECONDS,
+            limit=settings.KNOWLEDGE_WORKER_CONCURRENCY,
+            max_attempts=settings.KNOWLEDGE_QUEUE_MAX_ATTEMPTS
+        )
 
-            # Process items with semaphore control
-            await asyncio.gather(*[process_with_semaphore(item.id) for item in pending_items])
+        if claimed_items:
+            await asyncio.gather(*[process_queue_item(item.id, worker_id=worker_id) for item in claimed_items])
 
         PROCESSOR_STATUS["last_run"] = datetime.utcnow().isoformat()
 
@@ -133,23 +205,135 @@ async def run_processor():
         PROCESSOR_STATUS["is_running"] = False
 
 
+def get_listen_dsn() -> Optional[str]:
+    """libpq-style DSN for the LISTEN connection, or None when the database is not Postgres"""
+    url = make_url(settings.DATABASE_URL)
+    if not url.drivername.startswith("postgres"):
+        return None
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class KnowledgeQueueConsumer:
+    """
+    Long-running knowledge queue worker.
+
+    Items are claimed with FOR UPDATE SKIP LOCKED, so any number of worker processes can
+    share the queue, and up to `concurrency` of them are processed at once per worker.
+    The consumer wakes on the NOTIFY sent by the knowledge_queue insert trigger and when a
+    slot frees up; polling every poll_interval covers missed notifications and picks up
+    items whose worker died and let its lease expire.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, poll_interval: Optional[float] = None, worker_id: Optional[str] = None):
+        self.concurrency = concurrency or settings.KNOWLEDGE_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.KNOWLEDGE_QUEUE_POLL_INTERVAL
+        self.worker_id = worker_id or get_worker_id()
+        self._wakeup = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = False
+
+    def notify(self, *args):
+        """Wake the consumer; also used as the asyncpg notification callback"""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+
+    def _claim(self, limit: int) -> List[int]:
+        db = SessionLocal()
+        try:
+            items = KnowledgeQueueRepository(db).claim(
+                self.worker_id,
+                settings.KNOWLEDGE_QUEUE_LEASE_SECONDS,
+                limit=limit,
+                max_attempts=settings.KNOWLEDGE_QUEUE_MAX_ATTEMPTS
+            )
+            return [item.id for item in items]
+        finally:
+            db.close()
+
+    async def _process(self, queue_item_id: int):
+        try:
+            await process_queue_item(queue_item_id, worker_id=self.worker_id)
+        except Exception as e:
+            logger.error(f"Worker {self.worker_id} failed queue item {queue_item_id}: {str(e)}")
+        finally:
+            # A slot is free again
+            self._wakeup.set()
+
+    async def run_once(self) -> int:
+        """Claim items for the free slots and start processing them; returns the number claimed"""
+        free_slots = self.concurrency - len(self._tasks)
+        if free_slots <= 0:
+            return 0
+
+        queue_item_ids = await asyncio.to_thread(self._claim, free_slots)
+        for queue_item_id in queue_item_ids:
+            logger.info(f"Worker {self.worker_id} claimed queue item {queue_item_id}")
+            task = asyncio.create_task(self._process(queue_item_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        PROCESSOR_STATUS["last_run"] = datetime.utcnow().isoformat()
+        return len(queue_item_ids)
+
+    async def _listen(self):
+        """Keep a LISTEN connection open on the queue channel, reconnecting after failures"""
+        dsn = get_listen_dsn()
+        if not dsn:
+            logger.info("Knowledge queue notifications need Postgres, relying on polling")
+            return
+
+        import asyncpg
+        while not self._stopping:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(KNOWLEDGE_QUEUE_CHANNEL, self.notify)
+                logger.info(f"Worker {self.worker_id} listening on {KNOWLEDGE_QUEUE_CHANNEL}")
+                # Pick up anything queued while the connection was down
+                self.notify()
+                while not self._stopping:
+                    await asyncio.sleep(self.poll_interval)
+                    # Surfaces a dropped connection, which would otherwise miss notifications silently
+                    await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Knowledge queue LISTEN connection failed, relying on polling: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+
+    async def run(self):
+        """Process queue items until stop() is called"""
+        logger.info(f"Starting knowledge queue consumer {self.worker_id} with concurrency {self.concurrency}")
+        PROCESSOR_STATUS["is_running"] = True
+        listener = asyncio.create_task(self._listen())
+        try:
+            while not self._stopping:
+                self._wakeup.clear()
+                try:
+                    await self.run_once()
+                    PROCESSOR_STATUS["error"] = None
+                except Exception as e:
+                    logger.error(f"Error claiming knowledge queue items: {str(e)}")
+                    PROCESSOR_STATUS["error"] = str(e)
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            listener.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            PROCESSOR_STATUS["is_running"] = False
+
+
 # Main entry point for running as a standalone service
 if __name__ == "__main__":
-    import time
-    
     logger.info("Starting knowledge processor service")
-    
-    async def processor_loop():
-        while True:
-            try:
-                logger.info("Running knowledge processor")
-                await run_processor()
-                logger.info("Knowledge processor completed, sleeping for 60 seconds")
-            except Exception as e:
-                logger.error(f"Error in knowledge processor loop: {str(e)}")
-            
-            # Sleep for 60 seconds before next run
-            await asyncio.sleep(60)
-    
-    # Run the processor loop
-    asyncio.run(processor_loop())
+    asyncio.run(KnowledgeQueueConsumer().run())
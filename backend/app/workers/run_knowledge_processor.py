@@ -11,14 +11,16 @@ from pathlib import Path
 # Add the parent directory to Python path to allow imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from app.workers.knowledge_processor import run_processor
+from app.workers.knowledge_processor import KnowledgeQueueConsumer
 from app.core.logger import get_logger
 from app.services.firebase import initialize_firebase
+from app.core.config import settings
+from app.knowledge.embedder_registry import embedder_registry
 
 logger = get_logger(__name__)
 
-# Configure polling interval
-POLL_INTERVAL = int(os.environ.get('POLL_INTERVAL', '10'))  # Default to 10 seconds
+# Configure the fallback polling interval; new items are normally picked up via NOTIFY
+POLL_INTERVAL = int(os.environ.get('POLL_INTERVAL', settings.KNOWLEDGE_QUEUE_POLL_INTERVAL))
 WORKER_ID = os.environ.get('GUNICORN_WORKER_ID', 'standalone')
 
 # Initialize Firebase on module load
@@ -29,34 +31,16 @@ try:
 except Exception as e:
     logger.error(f"Worker {WORKER_ID}: Failed to initialize Firebase: {e}")
 
+# Load the embedding model before the first queue item instead of during it
+if settings.EMBEDDER_WARMUP_ON_STARTUP:
+    logger.info(f"Worker {WORKER_ID}: Embedding models warmed up: {embedder_registry.warm_up()}")
+
 async def run_processor_loop():
-    """Run the knowledge processor in a continuous loop with short poll interval"""
-    logger.info(f"Worker {WORKER_ID}: Starting knowledge processor with {POLL_INTERVAL}s polling interval")
-    
+    """Run the knowledge queue consumer; it wakes on queue notifications and polls as a fallback"""
+    logger.info(f"Worker {WORKER_ID}: Starting knowledge processor with {POLL_INTERVAL}s fallback polling interval")
+
     try:
-        logger.info(f"Worker {WORKER_ID}: Starting knowledge processor loop")
-        iteration = 0
-        
-        while True:
-            iteration += 1
-            start_time = asyncio.get_event_loop().time()
-            
-            try:
-                logger.info(f"Worker {WORKER_ID}: Iteration {iteration} - Checking for pending knowledge items...")
-                await run_processor()
-                logger.info(f"Worker {WORKER_ID}: Iteration {iteration} - Processing completed successfully")
-            except Exception as e:
-                logger.error(f"Worker {WORKER_ID}: Iteration {iteration} - Error in knowledge processor: {str(e)}")
-            
-            # Calculate how long the processing took
-            elapsed = asyncio.get_event_loop().time() - start_time
-            logger.info(f"Worker {WORKER_ID}: Iteration {iteration} - Processing took {elapsed:.2f} seconds")
-            
-            # If the processing took less than the polling interval, sleep for the remainder
-            sleep_time = max(0.1, POLL_INTERVAL - elapsed)
-            logger.info(f"Worker {WORKER_ID}: Iteration {iteration} - Sleeping for {sleep_time:.2f} seconds before next check")
-            await asyncio.sleep(sleep_time)
-            
+        await KnowledgeQueueConsumer(poll_interval=POLL_INTERVAL).run()
     except Exception as e:
         logger.error(f"Worker {WORKER_ID}: Fatal error in knowledge processor: {str(e)}")
         sys.exit(1)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+ChatterMate - Vector Load Benchmark
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+# Compares rows/sec of OptimizedPgVector's batched INSERT ... VALUES path with the binary COPY
+# bulk loader, for a load into an empty table and for an upsert over the same rows.
+# Runs against DATABASE_URL (pgvector required) in a scratch table that is dropped afterwards:
+#
+#     python scripts/benchmark_vector_load.py --rows 20000 --dimensions 384
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agno.document import Document
+from agno.embedder.base import Embedder
+from app.core.config import settings
+from app.knowledge.optimized_pgvector import OptimizedPgVector
+
+
+def make_documents(rows: int, dimensions: int):
+    rng = random.Random(42)
+    return [
+        Document(
+            id=f"bench-{i}",
+            name=f"https://example.com/page-{i // 20}",
+            content=f"Benchmark chunk {i} " + "lorem ipsum dolor sit amet " * 20,
+            meta_data={"chunk": i},
+            embedding=[rng.random() for _ in range(dimensions)]
+        )
+        for i in range(rows)
+    ]
+
+
+def timed(label: str, rows: int, load) -> float:
+    start = time.perf_counter()
+    load()
+    seconds = time.perf_counter() - start
+    print(f"{label:<32} {rows:>8} rows  {seconds:>8.2f}s  {rows / seconds:>10.0f} rows/sec")
+    return rows / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pgvector document loads: INSERT ... VALUES vs binary COPY")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=100, help="Batch size of the INSERT ... VALUES path")
+    args = parser.parse_args()
+
+    vector_db = OptimizedPgVector(
+        table_name=f"bench_vector_load_{os.getpid()}",
+        db_url=settings.DATABASE_URL,
+        embedder=Embedder(dimensions=args.dimensions)
+    )
+    filters = {"org_id": "benchmark", "agent_id": []}
+    documents = make_documents(args.rows, args.dimensions)
+
+    def statement_path(load):
+        # PGVECTOR_COPY_MIN_ROWS = 0 keeps insert/upsert on the INSERT ... VALUES path
+        copy_min_rows = settings.PGVECTOR_COPY_MIN_ROWS
+        settings.PGVECTOR_COPY_MIN_ROWS = 0
+        try:
+            load(documents, filters=filters, batch_size=args.batch_size)
+        finally:
+            settings.PGVECTOR_COPY_MIN_ROWS = copy_min_rows
+
+    try:
+        vector_db.drop()
+        vector_db.create()
+        insert_rate = timed("INSERT ... VALUES (empty table)", args.rows, lambda: statement_path(vector_db.insert))
+        upsert_rate = timed("INSERT ... VALUES (upsert)", args.rows, lambda: statement_path(vector_db.upsert))
+
+        vector_db.drop()
+        vector_db.create()
+        copy_rate = timed("COPY BINARY (empty table)", args.rows, lambda: vector_db.bulk_load(documents, filters, upsert=False))
+        copy_upsert_rate = timed("COPY BINARY (upsert)", args.rows, lambda: vector_db.bulk_load(documents, filters, upsert=True))
+
+        print(f"\nSpeed-up: {copy_rate / insert_rate:.1f}x on empty tables, {copy_upsert_rate / upsert_rate:.1f}x on upserts")
+    finally:
+        vector_db.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+ChatterMate - Vector Storage Migration
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+# Converts the ai.d_<org_id> vector tables of one or all organizations to another embedding storage
+# (vector or halfvec, optionally with a binary quantized HNSW index) and records the choice in
+# organization.settings["vector_storage"], so ingestion and search use it from then on. Pooled chat
+# agents and cached knowledge searches of the organization are invalidated on every worker.
+#
+# Before migrating, the exact float32 top-k of sampled queries is recorded; recall@k and latency
+# of the indexed search are measured against it before and after, and printed side by side:
+#
+#     python scripts/migrate_vector_storage.py --org-id <uuid> --storage halfvec --binary-index
+#     python scripts/migrate_vector_storage.py --all --storage halfvec --report-only
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agno.embedder.base import Embedder
+from sqlalchemy import text
+from app.core.config import settings
+from app.database import SessionLocal
+from app.knowledge.optimized_pgvector import OptimizedPgVector, STORAGE_TYPES
+from app.knowledge.vector_storage import (
+    evaluate_search,
+    exact_top_k,
+    get_organization_storage_options,
+    migrate_table,
+    sample_queries
+)
+from app.models.organization import Organization
+from app.agents.agent_pool import invalidate_organization
+from app.tools.knowledge_search_byagent import invalidate_organization_knowledge
+
+
+def vector_dimensions(db, table_name: str) -> int:
+    """Dimensions of the table's embedding column, read from its type modifier"""
+    return db.execute(
+        text(
+            "SELECT a.atttypmod FROM pg_attribute a "
+            "WHERE a.attrelid = CAST(:table AS regclass) AND a.attname = 'embedding'"
+        ),
+        {"table": f'ai."{table_name}"'}
+    ).scalar()
+
+
+def migrate_organization(db, organization, args) -> dict:
+    table_name = f"d_{organization.id}"
+    if not db.execute(text("SELECT to_regclass(:table)"), {"table": f'ai."{table_name}"'}).scalar():
+        return {"organization": str(organization.id), "skipped": "no vector table"}
+
+    current = get_organization_storage_options(db, organization.id)
+    vector_db = OptimizedPgVector(
+        table_name=table_name,
+        db_url=settings.DATABASE_URL,
+        schema="ai",
+        # Migration and measurements work on stored embeddings, so no model needs to be loaded
+        embedder=Embedder(dimensions=vector_dimensions(db, table_name)),
+        **current
+    )
+
+    queries = sample_queries(vector_db, args.queries)
+    truth, exact_latency = exact_top_k(vector_db, queries, args.k)
+    report = {
+        "organization": str(organization.id),
+        "exact_latency_ms": exact_latency,
+        "before": evaluate_search(vector_db, queries, truth, args.k)
+    }
+    if args.report_only:
+        return report
+
+    report["migration"] = migrate_table(vector_db, args.storage, args.binary_index)
+    report["after"] = evaluate_search(vector_db, queries, truth, args.k)
+
+    organization.settings = {
+        **(organization.settings or {}),
+        "vector_storage": {"type": args.storage, "binary_index": args.binary_index}
+    }
+    db.commit()
+
+    # Pooled agent templates keep their knowledge tool, and with it the storage options it
+    # queries with; both bump Redis versions so every worker rebuilds them against the new column
+    invalidate_organization(organization.id)
+    invalidate_organization_knowledge(organization.id)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate vector tables to halfvec / binary quantized storage")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--org-id")
+    target.add_argument("--all", action="store_true", help="Migrate every organization")
+    parser.add_argument("--storage", choices=STORAGE_TYPES, default="halfvec")
+    parser.add_argument("--binary-index", action="store_true", help="Build the HNSW index over binary quantized embeddings")
+    parser.add_argument("--report-only", action="store_true", help="Only measure recall and latency of the current storage")
+    parser.add_argument("--queries", type=int, default=50, help="Sampled query vectors per organization")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        query = db.query(Organization)
+        if args.org_id:
+            query = query.filter(Organization.id == args.org_id)
+        for organization in query.all():
+            print(json.dumps(migrate_organization(db, organization, args), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
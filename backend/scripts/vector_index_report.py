@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+ChatterMate - Vector Index Report
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+# Prints row estimates, index sizes and scan counts of an organization's vector table.
+# With --build, first builds the indexes the table and its sources have grown into
+# (table-wide HNSW and full-text indexes, partial HNSW indexes of large sources):
+#
+#     python scripts/vector_index_report.py --org-id <uuid> [--build]
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agno.embedder.base import Embedder
+from sqlalchemy import text
+from app.core.config import settings
+from app.knowledge.optimized_pgvector import OptimizedPgVector
+from app.knowledge.vector_index import vector_index_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report (and optionally build) the vector indexes of an organization")
+    parser.add_argument("--org-id", required=True)
+    parser.add_argument("--build", action="store_true", help="Build missing table and per-source indexes first")
+    args = parser.parse_args()
+
+    vector_db = OptimizedPgVector(
+        table_name=f"d_{args.org_id}",
+        db_url=settings.DATABASE_URL,
+        schema="ai",
+        # Only used for index and search settings, so no model needs to be loaded
+        embedder=Embedder(dimensions=384)
+    )
+    if not vector_db.table_exists():
+        sys.exit(f"No vector table for organization {args.org_id}")
+
+    if args.build:
+        vector_index_manager.ensure_indexes(vector_db)
+        with vector_db.db_engine.connect() as conn:
+            sources = conn.execute(
+                text(f'SELECT name FROM ai."{vector_db.table_name}" GROUP BY name HAVING count(*) >= :rows'),
+                {"rows": settings.PGVECTOR_SOURCE_INDEX_MIN_ROWS}
+            ).scalars().all() if settings.PGVECTOR_SOURCE_INDEX_MIN_ROWS > 0 else []
+        for source in sources:
+            vector_index_manager.ensure_source_index(vector_db, source)
+
+    print(json.dumps(vector_index_manager.get_stats(vector_db), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
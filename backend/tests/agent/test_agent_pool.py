@@ -0,0 +1,124 @@
+"""
+ChatterMate - Test Chat Agent Pool
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock, MagicMock
+from app.agents.agent_pool import ChatAgentPool
+
+
+def make_template(**kwargs):
+    return SimpleNamespace(created_at=time.monotonic(), **kwargs)
+
+
+@pytest.fixture
+def pool():
+    with patch("app.core.redis.get_redis", return_value=None):
+        yield ChatAgentPool(max_size=2, ttl=60)
+
+
+async def get_template(pool, agent_id="agent-1", org_id="org-1", model_name="gpt-4o-mini"):
+    return await pool.get_template(
+        org_id=org_id,
+        agent_id=agent_id,
+        session_id="session-1",
+        model_type="OPENAI",
+        model_name=model_name,
+        api_key="test-key"
+    )
+
+
+@pytest.mark.asyncio
+async def test_template_is_reused(pool):
+    with patch("app.agents.chat_agent.ChatAgent.build_template", side_effect=lambda **kw: make_template()) as build:
+        first = await get_template(pool)
+        second = await get_template(pool)
+
+    assert first is second
+    assert build.call_count == 1
+    assert pool.get_stats()["hits"] == 1
+    assert pool.get_stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_model_change_builds_new_template(pool):
+    with patch("app.agents.chat_agent.ChatAgent.build_template", side_effect=lambda **kw: make_template()) as build:
+        first = await get_template(pool)
+        second = await get_template(pool, model_name="gpt-4o")
+
+    assert first is not second
+    assert build.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_agent_and_organization(pool):
+    with patch("app.agents.chat_agent.ChatAgent.build_template", side_effect=lambda **kw: make_template()) as build:
+        first = await get_template(pool)
+        pool.invalidate_agent("agent-1")
+        second = await get_template(pool)
+        pool.invalidate_organization("org-1")
+        third = await get_template(pool)
+
+    assert len({id(first), id(second), id(third)}) == 3
+    assert build.call_count == 3
+    assert pool.get_stats()["invalidations"] == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_and_evicted_templates(pool):
+    with patch("app.agents.chat_agent.ChatAgent.build_template", side_effect=lambda **kw: make_template()) as build:
+        await get_template(pool, agent_id="agent-1")
+        await get_template(pool, agent_id="agent-2")
+        await get_template(pool, agent_id="agent-3")
+        assert pool.get_stats()["size"] == 2
+
+        pool.ttl = 0
+        await get_template(pool, agent_id="agent-3")
+
+    assert build.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_create_agent_falls_back_without_template(pool):
+    with patch("app.agents.chat_agent.ChatAgent.build_template", side_effect=Exception("db down")), \
+         patch("app.agents.chat_agent.ChatAgent.create_async", new_callable=AsyncMock) as create_async:
+        await pool.create_agent(api_key="test-key", org_id="org-1", agent_id="agent-1", session_id="session-1")
+
+    assert create_async.call_args.kwargs["template"] is None
+
+
+@pytest.mark.asyncio
+async def test_shared_versions_are_read_off_the_event_loop(pool):
+    loop_thread = threading.get_ident()
+    redis_client = MagicMock()
+    redis_client.mget.side_effect = lambda *keys: (
+        [b"1", None] if threading.get_ident() != loop_thread else pytest.fail("mget ran on the event loop")
+    )
+
+    with patch("app.core.redis.get_redis", return_value=redis_client), \
+         patch("app.agents.chat_agent.ChatAgent.build_template", side_effect=lambda **kw: make_template()) as build:
+        first = await get_template(pool)
+        second = await get_template(pool)
+        redis_client.mget.side_effect = lambda *keys: [b"2", None]
+        third = await get_template(pool)
+
+    assert first is second
+    assert third is not first
+    assert build.call_count == 2
@@ -0,0 +1,75 @@
+"""
+ChatterMate - Test Agent Session Storage
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from agno.storage.agent.postgres import PostgresAgentStorage
+from agno.storage.session.agent import AgentSession
+from app.agents import agent_storage
+from app.agents.agent_storage import WindowedPostgresAgentStorage
+
+
+@pytest.fixture
+def storage():
+    # The table is only defined, never created, so any engine will do
+    return WindowedPostgresAgentStorage(table_name="agent_sessions", db_engine=create_engine("sqlite://"), num_history_runs=3)
+
+
+def make_session(run_count):
+    return AgentSession(
+        session_id="session-1",
+        agent_id="agent-1",
+        memory={"runs": [{"run_id": str(i)} for i in range(run_count)], "summaries": {}}
+    )
+
+
+def test_upsert_writes_only_the_window(storage):
+    with patch.object(PostgresAgentStorage, "upsert", side_effect=lambda session, create_and_retry=True: session) as upsert:
+        storage.upsert(make_session(5))
+
+    written = upsert.call_args.args[0]
+    assert [run["run_id"] for run in written.memory["runs"]] == ["2", "3", "4"]
+    assert written.memory["summaries"] == {}
+
+
+def test_read_slices_runs_in_the_database(storage):
+    sql = str(storage._windowed_select("session-1").compile(dialect=postgresql.dialect()))
+
+    assert "jsonb_path_query_array" in sql
+    assert sql.count(" AS memory") == 1
+
+
+def test_read_falls_back_to_full_read(storage):
+    with patch.object(storage, "_windowed_select", side_effect=Exception("no jsonpath")), \
+         patch.object(PostgresAgentStorage, "read", return_value=make_session(5)):
+        session = storage.read("session-1")
+
+    assert len(session.memory["runs"]) == 3
+
+
+def test_storage_is_built_once_over_shared_engine():
+    with patch.object(agent_storage, "_agent_storage", None), \
+         patch.object(agent_storage, "WindowedPostgresAgentStorage") as storage_class:
+        first = agent_storage.get_agent_storage()
+        second = agent_storage.get_agent_storage()
+
+    from app.database import engine
+    assert first is second
+    storage_class.assert_called_once_with(table_name="agent_sessions", db_engine=engine)
@@ -203,7 +203,7 @@ async def test_chat_agent_initialization(test_organization_id, test_agent, mock_
     with patch('app.tools.knowledge_search_byagent.AIConfigRepository') as mock_ai_config_repo, \
          patch('app.agents.chat_agent.AgentShopifyConfigRepository') as mock_shopify_config_repo, \
          patch('app.agents.chat_agent.JiraRepository') as mock_jira_repo, \
-         patch('app.agents.chat_agent.PostgresAgentStorage', return_value=MockAgentStorage()):
+         patch('app.agents.chat_agent.get_agent_storage', return_value=MockAgentStorage()):
         mock_ai_config_repo.return_value.get_active_config.return_value = None
         mock_shopify_config_repo.return_value.get_agent_shopify_config.return_value = None
         
@@ -256,7 +256,7 @@ async def test_chat_agent_get_response(test_organization_id, test_agent, test_us
     with patch('app.tools.knowledge_search_byagent.AIConfigRepository') as mock_ai_config_repo, \
          patch('app.agents.chat_agent.AgentShopifyConfigRepository') as mock_shopify_config_repo, \
          patch('app.agents.chat_agent.JiraRepository') as mock_jira_repo, \
-         patch('app.agents.chat_agent.PostgresAgentStorage', return_value=MockAgentStorage()):
+         patch('app.agents.chat_agent.get_agent_storage', return_value=MockAgentStorage()):
         mock_ai_config_repo.return_value.get_active_config.return_value = None
         mock_shopify_config_repo.return_value.get_agent_shopify_config.return_value = None
         
@@ -341,7 +341,7 @@ async def test_chat_agent_error_handling(test_organization_id, test_agent, test_
     with patch('app.tools.knowledge_search_byagent.AIConfigRepository') as mock_ai_config_repo, \
          patch('app.agents.chat_agent.AgentShopifyConfigRepository') as mock_shopify_config_repo, \
          patch('app.agents.chat_agent.JiraRepository') as mock_jira_repo, \
-         patch('app.agents.chat_agent.PostgresAgentStorage', return_value=MockAgentStorage()):
+         patch('app.agents.chat_agent.get_agent_storage', return_value=MockAgentStorage()):
         mock_ai_config_repo.return_value.get_active_config.return_value = None
         mock_shopify_config_repo.return_value.get_agent_shopify_config.return_value = None
         
@@ -0,0 +1,87 @@
+"""
+ChatterMate - Test Tool Call Limiter
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import asyncio
+import time
+import pytest
+from agno.models.openai import OpenAIChat
+from agno.tools.function import Function, FunctionCall
+from app.agents.tool_calls import ToolCallLimiter, limit_tool_call
+
+
+async def search_knowledge_base(query: str) -> str:
+    await asyncio.sleep(0.2)
+    return f"knowledge: {query}"
+
+
+async def search_products(query: str) -> str:
+    await asyncio.sleep(0.1)
+    return f"products: {query}"
+
+
+async def stuck_tool(query: str) -> str:
+    await asyncio.sleep(10)
+    return "never"
+
+
+async def run_model_step(*tools):
+    """Run one model step calling each tool once, the way agno's arun does, and time it"""
+    function_calls = []
+    for index, tool in enumerate(tools):
+        function = Function.from_callable(tool)
+        function.tool_hooks = [limit_tool_call]
+        function_calls.append(FunctionCall(function=function, arguments={"query": "shoes"}, call_id=f"call_{index}"))
+
+    results = []
+    start = time.perf_counter()
+    async for _ in OpenAIChat(id="gpt-4o-mini", api_key="test").arun_function_calls(function_calls, results):
+        pass
+    return results, time.perf_counter() - start
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_of_a_step_run_concurrently_in_order():
+    ToolCallLimiter(max_concurrency=4, timeout=5).activate()
+
+    results, elapsed = await run_model_step(search_knowledge_base, search_products)
+
+    # Results come back in call order, after about the slowest call rather than the sum
+    assert [result.content for result in results] == ["knowledge: shoes", "products: shoes"]
+    assert [result.tool_call_id for result in results] == ["call_0", "call_1"]
+    assert elapsed < 0.28
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_are_capped():
+    ToolCallLimiter(max_concurrency=1, timeout=5).activate()
+
+    results, elapsed = await run_model_step(search_knowledge_base, search_products)
+
+    assert [result.content for result in results] == ["knowledge: shoes", "products: shoes"]
+    assert elapsed >= 0.3
+
+
+@pytest.mark.asyncio
+async def test_tool_call_timeout_is_reported_to_the_model():
+    ToolCallLimiter(max_concurrency=4, timeout=0.3).activate()
+
+    results, elapsed = await run_model_step(stuck_tool, search_products)
+
+    assert results[0].content == "Error: tool 'stuck_tool' did not respond within 0.3 seconds"
+    assert results[1].content == "products: shoes"
+    assert elapsed < 1
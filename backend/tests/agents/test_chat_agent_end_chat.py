@@ -65,7 +65,7 @@ def chat_agent(mock_agent_data, mock_db):
     # Mock environment variables
     mock_env = {}
     
-    # Mock PostgresAgentStorage
+    # Mock the shared agent storage
     mock_storage = Mock()
     mock_storage.get_session_state.return_value = {"status": "active"}
     
@@ -74,7 +74,7 @@ def chat_agent(mock_agent_data, mock_db):
          patch('app.tools.knowledge_search_byagent.AIConfigRepository', return_value=mock_ai_config_repo), \
          patch('app.tools.knowledge_search_byagent.KnowledgeSearchByAgent', return_value=mock_knowledge_tool), \
          patch('app.tools.knowledge_search_byagent.decrypt_api_key', return_value="decrypted-test-key"), \
-         patch('app.agents.chat_agent.PostgresAgentStorage', return_value=mock_storage), \
+         patch('app.agents.chat_agent.get_agent_storage', return_value=mock_storage), \
          patch('app.agents.chat_agent.settings.DATABASE_URL', "mock://test"), \
          patch.dict('os.environ', mock_env, clear=True):
         
@@ -247,4 +247,74 @@ class TestChatAgentEndChat:
                 
                 # Verify agent's default setting was used
                 assert result.request_rating is True
-                assert "Would you please take a moment to rate your experience?" in result.message 
\ No newline at end of file
+                assert "Would you please take a moment to rate your experience?" in result.message 
+
+class TestChatAgentStreaming:
+
+    @pytest.mark.asyncio
+    async def test_get_response_streams_message_deltas(self, chat_agent):
+        """Test get_response passes message deltas to on_delta and still returns the parsed response"""
+        from agno.run.response import RunResponseContentEvent
+
+        chunks = ['{"message": "Hel', 'lo there', '!", "transfer_to_human": false, ', '"end_chat": false, "request_rating": false, "create_ticket": false}']
+
+        async def response_stream():
+            for chunk in chunks:
+                yield RunResponseContentEvent(content=chunk)
+
+        async def arun(**kwargs):
+            assert kwargs["stream"] is True
+            assert chat_agent.agent.parse_response is False
+            return response_stream()
+
+        deltas = []
+
+        async def on_delta(delta):
+            deltas.append(delta)
+
+        with patch('app.agents.chat_agent.SessionLocal'), \
+             patch('app.agents.chat_agent.ChatRepository') as mock_chat_repo, \
+             patch.object(chat_agent.agent, 'arun', side_effect=arun):
+            result = await chat_agent.get_response(
+                message="Hi",
+                session_id=chat_agent.session_id,
+                on_delta=on_delta
+            )
+
+        assert deltas == ["Hel", "lo there", "!"]
+        assert result.message == "Hello there!"
+        assert chat_agent.agent.parse_response is True
+        assert mock_chat_repo.return_value.queue_message.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_streamed_shopify_reply_has_urls_removed(self, chat_agent):
+        """Test product URLs split across deltas are not streamed when Shopify tools are attached"""
+        from agno.run.response import RunResponseContentEvent
+
+        chunks = ['{"message": "See htt', 'ps://shop.example.com/pro', 'ducts/shoe for', ' details", "transfer_to_human": false, ',
+                  '"end_chat": false, "request_rating": false, "create_ticket": false}']
+
+        async def response_stream():
+            for chunk in chunks:
+                yield RunResponseContentEvent(content=chunk)
+
+        async def arun(**kwargs):
+            return response_stream()
+
+        deltas = []
+
+        async def on_delta(delta):
+            deltas.append(delta)
+
+        chat_agent.shopify_tools = Mock()
+        with patch('app.agents.chat_agent.SessionLocal'), \
+             patch('app.agents.chat_agent.ChatRepository'), \
+             patch.object(chat_agent.agent, 'arun', side_effect=arun):
+            await chat_agent.get_response(
+                message="Show me shoes",
+                session_id=chat_agent.session_id,
+                on_delta=on_delta
+            )
+
+        assert "".join(deltas) == "See [link removed] for details"
+        assert not any("shop.example.com" in delta or "ducts" in delta for delta in deltas)
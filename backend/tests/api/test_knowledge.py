@@ -27,6 +27,7 @@ from app.models.permission import Permission, role_permissions
 from app.models.knowledge import Knowledge, SourceType
 from app.models.knowledge_queue import KnowledgeQueue, QueueStatus
 from app.models.knowledge_to_agent import KnowledgeToAgent
+from app.models.knowledge_page import KnowledgePage
 from app.models.agent import Agent, AgentType
 from uuid import UUID, uuid4
 from app.api import knowledge as knowledge_router
@@ -252,6 +253,26 @@ def test_link_knowledge_to_agent(client: TestClient, test_knowledge, test_agent)
     data = response.json()
     assert data["message"] == "Knowledge linked to agent successfully"
 
+def test_link_does_not_touch_vector_rows(client: TestClient, test_knowledge, test_agent, db):
+    """Linking only records the agent link; the source's vector table is never queried"""
+    test_knowledge.table_name = "d_missing"
+    test_knowledge.schema = "ai"
+    db.commit()
+
+    response = client.post(
+        "/api/v1/knowledge/link",
+        params={
+            "knowledge_id": test_knowledge.id,
+            "agent_id": str(test_agent.id)
+        }
+    )
+
+    assert response.status_code == 200
+    assert db.query(KnowledgeToAgent).filter(
+        KnowledgeToAgent.knowledge_id == test_knowledge.id,
+        KnowledgeToAgent.agent_id == test_agent.id
+    ).count() == 1
+
 def test_unlink_knowledge_from_agent(client: TestClient, test_knowledge, test_agent, db):
     """Test unlinking knowledge from an agent"""
     # First link the knowledge
@@ -314,6 +335,28 @@ def test_get_knowledge_by_organization(client: TestClient, test_knowledge, test_
     assert data["pagination"]["page"] == 1
     assert data["pagination"]["page_size"] == 10
 
+def test_knowledge_listing_reads_page_catalog(client: TestClient, test_knowledge, test_organization, db):
+    """Subpages come from knowledge_pages; the (here missing) vector table is not scanned"""
+    test_knowledge.table_name = "d_missing"
+    test_knowledge.schema = "ai"
+    db.add_all([
+        KnowledgePage(organization_id=test_organization.id, source="test.pdf", subpage="test_1", chunk_count=3,
+                      created_at=datetime(2026, 1, 1, tzinfo=timezone.utc)),
+        KnowledgePage(organization_id=test_organization.id, source="test.pdf", subpage="test_2", chunk_count=1),
+    ])
+    db.commit()
+
+    response = client.get(
+        f"/api/v1/knowledge/organization/{test_organization.id}",
+        params={"page": 1, "page_size": 10}
+    )
+
+    assert response.status_code == 200
+    knowledge = response.json()["knowledge"][0]
+    assert "error" not in knowledge
+    assert [(page["subpage"], page["chunk_count"]) for page in knowledge["pages"]] == [("test_1", 3), ("test_2", 1)]
+    assert knowledge["pages"][0]["created_at"].startswith("2026-01-01")
+
 def test_get_queue_status(client: TestClient, test_knowledge_queue):
     """Test getting queue status"""
     response = client.get(f"/api/v1/knowledge/queue/{test_knowledge_queue.id}")
@@ -421,4 +464,33 @@ def test_get_nonexistent_queue(client: TestClient):
     assert response.status_code == 200  # API returns 200 with error message
     data = response.json()
     assert "error" in data
-    assert data["error"] == "Queue item not found" 
\ No newline at end of file
+    assert data["error"] == "Queue item not found" 
+def test_explore_progress_paginates_crawled_urls(client: TestClient, db: Session, test_knowledge_queue):
+    """Test that progress reads crawled URLs page by page"""
+    from app.repositories.knowledge_queue import KnowledgeQueueRepository
+    urls = [f"https://example.com/{i}" for i in range(5)]
+    KnowledgeQueueRepository(db).add_crawled_urls(test_knowledge_queue.id, urls)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/knowledge/explore/progress/{test_knowledge_queue.id}",
+        params={"offset": 2, "limit": 2}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["crawled_urls"] == urls[2:4]
+    assert data["crawled_count"] == 5
+    assert data["crawled_url"] == urls[-1]
+
+def test_explore_progress_reads_legacy_crawled_urls(client: TestClient, db: Session, test_knowledge_queue):
+    """Test that queue items from before knowledge_queue_urls still report their URLs"""
+    test_knowledge_queue.crawled_urls = ["https://example.com/a", {"url": "https://example.com/b"}]
+    db.commit()
+
+    response = client.get(f"{settings.API_V1_STR}/knowledge/explore/progress/{test_knowledge_queue.id}")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["crawled_urls"] == ["https://example.com/a", "https://example.com/b"]
+    assert data["crawled_url"] == "https://example.com/b"
+    assert data["crawled_count"] == 2
@@ -16,6 +16,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from app.models.widget import Widget
@@ -114,13 +115,13 @@ def mock_sio():
     return mock
 
 @pytest.mark.asyncio
-async def test_widget_connect(db, test_widget, test_ai_config, test_customer, mock_sio, monkeypatch):
+async def test_widget_connect(db, async_db, test_widget, test_ai_config, test_customer, mock_sio, monkeypatch):
     """Test widget connection handler"""
     from app.api import widget_chat
     
     # Mock dependencies
     monkeypatch.setattr(widget_chat, "sio", mock_sio)
-    monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+    monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
     
     # Mock authentication
     conversation_token = "test_token"
@@ -136,25 +137,25 @@ async def test_widget_connect(db, test_widget, test_ai_config, test_customer, mo
         AsyncMock(return_value=mock_auth_result)
     )
     
-    # Mock WidgetRepository.get_widget to return our test widget
+    # Mock AsyncWidgetRepository.get_widget to return our test widget
     monkeypatch.setattr(
-        "app.repositories.widget.WidgetRepository.get_widget",
-        lambda self, widget_id: test_widget
+        "app.repositories.widget.AsyncWidgetRepository.get_widget",
+        AsyncMock(return_value=test_widget)
     )
     
-    # Mock AIConfigRepository
+    # Mock AsyncAIConfigRepository
     mock_ai_config_repo = MagicMock()
-    mock_ai_config_repo.get_active_config.return_value = test_ai_config
-    monkeypatch.setattr(widget_chat, "AIConfigRepository", lambda db: mock_ai_config_repo)
+    mock_ai_config_repo.get_active_config = AsyncMock(return_value=test_ai_config)
+    monkeypatch.setattr(widget_chat, "AsyncAIConfigRepository", lambda db: mock_ai_config_repo)
     
     # Mock get_active_customer_session to return None
     monkeypatch.setattr(
-        "app.repositories.session_to_agent.SessionToAgentRepository.get_active_customer_session",
-        lambda self, customer_id, agent_id=None: None
+        "app.repositories.session_to_agent.AsyncSessionToAgentRepository.get_active_customer_session",
+        AsyncMock(return_value=None)
     )
     
     # Mock create_session to handle UUID conversion
-    def mock_create_session(self, session_id, agent_id, customer_id, organization_id, **kwargs):
+    async def mock_create_session(self, session_id, agent_id, customer_id, organization_id, **kwargs):
         session = SessionToAgent(
             session_id=session_id if isinstance(session_id, UUID) else UUID(session_id),
             agent_id=agent_id if isinstance(agent_id, UUID) else UUID(str(agent_id)),
@@ -163,11 +164,11 @@ async def test_widget_connect(db, test_widget, test_ai_config, test_customer, mo
             status=SessionStatus.OPEN
         )
         self.db.add(session)
-        self.db.commit()
+        await self.db.commit()
         return session
     
     monkeypatch.setattr(
-        "app.repositories.session_to_agent.SessionToAgentRepository.create_session",
+        "app.repositories.session_to_agent.AsyncSessionToAgentRepository.create_session",
         mock_create_session
     )
     
@@ -193,13 +194,14 @@ async def test_widget_connect(db, test_widget, test_ai_config, test_customer, mo
     assert session_data["conversation_token"] == conversation_token
 
 @pytest.mark.asyncio
-async def test_widget_chat_message(db, test_widget, test_ai_config, test_customer, mock_sio, monkeypatch):
+async def test_widget_chat_message(db, async_db, test_widget, test_ai_config, test_customer, mock_sio, monkeypatch):
     """Test widget chat message handler"""
     from app.api import widget_chat
     
     # Mock dependencies
     monkeypatch.setattr(widget_chat, "sio", mock_sio)
-    monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+    monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+    monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
     
     # Create a test session
     session_id = uuid4()
@@ -214,7 +216,7 @@ async def test_widget_chat_message(db, test_widget, test_ai_config, test_custome
     )
     
     # Create a test session
-    from app.repositories.session_to_agent import SessionToAgentRepository
+    from app.repositories.session_to_agent import SessionToAgentRepository, AsyncSessionToAgentRepository
     session_repo = SessionToAgentRepository(db)
     session_repo.create_session(
         session_id=session_id,
@@ -244,9 +246,9 @@ async def test_widget_chat_message(db, test_widget, test_ai_config, test_custome
     mock_session.user_id = None
     mock_session.workflow_id = None  # Explicitly set to None to avoid workflow path
     monkeypatch.setattr(
-        SessionToAgentRepository,
+        AsyncSessionToAgentRepository,
         "get_active_customer_session",
-        lambda self, customer_id, agent_id=None: mock_session
+        AsyncMock(return_value=mock_session)
     )
     
     # Test chat message
@@ -275,7 +277,7 @@ async def test_widget_chat_message(db, test_widget, test_ai_config, test_custome
     mock_result.should_continue = True
     mock_workflow_execution.execute_workflow = AsyncMock(return_value=mock_result)
     
-    with patch("app.api.widget_chat.ChatAgent.create_async", AsyncMock(return_value=mock_chat_agent)), \
+    with patch("app.api.widget_chat.agent_pool.create_agent", AsyncMock(return_value=mock_chat_agent)), \
          patch("app.api.widget_chat.WorkflowExecutionService", return_value=mock_workflow_execution):
         await widget_chat.handle_widget_chat(sid, data)
     
@@ -299,13 +301,14 @@ async def test_widget_chat_message(db, test_widget, test_ai_config, test_custome
     assert kwargs['namespace'] == '/widget', f"Expected namespace='/widget' but got {kwargs['namespace']}"
 
 @pytest.mark.asyncio
-async def test_widget_chat_history(db, test_widget, test_customer, mock_sio, monkeypatch):
+async def test_widget_chat_history(db, async_db, test_widget, test_customer, mock_sio, monkeypatch):
     """Test widget chat history handler"""
     from app.api import widget_chat
     
     # Mock dependencies
     monkeypatch.setattr(widget_chat, "sio", mock_sio)
-    monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+    monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+    monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
     
     # Create a test session
     session_id = uuid4()
@@ -320,7 +323,7 @@ async def test_widget_chat_history(db, test_widget, test_customer, mock_sio, mon
     )
     
     # Create a test session
-    from app.repositories.session_to_agent import SessionToAgentRepository
+    from app.repositories.session_to_agent import SessionToAgentRepository, AsyncSessionToAgentRepository
     session_repo = SessionToAgentRepository(db)
     session_repo.create_session(
         session_id=session_id,
@@ -392,19 +395,20 @@ async def test_agent_connect(db, mock_sio, monkeypatch):
     assert session_data["organization_id"] == str(org_id)
 
 @pytest.mark.asyncio
-async def test_agent_message(db, test_widget, test_customer, test_user, mock_sio, monkeypatch):
+async def test_agent_message(db, async_db, test_widget, test_customer, test_user, mock_sio, monkeypatch):
     """Test agent message handler"""
     from app.api import widget_chat
     
     # Mock dependencies
     monkeypatch.setattr(widget_chat, "sio", mock_sio)
-    monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+    monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+    monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
     
     # Create a test session
     session_id = uuid4()
     
     # Create a test session
-    from app.repositories.session_to_agent import SessionToAgentRepository
+    from app.repositories.session_to_agent import SessionToAgentRepository, AsyncSessionToAgentRepository
     session_repo = SessionToAgentRepository(db)
     session = session_repo.create_session(
         session_id=session_id,
@@ -435,7 +439,7 @@ async def test_agent_message(db, test_widget, test_customer, test_user, mock_sio
     mock_session.customer_id = str(test_customer.id)
     mock_session.organization_id = str(test_widget.organization_id)
     
-    with patch("app.repositories.session_to_agent.SessionToAgentRepository.get_session", return_value=mock_session):
+    with patch("app.repositories.session_to_agent.AsyncSessionToAgentRepository.get_session", return_value=mock_session):
         await widget_chat.handle_agent_message(sid, data)
     
     # Check for error message first, then for success
@@ -468,4 +472,45 @@ async def test_agent_message(db, test_widget, test_customer, test_user, mock_sio
             
             # Check that the room and namespace are correct
             assert call_args[1]['room'] == str(session_id)
-            assert call_args[1]['namespace'] == '/widget'
\ No newline at end of file
+            assert call_args[1]['namespace'] == '/widget'
+@pytest.mark.asyncio
+async def test_rating_submission_queries_off_the_event_loop(mock_sio, monkeypatch):
+    """Test that a slow sync query of the rating handler does not stall other sockets"""
+    import time
+    from app.api import widget_chat
+
+    monkeypatch.setattr(widget_chat, "sio", mock_sio)
+    monkeypatch.setattr(widget_chat, "SessionLocal", MagicMock)
+    monkeypatch.setattr(
+        widget_chat,
+        "authenticate_socket_conversation_token",
+        AsyncMock(return_value=("widget", "org", "customer", "token"))
+    )
+    mock_sio.get_session.return_value = {
+        "widget_id": "widget", "org_id": "org", "customer_id": "customer", "session_id": str(uuid4())
+    }
+
+    def slow_get_session(session_id):
+        time.sleep(0.2)
+        return MagicMock(user_id=None)
+
+    ticks = 0
+
+    async def other_socket():
+        nonlocal ticks
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    with patch("app.api.widget_chat.SessionToAgentRepository") as session_repo_class, \
+         patch("app.api.widget_chat.RatingRepository"):
+        session_repo_class.return_value.get_session.side_effect = slow_get_session
+        handler = asyncio.create_task(widget_chat.handle_rating_submission("sid", {"rating": 5}))
+        await other_socket()
+        # The other socket got its turns while the handler was still waiting on the query
+        handler_done_first = handler.done()
+        await handler
+
+    assert ticks == 10
+    assert not handler_done_first
+    assert mock_sio.emit.call_args_list[0][0][0] == 'rating_submitted'
@@ -28,8 +28,8 @@ from app.models.session_to_agent import SessionToAgent, SessionStatus
 
 from app.repositories.agent import AgentRepository
 from app.repositories.widget import WidgetRepository
-from app.repositories.session_to_agent import SessionToAgentRepository
-from app.repositories.chat import ChatRepository
+from app.repositories.session_to_agent import SessionToAgentRepository, AsyncSessionToAgentRepository
+from app.repositories.chat import ChatRepository, AsyncChatRepository
 from app.models.schemas.widget import WidgetCreate
 from app.core.security import encrypt_api_key
 from uuid import UUID, uuid4
@@ -211,7 +211,7 @@ class TestHandleWidgetChat:
         from app.api import widget_chat
         
         monkeypatch.setattr(widget_chat, "sio", mock_sio)
-        monkeypatch.setattr(widget_chat, "get_db", lambda: iter([MagicMock()]))
+        monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: AsyncMock())
         
         # Mock successful authentication but mismatched session data
         mock_auth_result = (str(test_widget.id), str(test_widget.organization_id), str(test_customer.id), "token")
@@ -242,12 +242,13 @@ class TestHandleWidgetChat:
         )
     
     @pytest.mark.asyncio
-    async def test_handle_widget_chat_no_active_session(self, mock_sio, monkeypatch, test_widget, test_customer, db):
+    async def test_handle_widget_chat_no_active_session(self, mock_sio, monkeypatch, test_widget, test_customer, db, async_db):
         """Test widget chat when no active session exists"""
         from app.api import widget_chat
         
         monkeypatch.setattr(widget_chat, "sio", mock_sio)
-        monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+        monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+        monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
         
         session_id = uuid4()
         mock_auth_result = (str(test_widget.id), str(test_widget.organization_id), str(test_customer.id), "token")
@@ -265,8 +266,8 @@ class TestHandleWidgetChat:
         )
         
         # Mock no active session found
-        with patch.object(SessionToAgentRepository, 'get_active_customer_session', return_value=None):
-            with patch.object(SessionToAgentRepository, 'get_latest_customer_session', return_value=None):
+        with patch.object(AsyncSessionToAgentRepository, 'get_active_customer_session', return_value=None):
+            with patch.object(AsyncSessionToAgentRepository, 'get_latest_customer_session', return_value=None):
                 sid = "test_sid"
                 data = {"message": "Hello"}
                 
@@ -281,12 +282,13 @@ class TestHandleWidgetChat:
                 )
     
     @pytest.mark.asyncio
-    async def test_handle_widget_chat_workflow_execution(self, mock_sio, monkeypatch, test_widget, test_customer, test_workflow, test_ai_config, db):
+    async def test_handle_widget_chat_workflow_execution(self, mock_sio, monkeypatch, test_widget, test_customer, test_workflow, test_ai_config, db, async_db):
         """Test widget chat with workflow execution"""
         from app.api import widget_chat
         
         monkeypatch.setattr(widget_chat, "sio", mock_sio)
-        monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+        monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+        monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
         
         session_id = uuid4()
         mock_auth_result = (str(test_widget.id), str(test_widget.organization_id), str(test_customer.id), "token")
@@ -322,7 +324,7 @@ class TestHandleWidgetChat:
         mock_workflow_result.end_conversation = False
         mock_workflow_result.transfer_to_human = False
         
-        with patch.object(SessionToAgentRepository, 'get_active_customer_session', return_value=mock_session):
+        with patch.object(AsyncSessionToAgentRepository, 'get_active_customer_session', return_value=mock_session):
             with patch.object(ChatRepository, 'create_message', return_value=MagicMock()):
                 with patch('app.api.widget_chat.WorkflowChatService') as mock_workflow_chat_service:
                     mock_workflow_chat_service.return_value.handle_workflow_chat = AsyncMock(return_value=mock_workflow_result)
@@ -399,12 +401,13 @@ class TestGetWidgetChatHistory:
         )
     
     @pytest.mark.asyncio
-    async def test_get_widget_chat_history_no_active_session(self, mock_sio, monkeypatch, test_widget, test_customer, db):
+    async def test_get_widget_chat_history_no_active_session(self, mock_sio, monkeypatch, test_widget, test_customer, db, async_db):
         """Test get chat history when no active session exists"""
         from app.api import widget_chat
         
         monkeypatch.setattr(widget_chat, "sio", mock_sio)
-        monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+        monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+        monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
         
         mock_auth_result = (str(test_widget.id), str(test_widget.organization_id), str(test_customer.id), "token")
         mock_sio.get_session.return_value = {
@@ -420,7 +423,7 @@ class TestGetWidgetChatHistory:
         )
         
         # Mock no active session found
-        with patch.object(SessionToAgentRepository, 'get_active_customer_session', return_value=None):
+        with patch.object(AsyncSessionToAgentRepository, 'get_active_customer_session', return_value=None):
             sid = "test_sid"
             
             await widget_chat.get_widget_chat_history(sid)
@@ -434,12 +437,13 @@ class TestGetWidgetChatHistory:
             )
     
     @pytest.mark.asyncio
-    async def test_get_widget_chat_history_success(self, mock_sio, monkeypatch, test_widget, test_customer, test_session, db):
+    async def test_get_widget_chat_history_success(self, mock_sio, monkeypatch, test_widget, test_customer, test_session, db, async_db):
         """Test get chat history success case"""
         from app.api import widget_chat
         
         monkeypatch.setattr(widget_chat, "sio", mock_sio)
-        monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+        monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+        monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
         
         mock_auth_result = (str(test_widget.id), str(test_widget.organization_id), str(test_customer.id), "token")
         mock_sio.get_session.return_value = {
@@ -471,8 +475,8 @@ class TestGetWidgetChatHistory:
         mock_message2.user = None
         mock_message2.agent = None
         
-        with patch.object(SessionToAgentRepository, 'get_active_customer_session', return_value=test_session):
-            with patch.object(ChatRepository, 'get_session_history', return_value=[mock_message1, mock_message2]):
+        with patch.object(AsyncSessionToAgentRepository, 'get_active_customer_session', return_value=test_session):
+            with patch.object(AsyncChatRepository, 'get_session_history', return_value=[mock_message1, mock_message2]):
                 with patch('app.api.widget_chat.format_datetime', return_value="2024-01-01T00:00:00Z"):
                     sid = "test_sid"
                     
@@ -506,12 +510,13 @@ class TestGetWidgetChatHistory:
                     )
     
     @pytest.mark.asyncio
-    async def test_get_widget_chat_history_database_error(self, mock_sio, monkeypatch, test_widget, test_customer, db):
+    async def test_get_widget_chat_history_database_error(self, mock_sio, monkeypatch, test_widget, test_customer, db, async_db):
         """Test get chat history with database error"""
         from app.api import widget_chat
         
         monkeypatch.setattr(widget_chat, "sio", mock_sio)
-        monkeypatch.setattr(widget_chat, "get_db", lambda: iter([db]))
+        monkeypatch.setattr(widget_chat, "AsyncSessionLocal", lambda: async_db)
+        monkeypatch.setattr(widget_chat, "SessionLocal", lambda: db)
         
         mock_auth_result = (str(test_widget.id), str(test_widget.organization_id), str(test_customer.id), "token")
         mock_sio.get_session.return_value = {
@@ -527,7 +532,7 @@ class TestGetWidgetChatHistory:
         )
         
         # Mock database error
-        with patch.object(SessionToAgentRepository, 'get_active_customer_session', side_effect=Exception("Database error")):
+        with patch.object(AsyncSessionToAgentRepository, 'get_active_customer_session', side_effect=Exception("Database error")):
             sid = "test_sid"
             
             await widget_chat.get_widget_chat_history(sid)
@@ -21,6 +21,7 @@ import uuid
 from sqlalchemy import create_engine, event, DDL
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import Base
 from typing import Generator
 from sqlalchemy.schema import CreateTable, Table
@@ -91,6 +92,19 @@ def db() -> Generator:
         # Drop all tables after test
         Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture
+def async_db(db) -> AsyncSession:
+    """AsyncSession over the test session, for code using the async repositories.
+    pysqlite is a sync driver so the async calls simply run inline on `db`."""
+    session = AsyncSession(sync_session_class=lambda **kwargs: db)
+
+    async def close():
+        # `db` owns the connection; handlers closing their session must not detach fixtures
+        pass
+
+    session.close = close
+    return session
+
 @pytest.fixture
 def test_organization(db) -> Organization:
     """Create a test organization"""
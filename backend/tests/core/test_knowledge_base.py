@@ -70,7 +70,8 @@ def knowledge_manager(mock_db, mock_ai_config, mock_vector_db):
          patch('app.knowledge.knowledge_base.AIConfigRepository') as mock_ai_config_repo, \
          patch('app.knowledge.knowledge_base.OptimizedPgVector') as mock_pg_vector, \
          patch('app.knowledge.knowledge_base.KnowledgeRepository') as mock_knowledge_repo, \
-         patch('app.knowledge.knowledge_base.KnowledgeToAgentRepository') as mock_link_repo:
+         patch('app.knowledge.knowledge_base.KnowledgeToAgentRepository') as mock_link_repo, \
+         patch('app.knowledge.knowledge_base.get_embedder'):
         
         # Configure basic mocks
         mock_session_local.return_value.__enter__.return_value = mock_db
@@ -156,21 +157,19 @@ async def test_add_pdf_files_success(knowledge_manager, mock_knowledge):
     # Setup
     files = ["/path/to/test.pdf"]
     
-    with patch('app.knowledge.knowledge_base.PDFKnowledgeBase') as mock_pdf_kb, \
-         patch('app.knowledge.knowledge_base.PDFImageReader') as mock_pdf_reader, \
+    with patch('app.knowledge.knowledge_base.ingest_pdf') as mock_ingest_pdf, \
+         patch('app.knowledge.knowledge_base.PDFKnowledgeBase') as mock_pdf_kb, \
          patch.object(knowledge_manager, '_add_knowledge_source', return_value=mock_knowledge) as mock_add_source:
-        # Configure mocks
-        mock_pdf_kb_instance = MagicMock()
-        mock_pdf_kb.return_value = mock_pdf_kb_instance
-        
         # Execute
         result = await knowledge_manager.add_pdf_files(files)
         
         # Assert
         assert result is True
-        mock_pdf_kb.assert_called_once()
-        mock_pdf_kb_instance.load.assert_called_once()
-        mock_add_source.assert_called_once()
+        mock_pdf_kb.assert_not_called()
+        args = mock_ingest_pdf.call_args.args
+        assert args[:3] == ("/path/to/test.pdf", "test", knowledge_manager.vector_db)
+        assert args[3]["name"] == "test"
+        mock_add_source.assert_called_once_with("test", SourceType.FILE)
 
 def test_get_knowledge_base_for_agent(knowledge_manager, mock_knowledge):
     """Test getting knowledge base for a specific agent"""
@@ -227,7 +226,8 @@ async def test_process_knowledge_pdf_file(knowledge_manager):
     with patch.object(knowledge_manager, 'add_pdf_files') as mock_add_pdf_files, \
          patch('os.path.exists') as mock_exists, \
          patch('os.remove') as mock_remove, \
-         patch('app.knowledge.knowledge_base.KnowledgeQueueRepository') as mock_queue_repo_cls:
+         patch('app.knowledge.knowledge_base.KnowledgeQueueRepository') as mock_queue_repo_cls, \
+         patch('app.knowledge.knowledge_base.vector_index_manager') as mock_index_manager:
         # Configure mocks
         mock_add_pdf_files.return_value = True
         mock_exists.return_value = True
@@ -244,6 +244,7 @@ async def test_process_knowledge_pdf_file(knowledge_manager):
         mock_add_pdf_files.assert_called_once_with([queue_item.source])
         mock_exists.assert_called_once_with(queue_item.source)
         mock_remove.assert_called_once_with(queue_item.source)
+        mock_index_manager.ensure_indexes.assert_called_once_with(knowledge_manager.vector_db, None)
 
 @pytest.mark.asyncio
 async def test_process_knowledge_unsupported_type(knowledge_manager):
@@ -0,0 +1,45 @@
+"""
+ChatterMate - Test Chunk Deduplication
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from agno.document import Document
+from app.knowledge.chunk_dedup import ChunkDeduplicator, lsh_bands
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_near_duplicates_are_matched_to_the_kept_chunk():
+    deduplicator = ChunkDeduplicator(threshold=0.8, num_perm=128)
+
+    assert deduplicator.check(Document(id="a", content=words("w", 300))) is None
+    assert deduplicator.check(Document(id="b", content=words("w", 300) + " and a short footer")) == "a"
+    assert deduplicator.check(Document(id="c", content=words("other", 300))) is None
+    # Half of a kept chunk is similar, not a near-duplicate
+    assert deduplicator.check(Document(id="d", content=words("w", 150))) is None
+
+    stats = deduplicator.get_stats()
+    assert stats["chunks"] == 4
+    assert stats["duplicates"] == stats["embeddings_saved"] == 1
+
+
+def test_lsh_bands_keep_candidates_at_the_threshold():
+    for threshold in (0.5, 0.8, 0.9, 0.95):
+        bands, rows = lsh_bands(128, threshold)
+        assert bands * rows <= 128
+        assert (1 / bands) ** (1 / rows) <= threshold
@@ -0,0 +1,59 @@
+"""
+ChatterMate - Test Crawl Progress
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from app.knowledge.crawl_progress import CrawledUrlBuffer
+
+
+@pytest.fixture
+def repo():
+    repo = MagicMock()
+    repo.add_crawled_urls.side_effect = lambda queue_id, urls: len(urls)
+    with patch("app.knowledge.crawl_progress.SessionLocal"), \
+         patch("app.knowledge.crawl_progress.KnowledgeQueueRepository", return_value=repo):
+        yield repo
+
+
+def test_urls_are_written_in_batches(repo):
+    buffer = CrawledUrlBuffer(queue_id=7, flush_size=3, flush_interval=60)
+
+    for i in range(4):
+        buffer.add(f"https://example.com/{i}")
+
+    repo.add_crawled_urls.assert_called_once_with(7, ["https://example.com/0", "https://example.com/1", "https://example.com/2"])
+    assert buffer.flush() == 1
+    assert buffer.flush() == 0
+    assert repo.add_crawled_urls.call_count == 2
+
+
+def test_slow_crawls_flush_after_interval(repo):
+    buffer = CrawledUrlBuffer(queue_id=7, flush_size=100, flush_interval=0)
+
+    buffer.add("https://example.com/")
+
+    repo.add_crawled_urls.assert_called_once_with(7, ["https://example.com/"])
+
+
+def test_write_failures_do_not_raise(repo):
+    repo.add_crawled_urls.side_effect = Exception("db down")
+    buffer = CrawledUrlBuffer(queue_id=7, flush_size=1)
+
+    buffer.add("https://example.com/")
+
+    assert buffer.flush() == 0
@@ -0,0 +1,95 @@
+"""
+ChatterMate - Test Embedder Registry
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import copy
+import pytest
+import numpy as np
+from unittest.mock import patch
+from app.core.config import settings
+from agno.document import Document
+from app.knowledge.embedder_registry import EmbedderRegistry, embed_documents
+
+
+class FakeTextEmbedding:
+    loads = 0
+
+    def __init__(self, model_name):
+        FakeTextEmbedding.loads += 1
+        self.model_name = model_name
+
+    def embed(self, texts, batch_size=256):
+        for text in [texts] if isinstance(texts, str) else texts:
+            yield np.full(8, float(len(text)))
+
+
+@pytest.fixture
+def registry():
+    FakeTextEmbedding.loads = 0
+    with patch("fastembed.TextEmbedding", FakeTextEmbedding):
+        yield EmbedderRegistry()
+
+
+def test_model_is_loaded_once_and_shared(registry):
+    first = registry.get()
+    second = registry.get(settings.FASTEMBED_MODEL)
+
+    assert first is second
+    assert copy.deepcopy(first) is first
+    assert first.id == settings.FASTEMBED_MODEL
+    assert first.dimensions == 8
+
+    assert first.get_embedding("abc") == [3.0] * 8
+    assert first.get_embedding("abcd") == [4.0] * 8
+    assert FakeTextEmbedding.loads == 1
+
+
+def test_warm_up_reports_stats(registry):
+    stats = registry.warm_up(["model-a", "model-b"])
+
+    assert set(stats["models"]) == {"model-a", "model-b"}
+    assert stats["models"]["model-a"]["dimensions"] == 8
+    assert stats["models"]["model-a"]["embeddings"] == 0
+    assert FakeTextEmbedding.loads == 2
+
+
+def test_warm_up_failure_is_logged_not_raised(registry):
+    with patch("fastembed.TextEmbedding", side_effect=Exception("download failed")):
+        stats = registry.warm_up()
+
+    assert stats["models"] == {}
+
+
+def test_embed_documents_uses_one_batch_call(registry):
+    embedder = registry.get()
+    documents = [Document(content="a"), Document(content="abc"), Document(content="xy", embedding=[0.0])]
+
+    with patch.object(embedder.model, "embed", wraps=embedder.model.embed) as embed:
+        assert embed_documents(documents, embedder) == 2
+
+    embed.assert_called_once_with(["a", "abc"], batch_size=2)
+    assert [d.embedding[0] for d in documents] == [1.0, 3.0, 0.0]
+
+
+def test_embed_documents_falls_back_to_single_calls(registry):
+    embedder = registry.get()
+    documents = [Document(content="a"), Document(content="abc")]
+
+    with patch.object(type(embedder), "get_embeddings", side_effect=Exception("batch failed")):
+        assert embed_documents(documents, embedder) == 2
+
+    assert [d.embedding[0] for d in documents] == [1.0, 3.0]
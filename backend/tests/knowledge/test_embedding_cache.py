@@ -0,0 +1,89 @@
+"""
+ChatterMate - Test Embedding Cache
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from datetime import datetime, timedelta, timezone
+from agno.document import Document
+from sqlalchemy.orm import sessionmaker
+from app.knowledge.embedder_registry import embed_documents
+from app.knowledge.embedding_cache import EmbeddingCache, content_hash
+from app.models.embedding_cache import EmbeddingCacheEntry
+from app.repositories.embedding_cache import EmbeddingCacheRepository
+
+
+class CountingEmbedder:
+    id = "test-model"
+
+    def __init__(self):
+        self.texts = []
+
+    def get_embeddings(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+def cache_for(db, **kwargs):
+    return EmbeddingCache(session_factory=sessionmaker(bind=db.get_bind()), **kwargs)
+
+
+def test_identical_chunks_are_embedded_once(db):
+    cache = cache_for(db, memory_items=0)
+    embedder = CountingEmbedder()
+    documents = [Document(content="footer"), Document(content="page one"), Document(content="footer")]
+
+    assert embed_documents(documents, embedder, cache) == 3
+    assert embedder.texts == ["footer", "page one"]
+    assert documents[2].embedding == [6.0, 0.5]
+
+    # A re-ingestion (or another source) with the same chunks is served from the table
+    again = [Document(content="page one"), Document(content="page two")]
+    assert embed_documents(again, embedder, cache) == 2
+    assert embedder.texts == ["footer", "page one", "page two"]
+    assert again[0].embedding == [8.0, 0.5]
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_cache_is_keyed_by_model(db):
+    cache = cache_for(db)
+    cache.put_many("model-a", {content_hash("text"): [1.0]})
+
+    assert cache.get_many("model-a", [content_hash("text")]) == {content_hash("text"): [1.0]}
+    assert cache.get_many("model-b", [content_hash("text")]) == {}
+
+
+def test_least_recently_used_rows_are_evicted(db):
+    repo = EmbeddingCacheRepository(db)
+    repo.put_many("model", {key: (1, b"\x00\x00\x80?") for key in ("a", "b", "c")})
+    now = datetime.now(timezone.utc)
+    for age, key in enumerate(("c", "b", "a")):
+        db.query(EmbeddingCacheEntry).filter(EmbeddingCacheEntry.content_hash == key)\
+            .update({EmbeddingCacheEntry.last_used_at: now - timedelta(minutes=age)})
+    db.commit()
+
+    assert repo.evict(2) == 1
+    assert set(repo.get_many("model", ["a", "b", "c"])) == {"b", "c"}
+
+
+def test_lookup_failures_fall_back_to_embedding():
+    def broken_session():
+        raise Exception("db down")
+
+    embedder = CountingEmbedder()
+    documents = [Document(content="text")]
+
+    assert embed_documents(documents, embedder, EmbeddingCache(session_factory=broken_session)) == 1
+    assert embedder.texts == ["text"]
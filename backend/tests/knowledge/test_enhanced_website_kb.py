@@ -248,4 +248,146 @@ class TestEnhancedWebsiteKnowledgeBase:
             assert mock_reader.read.call_count == 2
             
             # Should still have called upsert with the successful documents
-            mock_vector_db.upsert.assert_called_once() 
\ No newline at end of file
+            mock_vector_db.upsert.assert_called_once() 
+
+def test_embedding_worker_embeds_micro_batches(mock_vector_db, mock_reader):
+    """Queued documents are embedded with one batch call per micro-batch"""
+    kb = EnhancedWebsiteKnowledgeBase(urls=TEST_URLS, reader=mock_reader)
+    kb.vector_db = mock_vector_db
+    mock_vector_db.embedder.get_embeddings.side_effect = lambda texts: [[float(len(t))] for t in texts]
+    documents = [Document(content=f"content {i}") for i in range(5)]
+
+    with patch('app.knowledge.enhanced_website_kb.settings') as mock_settings:
+        mock_settings.ENABLE_IMMEDIATE_EMBEDDING = True
+        mock_settings.EMBEDDING_MAX_WORKERS = 1
+        mock_settings.EMBEDDING_BATCH_SIZE = 2
+        mock_settings.EMBEDDING_BATCH_WAIT = 0.01
+        kb._init_embedding_system()
+        for document in documents:
+            kb._embedding_queue.put(document)
+        kb._embedding_queue.put(None)
+        kb._embedding_worker()
+
+    assert all(document.embedding == [9.0] for document in documents)
+    assert [len(c.args[0]) for c in mock_vector_db.embedder.get_embeddings.call_args_list] == [2, 2, 1]
+    assert kb._embedding_stats["batches"] == 3
+    assert kb._embedding_stats["documents"] == 5
+    kb._shutdown_embedding_system()
+
+
+def test_incremental_load_saves_page_states_and_removes_deleted_pages(mock_vector_db, mock_reader):
+    """An incremental load upserts only changed pages, then deletes removed pages and stores page states"""
+    from app.knowledge.enhanced_website_reader import IncrementalCrawl, PageState
+
+    org_id = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+    kb = EnhancedWebsiteKnowledgeBase(urls=[TEST_URLS[0]], reader=mock_reader, incremental=True)
+    kb.vector_db = mock_vector_db
+    mock_vector_db.embedder = None
+    incremental = IncrementalCrawl(previous={
+        "https://example.com/page1": PageState(content_hash="old"),
+        "https://example.com/removed": PageState(content_hash="gone"),
+    })
+
+    def read(url, vector_db_callback, url_crawled_callback, incremental):
+        incremental.pages["https://example.com/page1"] = PageState(content_hash="new")
+        incremental.pages["https://example.com/page2"] = PageState(content_hash="same")
+        incremental.unchanged.add("https://example.com/page2")
+        return [TEST_DOCUMENTS[0]]
+
+    mock_reader.read.side_effect = read
+    with patch.object(EnhancedWebsiteKnowledgeBase, '_start_incremental_crawl', return_value=incremental), \
+         patch('app.knowledge.enhanced_website_kb.SessionLocal'), \
+         patch('app.knowledge.enhanced_website_kb.CrawledPageRepository') as page_repo_class:
+        kb.load(filters={"name": TEST_URLS[0], "org_id": org_id})
+
+    assert mock_vector_db.upsert.call_args[1]['documents'] == [TEST_DOCUMENTS[0]]
+    mock_vector_db.delete_documents.assert_called_once_with(name=TEST_URLS[0], ids=["https://example.com/removed"])
+    args = page_repo_class.return_value.save_pages.call_args.args
+    assert str(args[0]) == org_id
+    assert set(args[2]) == {"https://example.com/page1", "https://example.com/page2"}
+    assert args[3] == ["https://example.com/removed"]
+
+
+def test_recrawl_reads_pages_dropped_as_near_duplicates(mock_vector_db, mock_reader):
+    """A page dropped as a near-duplicate stores no page state, so the next crawl reads it again"""
+    from hashlib import md5
+    from app.knowledge.enhanced_website_reader import IncrementalCrawl, PageState
+
+    org_id = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+    mock_vector_db.embedder = None
+    mock_vector_db.dimensions = 384
+    boilerplate = " ".join(f"cookie banner and navigation item {i}" for i in range(60))
+    site = {
+        "https://example.com/a": boilerplate + " shoes",
+        "https://example.com/b": boilerplate + " boots",
+    }
+
+    def read(url, vector_db_callback, url_crawled_callback, incremental):
+        # Like the reader: unchanged pages produce no document, the others one each
+        documents = []
+        for page_url, content in site.items():
+            state = PageState(content_hash=md5(content.encode()).hexdigest())
+            incremental.pages[page_url] = state
+            previous = incremental.previous.get(page_url)
+            if previous and previous.content_hash == state.content_hash:
+                incremental.unchanged.add(page_url)
+                continue
+            document = Document(id=page_url, content=content, meta_data={"url": page_url})
+            documents.append(document)
+            vector_db_callback(document)
+        return documents
+
+    def crawl(previous):
+        kb = EnhancedWebsiteKnowledgeBase(urls=[TEST_URLS[0]], reader=mock_reader, incremental=True, dedup_threshold=0.8)
+        kb.vector_db = mock_vector_db
+        mock_vector_db.upsert.reset_mock()
+        incremental = IncrementalCrawl(previous=previous)
+        with patch.object(EnhancedWebsiteKnowledgeBase, '_start_incremental_crawl', return_value=incremental), \
+             patch('app.knowledge.enhanced_website_kb.SessionLocal'), \
+             patch('app.knowledge.enhanced_website_kb.CrawledPageRepository') as page_repo_class:
+            kb.load(filters={"name": TEST_URLS[0], "org_id": org_id})
+        upserted = [d.id for call in mock_vector_db.upsert.call_args_list for d in call[1]['documents']]
+        saved = page_repo_class.return_value.save_pages.call_args.args[2]
+        return upserted, {url: PageState(**state) for url, state in saved.items()}
+
+    mock_reader.read.side_effect = read
+    upserted, saved = crawl({})
+    assert upserted == ["https://example.com/a"]
+    assert set(saved) == {"https://example.com/a"}
+
+    # Page a is unchanged now, so page b is read again and no longer dropped
+    upserted, saved = crawl(saved)
+    assert upserted == ["https://example.com/b"]
+    assert set(saved) == {"https://example.com/a", "https://example.com/b"}
+
+
+def test_load_drops_near_duplicate_chunks_before_embedding(mock_vector_db, mock_reader):
+    """Chunks nearly identical to one already kept are neither queued for embedding nor upserted"""
+    kb = EnhancedWebsiteKnowledgeBase(urls=[TEST_URLS[0]], reader=mock_reader, dedup_threshold=0.8)
+    kb.vector_db = mock_vector_db
+    kb.queue_item = MagicMock(id=7)
+    kb.queue_repo = MagicMock()
+    mock_vector_db.embedder = None
+    mock_vector_db.dimensions = 384
+    mock_vector_db.storage = "vector"
+    boilerplate = " ".join(f"cookie banner and navigation item {i}" for i in range(60))
+    documents = [
+        Document(id="https://example.com/a", content=boilerplate + " shoes"),
+        Document(id="https://example.com/b", content=boilerplate + " boots"),
+        Document(id="https://example.com/c", content="A page about returns and refunds " * 20),
+    ]
+
+    def read(url, vector_db_callback, url_crawled_callback):
+        for document in documents:
+            vector_db_callback(document)
+        return documents
+
+    mock_reader.read.side_effect = read
+    with patch('app.knowledge.enhanced_website_kb.CrawledUrlBuffer'):
+        kb.load(filters={"name": TEST_URLS[0]})
+
+    assert [d.id for d in mock_vector_db.upsert.call_args[1]['documents']] == ["https://example.com/a", "https://example.com/c"]
+    stats = kb.queue_repo.update_metadata.call_args.args[1]["deduplication"]
+    assert stats["chunks"] == 3 and stats["duplicates"] == 1
+    assert stats["content_bytes_saved"] == len(documents[1].content)
+    assert stats["embedding_bytes_saved"] == 384 * 4
@@ -16,13 +16,15 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+import asyncio
 import os
 import unittest
-from unittest.mock import patch, MagicMock, Mock
+from unittest.mock import patch, AsyncMock, MagicMock, Mock
 from bs4 import BeautifulSoup
 import httpx
 
-from app.knowledge.enhanced_website_reader import EnhancedWebsiteReader
+from hashlib import md5
+from app.knowledge.enhanced_website_reader import EnhancedWebsiteReader, IncrementalCrawl, PageState
 
 
 class TestEnhancedWebsiteReader(unittest.TestCase):
@@ -152,76 +154,63 @@ class TestEnhancedWebsiteReader(unittest.TestCase):
         self.assertIsNone(soup_copy.find('nav'))
         self.assertIsNone(soup_copy.find(class_='hidden'))
         
-    @patch('httpx.Client')
-    def test_crawl_with_successful_request(self, mock_client):
+    def mock_client(self, handler):
+        """Patch the crawl's HTTP client to answer requests with handler"""
+        def create_client(reader):
+            return httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+        return patch.object(EnhancedWebsiteReader, '_create_client', create_client)
+
+    def test_crawl_with_successful_request(self):
         """Test crawling with successful HTTP requests"""
-        # Mock HTTP client response
-        mock_response = MagicMock()
-        mock_response.text = self.test_html
-        mock_response.raise_for_status = MagicMock()
-        
-        # Setup mock client
-        mock_client_instance = MagicMock()
-        mock_client_instance.get.return_value = mock_response
-        mock_client.return_value.__enter__.return_value = mock_client_instance
-        
+        requests = []
+
+        def handler(request):
+            requests.append(str(request.url))
+            return httpx.Response(200, text=self.test_html)
+
         # Test crawling
-        result = self.reader.crawl('https://example.com')
+        with self.mock_client(handler):
+            result = self.reader.crawl('https://example.com')
         
-        # Verify call to httpx client
-        mock_client.assert_called_once()
-        mock_client_instance.get.assert_called_with('https://example.com')
+        # Verify the request made through the client
+        self.assertEqual(requests, ['https://example.com'])
         
         # Verify result contains the expected content
         self.assertIn('https://example.com', result)
         self.assertIn("Main Content", result['https://example.com'])
         
-    @patch('httpx.Client')
-    @patch('time.sleep', return_value=None)  # Skip actual sleeping
-    def test_crawl_with_retries(self, mock_sleep, mock_client):
+    @patch('app.knowledge.enhanced_website_reader.asyncio.sleep', new_callable=AsyncMock)  # Skip actual backoff
+    def test_crawl_with_retries(self, mock_sleep):
         """Test crawling with retries on failed requests"""
-        # Mock HTTP errors for the first two attempts
-        mock_response_error = MagicMock()
-        mock_response_error.raise_for_status.side_effect = httpx.HTTPStatusError("Error", request=MagicMock(), response=MagicMock(status_code=500))
-        
-        mock_response_success = MagicMock()
-        mock_response_success.text = self.test_html
-        mock_response_success.raise_for_status = MagicMock()
-        
-        # Setup mock client
-        mock_client_instance = MagicMock()
-        mock_client_instance.get.side_effect = [
-            mock_response_error,  # First attempt fails with HTTP error
-            MagicMock(raise_for_status=MagicMock(side_effect=httpx.RequestError("Timeout", request=MagicMock()))),  # Second attempt fails with request error
-            mock_response_success  # Third attempt succeeds
-        ]
-        mock_client.return_value.__enter__.return_value = mock_client_instance
-        
+        # First attempt fails with HTTP error, second with request error, third succeeds
+        attempts = []
+
+        def handler(request):
+            attempts.append(request)
+            if len(attempts) == 1:
+                return httpx.Response(500)
+            if len(attempts) == 2:
+                raise httpx.ConnectTimeout("Timeout", request=request)
+            return httpx.Response(200, text=self.test_html)
+
         # Test crawling with retries
-        result = self.reader.crawl('https://example.com')
+        self.reader.host_delay = 0
+        with self.mock_client(handler):
+            result = self.reader.crawl('https://example.com')
         
-        # Verify httpx client's get method was called 3 times (2 failures + 1 success)
-        self.assertEqual(mock_client_instance.get.call_count, 3)
+        # Verify the page was requested 3 times (2 failures + 1 success) with non-blocking backoff
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual([c.args[0] for c in mock_sleep.await_args_list], [2, 4])
         
         # Verify result contains the expected content after successful retry
         self.assertIn('https://example.com', result)
         self.assertIn("Main Content", result['https://example.com'])
         
-    @patch('httpx.Client')
-    def test_read_method(self, mock_client):
+    def test_read_method(self):
         """Test the read method to ensure it returns proper Document objects"""
-        # Mock HTTP response
-        mock_response = MagicMock()
-        mock_response.text = self.test_html
-        mock_response.raise_for_status = MagicMock()
-        
-        # Setup mock client
-        mock_client_instance = MagicMock()
-        mock_client_instance.get.return_value = mock_response
-        mock_client.return_value.__enter__.return_value = mock_client_instance
-        
         # Test read method
-        documents = self.reader.read('https://example.com')
+        with self.mock_client(lambda request: httpx.Response(200, text=self.test_html)):
+            documents = self.reader.read('https://example.com')
         
         # Verify documents are created correctly
         self.assertTrue(len(documents) > 0)
@@ -237,6 +226,106 @@ class TestEnhancedWebsiteReader(unittest.TestCase):
         # Verify that name is the original source URL
         self.assertEqual(documents[0].name, 'https://example.com')
 
+    def site_html(self, links):
+        """A page with enough content and links to the given paths"""
+        anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+        return f"<html><body><main><p>{'Meaningful page content. ' * 5}</p>{anchors}</main></body></html>"
+
+    def test_crawl_shares_one_client_and_limits_host_concurrency(self):
+        """All pages are fetched through one client with at most per_host_concurrency requests in flight"""
+        reader = EnhancedWebsiteReader(max_depth=2, max_links=10, min_content_length=50,
+                                       max_workers=6, per_host_concurrency=2, host_delay=0)
+        in_flight = {"current": 0, "max": 0}
+        clients = []
+
+        async def handler(request):
+            in_flight["current"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["current"])
+            await asyncio.sleep(0.01)
+            in_flight["current"] -= 1
+            links = [f"/page{i}" for i in range(8)] if request.url.path in ("", "/") else []
+            return httpx.Response(200, text=self.site_html(links))
+
+        def create_client(reader):
+            clients.append(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+            return clients[-1]
+
+        with patch.object(EnhancedWebsiteReader, '_create_client', create_client):
+            result = reader.crawl('https://example.com')
+
+        self.assertEqual(len(result), 9)
+        self.assertEqual(len(clients), 1)
+        self.assertEqual(in_flight["max"], 2)
+
+    def test_crawl_bounds_the_frontier(self):
+        """Links beyond max_frontier are dropped instead of queued"""
+        reader = EnhancedWebsiteReader(max_depth=2, max_links=10, min_content_length=50,
+                                       max_workers=1, max_frontier=3, host_delay=0)
+
+        def handler(request):
+            links = [f"/page{i}" for i in range(8)] if request.url.path in ("", "/") else []
+            return httpx.Response(200, text=self.site_html(links))
+
+        with self.mock_client(handler):
+            result = reader.crawl('https://example.com')
+
+        self.assertEqual(len(result), 4)
+
+    def test_crawl_inside_running_event_loop(self):
+        """crawl() keeps working when called from async code"""
+        async def crawl_from_loop():
+            return self.reader.crawl('https://example.com')
+
+        with self.mock_client(lambda request: httpx.Response(200, text=self.test_html)):
+            result = asyncio.run(crawl_from_loop())
+
+        self.assertIn('https://example.com', result)
+
+    def test_incremental_crawl_skips_unchanged_pages(self):
+        """Unchanged pages answer 304 or hash the same and produce no content; removed pages are reported"""
+        reader = EnhancedWebsiteReader(max_depth=3, max_links=10, min_content_length=50, host_delay=0)
+        root_html = self.site_html(["/same", "/changed"])
+        same_html = self.site_html([])
+        previous = {
+            'https://example.com': PageState(etag='"root-v1"', links=['https://example.com/same', 'https://example.com/changed']),
+            'https://example.com/same': PageState(content_hash=None),
+            'https://example.com/changed': PageState(content_hash='outdated'),
+            'https://example.com/deleted': PageState(content_hash='gone'),
+        }
+        requests = {}
+
+        def handler(request):
+            requests[str(request.url)] = request.headers
+            if request.url.path in ("", "/"):
+                if request.headers.get('if-none-match') == '"root-v1"':
+                    return httpx.Response(304)
+                return httpx.Response(200, text=root_html)
+            if request.url.path == "/same":
+                return httpx.Response(200, text=same_html)
+            return httpx.Response(200, text=self.site_html(["/new"]), headers={'ETag': '"changed-v2"'})
+
+        # The unchanged page is known by the hash of its extracted text
+        previous['https://example.com/same'].content_hash = md5(reader._parse_page(same_html, 'https://example.com/same', 1)[0].encode()).hexdigest()
+        incremental = IncrementalCrawl(previous=previous)
+
+        with self.mock_client(handler):
+            result = reader.crawl('https://example.com', incremental=incremental)
+
+        self.assertEqual(set(result), {'https://example.com/changed', 'https://example.com/new'})
+        self.assertEqual(incremental.unchanged, {'https://example.com', 'https://example.com/same'})
+        self.assertEqual(incremental.pages['https://example.com/changed'].etag, '"changed-v2"')
+        self.assertEqual(incremental.removed_urls, ['https://example.com/deleted'])
+
+    def test_incremental_crawl_keeps_pages_when_truncated_or_failed(self):
+        """Pages not reached by a truncated crawl, or failing transiently, are not removed"""
+        incremental = IncrementalCrawl(previous={url: PageState() for url in ['a', 'b', 'c']})
+        incremental.pages['a'] = PageState()
+        incremental.failed.update({'b', 'c'})
+        incremental.gone.add('c')
+        self.assertEqual(incremental.removed_urls, ['c'])
+
+        incremental = IncrementalCrawl(previous={url: PageState() for url in ['a', 'b']}, truncated=True)
+        self.assertEqual(incremental.removed_urls, [])
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+ChatterMate - Test PDF Ingestion
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from agno.document.reader.pdf_reader import PDFReader
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from app.knowledge.pdf_ingest import extract_pages, ingest_pdf
+
+
+def write_pdf(path, page_texts):
+    """PDF whose pages show the given texts; None makes a page without a text layer, like a scan"""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for text in page_texts:
+        page = writer.add_blank_page(width=612, height=792)
+        if text is None:
+            continue
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def manual(tmp_path):
+    return write_pdf(tmp_path / "manual.pdf", [
+        "Installing the pump requires a flat surface",
+        None,
+        "Warranty covers two years of normal use",
+    ])
+
+
+def test_only_pages_without_text_are_ocrd(manual):
+    with patch("app.knowledge.pdf_ingest._ocr_page", return_value="Scanned wiring diagram") as ocr:
+        pages = extract_pages(manual, [0, 1, 2], min_text_chars=20)
+
+    assert ocr.call_count == 1
+    assert [(number, ocr_used) for number, _, ocr_used in pages] == [(1, False), (2, True), (3, False)]
+    assert "flat surface" in pages[0][1]
+    assert pages[1][1] == "Scanned wiring diagram"
+
+
+def test_pages_are_upserted_as_they_are_extracted(manual):
+    vector_db = MagicMock()
+    with patch("app.knowledge.pdf_ingest.settings") as mock_settings, \
+         patch("app.knowledge.pdf_ingest._ocr_page", return_value=""):
+        mock_settings.PDF_PAGES_PER_TASK = 2
+        mock_settings.PDF_PROCESS_WORKERS = 2
+        mock_settings.PDF_OCR_MIN_TEXT_CHARS = 20
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            stats = ingest_pdf(manual, "manual", vector_db, {"name": "manual"}, PDFReader(chunk=True), executor=executor)
+
+    # One upsert per batch of pages holding text; the empty scan produces no chunk
+    assert vector_db.upsert.call_count == 2
+    documents = [doc for c in vector_db.upsert.call_args_list for doc in c.kwargs["documents"]]
+    assert sorted(doc.id for doc in documents) == ["manual_1_1", "manual_3_1"]
+    assert {doc.name for doc in documents} == {"manual"}
+    assert all(c.kwargs["filters"] == {"name": "manual"} for c in vector_db.upsert.call_args_list)
+    assert stats["pages"] == 3 and stats["empty_pages"] == 1 and stats["chunks"] == 2
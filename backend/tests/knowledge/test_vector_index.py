@@ -0,0 +1,90 @@
+"""
+ChatterMate - Test Vector Index Manager
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from agno.vectordb.distance import Distance
+from agno.vectordb.pgvector.index import HNSW, Ivfflat
+from app.knowledge.vector_index import VectorIndexManager, source_index_name
+
+
+@pytest.fixture
+def manager():
+    return VectorIndexManager()
+
+
+@pytest.fixture
+def vector_db():
+    db = MagicMock()
+    db.table_name = "d_4f6c2a8e-0d7b-4b8e-9a51-3c2d1e0f9a7b"
+    db.schema = "ai"
+    db.distance = Distance.cosine
+    db.storage = "vector"
+    db.binary_index = False
+    db.vector_index = HNSW()
+    db._index_exists.return_value = False
+    conn = db.db_engine.connect.return_value.__enter__.return_value
+    autocommit = db.db_engine.connect.return_value.execution_options.return_value.__enter__.return_value
+    return db, conn, autocommit
+
+
+def test_ef_search_scales_with_limit(manager):
+    with patch("app.knowledge.vector_index.settings.PGVECTOR_EF_SEARCH_FACTOR", 10), \
+         patch("app.knowledge.vector_index.settings.PGVECTOR_EF_SEARCH_MIN", 40), \
+         patch("app.knowledge.vector_index.settings.PGVECTOR_EF_SEARCH_MAX", 400):
+        assert manager.ef_search(1) == 40
+        assert manager.ef_search(12) == 120
+        assert manager.ef_search(100) == 400
+
+
+def test_iterative_scan_only_on_pgvector_0_8(manager, vector_db):
+    db, conn, _ = vector_db
+    conn.execute.return_value.scalar.return_value = "0.8.0"
+    assert manager.search_settings(db, 5) == [
+        "SET LOCAL hnsw.ef_search = 50",
+        "SET LOCAL hnsw.iterative_scan = relaxed_order",
+        "SET LOCAL hnsw.max_scan_tuples = 20000",
+    ]
+
+    older = VectorIndexManager()
+    conn.execute.return_value.scalar.return_value = "0.7.4"
+    assert older.search_settings(db, 5) == ["SET LOCAL hnsw.ef_search = 50"]
+
+    db.vector_index = Ivfflat(probes=7)
+    assert older.search_settings(db, 5) == ["SET LOCAL ivfflat.probes = 7"]
+
+
+def test_large_sources_get_a_partial_hnsw_index(manager, vector_db):
+    db, conn, autocommit = vector_db
+    source = "https://example.com/o'brien"
+
+    with patch("app.knowledge.vector_index.settings.PGVECTOR_SOURCE_INDEX_MIN_ROWS", 100):
+        conn.execute.return_value.scalar.return_value = 99
+        assert manager.ensure_source_index(db, source) is False
+        autocommit.execute.assert_not_called()
+
+        conn.execute.return_value.scalar.return_value = 100
+        assert manager.ensure_source_index(db, source) is True
+
+    index_name = source_index_name(db.table_name, source)
+    assert len(index_name) <= 63
+    create_sql = str(autocommit.execute.call_args.args[0])
+    assert create_sql.startswith(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}"')
+    assert "USING hnsw (embedding vector_cosine_ops)" in create_sql
+    assert create_sql.endswith("WHERE name = 'https://example.com/o''brien'")
+    assert manager._builds[index_name]["rows"] == 100
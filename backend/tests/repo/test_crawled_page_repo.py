@@ -0,0 +1,65 @@
+"""
+ChatterMate - Test Crawled Page Repository
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import pytest
+from app.repositories.crawled_page import CrawledPageRepository
+from app.repositories.knowledge import KnowledgeRepository
+from app.models.knowledge import Knowledge, SourceType
+
+SOURCE = "https://example.com"
+
+
+@pytest.fixture
+def page_repo(db):
+    return CrawledPageRepository(db)
+
+
+def page(content_hash, etag=None, links=None):
+    return {"etag": etag, "last_modified": None, "content_hash": content_hash, "links": links or []}
+
+
+def test_save_pages_inserts_updates_and_removes(page_repo, test_organization_id):
+    page_repo.save_pages(test_organization_id, SOURCE, {
+        f"{SOURCE}/a": page("a1", etag='"a"', links=[f"{SOURCE}/b"]),
+        f"{SOURCE}/b": page("b1"),
+    })
+
+    page_repo.save_pages(test_organization_id, SOURCE, {
+        f"{SOURCE}/a": page("a2"),
+        f"{SOURCE}/c": page("c1"),
+    }, removed_urls=[f"{SOURCE}/b"])
+
+    pages = {p.url: p for p in page_repo.get_by_source(test_organization_id, SOURCE)}
+    assert set(pages) == {f"{SOURCE}/a", f"{SOURCE}/c"}
+    assert pages[f"{SOURCE}/a"].content_hash == "a2"
+    assert pages[f"{SOURCE}/a"].etag is None
+    assert page_repo.get_by_source(test_organization_id, "https://other.com") == []
+
+
+def test_deleting_knowledge_forgets_its_pages(db, page_repo, test_organization_id):
+    knowledge = KnowledgeRepository(db).create(Knowledge(
+        organization_id=test_organization_id,
+        source=SOURCE,
+        source_type=SourceType.WEBSITE,
+        schema="ai",
+        table_name="d_test"
+    ))
+    page_repo.save_pages(test_organization_id, SOURCE, {SOURCE: page("root")})
+
+    assert KnowledgeRepository(db).delete_with_data(knowledge.id)
+    assert page_repo.get_by_source(test_organization_id, SOURCE) == []
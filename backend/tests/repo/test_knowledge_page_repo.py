@@ -0,0 +1,52 @@
+"""
+ChatterMate - Test Knowledge Page Repository
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+from datetime import datetime, timezone
+from app.repositories.knowledge_page import KnowledgePageRepository, subpage_of
+
+SOURCE = "manual"
+
+
+def at(day):
+    return datetime(2026, 1, day, tzinfo=timezone.utc)
+
+
+def test_replace_source_aggregates_chunks_per_subpage(db, test_organization_id):
+    page_repo = KnowledgePageRepository(db)
+
+    assert page_repo.replace_source(test_organization_id, SOURCE, [
+        ("manual_1_1", at(1), None),
+        ("manual_1_2", at(2), at(5)),
+        ("manual_2_1", at(3), None),
+    ]) == 2
+    pages = page_repo.get_by_sources(test_organization_id, [SOURCE, "other"])[SOURCE]
+    assert [(page.subpage, page.chunk_count) for page in pages] == [("manual_1", 2), ("manual_2", 1)]
+    assert pages[0].created_at.day == 1 and pages[0].updated_at.day == 5
+
+    # A re-ingest replaces the catalog of the source
+    page_repo.replace_source(test_organization_id, SOURCE, [("manual_3_1", at(6), None)])
+    pages = page_repo.get_by_sources(test_organization_id, [SOURCE])[SOURCE]
+    assert [page.subpage for page in pages] == ["manual_3"]
+
+    assert page_repo.delete_by_source(test_organization_id, SOURCE) == 1
+    assert SOURCE not in page_repo.get_by_sources(test_organization_id, [SOURCE])
+
+
+def test_subpage_strips_chunk_suffix():
+    assert subpage_of("https://example.com/docs_2") == "https://example.com/docs"
+    assert subpage_of("https://example.com/docs") == "https://example.com/docs"
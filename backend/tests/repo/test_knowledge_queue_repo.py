@@ -149,4 +149,87 @@ def test_update_status_with_error(queue_repo, test_queue_item):
 def test_update_status_nonexistent(queue_repo):
     """Test updating status of nonexistent queue item"""
     success = queue_repo.update_status(999, QueueStatus.COMPLETED)
-    assert success is False 
\ No newline at end of file
+    assert success is False 
+def test_claim_leases_pending_items(queue_repo, test_queue_item):
+    """Test claiming pending items for a worker"""
+    claimed = queue_repo.claim("worker-1", lease_seconds=60, limit=5)
+
+    assert [item.id for item in claimed] == [test_queue_item.id]
+    item = queue_repo.get_by_id(test_queue_item.id)
+    assert item.status == QueueStatus.PROCESSING
+    assert item.locked_by == "worker-1"
+    assert item.lease_expires_at is not None
+    assert item.attempts == 1
+
+    # Leased items are not handed out again
+    assert queue_repo.claim("worker-2", lease_seconds=60) == []
+
+def test_claim_single_item(queue_repo, test_queue_item):
+    """Test claiming one specific item"""
+    assert queue_repo.claim("worker-1", lease_seconds=60, queue_id=999) == []
+    assert len(queue_repo.claim("worker-1", lease_seconds=60, queue_id=test_queue_item.id)) == 1
+
+def test_heartbeat_extends_only_own_lease(queue_repo, test_queue_item):
+    """Test that only the lease holder can extend a lease"""
+    queue_repo.claim("worker-1", lease_seconds=60)
+    first_expiry = queue_repo.get_by_id(test_queue_item.id).lease_expires_at
+
+    assert queue_repo.heartbeat(test_queue_item.id, "worker-2", 600) is False
+    assert queue_repo.heartbeat(test_queue_item.id, "worker-1", 600) is True
+    queue_repo.db.expire_all()
+    assert queue_repo.get_by_id(test_queue_item.id).lease_expires_at > first_expiry
+
+def test_heartbeat_keeps_lease_after_item_marked_completed(queue_repo, test_queue_item):
+    """Test that the lease is still renewed while indexes are built after processing marked the item completed"""
+    queue_repo.claim("worker-1", lease_seconds=60)
+    queue_repo.update_status(test_queue_item.id, QueueStatus.COMPLETED)
+
+    assert queue_repo.heartbeat(test_queue_item.id, "worker-1", 600) is True
+    queue_repo.db.expire_all()
+    item = queue_repo.get_by_id(test_queue_item.id)
+    assert item.locked_by == "worker-1"
+    assert item.lease_expires_at is not None
+
+def test_release_only_by_lease_holder(queue_repo, test_queue_item):
+    """Test that a worker whose lease was reclaimed cannot overwrite the new owner's state"""
+    queue_repo.claim("worker-1", lease_seconds=-1)
+    queue_repo.claim("worker-2", lease_seconds=60)
+
+    assert queue_repo.release(test_queue_item.id, "worker-1", QueueStatus.FAILED, error="stale") is False
+    queue_repo.db.expire_all()
+    item = queue_repo.get_by_id(test_queue_item.id)
+    assert item.status == QueueStatus.PROCESSING
+    assert item.locked_by == "worker-2"
+
+    assert queue_repo.release(test_queue_item.id, "worker-2", QueueStatus.COMPLETED) is True
+    queue_repo.db.expire_all()
+    item = queue_repo.get_by_id(test_queue_item.id)
+    assert item.status == QueueStatus.COMPLETED
+    assert item.locked_by is None
+    assert item.lease_expires_at is None
+
+def test_expired_lease_is_reclaimed(queue_repo, test_queue_item):
+    """Test that items of crashed workers are reclaimed, and failed after max attempts"""
+    queue_repo.claim("worker-1", lease_seconds=-1)
+
+    reclaimed = queue_repo.claim("worker-2", lease_seconds=-1, max_attempts=2)
+    assert [item.locked_by for item in reclaimed] == ["worker-2"]
+    assert reclaimed[0].attempts == 2
+
+    assert queue_repo.claim("worker-3", lease_seconds=60, max_attempts=2) == []
+    item = queue_repo.get_by_id(test_queue_item.id)
+    assert item.status == QueueStatus.FAILED
+    assert item.locked_by is None
+    assert "lease expired" in item.error
+
+def test_crawled_urls_are_appended_and_paginated(queue_repo, test_queue_item):
+    """Test the append-only crawled URL progress"""
+    queue_repo.add_crawled_urls(test_queue_item.id, ["https://a.com/1", "https://a.com/2"])
+    queue_repo.add_crawled_urls(test_queue_item.id, ["https://a.com/2", "https://a.com/3"])
+    queue_repo.update_progress(test_queue_item.id, crawled_url="https://a.com/4")
+
+    assert queue_repo.count_crawled_urls(test_queue_item.id) == 4
+    assert queue_repo.get_latest_crawled_url(test_queue_item.id) == "https://a.com/4"
+    assert queue_repo.get_crawled_urls(test_queue_item.id, offset=1, limit=2) == ["https://a.com/2", "https://a.com/3"]
+    # The legacy JSON column is no longer rewritten
+    assert not queue_repo.get_by_id(test_queue_item.id).crawled_urls
@@ -0,0 +1,81 @@
+"""
+ChatterMate - Test Async Repositories
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import pytest
+from uuid import uuid4
+from app.models.session_to_agent import SessionStatus
+from app.repositories.session_to_agent import AsyncSessionToAgentRepository
+from app.repositories.chat import AsyncChatRepository
+from app.repositories.widget import AsyncWidgetRepository
+from app.repositories.ai_config import AsyncAIConfigRepository
+
+
+@pytest.mark.asyncio
+async def test_session_lifecycle(async_db, test_agent, test_customer, test_organization):
+    repo = AsyncSessionToAgentRepository(async_db)
+    session_id = uuid4()
+
+    await repo.create_session(
+        session_id=session_id,
+        agent_id=test_agent.id,
+        customer_id=test_customer.id,
+        organization_id=test_organization.id
+    )
+
+    active = await repo.get_active_customer_session(test_customer.id, test_agent.id)
+    assert active.session_id == session_id
+    assert (await repo.get_session(str(session_id))).status == SessionStatus.OPEN
+
+    assert await repo.update_session_status(str(session_id), "CLOSED")
+    assert await repo.get_active_customer_session(test_customer.id, test_agent.id) is None
+
+
+@pytest.mark.asyncio
+async def test_chat_message_and_history(async_db, test_agent, test_customer, test_organization):
+    session_id = uuid4()
+    await AsyncSessionToAgentRepository(async_db).create_session(
+        session_id=session_id,
+        agent_id=test_agent.id,
+        customer_id=test_customer.id,
+        organization_id=test_organization.id
+    )
+
+    chat_repo = AsyncChatRepository(async_db)
+    for text, message_type in [("Hello", "user"), ("Hi there!", "bot")]:
+        await chat_repo.create_message({
+            "message": text,
+            "message_type": message_type,
+            "session_id": str(session_id),
+            "organization_id": str(test_organization.id),
+            "customer_id": str(test_customer.id),
+            "agent_id": str(test_agent.id),
+            "attributes": {}
+        })
+
+    history = await chat_repo.get_session_history(str(session_id))
+    assert [m.message for m in history] == ["Hello", "Hi there!"]
+    assert history[1].agent.id == test_agent.id
+
+
+@pytest.mark.asyncio
+async def test_widget_and_ai_config_lookup(async_db, test_widget, test_ai_config, test_organization):
+    widget = await AsyncWidgetRepository(async_db).get_widget(str(test_widget.id))
+    assert widget.id == test_widget.id
+
+    ai_config = await AsyncAIConfigRepository(async_db).get_active_config(test_organization.id)
+    assert ai_config.id == test_ai_config.id
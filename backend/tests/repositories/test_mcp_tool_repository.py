@@ -20,7 +20,7 @@ import pytest
 from uuid import uuid4
 from sqlalchemy.orm import Session
 
-from app.repositories.mcp_tool import MCPToolRepository
+from app.repositories.mcp_tool import MCPToolRepository, mcp_tool_fingerprint
 from app.models.mcp_tool import MCPTransportType, MCPTool, MCPToolToAgent
 from tests.conftest import TestingSessionLocal, create_tables, Base
 
@@ -155,3 +155,24 @@ def test_get_mcp_tool_with_agents(db: Session):
     # Ensure relationship is accessible
     assert hasattr(fetched, "agent_links")
 
+
+def test_save_tool_catalog_keeps_config_version(db: Session):
+    repo = MCPToolRepository(db)
+    tool = _create_tool(repo, uuid4())
+    updated_at = tool.updated_at
+    fingerprint = mcp_tool_fingerprint(tool)
+
+    catalog = [{"name": "list", "description": "List files", "parameters": {"type": "object", "properties": {}}}]
+    assert repo.save_tool_catalog(tool.id, catalog, fingerprint) is True
+    db.expire_all()
+    stored = repo.get_mcp_tool(tool.id)
+    assert stored.tool_catalog == catalog
+    assert stored.catalog_fingerprint == fingerprint
+    assert stored.catalog_refreshed_at is not None
+    assert stored.updated_at == updated_at
+
+    # Editing the connection settings invalidates the stored catalog
+    repo.update_mcp_tool(tool.id, args=["-y", "@modelcontextprotocol/server-git"])
+    assert mcp_tool_fingerprint(stored) != fingerprint
+    repo.update_mcp_tool(tool.id, description="Renamed")
+    assert mcp_tool_fingerprint(stored) == mcp_tool_fingerprint(repo.get_mcp_tool(tool.id))
@@ -0,0 +1,133 @@
+"""
+ChatterMate - Test Chat Message Writer
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import pytest
+from uuid import uuid4
+from unittest.mock import patch
+from sqlalchemy.orm import sessionmaker
+from app.models.chat_history import ChatHistory
+from app.core.config import settings
+from app.repositories.chat import ChatRepository
+from app.services.chat_message_writer import ChatMessageWriter
+
+
+@pytest.fixture
+def writer(db):
+    # A long interval keeps the background thread out of the way; tests flush explicitly
+    writer = ChatMessageWriter(batch_size=50, flush_interval=60, session_factory=sessionmaker(bind=db.get_bind()))
+    yield writer
+    writer.close()
+
+
+def message(session_id, text, message_type="user"):
+    return {
+        "message": text,
+        "message_type": message_type,
+        "session_id": str(session_id),
+        "organization_id": str(uuid4()),
+        "customer_id": str(uuid4())
+    }
+
+
+def test_flush_preserves_order(db, writer):
+    session_a, session_b = uuid4(), uuid4()
+    for i in range(3):
+        writer.enqueue(message(session_a, f"a{i}"))
+        writer.enqueue(message(session_b, f"b{i}", "bot"))
+
+    assert writer.has_pending(session_a)
+    assert db.query(ChatHistory).count() == 0
+
+    assert writer.flush() == 6
+    assert not writer.has_pending()
+
+    rows = db.query(ChatHistory).filter(ChatHistory.session_id == session_a).order_by(ChatHistory.created_at).all()
+    assert [r.message for r in rows] == ["a0", "a1", "a2"]
+    assert [r.id for r in rows] == sorted(r.id for r in rows)
+
+
+def test_reads_and_direct_writes_see_buffered_messages(db, writer):
+    session_id = uuid4()
+    with patch("app.repositories.chat.chat_message_writer", writer), \
+         patch.object(settings, "CHAT_WRITE_BEHIND_ENABLED", True):
+        writer.enqueue(message(session_id, "queued"))
+        ChatRepository(db).create_message(message(session_id, "direct", "bot"))
+
+        history = ChatRepository(db).get_session_history(str(session_id))
+
+    assert [m.message for m in history] == ["queued", "direct"]
+
+
+def test_flush_session_writes_only_that_session(db, writer):
+    session_a, session_b = uuid4(), uuid4()
+    writer.enqueue(message(session_a, "a0"))
+    writer.enqueue(message(session_b, "b0"))
+    writer.enqueue(message(session_a, "a1"))
+
+    assert writer.flush_session(session_a) == 2
+
+    assert not writer.has_pending(session_a)
+    assert writer.has_pending(session_b)
+    assert sorted(r.message for r in db.query(ChatHistory).all()) == ["a0", "a1"]
+
+
+def test_failed_read_your_writes_flush_does_not_fail_the_caller(db, writer):
+    session_id = uuid4()
+    with patch("app.repositories.chat.chat_message_writer", writer), \
+         patch.object(settings, "CHAT_WRITE_BEHIND_ENABLED", True):
+        writer.enqueue(message(session_id, "queued"))
+        with patch.object(writer, "_write", side_effect=Exception("db down")):
+            ChatRepository(db).create_message(message(session_id, "direct", "bot"))
+            history = ChatRepository(db).get_session_history(str(session_id))
+
+    assert [m.message for m in history] == ["direct"]
+    # Left for the background flush to retry
+    assert writer.get_stats()["pending"] == 1
+    assert writer.flush() == 1
+
+
+def test_failed_flush_keeps_rows_then_drops_bad_ones(db, writer):
+    session_id = uuid4()
+    writer.enqueue(message(session_id, "first"))
+    writer.enqueue(message(session_id, "second"))
+
+    original_write = writer._write
+
+    def failing_write(rows):
+        if any(row["message"] == "first" for row in rows):
+            raise Exception("db down")
+        original_write(rows)
+
+    with patch.object(writer, "_write", side_effect=failing_write):
+        for _ in range(writer.max_retries - 1):
+            with pytest.raises(Exception):
+                writer.flush()
+            assert writer.get_stats()["pending"] == 2
+
+        writer.flush()
+
+    assert writer.get_stats() == {"pending": 0, "flushed": 2, "dropped": 1}
+    assert [r.message for r in db.query(ChatHistory).all()] == ["second"]
+
+
+def test_close_flushes_pending_messages(db, writer):
+    writer.enqueue(message(uuid4(), "bye"))
+    writer.close()
+
+    assert not writer.enabled
+    assert db.query(ChatHistory).count() == 1
@@ -19,1388 +19,535 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 import pytest
 import json
 import os
-import requests
+import httpx
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock, AsyncMock
 from app.tools.jira_toolkit import JiraTools
-from app.models.jira import AgentJiraConfig, JiraToken
-from app.models.organization import Organization
-from app.models.agent import Agent
-from app.models.session_to_agent import SessionToAgent
 from uuid import UUID
-from datetime import timedelta
+
+
+def _result(row):
+    """Result of an AsyncSession.execute returning row through scalars() and unique().scalars()"""
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = row
+    result.unique.return_value = result
+    return result
+
+
+def _set_rows(db, *rows):
+    """Rows returned by the db's execute calls, in query order"""
+    db.execute.side_effect = [_result(row) for row in rows]
+
+
+def _response(status_code, data=None, text=""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = data
+    response.text = text
+    return response
+
+
+def _meta_response(fields=None):
+    return _response(200, {"projects": [{"issuetypes": [{"fields": fields or {}}]}]})
+
+
+def _created_response():
+    return _response(201, {
+        "id": "10000",
+        "key": "TEST-123",
+        "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
+    })
+
+
+def _jira_tools(agent_id="00000000-0000-0000-0000-000000000001", org_id="00000000-0000-0000-0000-000000000002"):
+    return JiraTools(agent_id=agent_id, org_id=org_id, session_id="test_session_id")
+
+
+def _no_existing_ticket():
+    return AsyncMock(return_value=json.dumps({
+        "exists": False,
+        "message": "No ticket found for this session"
+    }))
+
 
 @pytest.fixture
-def mock_db():
-    db = MagicMock()
-    
-    # Mock agent
+def agent():
     agent = MagicMock()
     agent.id = UUID("00000000-0000-0000-0000-000000000001")
     agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-    
-    # Mock organization
+    return agent
+
+
+@pytest.fixture
+def org():
     org = MagicMock()
     org.id = UUID("00000000-0000-0000-0000-000000000002")
-    
-    # Mock Jira config
+    org.name = "Test Org"
+    return org
+
+
+@pytest.fixture
+def jira_config():
     jira_config = MagicMock()
     jira_config.enabled = True
     jira_config.project_key = "TEST"
     jira_config.issue_type_id = "10001"
-    
-    # Mock Jira token
+    return jira_config
+
+
+@pytest.fixture
+def jira_token():
     jira_token = MagicMock()
     jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
     jira_token.access_token = "test_access_token"
     jira_token.refresh_token = "test_refresh_token"
     jira_token.cloud_id = "test_cloud_id"
-    
-    # Mock session
-    session = MagicMock()
-    session.id = "test_session_id"
-    session.ticket_id = None
-    
-    # Setup query results
-    db.query.return_value.filter.return_value.first.side_effect = [
-        agent,  # For Agent query
-        org,    # For Organization query
-        jira_config,  # For AgentJiraConfig query
-        jira_token,   # For JiraToken query
-    ]
-    
+    jira_token.site_url = "https://example.atlassian.net"
+    return jira_token
+
+
+@pytest.fixture
+def mock_db():
+    db = MagicMock()
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
     return db
 
+
 @pytest.fixture
 def mock_session_repo():
     repo = MagicMock()
-    repo.get_session.return_value = None
-    repo.update_session.return_value = True
+    repo.get_session = AsyncMock(return_value=None)
+    repo.update_session = AsyncMock(return_value=True)
     return repo
 
+
 @pytest.fixture
 def mock_jira_service():
-    service = AsyncMock()
-    service.create_issue.return_value = {
-        "key": "TEST-123",
-        "status": {"name": "Open"},
-        "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-    }
+    service = MagicMock()
     service.validate_token.return_value = True
     return service
 
+
+@pytest.fixture
+def mock_http_client():
+    client = MagicMock()
+    client.get = AsyncMock()
+    client.post = AsyncMock()
+    client.put = AsyncMock()
+    return client
+
+
+@pytest.fixture
+def toolkit(mock_db, mock_session_repo, mock_jira_service, mock_http_client):
+    """Patches the toolkit's async sessions, session repository, Jira service and HTTP client"""
+    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service), \
+         patch("app.tools.jira_toolkit.AsyncSessionToAgentRepository", return_value=mock_session_repo), \
+         patch("app.tools.jira_toolkit.get_http_client", return_value=mock_http_client), \
+         patch("app.tools.jira_toolkit.AsyncSessionLocal") as mock_session_local:
+        mock_session_local.return_value.__aenter__.return_value = mock_db
+        mock_session_local.return_value.__aexit__.return_value = None
+        yield SimpleNamespace(
+            db=mock_db,
+            session_repo=mock_session_repo,
+            jira_service=mock_jira_service,
+            http=mock_http_client
+        )
+
+
+@pytest.mark.asyncio
+async def test_create_jira_ticket(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.post.return_value = _created_response()
+    toolkit.http.get.return_value = _meta_response({
+        "priority": {
+            "allowedValues": [
+                {"name": "Highest"},
+                {"name": "High"},
+                {"name": "Medium"},
+                {"name": "Low"},
+                {"name": "Lowest"}
+            ]
+        }
+    })
+
+    jira_tools = _jira_tools()
+    with patch.object(jira_tools, "check_existing_ticket", _no_existing_ticket()):
+        result = json.loads(await jira_tools.create_jira_ticket(
+            summary="Test ticket",
+            description="This is a test ticket",
+            priority="High"
+        ))
+
+    assert result["success"] is True
+    assert result["ticket_id"] == "TEST-123"
+    assert "message" in result
+    assert "ticket_url" in result
+    assert toolkit.http.post.call_args[1]["json"]["fields"]["priority"] == {"id": "2"}
+    toolkit.session_repo.update_session.assert_awaited_once()
+
+
 @pytest.mark.asyncio
-async def test_create_jira_ticket(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                mock_session_repo = mock_session_repo_class.return_value
-                mock_session_repo.get_session.return_value = None
-                
-                # Mock the necessary database queries
-                agent = MagicMock()
-                agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                
-                org = MagicMock()
-                org.id = UUID("00000000-0000-0000-0000-000000000002")
-                
-                jira_config = MagicMock()
-                jira_config.enabled = True
-                jira_config.project_key = "TEST"
-                jira_config.issue_type_id = "10001"
-                
-                jira_token = MagicMock()
-                jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                jira_token.access_token = "test_access_token"
-                jira_token.refresh_token = "test_refresh_token"
-                jira_token.cloud_id = "test_cloud_id"
-                
-                # Setup the mock SessionLocal context manager
-                mock_session_local.return_value.__enter__.return_value = mock_db
-                mock_session_local.return_value.__exit__.return_value = None
-                
-                # Setup the mock db query chain
-                mock_db.query.return_value.filter.return_value.first.side_effect = [
-                    agent,  # For Agent query
-                    org,    # For Organization query
-                    jira_config,  # For AgentJiraConfig query
-                    jira_token,   # For JiraToken query
-                ]
-                
-                # Mock the requests.post response for creating an issue
-                mock_response = MagicMock()
-                mock_response.status_code = 201
-                mock_response.json.return_value = {
-                    "id": "10000",
-                    "key": "TEST-123",
-                    "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-                }
-                
-                with patch("requests.post", return_value=mock_response):
-                    # Mock the requests.get response for checking fields
-                    mock_meta_response = MagicMock()
-                    mock_meta_response.status_code = 200
-                    mock_meta_response.json.return_value = {
-                        "projects": [{
-                            "issuetypes": [{
-                                "fields": {
-                                    "priority": {
-                                        "allowedValues": [
-                                            {"name": "Highest"},
-                                            {"name": "High"},
-                                            {"name": "Medium"},
-                                            {"name": "Low"},
-                                            {"name": "Lowest"}
-                                        ]
-                                    }
-                                }
-                            }]
-                        }]
-                    }
-                    
-                    with patch("requests.get", return_value=mock_meta_response):
-                        # Create the JiraTools instance
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                        
-                        # Mock the check_existing_ticket method
-                        with patch.object(jira_tools, 'check_existing_ticket', return_value=json.dumps({
-                            "exists": False,
-                            "message": "No ticket found for this session"
-                        })):
-                            # Mock the JiraService.validate_token method
-                            mock_jira_service.validate_token.return_value = True
-                            
-                            # Act
-                            result_str = jira_tools.create_jira_ticket(
-                                summary="Test ticket",
-                                description="This is a test ticket",
-                                priority="High"
-                            )
-                            
-                            # Parse the JSON string to a dictionary
-                            result = json.loads(result_str)
-                            
-                            # Assert
-                            assert result["success"] is True
-                            assert result["ticket_id"] == "TEST-123"
-                            assert "message" in result
-                            assert "ticket_url" in result
-                            mock_session_repo.update_session.assert_called_once()
-
-def test_check_existing_ticket_none(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("asyncio.run", side_effect=lambda x: x) as mock_asyncio_run:
-                mock_session_repo = mock_session_repo_class.return_value
-                mock_session_repo.get_session.return_value = None
-                
-                jira_tools = JiraTools(
-                    agent_id="00000000-0000-0000-0000-000000000001",
-                    org_id="00000000-0000-0000-0000-000000000002",
-                    session_id="test_session_id"
-                )
-                jira_tools.db = mock_db
-                
-                # Mock the _check_existing_ticket method
-                jira_tools._check_existing_ticket = AsyncMock(return_value={"exists": False, "message": "No ticket found for this session"})
-                
-                # Act
-                result_str = jira_tools.check_existing_ticket()
-                
-                # Parse the JSON string to a dictionary
-                result = json.loads(result_str)
-                
-                # Assert
-                assert result["exists"] is False
-                assert "No ticket found" in result["message"]
-
-def test_check_existing_ticket_exists(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("asyncio.run", side_effect=lambda x: x) as mock_asyncio_run:
-                mock_session_repo = mock_session_repo_class.return_value
-                mock_session = MagicMock()
-                mock_session.ticket_id = "TEST-123"
-                mock_session.ticket_status = "Open"
-                mock_session.ticket_summary = "Test ticket"
-                mock_session.ticket_description = "This is a test ticket"
-                mock_session.ticket_priority = "High"
-                mock_session_repo.get_session.return_value = mock_session
-                
-                jira_tools = JiraTools(
-                    agent_id="00000000-0000-0000-0000-000000000001",
-                    org_id="00000000-0000-0000-0000-000000000002",
-                    session_id="test_session_id"
-                )
-                jira_tools.db = mock_db
-                
-                # Mock the get_ticket_status method to return a response with "In Progress" status
-                with patch.object(jira_tools, 'get_ticket_status', return_value=json.dumps({
-                    "success": True,
-                    "ticket_id": "TEST-123",
-                    "ticket_status": "In Progress",
-                    "ticket_summary": "Test ticket",
-                    "ticket_description": "This is a test ticket",
-                    "ticket_priority": "High",
-                    "ticket_url": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-                })):
-                    # Act
-                    result_str = jira_tools.check_existing_ticket()
-                    
-                    # Parse the JSON string to a dictionary
-                    result = json.loads(result_str)
-                    
-                    # Assert
-                    assert result["exists"] is True
-                    assert result["ticket_id"] == "TEST-123"
-                    assert result["ticket_status"] == "In Progress"
-
-def test_get_ticket_status(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                mock_session_repo = mock_session_repo_class.return_value
-                mock_session = MagicMock()
-                mock_session.ticket_id = "TEST-123"
-                mock_session_repo.get_session.return_value = mock_session
-                
-                # Setup the mock SessionLocal context manager
-                mock_session_local.return_value.__enter__.return_value = mock_db
-                mock_session_local.return_value.__exit__.return_value = None
-                
-                # Setup organization for the test
-                org = MagicMock()
-                org.id = UUID("00000000-0000-0000-0000-000000000002")
-                
-                # Setup jira token
-                jira_token = MagicMock()
-                jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                jira_token.access_token = "test_access_token"
-                jira_token.refresh_token = "test_refresh_token"
-                jira_token.cloud_id = "test_cloud_id"
-                
-                # Setup the mock db query chain
-                mock_db.query.return_value.filter.return_value.first.side_effect = [
-                    org,  # For Organization query
-                    jira_token,  # For JiraToken query
-                ]
-                
-                # Mock requests.get
-                mock_response = MagicMock()
-                mock_response.status_code = 200
-                mock_response.json.return_value = {
-                    "id": "10000",
-                    "key": "TEST-123",
-                    "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123",
-                    "fields": {
-                        "summary": "Test ticket",
-                        "description": "This is a test ticket",
-                        "status": {"name": "In Progress"},
-                        "priority": {"name": "High"}
-                    }
-                }
-                
-                with patch("requests.get", return_value=mock_response):
-                    jira_tools = JiraTools(
-                        agent_id="00000000-0000-0000-0000-000000000001",
-                        org_id="00000000-0000-0000-0000-000000000002",
-                        session_id="test_session_id"
-                    )
-                    
-                    # Act
-                    result_str = jira_tools.get_ticket_status("TEST-123")
-                    
-                    # Parse the JSON string to a dictionary
-                    result = json.loads(result_str)
-                    
-                    # Assert
-                    assert result["success"] is True
-                    assert result["ticket_id"] == "TEST-123"
-                    assert result["ticket_status"] == "In Progress"
-                    assert result["ticket_summary"] == "Test ticket"
-                    assert result["ticket_priority"] == "High"
-
-def test_create_jira_ticket_disabled_integration(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("asyncio.run", side_effect=lambda x: x) as mock_asyncio_run:
-                with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                    mock_session_repo = mock_session_repo_class.return_value
-                    mock_session_repo.get_session.return_value = None
-                    
-                    # Setup SessionLocal to return our test db when used as context manager
-                    mock_session_local.return_value.__enter__.return_value = mock_db
-                    mock_session_local.return_value.__exit__.return_value = None
-                    
-                    # Mock the necessary database queries
-                    agent = MagicMock()
-                    agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                    agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                    
-                    org = MagicMock()
-                    org.id = UUID("00000000-0000-0000-0000-000000000002")
-                    
-                    # Create a Jira config with enabled=False
-                    jira_config = MagicMock()
-                    jira_config.enabled = False
-                    jira_config.project_key = "TEST"
-                    jira_config.issue_type_id = "10001"
-                    
-                    # Setup the mock db query chain
-                    mock_db.query.return_value.filter.return_value.first.side_effect = [
-                        agent,  # For Agent query
-                        org,    # For Organization query
-                        jira_config,  # For AgentJiraConfig query with enabled=False
-                    ]
-                    
-                    # Create the JiraTools instance
-                    jira_tools = JiraTools(
-                        agent_id="00000000-0000-0000-0000-000000000001",
-                        org_id="00000000-0000-0000-0000-000000000002",
-                        session_id="test_session_id"
-                    )
-                    
-                    # Mock the check_existing_ticket method
-                    with patch.object(jira_tools, 'check_existing_ticket', return_value=json.dumps({
-                        "exists": False,
-                        "message": "No ticket found for this session"
-                    })):
-                        # Act
-                        result_str = jira_tools.create_jira_ticket(
-                            summary="Test ticket",
-                            description="This is a test ticket",
-                            priority="High"
-                        )
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is False
-                        assert "Jira integration is not enabled" in result["message"]
-                        # Verify that no API calls were made
-                        mock_jira_service.create_issue.assert_not_called()
-                        mock_session_repo.update_session.assert_not_called()
-
-def test_create_jira_ticket_no_token(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("asyncio.run", side_effect=lambda x: x) as mock_asyncio_run:
-                with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                    mock_session_repo = mock_session_repo_class.return_value
-                    mock_session_repo.get_session.return_value = None
-                    
-                    # Setup SessionLocal to return our test db when used as context manager
-                    mock_session_local.return_value.__enter__.return_value = mock_db
-                    mock_session_local.return_value.__exit__.return_value = None
-                    
-                    # Mock the necessary database queries
-                    agent = MagicMock()
-                    agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                    agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                    
-                    org = MagicMock()
-                    org.id = UUID("00000000-0000-0000-0000-000000000002")
-                    
-                    # Create a Jira config with enabled=True
-                    jira_config = MagicMock()
-                    jira_config.enabled = True
-                    jira_config.project_key = "TEST"
-                    jira_config.issue_type_id = "10001"
-                    
-                    # Return None for the JiraToken query to simulate no token found
-                    mock_db.query.return_value.filter.return_value.first.side_effect = [
-                        agent,  # For Agent query
-                        org,    # For Organization query
-                        jira_config,  # For AgentJiraConfig query
-                        None,   # For JiraToken query - no token found
-                    ]
-                    
-                    # Create the JiraTools instance
-                    jira_tools = JiraTools(
-                        agent_id="00000000-0000-0000-0000-000000000001",
-                        org_id="00000000-0000-0000-0000-000000000002",
-                        session_id="test_session_id"
-                    )
-                    
-                    # Mock the check_existing_ticket method
-                    with patch.object(jira_tools, 'check_existing_ticket', return_value=json.dumps({
-                        "exists": False,
-                        "message": "No ticket found for this session"
-                    })):
-                        # Act
-                        result_str = jira_tools.create_jira_ticket(
-                            summary="Test ticket",
-                            description="This is a test ticket",
-                            priority="High"
-                        )
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is False
-                        assert "No Jira connection found" in result["message"]
-                        # Verify that no API calls were made
-                        mock_jira_service.create_issue.assert_not_called()
-                        mock_session_repo.update_session.assert_not_called()
-
-def test_get_ticket_status_api_error(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("asyncio.run", side_effect=lambda x: x) as mock_asyncio_run:
-                with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                    mock_session_repo = mock_session_repo_class.return_value
-                    mock_session = MagicMock()
-                    mock_session.ticket_id = "TEST-123"
-                    mock_session_repo.get_session.return_value = mock_session
-                    
-                    # Setup SessionLocal to return our test db when used as context manager
-                    mock_session_local.return_value.__enter__.return_value = mock_db
-                    mock_session_local.return_value.__exit__.return_value = None
-                    
-                    # Mock organization
-                    org = MagicMock()
-                    org.id = UUID("00000000-0000-0000-0000-000000000002")
-                    
-                    # Mock Jira token
-                    jira_token = MagicMock()
-                    jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                    jira_token.access_token = "test_access_token"
-                    jira_token.refresh_token = "test_refresh_token"
-                    jira_token.cloud_id = "test_cloud_id"
-                    
-                    # Setup the mock db query chain
-                    mock_db.query.return_value.filter.return_value.first.side_effect = [
-                        org,  # For Organization query
-                        jira_token,  # For JiraToken query
-                    ]
-                    
-                    # Mock requests.get to return an error
-                    mock_response = MagicMock()
-                    mock_response.status_code = 404
-                    mock_response.text = "Issue does not exist"
-                    
-                    with patch("requests.get", return_value=mock_response):
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                        
-                        # Act
-                        result_str = jira_tools.get_ticket_status("TEST-123")
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is False
-                        assert "Failed to get Jira ticket" in result["message"] 
+async def test_check_existing_ticket_none(toolkit):
+    jira_tools = _jira_tools()
+
+    result = json.loads(await jira_tools.check_existing_ticket())
+
+    assert result["exists"] is False
+    assert "No ticket found" in result["message"]
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_invalid_agent_id(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()):
-            # Create JiraTools with invalid agent_id
-            with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                # Setup SessionLocal to return our test db when used as context manager
-                mock_session_local.return_value.__enter__.return_value = mock_db
-                mock_session_local.return_value.__exit__.return_value = None
-                
-                jira_tools = JiraTools(
-                    agent_id="invalid-uuid",
-                    org_id="00000000-0000-0000-0000-000000000002",
-                    session_id="test_session_id"
-                )
-                
-                # Act
-                result_str = jira_tools.create_jira_ticket(
-                    summary="Test ticket",
-                    description="This is a test ticket",
-                    priority="High"
-                )
-                
-                # Parse the JSON string to a dictionary
-                result = json.loads(result_str)
-                
-                # Assert
-                assert result["success"] is False
-                assert "Invalid agent ID format" in result["message"]
+async def test_check_existing_ticket_exists(toolkit):
+    mock_session = MagicMock()
+    mock_session.ticket_id = "TEST-123"
+    mock_session.ticket_status = "Open"
+    mock_session.ticket_summary = "Test ticket"
+    mock_session.ticket_description = "This is a test ticket"
+    mock_session.ticket_priority = "High"
+    toolkit.session_repo.get_session.return_value = mock_session
+
+    jira_tools = _jira_tools()
+    with patch.object(jira_tools, "get_ticket_status", AsyncMock(return_value=json.dumps({
+        "success": True,
+        "ticket_id": "TEST-123",
+        "ticket_status": "In Progress",
+        "ticket_summary": "Test ticket",
+        "ticket_description": "This is a test ticket",
+        "ticket_priority": "High",
+        "ticket_url": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
+    }))):
+        result = json.loads(await jira_tools.check_existing_ticket())
+
+    assert result["exists"] is True
+    assert result["ticket_id"] == "TEST-123"
+    assert result["ticket_status"] == "In Progress"
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_invalid_org_id(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()):
-            with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                # Setup SessionLocal to return our test db when used as context manager
-                mock_session_local.return_value.__enter__.return_value = mock_db
-                mock_session_local.return_value.__exit__.return_value = None
-                
-                # Create JiraTools with invalid org_id
-                jira_tools = JiraTools(
-                    agent_id="00000000-0000-0000-0000-000000000001",
-                    org_id="invalid-uuid",
-                    session_id="test_session_id"
-                )
-                
-                # Mock the agent query to return a valid agent
-                agent = MagicMock()
-                agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                mock_db.query.return_value.filter.return_value.first.return_value = agent
-                
-                # Act
-                result_str = jira_tools.create_jira_ticket(
-                    summary="Test ticket",
-                    description="This is a test ticket",
-                    priority="High"
-                )
-                
-                # Parse the JSON string to a dictionary
-                result = json.loads(result_str)
-                
-                # Assert
-                assert result["success"] is False
-                assert "Invalid organization ID format" in result["message"]
+async def test_get_ticket_status(toolkit, org, jira_token):
+    _set_rows(toolkit.db, org, jira_token)
+    toolkit.http.get.return_value = _response(200, {
+        "id": "10000",
+        "key": "TEST-123",
+        "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123",
+        "fields": {
+            "summary": "Test ticket",
+            "description": "This is a test ticket",
+            "status": {"name": "In Progress"},
+            "priority": {"name": "High"}
+        }
+    })
+
+    result = json.loads(await _jira_tools().get_ticket_status("TEST-123"))
+
+    assert result["success"] is True
+    assert result["ticket_id"] == "TEST-123"
+    assert result["ticket_status"] == "In Progress"
+    assert result["ticket_summary"] == "Test ticket"
+    assert result["ticket_priority"] == "High"
+    assert result["ticket_url"] == "https://example.atlassian.net/browse/TEST-123"
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_token_refresh(mock_db, mock_jira_service):
-    # Create JiraTools instance first
-    jira_tools = JiraTools(
-        agent_id="00000000-0000-0000-0000-000000000001",
-        org_id="00000000-0000-0000-0000-000000000002",
-        session_id="test_session_id"
-    )
-    jira_tools.db = mock_db
-
-    # Create a custom implementation for create_jira_ticket that returns success
-    def mock_create_jira_ticket(*args, **kwargs):
-        # Call mock_db.commit() to simulate the token refresh
-        mock_db.commit()
-        return json.dumps({
-            "success": True,
-            "message": "Ticket created successfully: TEST-123",
-            "ticket_id": "TEST-123",
-            "ticket_url": "https://example.atlassian.net/browse/TEST-123",
-            "was_updated": False
-        })
-    
-    # Replace the real method with our mock
-    with patch.object(JiraTools, 'create_jira_ticket', mock_create_jira_ticket):
-        # Act
-        result_str = jira_tools.create_jira_ticket(
+async def test_create_jira_ticket_disabled_integration(toolkit, agent, org, jira_config):
+    jira_config.enabled = False
+    _set_rows(toolkit.db, agent, org, jira_config)
+
+    jira_tools = _jira_tools()
+    with patch.object(jira_tools, "check_existing_ticket", _no_existing_ticket()):
+        result = json.loads(await jira_tools.create_jira_ticket(
             summary="Test ticket",
             description="This is a test ticket",
             priority="High"
-        )
-        
-        # Parse the JSON string to a dictionary
-        result = json.loads(result_str)
-        
-        # Assert
-        assert result["success"] is True
-        assert result["ticket_id"] == "TEST-123"
-        assert mock_db.commit.called  # Token should be updated in database
+        ))
+
+    assert result["success"] is False
+    assert "Jira integration is not enabled" in result["message"]
+    # No API calls were made
+    toolkit.http.post.assert_not_called()
+    toolkit.session_repo.update_session.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_create_jira_ticket_no_token(toolkit, agent, org, jira_config):
+    _set_rows(toolkit.db, agent, org, jira_config, None)
+
+    jira_tools = _jira_tools()
+    with patch.object(jira_tools, "check_existing_ticket", _no_existing_ticket()):
+        result = json.loads(await jira_tools.create_jira_ticket(
+            summary="Test ticket",
+            description="This is a test ticket",
+            priority="High"
+        ))
+
+    assert result["success"] is False
+    assert "No Jira connection found" in result["message"]
+    toolkit.http.post.assert_not_called()
+    toolkit.session_repo.update_session.assert_not_called()
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_token_refresh_failure(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("requests.post") as mock_post:
-                with patch("os.getenv") as mock_getenv:
-                    with patch("datetime.datetime") as mock_datetime:
-                        with patch("datetime.timedelta", timedelta):
-                            with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                                # Mock datetime.utcnow to return a fixed date
-                                mock_now = MagicMock()
-                                mock_datetime.utcnow.return_value = mock_now
-                                
-                                # Setup environment variables
-                                mock_getenv.side_effect = lambda x: {
-                                    "JIRA_CLIENT_ID": "test_client_id",
-                                    "JIRA_CLIENT_SECRET": "test_client_secret"
-                                }.get(x)
-                                
-                                # Setup SessionLocal to return our test db when used as context manager
-                                mock_session_local.return_value.__enter__.return_value = mock_db
-                                mock_session_local.return_value.__exit__.return_value = None
-                                
-                                # Mock token refresh response with error
-                                mock_refresh_response = MagicMock()
-                                mock_refresh_response.status_code = 400
-                                mock_refresh_response.text = "Invalid refresh token"
-                                mock_post.return_value = mock_refresh_response
-                                
-                                # Setup the mock db query chain
-                                agent = MagicMock()
-                                agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                                agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                                
-                                org = MagicMock()
-                                org.id = UUID("00000000-0000-0000-0000-000000000002")
-                                
-                                jira_config = MagicMock()
-                                jira_config.enabled = True
-                                jira_config.project_key = "TEST"
-                                jira_config.issue_type_id = "10001"
-                                
-                                jira_token = MagicMock()
-                                jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                                jira_token.access_token = "old_access_token"
-                                jira_token.refresh_token = "old_refresh_token"
-                                jira_token.cloud_id = "test_cloud_id"
-                                
-                                mock_db.query.return_value.filter.return_value.first.side_effect = [
-                                    agent,  # For Agent query
-                                    org,    # For Organization query
-                                    jira_config,  # For AgentJiraConfig query
-                                    jira_token,   # For JiraToken query
-                                ]
-                                
-                                # Mock token validation to trigger refresh
-                                mock_jira_service.validate_token.return_value = False
-                                
-                                # Mock session repository
-                                mock_session_repo = mock_session_repo_class.return_value
-                                mock_session_repo.get_session.return_value = None
-                                
-                                # Create JiraTools instance
-                                jira_tools = JiraTools(
-                                    agent_id="00000000-0000-0000-0000-000000000001",
-                                    org_id="00000000-0000-0000-0000-000000000002",
-                                    session_id="test_session_id"
-                                )
-                                
-                                # Act
-                                result_str = jira_tools.create_jira_ticket(
-                                    summary="Test ticket",
-                                    description="This is a test ticket",
-                                    priority="High"
-                                )
-                                
-                                # Parse the JSON string to a dictionary
-                                result = json.loads(result_str)
-                                
-                                # Assert
-                                assert result["success"] is False
-                                assert "Failed to create Jira ticket: Invalid refresh token" in result["message"]
-                                assert mock_post.call_count == 1  # Only the failed token refresh attempt
-                                assert not mock_db.commit.called  # Token should not be updated in database
+async def test_get_ticket_status_api_error(toolkit, org, jira_token):
+    _set_rows(toolkit.db, org, jira_token)
+    toolkit.http.get.return_value = _response(404, text="Issue does not exist")
+
+    result = json.loads(await _jira_tools().get_ticket_status("TEST-123"))
+
+    assert result["success"] is False
+    assert "Failed to get Jira ticket" in result["message"]
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_api_error(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("requests.post") as mock_post:
-                with patch("requests.get") as mock_get:
-                    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                        # Setup SessionLocal to return our test db when used as context manager
-                        mock_session_local.return_value.__enter__.return_value = mock_db
-                        mock_session_local.return_value.__exit__.return_value = None
-                        
-                        # Mock API error response
-                        mock_error_response = MagicMock()
-                        mock_error_response.status_code = 500
-                        mock_error_response.text = "Internal Server Error"
-                        mock_post.return_value = mock_error_response
-                        
-                        # Mock metadata response
-                        mock_meta_response = MagicMock()
-                        mock_meta_response.status_code = 200
-                        mock_meta_response.json.return_value = {
-                            "projects": [{
-                                "issuetypes": [{
-                                    "fields": {
-                                        "priority": {
-                                            "allowedValues": [
-                                                {"name": "High"}
-                                            ]
-                                        }
-                                    }
-                                }]
-                            }]
-                        }
-                        mock_get.return_value = mock_meta_response
-                        
-                        # Setup the mock db query chain
-                        agent = MagicMock()
-                        agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                        agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        org = MagicMock()
-                        org.id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        jira_config = MagicMock()
-                        jira_config.enabled = True
-                        jira_config.project_key = "TEST"
-                        jira_config.issue_type_id = "10001"
-                        
-                        jira_token = MagicMock()
-                        jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        jira_token.access_token = "test_access_token"
-                        jira_token.refresh_token = "test_refresh_token"
-                        jira_token.cloud_id = "test_cloud_id"
-                        
-                        mock_db.query.return_value.filter.return_value.first.side_effect = [
-                            agent,  # For Agent query
-                            org,    # For Organization query
-                            jira_config,  # For AgentJiraConfig query
-                            jira_token,   # For JiraToken query
-                        ]
-                        
-                        # Mock token validation
-                        mock_jira_service.validate_token.return_value = True
-                        
-                        # Mock session repository
-                        mock_session_repo = mock_session_repo_class.return_value
-                        mock_session_repo.get_session.return_value = None
-                        
-                        # Create JiraTools instance
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                        
-                        # Act
-                        result_str = jira_tools.create_jira_ticket(
-                            summary="Test ticket",
-                            description="This is a test ticket",
-                            priority="High"
-                        )
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is False
-                        assert "Failed to create Jira ticket: Internal Server Error" in result["message"]
+async def test_get_ticket_status_request_error(toolkit, org, jira_token):
+    _set_rows(toolkit.db, org, jira_token)
+    toolkit.http.get.side_effect = httpx.ConnectError("Connection refused")
+
+    result = json.loads(await _jira_tools().get_ticket_status("TEST-123"))
+
+    assert result["success"] is False
+    assert "Failed to make request to Jira API: Connection refused" in result["message"]
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_priority_not_available(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("requests.post") as mock_post:
-                with patch("requests.get") as mock_get:
-                    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                        # Setup SessionLocal to return our test db when used as context manager
-                        mock_session_local.return_value.__enter__.return_value = mock_db
-                        mock_session_local.return_value.__exit__.return_value = None
-                        
-                        # Mock successful issue creation
-                        mock_issue_response = MagicMock()
-                        mock_issue_response.status_code = 201
-                        mock_issue_response.json.return_value = {
-                            "id": "10000",
-                            "key": "TEST-123",
-                            "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-                        }
-                        mock_post.return_value = mock_issue_response
-                        
-                        # Mock metadata response without priority field
-                        mock_meta_response = MagicMock()
-                        mock_meta_response.status_code = 200
-                        mock_meta_response.json.return_value = {
-                            "projects": [{
-                                "issuetypes": [{
-                                    "fields": {}  # No priority field available
-                                }]
-                            }]
-                        }
-                        mock_get.return_value = mock_meta_response
-                        
-                        # Setup the mock db query chain
-                        agent = MagicMock()
-                        agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                        agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        org = MagicMock()
-                        org.id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        jira_config = MagicMock()
-                        jira_config.enabled = True
-                        jira_config.project_key = "TEST"
-                        jira_config.issue_type_id = "10001"
-                        
-                        jira_token = MagicMock()
-                        jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        jira_token.access_token = "test_access_token"
-                        jira_token.refresh_token = "test_refresh_token"
-                        jira_token.cloud_id = "test_cloud_id"
-                        jira_token.site_url = "https://example.atlassian.net"
-                        
-                        mock_db.query.return_value.filter.return_value.first.side_effect = [
-                            agent,  # For Agent query
-                            org,    # For Organization query
-                            jira_config,  # For AgentJiraConfig query
-                            jira_token,   # For JiraToken query
-                        ]
-                        
-                        # Mock token validation
-                        mock_jira_service.validate_token.return_value = True
-                        
-                        # Mock session repository
-                        mock_session_repo = mock_session_repo_class.return_value
-                        mock_session_repo.get_session.return_value = None
-                        mock_session_repo.update_session.return_value = True
-                        
-                        # Create JiraTools instance
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                    
-                        # Mock check_existing_ticket to return no existing ticket
-                        with patch.object(jira_tools, 'check_existing_ticket', return_value=json.dumps({
-                            "exists": False,
-                            "message": "No ticket found for this session"
-                        })):
-                            # Act
-                            result_str = jira_tools.create_jira_ticket(
-                                summary="Test ticket",
-                                description="This is a test ticket",
-                                priority="High"  # Priority will be ignored
-                            )
-                            
-                            # Parse the JSON string to a dictionary
-                            result = json.loads(result_str)
-                            
-                            # Assert
-                            assert result["success"] is True
-                            assert result["ticket_id"] == "TEST-123"
-                            # Verify that the API call was made without priority field
-                            api_data = json.loads(json.dumps(mock_post.call_args[1]["json"]))  # Convert to string and back
-                            assert "priority" not in api_data["fields"]
+async def test_create_jira_ticket_invalid_agent_id(toolkit):
+    result = json.loads(await _jira_tools(agent_id="invalid-uuid").create_jira_ticket(
+        summary="Test ticket",
+        description="This is a test ticket",
+        priority="High"
+    ))
+
+    assert result["success"] is False
+    assert "Invalid agent ID format" in result["message"]
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_metadata_error(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("requests.post") as mock_post:
-                with patch("requests.get") as mock_get:
-                    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                        # Setup SessionLocal to return our test db when used as context manager
-                        mock_session_local.return_value.__enter__.return_value = mock_db
-                        mock_session_local.return_value.__exit__.return_value = None
-                        
-                        # Mock successful issue creation
-                        mock_issue_response = MagicMock()
-                        mock_issue_response.status_code = 201
-                        mock_issue_response.json.return_value = {
-                            "id": "10000",
-                            "key": "TEST-123",
-                            "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-                        }
-                        mock_post.return_value = mock_issue_response
-                        
-                        # Mock metadata error response
-                        mock_meta_response = MagicMock()
-                        mock_meta_response.status_code = 500
-                        mock_meta_response.text = "Failed to get metadata"
-                        mock_get.return_value = mock_meta_response
-                        
-                        # Setup the mock db query chain
-                        agent = MagicMock()
-                        agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                        agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        org = MagicMock()
-                        org.id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        jira_config = MagicMock()
-                        jira_config.enabled = True
-                        jira_config.project_key = "TEST"
-                        jira_config.issue_type_id = "10001"
-                        
-                        jira_token = MagicMock()
-                        jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        jira_token.access_token = "test_access_token"
-                        jira_token.refresh_token = "test_refresh_token"
-                        jira_token.cloud_id = "test_cloud_id"
-                        
-                        mock_db.query.return_value.filter.return_value.first.side_effect = [
-                            agent,  # For Agent query
-                            org,    # For Organization query
-                            jira_config,  # For AgentJiraConfig query
-                            jira_token,   # For JiraToken query
-                        ]
-                        
-                        # Mock token validation
-                        mock_jira_service.validate_token.return_value = True
-                        
-                        # Mock session repository
-                        mock_session_repo = mock_session_repo_class.return_value
-                        mock_session_repo.get_session.return_value = None
-                        mock_session_repo.update_session.return_value = True
-                        
-                        # Create JiraTools instance
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                    
-                        # Act
-                        result_str = jira_tools.create_jira_ticket(
-                            summary="Test ticket",
-                            description="This is a test ticket",
-                            priority="High"
-                        )
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is True  # Should still succeed even if metadata fails
-                        assert result["ticket_id"] == "TEST-123"
-                        # Verify that the API call was made without priority field
-                        api_data = json.loads(json.dumps(mock_post.call_args[1]["json"]))  # Convert to string and back
-                        assert "priority" not in api_data["fields"]
+async def test_create_jira_ticket_invalid_org_id(toolkit, agent):
+    _set_rows(toolkit.db, agent)
+
+    result = json.loads(await _jira_tools(org_id="invalid-uuid").create_jira_ticket(
+        summary="Test ticket",
+        description="This is a test ticket",
+        priority="High"
+    ))
+
+    assert result["success"] is False
+    assert "Invalid organization ID format" in result["message"]
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_site_url_from_token(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("requests.post") as mock_post:
-                with patch("requests.get") as mock_get:
-                    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                        # Setup SessionLocal to return our test db when used as context manager
-                        mock_session_local.return_value.__enter__.return_value = mock_db
-                        mock_session_local.return_value.__exit__.return_value = None
-                        
-                        # Mock successful issue creation
-                        mock_issue_response = MagicMock()
-                        mock_issue_response.status_code = 201
-                        mock_issue_response.json.return_value = {
-                            "id": "10000",
-                            "key": "TEST-123",
-                            "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-                        }
-                        mock_post.return_value = mock_issue_response
-                        
-                        # Mock metadata response
-                        mock_meta_response = MagicMock()
-                        mock_meta_response.status_code = 200
-                        mock_meta_response.json.return_value = {
-                            "projects": [{
-                                "issuetypes": [{
-                                    "fields": {}
-                                }]
-                            }]
-                        }
-                        mock_get.return_value = mock_meta_response
-                        
-                        # Setup the mock db query chain
-                        agent = MagicMock()
-                        agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                        agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        org = MagicMock()
-                        org.id = UUID("00000000-0000-0000-0000-000000000002")
-                        org.name = "Test Org"
-                        
-                        jira_config = MagicMock()
-                        jira_config.enabled = True
-                        jira_config.project_key = "TEST"
-                        jira_config.issue_type_id = "10001"
-                        
-                        jira_token = MagicMock()
-                        jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        jira_token.access_token = "test_access_token"
-                        jira_token.refresh_token = "test_refresh_token"
-                        jira_token.cloud_id = "test_cloud_id"
-                        jira_token.site_url = "https://custom.atlassian.net"
-                        jira_token.domain = None
-                        
-                        mock_db.query.return_value.filter.return_value.first.side_effect = [
-                            agent,  # For Agent query
-                            org,    # For Organization query
-                            jira_config,  # For AgentJiraConfig query
-                            jira_token,   # For JiraToken query
-                        ]
-                        
-                        # Mock token validation
-                        mock_jira_service.validate_token.return_value = True
-                        
-                        # Mock session repository
-                        mock_session_repo = mock_session_repo_class.return_value
-                        mock_session_repo.get_session.return_value = None
-                        
-                        # Create JiraTools instance
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                        
-                        # Act
-                        result_str = jira_tools.create_jira_ticket(
-                            summary="Test ticket",
-                            description="This is a test ticket"
-                        )
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is True
-                        assert result["ticket_url"] == "https://custom.atlassian.net/browse/TEST-123"
+async def test_create_jira_ticket_token_refresh(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.jira_service.validate_token.return_value = False
+    toolkit.http.post.side_effect = [
+        _response(200, {
+            "access_token": "new_access_token",
+            "refresh_token": "new_refresh_token",
+            "token_type": "Bearer",
+            "expires_in": 3600
+        }),
+        _created_response()
+    ]
+    toolkit.http.get.return_value = _meta_response()
+
+    jira_tools = _jira_tools()
+    with patch.dict(os.environ, {"JIRA_CLIENT_ID": "test_client_id", "JIRA_CLIENT_SECRET": "test_client_secret"}), \
+         patch.object(jira_tools, "check_existing_ticket", _no_existing_ticket()):
+        result = json.loads(await jira_tools.create_jira_ticket(
+            summary="Test ticket",
+            description="This is a test ticket",
+            priority="High"
+        ))
+
+    assert result["success"] is True
+    assert result["ticket_id"] == "TEST-123"
+    # Token is updated in the database and used for the ticket
+    toolkit.db.commit.assert_awaited_once()
+    assert jira_token.access_token == "new_access_token"
+    assert toolkit.http.post.call_args[1]["headers"]["Authorization"] == "Bearer new_access_token"
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_site_url_from_domain(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("requests.post") as mock_post:
-                with patch("requests.get") as mock_get:
-                    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                        # Setup SessionLocal to return our test db when used as context manager
-                        mock_session_local.return_value.__enter__.return_value = mock_db
-                        mock_session_local.return_value.__exit__.return_value = None
-                        
-                        # Mock successful issue creation
-                        mock_issue_response = MagicMock()
-                        mock_issue_response.status_code = 201
-                        mock_issue_response.json.return_value = {
-                            "id": "10000",
-                            "key": "TEST-123",
-                            "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-                        }
-                        mock_post.return_value = mock_issue_response
-                        
-                        # Mock metadata response
-                        mock_meta_response = MagicMock()
-                        mock_meta_response.status_code = 200
-                        mock_meta_response.json.return_value = {
-                            "projects": [{
-                                "issuetypes": [{
-                                    "fields": {}
-                                }]
-                            }]
-                        }
-                        mock_get.return_value = mock_meta_response
-                        
-                        # Setup the mock db query chain
-                        agent = MagicMock()
-                        agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                        agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        org = MagicMock()
-                        org.id = UUID("00000000-0000-0000-0000-000000000002")
-                        org.name = "Test Org"
-                        
-                        jira_config = MagicMock()
-                        jira_config.enabled = True
-                        jira_config.project_key = "TEST"
-                        jira_config.issue_type_id = "10001"
-                        
-                        jira_token = MagicMock()
-                        jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        jira_token.access_token = "test_access_token"
-                        jira_token.refresh_token = "test_refresh_token"
-                        jira_token.cloud_id = "test_cloud_id"
-                        jira_token.site_url = None
-                        jira_token.domain = "testorg"
-                        
-                        mock_db.query.return_value.filter.return_value.first.side_effect = [
-                            agent,  # For Agent query
-                            org,    # For Organization query
-                            jira_config,  # For AgentJiraConfig query
-                            jira_token,   # For JiraToken query
-                        ]
-                        
-                        # Mock token validation
-                        mock_jira_service.validate_token.return_value = True
-                        
-                        # Mock session repository
-                        mock_session_repo = mock_session_repo_class.return_value
-                        mock_session_repo.get_session.return_value = None
-                        
-                        # Create JiraTools instance
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                    
-                        # Act
-                        result_str = jira_tools.create_jira_ticket(
-                            summary="Test ticket",
-                            description="This is a test ticket"
-                        )
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is True
-                        assert result["ticket_url"] == "https://testorg.atlassian.net/browse/TEST-123"
+async def test_create_jira_ticket_token_refresh_failure(toolkit, agent, org, jira_config, jira_token):
+    jira_token.access_token = "old_access_token"
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.jira_service.validate_token.return_value = False
+    toolkit.http.post.return_value = _response(400, text="Invalid refresh token")
+
+    jira_tools = _jira_tools()
+    with patch.dict(os.environ, {"JIRA_CLIENT_ID": "test_client_id", "JIRA_CLIENT_SECRET": "test_client_secret"}):
+        result = json.loads(await jira_tools.create_jira_ticket(
+            summary="Test ticket",
+            description="This is a test ticket",
+            priority="High"
+        ))
+
+    assert result["success"] is False
+    assert "Failed to refresh Jira token: Invalid refresh token" in result["message"]
+    assert toolkit.http.post.call_count == 1  # Only the failed token refresh attempt
+    assert not toolkit.db.commit.called  # Token should not be updated in database
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_session_update_failure(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("requests.post") as mock_post:
-                with patch("requests.get") as mock_get:
-                    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                        # Setup SessionLocal to return our test db when used as context manager
-                        mock_session_local.return_value.__enter__.return_value = mock_db
-                        mock_session_local.return_value.__exit__.return_value = None
-                        
-                        # Mock successful issue creation
-                        mock_issue_response = MagicMock()
-                        mock_issue_response.status_code = 201
-                        mock_issue_response.json.return_value = {
-                            "id": "10000",
-                            "key": "TEST-123",
-                            "self": "https://example.atlassian.net/rest/api/3/issue/TEST-123"
-                        }
-                        mock_post.return_value = mock_issue_response
-                        
-                        # Mock metadata response
-                        mock_meta_response = MagicMock()
-                        mock_meta_response.status_code = 200
-                        mock_meta_response.json.return_value = {
-                            "projects": [{
-                                "issuetypes": [{
-                                    "fields": {}
-                                }]
-                            }]
-                        }
-                        mock_get.return_value = mock_meta_response
-                        
-                        # Setup the mock db query chain
-                        agent = MagicMock()
-                        agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                        agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        
-                        org = MagicMock()
-                        org.id = UUID("00000000-0000-0000-0000-000000000002")
-                        org.name = "Test Org"
-                        
-                        jira_config = MagicMock()
-                        jira_config.enabled = True
-                        jira_config.project_key = "TEST"
-                        jira_config.issue_type_id = "10001"
-                        
-                        jira_token = MagicMock()
-                        jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                        jira_token.access_token = "test_access_token"
-                        jira_token.refresh_token = "test_refresh_token"
-                        jira_token.cloud_id = "test_cloud_id"
-                        
-                        mock_db.query.return_value.filter.return_value.first.side_effect = [
-                            agent,  # For Agent query
-                            org,    # For Organization query
-                            jira_config,  # For AgentJiraConfig query
-                            jira_token,   # For JiraToken query
-                        ]
-                        
-                        # Mock token validation
-                        mock_jira_service.validate_token.return_value = True
-                        
-                        # Mock session repository
-                        mock_session_repo = mock_session_repo_class.return_value
-                        mock_session_repo.get_session.return_value = None
-                        mock_session_repo.update_session.side_effect = Exception("Failed to update session")
-                        
-                        # Create JiraTools instance
-                        jira_tools = JiraTools(
-                            agent_id="00000000-0000-0000-0000-000000000001",
-                            org_id="00000000-0000-0000-0000-000000000002",
-                            session_id="test_session_id"
-                        )
-                    
-                        # Act
-                        result_str = jira_tools.create_jira_ticket(
-                            summary="Test ticket",
-                            description="This is a test ticket"
-                        )
-                        
-                        # Parse the JSON string to a dictionary
-                        result = json.loads(result_str)
-                        
-                        # Assert
-                        assert result["success"] is True  # Should still succeed even if session update fails
-                        assert result["ticket_id"] == "TEST-123"
-                        # Verify that session update was attempted
-                        mock_session_repo.update_session.assert_called_once() 
+async def test_create_jira_ticket_api_error(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.post.return_value = _response(500, text="Internal Server Error")
+    toolkit.http.get.return_value = _meta_response({"priority": {"allowedValues": [{"name": "High"}]}})
+
+    result = json.loads(await _jira_tools().create_jira_ticket(
+        summary="Test ticket",
+        description="This is a test ticket",
+        priority="High"
+    ))
+
+    assert result["success"] is False
+    assert "Failed to create Jira ticket: Internal Server Error" in result["message"]
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_update_description(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-        # Setup SessionLocal to return our test db when used as context manager
-        mock_session_local.return_value.__enter__.return_value = mock_db
-        mock_session_local.return_value.__exit__.return_value = None
-        
-        # Create JiraTools instance first
-        jira_tools = JiraTools(
-            agent_id="00000000-0000-0000-0000-000000000001",
-            org_id="00000000-0000-0000-0000-000000000002",
-            session_id="test_session_id"
-        )
-        
-        # Create a custom implementation for create_jira_ticket that returns success
-        def mock_create_jira_ticket(*args, **kwargs):
-            return json.dumps({
-                "success": True,
-                "message": "Ticket updated successfully: TEST-123",
-                "ticket_id": "TEST-123",
-                "ticket_url": "https://example.atlassian.net/browse/TEST-123",
-                "was_updated": True
-            })
-        
-        # Replace the real method with our mock
-        with patch.object(JiraTools, 'create_jira_ticket', mock_create_jira_ticket):
-            # Act
-            result_str = jira_tools.create_jira_ticket(
-                summary="Updated ticket",
-                description="Updated description"
-            )
-            
-            # Parse the JSON string to a dictionary
-            result = json.loads(result_str)
-            
-            # Assert
-            assert result["success"] is True
-            assert result["ticket_id"] == "TEST-123"
-            assert "was_updated" in result
-            assert result["was_updated"] is True
+async def test_create_jira_ticket_priority_not_available(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.post.return_value = _created_response()
+    toolkit.http.get.return_value = _meta_response()  # No priority field available
+
+    jira_tools = _jira_tools()
+    with patch.object(jira_tools, "check_existing_ticket", _no_existing_ticket()):
+        result = json.loads(await jira_tools.create_jira_ticket(
+            summary="Test ticket",
+            description="This is a test ticket",
+            priority="High"  # Priority will be ignored
+        ))
+
+    assert result["success"] is True
+    assert result["ticket_id"] == "TEST-123"
+    assert "priority" not in toolkit.http.post.call_args[1]["json"]["fields"]
+
+
+@pytest.mark.asyncio
+async def test_create_jira_ticket_metadata_error(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.post.return_value = _created_response()
+    toolkit.http.get.return_value = _response(500, text="Failed to get metadata")
+
+    result = json.loads(await _jira_tools().create_jira_ticket(
+        summary="Test ticket",
+        description="This is a test ticket",
+        priority="High"
+    ))
+
+    assert result["success"] is True  # Should still succeed even if metadata fails
+    assert result["ticket_id"] == "TEST-123"
+    assert "priority" not in toolkit.http.post.call_args[1]["json"]["fields"]
+
+
+@pytest.mark.asyncio
+async def test_create_jira_ticket_site_url_from_token(toolkit, agent, org, jira_config, jira_token):
+    jira_token.site_url = "https://custom.atlassian.net"
+    jira_token.domain = None
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.post.return_value = _created_response()
+    toolkit.http.get.return_value = _meta_response()
+
+    result = json.loads(await _jira_tools().create_jira_ticket(
+        summary="Test ticket",
+        description="This is a test ticket"
+    ))
+
+    assert result["success"] is True
+    assert result["ticket_url"] == "https://custom.atlassian.net/browse/TEST-123"
+
+
+@pytest.mark.asyncio
+async def test_create_jira_ticket_site_url_from_domain(toolkit, agent, org, jira_config, jira_token):
+    jira_token.site_url = None
+    jira_token.domain = "testorg"
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.post.return_value = _created_response()
+    toolkit.http.get.return_value = _meta_response()
+
+    result = json.loads(await _jira_tools().create_jira_ticket(
+        summary="Test ticket",
+        description="This is a test ticket"
+    ))
+
+    assert result["success"] is True
+    assert result["ticket_url"] == "https://testorg.atlassian.net/browse/TEST-123"
+
 
 @pytest.mark.asyncio
-async def test_create_jira_ticket_update_description_error(mock_db, mock_jira_service):
-    # Arrange
-    with patch("app.tools.jira_toolkit.JiraService", return_value=mock_jira_service):
-        with patch("app.tools.jira_toolkit.SessionToAgentRepository", return_value=MagicMock()) as mock_session_repo_class:
-            with patch("asyncio.run", side_effect=lambda x: x):
-                with patch("datetime.datetime") as mock_datetime:
-                    with patch("datetime.timedelta", timedelta):
-                        with patch("requests.post") as mock_post:
-                            with patch("requests.get") as mock_get:
-                                with patch("requests.put") as mock_put:
-                                    with patch("app.tools.jira_toolkit.SessionLocal") as mock_session_local:
-                                        # Setup SessionLocal to return our test db when used as context manager
-                                        mock_session_local.return_value.__enter__.return_value = mock_db
-                                        mock_session_local.return_value.__exit__.return_value = None
-                                        
-                                        # Mock datetime.utcnow and datetime.now
-                                        mock_now = MagicMock()
-                                        mock_datetime.utcnow.return_value = mock_now
-                                        mock_datetime.now.return_value = mock_now
-                                        mock_now.strftime.return_value = "2024-07-26 00:00:00"
-                                        
-                                        # Mock existing ticket check
-                                        mock_session_repo = mock_session_repo_class.return_value
-                                        mock_session = MagicMock()
-                                        mock_session.ticket_id = "TEST-123"
-                                        mock_session_repo.get_session.return_value = mock_session
-                                        
-                                        # We're not using the JiraService's create_issue method in this test
-                                        # Instead, we're directly mocking the requests calls
-                                        
-                                        # Mock token validation
-                                        mock_jira_service.validate_token.return_value = True
-                                        
-                                        # Mock existing ticket response with error
-                                        mock_existing_response = MagicMock()
-                                        mock_existing_response.status_code = 404
-                                        mock_existing_response.text = "Error updating Jira ticket"
-                                        
-                                        # Mock get responses
-                                        mock_get.side_effect = [
-                                            # First call for metadata
-                                            MagicMock(
-                                                status_code=200,
-                                                json=lambda: {
-                                                    "projects": [{
-                                                        "issuetypes": [{
-                                                            "fields": {}
-                                                        }]
-                                                    }]
-                                                }
-                                            ),
-                                            # Second call for existing ticket
-                                            mock_existing_response
-                                        ]
-                                        
-                                        # Setup the mock db query chain
-                                        agent = MagicMock()
-                                        agent.id = UUID("00000000-0000-0000-0000-000000000001")
-                                        agent.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                                        
-                                        org = MagicMock()
-                                        org.id = UUID("00000000-0000-0000-0000-000000000002")
-                                        org.name = "Test Org"
-                                        
-                                        jira_config = MagicMock()
-                                        jira_config.enabled = True
-                                        jira_config.project_key = "TEST"
-                                        jira_config.issue_type_id = "10001"
-                                        
-                                        jira_token = MagicMock()
-                                        jira_token.organization_id = UUID("00000000-0000-0000-0000-000000000002")
-                                        jira_token.access_token = "test_access_token"
-                                        jira_token.refresh_token = "test_refresh_token"
-                                        jira_token.cloud_id = "test_cloud_id"
-                                        jira_token.site_url = "https://example.atlassian.net"
-                                        
-                                        # Handle the datetime comparison issue by making expires_at a MagicMock with proper comparison
-                                        from datetime import datetime, timedelta as real_timedelta
-                                        future_time = datetime.utcnow() + real_timedelta(hours=1)
-                                        jira_token.expires_at = future_time
-                                        
-                                        mock_db.query.return_value.filter.return_value.first.side_effect = [
-                                            agent,  # For Agent query
-                                            org,    # For Organization query
-                                            jira_config,  # For AgentJiraConfig query
-                                            jira_token,   # For JiraToken query
-                                        ]
-                                        
-                                        # Create JiraTools instance
-                                        jira_tools = JiraTools(
-                                            agent_id="00000000-0000-0000-0000-000000000001",
-                                            org_id="00000000-0000-0000-0000-000000000002",
-                                            session_id="test_session_id"
-                                        )
-                                        
-                                        # Mock check_existing_ticket to return existing ticket
-                                        with patch.object(jira_tools, 'check_existing_ticket', return_value=json.dumps({
-                                            "exists": True,
-                                            "ticket_id": "TEST-123",
-                                            "ticket_status": "Open"
-                                        })):
-                                            # Act
-                                            result_str = jira_tools.create_jira_ticket(
-                                                summary="Updated ticket",
-                                                description="Updated description"
-                                            )
-                                            
-                                            # Parse the JSON string to a dictionary
-                                            result = json.loads(result_str)
-                                            
-                                            # Assert
-                                            assert result["success"] is False
-                                            assert "Error updating Jira ticket" in result["message"]
-                                            assert mock_put.call_count == 0  # No update should be attempted 
\ No newline at end of file
+async def test_create_jira_ticket_session_update_failure(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.post.return_value = _created_response()
+    toolkit.http.get.return_value = _meta_response()
+    toolkit.session_repo.update_session.side_effect = Exception("Failed to update session")
+
+    result = json.loads(await _jira_tools().create_jira_ticket(
+        summary="Test ticket",
+        description="This is a test ticket"
+    ))
+
+    assert result["success"] is True  # Should still succeed even if session update fails
+    assert result["ticket_id"] == "TEST-123"
+    toolkit.session_repo.update_session.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_create_jira_ticket_update_description(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.get.side_effect = [
+        _meta_response(),
+        # Existing ticket details
+        _response(200, {"key": "TEST-123", "fields": {"description": {
+            "type": "doc",
+            "version": 1,
+            "content": [{"type": "paragraph", "content": [{"type": "text", "text": "Original description"}]}]
+        }}}),
+        # Updated ticket details
+        _response(200, {"key": "TEST-123"})
+    ]
+    toolkit.http.put.return_value = _response(204)
+
+    jira_tools = _jira_tools()
+    with patch.object(jira_tools, "check_existing_ticket", AsyncMock(return_value=json.dumps({
+        "exists": True,
+        "ticket_id": "TEST-123",
+        "ticket_status": "Open"
+    }))):
+        result = json.loads(await jira_tools.create_jira_ticket(
+            summary="Updated ticket",
+            description="Updated description"
+        ))
+
+    assert result["success"] is True
+    assert result["ticket_id"] == "TEST-123"
+    assert result["was_updated"] is True
+    toolkit.http.post.assert_not_called()
+    fields = toolkit.http.put.call_args[1]["json"]["fields"]
+    assert "project" not in fields
+    description = fields["description"]["content"][0]["content"][0]["text"]
+    assert description.startswith("Original description")
+    assert description.endswith("Updated description")
+
+
+@pytest.mark.asyncio
+async def test_create_jira_ticket_update_description_error(toolkit, agent, org, jira_config, jira_token):
+    _set_rows(toolkit.db, agent, org, jira_config, jira_token)
+    toolkit.http.get.side_effect = [
+        _meta_response(),
+        _response(404, text="Error updating Jira ticket")
+    ]
+
+    jira_tools = _jira_tools()
+    with patch.object(jira_tools, "check_existing_ticket", AsyncMock(return_value=json.dumps({
+        "exists": True,
+        "ticket_id": "TEST-123",
+        "ticket_status": "Open"
+    }))):
+        result = json.loads(await jira_tools.create_jira_ticket(
+            summary="Updated ticket",
+            description="Updated description"
+        ))
+
+    assert result["success"] is False
+    assert "Error updating Jira ticket" in result["message"]
+    toolkit.http.put.assert_not_called()
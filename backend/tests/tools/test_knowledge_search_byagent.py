@@ -84,7 +84,7 @@ def knowledge_search_tool(mock_db, mock_knowledge, mock_vector_db, mock_agent_kn
     
     # Create a real instance but with mocked dependencies
     with patch('app.tools.knowledge_search_byagent.SessionLocal') as mock_session_local, \
-         patch('app.tools.knowledge_search_byagent.PgVector') as mock_pg_vector, \
+         patch('app.tools.knowledge_search_byagent.OptimizedPgVector') as mock_pg_vector, \
          patch('app.tools.knowledge_search_byagent.AgentKnowledge') as mock_agent_knowledge_class, \
          patch('app.tools.knowledge_search_byagent.KnowledgeRepository') as mock_knowledge_repo_class, \
          patch('app.tools.knowledge_search_byagent.AIConfigRepository') as mock_ai_config_repo_class, \
@@ -129,11 +129,11 @@ def knowledge_search_tool(mock_db, mock_knowledge, mock_vector_db, mock_agent_kn
                 if not knowledge_sources:
                     return "No knowledge sources available for this agent."
                 
-                # Search with agent_id filter
+                # Search the linked sources
                 documents = tool.agent_knowledge.search(
                     query=query,
                     num_documents=5,
-                    filters={"agent_id": [str(tool.agent_id)]}
+                    filters={"name": [source.source for source in knowledge_sources]}
                 )
                 
                 search_results = []
@@ -395,4 +395,29 @@ def test_search_knowledge_base_error(knowledge_search_tool):
     result = knowledge_search_tool.search_knowledge_base(query)
     
     # Assert
-    assert "Error searching knowledge base" in result
\ No newline at end of file
+    assert "Error searching knowledge base" in result
+def test_search_is_restricted_to_linked_sources(mock_knowledge):
+    """Agent visibility comes from the knowledge links, passed to the vector db as source names"""
+    other = MagicMock(source="faq.html", source_type=SourceType.WEBSITE)
+    agent_knowledge = MagicMock(spec=AgentKnowledge)
+    agent_knowledge.search.return_value = []
+
+    with patch('app.tools.knowledge_search_byagent.SessionLocal'), \
+         patch('app.tools.knowledge_search_byagent.AIConfigRepository'), \
+         patch('app.tools.knowledge_search_byagent.decrypt_api_key', return_value="test-key"), \
+         patch('app.tools.knowledge_search_byagent.KnowledgeRepository') as mock_knowledge_repo_class:
+        mock_knowledge_repo_class.return_value.get_by_agent.return_value = [mock_knowledge, other]
+
+        tool = KnowledgeSearchByAgent(agent_id=str(uuid4()), org_id=uuid4())
+        tool.agent_knowledge = agent_knowledge
+        tool._search_knowledge_base("test query")
+        assert agent_knowledge.search.call_args.kwargs["filters"] == {"name": ["test_document.pdf", "faq.html"]}
+
+        tool.source = "faq.html"
+        tool._search_knowledge_base("test query")
+        assert agent_knowledge.search.call_args.kwargs["filters"] == {"name": ["faq.html"]}
+
+        tool.source = "unlinked.pdf"
+        agent_knowledge.search.reset_mock()
+        assert tool._search_knowledge_base("test query") == "No relevant information found in the knowledge base."
+        agent_knowledge.search.assert_not_called()
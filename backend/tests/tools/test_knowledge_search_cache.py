@@ -0,0 +1,176 @@
+"""
+ChatterMate - Test Knowledge Search Cache
+Copyright (C) 2024 ChatterMate
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>
+"""
+
+import asyncio
+import time
+import pytest
+from uuid import uuid4
+from unittest.mock import MagicMock, patch
+from app.tools.knowledge_search_byagent import (
+    KnowledgeSearchByAgent,
+    KnowledgePrefetchStats,
+    KnowledgeSearchCache,
+    SEARCH_ERROR_MESSAGE
+)
+
+
+@pytest.fixture
+def cache():
+    with patch("app.core.redis.get_redis", return_value=None):
+        yield KnowledgeSearchCache(max_queries=2, max_results=10, ttl=60)
+
+
+@pytest.fixture
+def tool(cache):
+    with patch("app.tools.knowledge_search_byagent.SessionLocal"), \
+         patch("app.tools.knowledge_search_byagent.AIConfigRepository"), \
+         patch("app.tools.knowledge_search_byagent.decrypt_api_key", return_value="test-key"), \
+         patch("app.tools.knowledge_search_byagent.knowledge_search_cache", cache):
+        tool = KnowledgeSearchByAgent(agent_id=str(uuid4()), org_id=uuid4())
+        with patch.object(tool, "_search_knowledge_base", return_value="[FILE - doc.pdf] answer") as search:
+            tool._search = search
+            yield tool
+
+
+def test_query_embeddings_are_reused_and_evicted(cache):
+    embedder = MagicMock(id="model-a")
+    embedder.get_embedding.side_effect = lambda text: [float(len(text))]
+
+    assert cache.get_query_embedding(embedder, "Shipping  Policy") == [16.0]
+    assert cache.get_query_embedding(embedder, "shipping policy") == [16.0]
+    cache.get_query_embedding(embedder, "returns")
+    cache.get_query_embedding(embedder, "refunds")
+    cache.get_query_embedding(embedder, "shipping policy")
+
+    stats = cache.get_stats()
+    assert embedder.get_embedding.call_count == 4
+    assert stats["embedding_hits"] == 1
+    assert stats["embedding_cache_size"] == 2
+
+
+def test_results_are_cached_per_agent(tool, cache):
+    assert asyncio.run(tool.search_knowledge_base("Shipping policy?")) == "[FILE - doc.pdf] answer"
+    assert asyncio.run(tool.search_knowledge_base("shipping   POLICY?")) == "[FILE - doc.pdf] answer"
+
+    assert tool._search.call_count == 1
+    assert cache.get_stats()["result_hits"] == 1
+
+
+def test_results_expire_after_ttl(tool, cache):
+    with patch("app.tools.knowledge_search_byagent.time.monotonic", return_value=1000):
+        asyncio.run(tool.search_knowledge_base("shipping"))
+    with patch("app.tools.knowledge_search_byagent.time.monotonic", return_value=1000 + cache.ttl + 1):
+        asyncio.run(tool.search_knowledge_base("shipping"))
+
+    assert tool._search.call_count == 2
+
+
+def test_agent_and_organization_invalidation(tool, cache):
+    asyncio.run(tool.search_knowledge_base("shipping"))
+    cache.invalidate_agent(tool.agent_id)
+    asyncio.run(tool.search_knowledge_base("shipping"))
+    cache.invalidate_organization(tool.org_id)
+    asyncio.run(tool.search_knowledge_base("shipping"))
+    cache.invalidate_agent(uuid4())
+    asyncio.run(tool.search_knowledge_base("shipping"))
+
+    assert tool._search.call_count == 3
+    assert cache.get_stats()["invalidations"] == 3
+
+
+def test_invalidation_is_shared_through_redis(cache):
+    redis_client = MagicMock()
+    redis_client.mget.return_value = [b"1", None]
+    with patch("app.core.redis.get_redis", return_value=redis_client):
+        before = cache.result_key("org", "agent", None, "shipping")
+        cache.invalidate_agent("agent")
+        redis_client.mget.return_value = [b"2", None]
+        after = cache.result_key("org", "agent", None, "shipping")
+
+    redis_client.incr.assert_called_once_with("knowledge_search:version:agent:agent")
+    assert before != after
+
+
+def test_errors_are_not_cached(tool):
+    tool._search.return_value = SEARCH_ERROR_MESSAGE
+
+    asyncio.run(tool.search_knowledge_base("shipping"))
+    asyncio.run(tool.search_knowledge_base("shipping"))
+
+    assert tool._search.call_count == 2
+
+
+@pytest.fixture
+def prefetch_stats():
+    stats = KnowledgePrefetchStats()
+    with patch("app.tools.knowledge_search_byagent.knowledge_prefetch_stats", stats):
+        yield stats
+
+
+def slow_search(seconds):
+    def search(query):
+        time.sleep(seconds)
+        return f"[FILE - doc.pdf] {query}"
+    return search
+
+
+@pytest.mark.asyncio
+async def test_prefetch_answers_a_similar_tool_query(tool, prefetch_stats):
+    tool._search.side_effect = slow_search(0.2)
+
+    prefetch = tool.prefetch("What is your shipping policy?")
+    await asyncio.sleep(0.25)  # The model's first step
+    started = time.perf_counter()
+    results = await tool.search_knowledge_base("shipping policy")
+    elapsed = time.perf_counter() - started
+    prefetch.finish()
+
+    assert results == "[FILE - doc.pdf] What is your shipping policy?"
+    assert elapsed < 0.1
+    assert tool._search.call_count == 1
+    stats = prefetch_stats.get_stats()
+    assert (stats["hits"], stats["hit_rate"]) == (1, 1.0)
+    assert stats["saved_ms"] >= 150
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_not_used_for_a_different_query(tool, prefetch_stats):
+    tool._search.side_effect = slow_search(0.1)
+
+    prefetch = tool.prefetch("How do I reset my password?")
+    results = await tool.search_knowledge_base("shipping policy")
+    prefetch.finish()
+
+    assert results == "[FILE - doc.pdf] shipping policy"
+    assert prefetch_stats.get_stats()["misses"] == 1
+    # Outside the run the tool searches normally again
+    assert await tool.search_knowledge_base("reset password") == "[FILE - doc.pdf] reset password"
+
+
+@pytest.mark.asyncio
+async def test_unused_prefetch_is_cancelled(tool, prefetch_stats):
+    tool._search.side_effect = slow_search(0.1)
+
+    prefetch = tool.prefetch("Hello there")
+    await asyncio.sleep(0)
+    prefetch.finish()
+    await asyncio.sleep(0)
+
+    assert prefetch._task.cancelled()
+    stats = prefetch_stats.get_stats()
+    assert (stats["unused"], stats["hit_rate"], stats["saved_ms"]) == (1, 0.0, 0.0)
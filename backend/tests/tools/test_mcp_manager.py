@@ -119,3 +119,170 @@ async def test_initialize_and_cleanup_helpers():
         mock_mgr.cleanup_mcp_tools.assert_awaited()
 
 
+
+
+def _pool_tool_config(name="FS Tool"):
+    from app.models.mcp_tool import MCPTransportType
+    config = MagicMock()
+    config.id = uuid4()
+    config.updated_at = "v1"
+    config.name = name
+    config.transport_type = MCPTransportType.STDIO
+    config.command = "npx"
+    config.args = ["-y", "@modelcontextprotocol/server-filesystem", "/tmp"]
+    config.env_vars = {}
+    return config
+
+
+def _connected_tools():
+    tools = AsyncMock()
+    tools.functions = {"list": MagicMock()}
+    return tools
+
+
+@pytest.mark.asyncio
+async def test_pooled_session_reused_across_managers():
+    from app.tools.mcp_manager import MCPSessionPool
+    pool = MCPSessionPool(max_sessions=4, max_per_tool=2, acquire_timeout=0.1)
+    config = _pool_tool_config()
+
+    with patch("app.tools.mcp_manager.SessionLocal"), \
+         patch("app.tools.mcp_manager.MCPToolRepository") as mock_repo_cls, \
+         patch("app.tools.mcp_manager.MCPTools") as mock_mcp_tools_cls:
+        mock_repo_cls.return_value.get_agent_mcp_tools.return_value = [config]
+        mock_mcp_tools_cls.side_effect = lambda *args, **kwargs: _connected_tools()
+
+        first = MCPToolsManager(pool=pool)
+        tools = await first.initialize_mcp_tools("agent", "org")
+        await first.cleanup_mcp_tools()
+
+        second = MCPToolsManager(pool=pool)
+        assert await second.initialize_mcp_tools("agent", "org") == tools
+        await second.cleanup_mcp_tools()
+
+        # One process spawned for both runs, still open after their cleanup
+        assert mock_mcp_tools_cls.call_count == 1
+        tools[0].__aexit__.assert_not_awaited()
+        assert pool.get_stats()["reuses"] == 1
+
+        await pool.close_all()
+        tools[0].__aexit__.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_pool_waits_for_free_session_then_times_out():
+    from app.tools.mcp_manager import MCPSessionPool
+    pool = MCPSessionPool(max_sessions=4, max_per_tool=1, acquire_timeout=0.05)
+    key = ("tool", "v1")
+
+    lease = await pool.acquire(key, "tool", _connected_tools)
+    assert await pool.acquire(key, "tool", _connected_tools) is None
+    assert pool.get_stats()["timeouts"] == 1
+
+    waiter = asyncio.create_task(pool.acquire(key, "tool", _connected_tools))
+    await asyncio.sleep(0)
+    await pool.release(lease)
+    assert await waiter is lease
+    await pool.close_all()
+
+
+@pytest.mark.asyncio
+async def test_pool_closes_idle_and_superseded_sessions():
+    from app.tools.mcp_manager import MCPSessionPool
+    pool = MCPSessionPool(max_sessions=4, max_per_tool=2, idle_timeout=0)
+
+    old = await pool.acquire(("tool", "v1"), "tool", _connected_tools)
+    await pool.release(old)
+    new = await pool.acquire(("tool", "v2"), "tool", _connected_tools)
+
+    assert new is not old
+    old.tools.__aexit__.assert_awaited()
+    assert pool.get_stats()["sessions"] == 1
+    await pool.close_all()
+
+
+@pytest.mark.asyncio
+async def test_pool_reconnects_after_failed_health_check():
+    from app.tools.mcp_manager import MCPSessionPool
+    pool = MCPSessionPool(max_sessions=4, max_per_tool=1, health_check_interval=0)
+    key = ("tool", "v1")
+
+    first = await pool.acquire(key, "tool", _connected_tools)
+    first.tools.session.send_ping.side_effect = ConnectionError("broken pipe")
+    await pool.release(first)
+
+    second = await pool.acquire(key, "tool", _connected_tools)
+    assert second is not first
+    first.tools.__aexit__.assert_awaited()
+    assert pool.get_stats()["health_check_failures"] == 1
+    await pool.close_all()
+
+
+@pytest.mark.asyncio
+async def test_cached_catalog_builds_tools_without_connecting():
+    from datetime import datetime, timezone
+    from app.repositories.mcp_tool import mcp_tool_fingerprint
+    from app.tools.mcp_manager import MCPSessionPool, CatalogMCPTools
+    pool = MCPSessionPool(max_sessions=4, max_per_tool=1)
+    config = _pool_tool_config()
+    config.tool_catalog = [{"name": "list", "description": "List files", "parameters": {"type": "object", "properties": {}}}]
+    config.catalog_fingerprint = mcp_tool_fingerprint(config)
+    config.catalog_refreshed_at = datetime.now(timezone.utc)
+
+    with patch("app.tools.mcp_manager.SessionLocal"), \
+         patch("app.tools.mcp_manager.MCPToolRepository") as mock_repo_cls, \
+         patch("app.tools.mcp_manager.MCPTools") as mock_mcp_tools_cls:
+        mock_repo_cls.return_value.get_agent_mcp_tools.return_value = [config]
+        connected = _connected_tools()
+        connected.functions["list"].entrypoint = AsyncMock(return_value="a.txt")
+        mock_mcp_tools_cls.return_value = connected
+
+        manager = MCPToolsManager(pool=pool)
+        tools = await manager.initialize_mcp_tools("agent", "org")
+        assert isinstance(tools[0], CatalogMCPTools)
+        assert tools[0].functions["list"].parameters == config.tool_catalog[0]["parameters"]
+        mock_mcp_tools_cls.assert_not_called()
+
+        # The first tool call connects through the pool
+        assert await tools[0].functions["list"].entrypoint(agent=None, path="/tmp") == "a.txt"
+        connected.functions["list"].entrypoint.assert_awaited_once_with(agent=None, path="/tmp")
+        await manager.cleanup_mcp_tools()
+        stats = pool.get_stats()
+        assert (stats["sessions"], stats["in_use"]) == (1, 0)
+    await pool.close_all()
+
+
+@pytest.mark.asyncio
+async def test_stale_catalog_is_served_and_refreshed_in_background():
+    from datetime import datetime, timezone
+    from app.repositories.mcp_tool import mcp_tool_fingerprint
+    from app.tools.mcp_manager import MCPSessionPool, _catalog_refreshes
+    pool = MCPSessionPool(max_sessions=4, max_per_tool=1)
+    config = _pool_tool_config()
+    config.tool_catalog = [{"name": "list", "description": "List files", "parameters": {}}]
+    config.catalog_fingerprint = mcp_tool_fingerprint(config)
+    config.catalog_refreshed_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    listed_tool = MagicMock(description="Read a file", inputSchema={"type": "object"})
+    listed_tool.name = "read"
+    with patch("app.tools.mcp_manager.SessionLocal"), \
+         patch("app.tools.mcp_manager.MCPToolRepository") as mock_repo_cls, \
+         patch("app.tools.mcp_manager.MCPTools") as mock_mcp_tools_cls:
+        mock_repo_cls.return_value.get_agent_mcp_tools.return_value = [config]
+        connected = _connected_tools()
+        connected.session.list_tools.return_value = MagicMock(tools=[listed_tool])
+        mock_mcp_tools_cls.return_value = connected
+
+        manager = MCPToolsManager(pool=pool)
+        tools = await manager.initialize_mcp_tools("agent", "org")
+        assert list(tools[0].functions) == ["list"]
+
+        await asyncio.gather(*_catalog_refreshes.values())
+        mock_repo_cls.return_value.save_tool_catalog.assert_called_once_with(
+            config.id,
+            [{"name": "read", "description": "Read a file", "parameters": {"type": "object"}}],
+            config.catalog_fingerprint
+        )
+        await manager.cleanup_mcp_tools()
+    await pool.close_all()
+
@@ -17,14 +17,15 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
 import pytest
+import asyncio
+import time
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from app.tools.shopify_toolkit import ShopifyTools
 from app.models.shopify import AgentShopifyConfig, ShopifyShop
 from app.models.organization import Organization
 from app.models.agent import Agent
 from uuid import UUID, uuid4
-import requests
 
 @pytest.fixture
 def mock_db():
@@ -120,9 +121,10 @@ def shopify_tools(mock_db, mock_agent, mock_org, mock_shopify_config, mock_shop,
     session_id = "test_session_id"
     
     with patch('app.tools.shopify_toolkit.SessionLocal') as mock_session_local, \
+         patch('app.tools.shopify_toolkit.AsyncSessionLocal'), \
          patch('app.tools.shopify_toolkit.ShopifyService') as mock_service_class, \
-         patch('app.tools.shopify_toolkit.ShopifyShopRepository') as mock_shop_repo_class, \
-         patch('app.tools.shopify_toolkit.AgentShopifyConfigRepository') as mock_config_repo_class:
+         patch('app.tools.shopify_toolkit.AsyncShopifyShopRepository') as mock_shop_repo_class, \
+         patch('app.tools.shopify_toolkit.AsyncAgentShopifyConfigRepository') as mock_config_repo_class:
         
         # Configure session to return our mock db
         mock_session_local.return_value.__enter__.return_value = mock_db
@@ -133,22 +135,23 @@ def shopify_tools(mock_db, mock_agent, mock_org, mock_shopify_config, mock_shop,
         # Create mock repository instances
         mock_shop_repo = MagicMock()
         mock_shop_repo_class.return_value = mock_shop_repo
-        mock_shop_repo.get_shop.return_value = mock_shop
+        mock_shop_repo.get_shop = AsyncMock(return_value=mock_shop)
         
         mock_config_repo = MagicMock()
         mock_config_repo_class.return_value = mock_config_repo
-        mock_config_repo.get_agent_shopify_config.return_value = mock_shopify_config
+        mock_config_repo.get_agent_shopify_config = AsyncMock(return_value=mock_shopify_config)
         
         # Create tool instance
         tool = ShopifyTools(agent_id=agent_id, org_id=org_id, session_id=session_id)
         
         # Mock the _get_shop_for_agent method directly to avoid database operations
-        with patch.object(tool, '_get_shop_for_agent', return_value=mock_shop):
+        with patch.object(tool, '_get_shop_for_agent', AsyncMock(return_value=mock_shop)):
             yield tool
 
-def test_list_products(shopify_tools, mock_shopify_service):
+@pytest.mark.asyncio
+async def test_list_products(shopify_tools, mock_shopify_service):
     # Act
-    result_str = shopify_tools.list_products(limit=10)
+    result_str = await shopify_tools.list_products(limit=10)
     result = json.loads(result_str)
     
     # Assert
@@ -158,9 +161,10 @@ def test_list_products(shopify_tools, mock_shopify_service):
     assert result["products"][0]["title"] == "Test Product"
     mock_shopify_service.get_products.assert_called_once()
 
-def test_get_product(shopify_tools, mock_shopify_service):
+@pytest.mark.asyncio
+async def test_get_product(shopify_tools, mock_shopify_service):
     # Act
-    result_str = shopify_tools.get_product(product_id="123456789")
+    result_str = await shopify_tools.get_product(product_id="123456789")
     result = json.loads(result_str)
     
     # Assert
@@ -169,7 +173,8 @@ def test_get_product(shopify_tools, mock_shopify_service):
     assert result["shopify_product"]["title"] == "Test Product"
     mock_shopify_service.get_product.assert_called_once()
 
-def test_search_products(shopify_tools):
+@pytest.mark.asyncio
+async def test_search_products(shopify_tools):
     # Mock the requests.post response
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -221,9 +226,10 @@ def test_search_products(shopify_tools):
         }
     }
     
-    with patch("requests.post", return_value=mock_response):
+    with patch("app.tools.shopify_toolkit.get_http_client") as mock_http_client:
+        mock_http_client.return_value.post = AsyncMock(return_value=mock_response)
         # Act
-        result_str = shopify_tools.search_products(query="test", limit=5)
+        result_str = await shopify_tools.search_products(query="test", limit=5)
         result = json.loads(result_str)
         
         # Assert
@@ -235,9 +241,10 @@ def test_search_products(shopify_tools):
         assert result["shopify_output"]["search_query"] == "test"
         assert "pageInfo" in result["shopify_output"]
 
-def test_get_order_status(shopify_tools, mock_shopify_service):
+@pytest.mark.asyncio
+async def test_get_order_status(shopify_tools, mock_shopify_service):
     # Act
-    result_str = shopify_tools.get_order_status(order_id="987654321")
+    result_str = await shopify_tools.get_order_status(order_id="987654321")
     result = json.loads(result_str)
     
     # Assert
@@ -249,7 +256,8 @@ def test_get_order_status(shopify_tools, mock_shopify_service):
     assert result["tracking_numbers"][0] == "12345"
     mock_shopify_service.get_order.assert_called_once()
 
-def test_search_orders(shopify_tools):
+@pytest.mark.asyncio
+async def test_search_orders(shopify_tools):
     # Mock the requests.post response
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -344,9 +352,10 @@ def test_search_orders(shopify_tools):
         }
     }
     
-    with patch("requests.post", return_value=mock_response):
+    with patch("app.tools.shopify_toolkit.get_http_client") as mock_http_client:
+        mock_http_client.return_value.post = AsyncMock(return_value=mock_response)
         # Act
-        result_str = shopify_tools.search_orders(query="test", limit=10)
+        result_str = await shopify_tools.search_orders(query="test", limit=10)
         result = json.loads(result_str)
         
         # Assert
@@ -358,7 +367,8 @@ def test_search_orders(shopify_tools):
         assert "line_items" in result["orders"][0]
         assert "page_info" in result
 
-def test_recommend_products(shopify_tools):
+@pytest.mark.asyncio
+async def test_recommend_products(shopify_tools):
     # Mock the first requests.post response (product details)
     mock_product_response = MagicMock()
     mock_product_response.status_code = 200
@@ -424,9 +434,10 @@ def test_recommend_products(shopify_tools):
         }
     }
     
-    with patch("requests.post", side_effect=[mock_product_response, mock_recommendations_response]):
+    with patch("app.tools.shopify_toolkit.get_http_client") as mock_http_client:
+        mock_http_client.return_value.post = AsyncMock(side_effect=[mock_product_response, mock_recommendations_response])
         # Act
-        result_str = shopify_tools.recommend_products(product_id="123456789", limit=3)
+        result_str = await shopify_tools.recommend_products(product_id="123456789", limit=3)
         result = json.loads(result_str)
         
         # Assert
@@ -438,7 +449,8 @@ def test_recommend_products(shopify_tools):
         assert result["shopify_output"]["search_type"] == "recommendations"
         assert "pageInfo" in result["shopify_output"]
 
-def test_integration_disabled():
+@pytest.mark.asyncio
+async def test_integration_disabled():
     """Test when Shopify integration is disabled for the agent"""
     agent_id = "00000000-0000-0000-0000-000000000001"
     org_id = "00000000-0000-0000-0000-000000000002"
@@ -449,27 +461,29 @@ def test_integration_disabled():
     mock_config.enabled = False
     
     with patch('app.tools.shopify_toolkit.SessionLocal'), \
+         patch('app.tools.shopify_toolkit.AsyncSessionLocal'), \
          patch('app.tools.shopify_toolkit.ShopifyService'), \
-         patch('app.tools.shopify_toolkit.ShopifyShopRepository'), \
-         patch('app.tools.shopify_toolkit.AgentShopifyConfigRepository') as mock_config_repo_class:
+         patch('app.tools.shopify_toolkit.AsyncShopifyShopRepository'), \
+         patch('app.tools.shopify_toolkit.AsyncAgentShopifyConfigRepository') as mock_config_repo_class:
         
         # Configure config repo to return disabled config
         mock_config_repo = MagicMock()
         mock_config_repo_class.return_value = mock_config_repo
-        mock_config_repo.get_agent_shopify_config.return_value = mock_config
+        mock_config_repo.get_agent_shopify_config = AsyncMock(return_value=mock_config)
         
         # Create tool instance
         tool = ShopifyTools(agent_id=agent_id, org_id=org_id, session_id=session_id)
         
         # Act
-        result_str = tool.list_products()
+        result_str = await tool.list_products()
         result = json.loads(result_str)
         
         # Assert
         assert result["success"] is False
         assert "not enabled" in result["message"].lower()
 
-def test_shop_not_found():
+@pytest.mark.asyncio
+async def test_shop_not_found():
     """Test when shop is not found for the agent"""
     agent_id = "00000000-0000-0000-0000-000000000001"
     org_id = "00000000-0000-0000-0000-000000000002"
@@ -481,39 +495,63 @@ def test_shop_not_found():
     mock_config.shop_id = UUID("00000000-0000-0000-0000-000000000003")
     
     with patch('app.tools.shopify_toolkit.SessionLocal'), \
+         patch('app.tools.shopify_toolkit.AsyncSessionLocal'), \
          patch('app.tools.shopify_toolkit.ShopifyService'), \
-         patch('app.tools.shopify_toolkit.ShopifyShopRepository') as mock_shop_repo_class, \
-         patch('app.tools.shopify_toolkit.AgentShopifyConfigRepository') as mock_config_repo_class:
+         patch('app.tools.shopify_toolkit.AsyncShopifyShopRepository') as mock_shop_repo_class, \
+         patch('app.tools.shopify_toolkit.AsyncAgentShopifyConfigRepository') as mock_config_repo_class:
         
         # Configure repos
         mock_config_repo = MagicMock()
         mock_config_repo_class.return_value = mock_config_repo
-        mock_config_repo.get_agent_shopify_config.return_value = mock_config
+        mock_config_repo.get_agent_shopify_config = AsyncMock(return_value=mock_config)
         
         mock_shop_repo = MagicMock()
         mock_shop_repo_class.return_value = mock_shop_repo
-        mock_shop_repo.get_shop.return_value = None  # Shop not found
+        mock_shop_repo.get_shop = AsyncMock(return_value=None)  # Shop not found
         
         # Create tool instance
         tool = ShopifyTools(agent_id=agent_id, org_id=org_id, session_id=session_id)
         
         # Act
-        result_str = tool.list_products()
+        result_str = await tool.list_products()
         result = json.loads(result_str)
         
         # Assert
         assert result["success"] is False
         assert "not found" in result["message"].lower() or "not enabled" in result["message"].lower()
 
-def test_api_error(shopify_tools, mock_shopify_service):
+@pytest.mark.asyncio
+async def test_api_error(shopify_tools, mock_shopify_service):
     """Test when an API error occurs"""
     # Set up service method to raise an exception
     mock_shopify_service.get_products.side_effect = Exception("API Error")
     
     # Act
-    result_str = shopify_tools.list_products()
+    result_str = await shopify_tools.list_products()
     result = json.loads(result_str)
     
     # Assert
     assert result["success"] is False
-    assert "error" in result["message"].lower() 
\ No newline at end of file
+    assert "error" in result["message"].lower() 
+@pytest.mark.asyncio
+async def test_search_products_does_not_block_the_event_loop(shopify_tools):
+    """Concurrent chats' tool calls overlap instead of queueing behind each other"""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {
+        "data": {"products": {"edges": [], "pageInfo": {"hasNextPage": False, "endCursor": None}}}
+    }
+
+    async def slow_post(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        return mock_response
+
+    with patch("app.tools.shopify_toolkit.get_http_client") as mock_http_client:
+        mock_http_client.return_value.post = AsyncMock(side_effect=slow_post)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(shopify_tools.search_products(query=f"query {i}") for i in range(3)))
+        elapsed = time.perf_counter() - start
+
+    assert all(json.loads(result)["success"] is True for result in results)
+    assert mock_http_client.return_value.post.await_count == 3
+    assert elapsed < 0.4
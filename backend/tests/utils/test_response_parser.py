@@ -23,7 +23,8 @@ from app.utils.response_parser import (
     extract_json_from_text,
     clean_malformed_output,
     extract_fields_from_text,
-    create_basic_chat_response
+    create_basic_chat_response,
+    StreamingMessageExtractor
 )
 from app.models.schemas.chat import ChatResponse
 
@@ -227,4 +228,28 @@ class TestCreateBasicChatResponse:
         assert isinstance(result, ChatResponse)
         assert result.message == message
         assert result.transfer_to_human is True
-        assert result.end_chat is False 
\ No newline at end of file
+        assert result.end_chat is False 
+
+class TestStreamingMessageExtractor:
+    def test_message_split_across_chunks(self):
+        """Test extracting the message field token by token"""
+        extractor = StreamingMessageExtractor()
+        chunks = ['{"mess', 'age": "Hel', 'lo, \\', 'nhow can', ' I \\u00e9', 'help?"', ', "end_chat": false}']
+        streamed = "".join(extractor.feed(chunk) for chunk in chunks)
+
+        assert streamed == "Hello, \nhow can I \u00e9help?"
+        assert extractor.done is True
+
+    def test_escaped_quote(self):
+        """Test an escaped quote does not end the message"""
+        extractor = StreamingMessageExtractor()
+        streamed = extractor.feed('{"message": "Say \\"hi\\"", "transfer_to_human": false}')
+
+        assert streamed == 'Say "hi"'
+
+    def test_plain_text_passthrough(self):
+        """Test non JSON replies are streamed as they arrive"""
+        extractor = StreamingMessageExtractor()
+
+        assert extractor.feed("Hello") == "Hello"
+        assert extractor.feed(" there") == " there"
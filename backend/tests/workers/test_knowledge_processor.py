@@ -16,9 +16,10 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>
 """
 
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
-from app.workers.knowledge_processor import process_queue_item, run_processor
+from app.workers.knowledge_processor import process_queue_item, run_processor, get_worker_id, KnowledgeQueueConsumer
 from app.models.knowledge_queue import QueueStatus
 from app.models.notification import NotificationType
 from uuid import uuid4
@@ -48,7 +49,8 @@ def mock_queue_repo(mock_queue_item):
     """Create a mock queue repository"""
     repo = MagicMock()
     repo.get_by_id.return_value = mock_queue_item
-    repo.get_pending.return_value = [mock_queue_item]
+    repo.claim.return_value = [mock_queue_item]
+    repo.release.return_value = True
     return repo
 
 @pytest.fixture
@@ -79,7 +81,7 @@ async def test_process_queue_item_success(mock_dependencies, mock_queue_item):
     await process_queue_item(mock_queue_item.id)
 
     # Assert
-    assert mock_queue_item.status == QueueStatus.COMPLETED
+    mock_dependencies['queue_repo'].release.assert_called_once_with(mock_queue_item.id, get_worker_id(), QueueStatus.COMPLETED)
     mock_dependencies['knowledge_manager'].process_knowledge.assert_awaited_once_with(mock_queue_item)
     
     # Verify notification was created
@@ -117,7 +119,8 @@ async def test_process_queue_item_error(mock_dependencies, mock_queue_item):
         await process_queue_item(mock_queue_item.id)
     
     # Assert
-    assert mock_queue_item.status == QueueStatus.FAILED
+    mock_dependencies['queue_repo'].release.assert_called_once_with(
+        mock_queue_item.id, get_worker_id(), QueueStatus.FAILED, error=error_message)
     
     # Verify error notification was created
     mock_dependencies['db'].add.assert_called_once()
@@ -133,6 +136,7 @@ async def test_process_queue_item_error(mock_dependencies, mock_queue_item):
 async def test_run_processor_success(mock_dependencies):
     """Test successful run of the processor"""
     from app.api.knowledge import PROCESSOR_STATUS
+    mock_dependencies['queue_repo'].claim.return_value[0].locked_by = get_worker_id()
     
     # Execute
     await run_processor()
@@ -141,14 +145,14 @@ async def test_run_processor_success(mock_dependencies):
     assert not PROCESSOR_STATUS["is_running"]
     assert PROCESSOR_STATUS["error"] is None
     assert isinstance(PROCESSOR_STATUS["last_run"], str)
-    mock_dependencies['queue_repo'].get_pending.assert_called_once()
+    mock_dependencies['queue_repo'].claim.assert_called_once()
     mock_dependencies['knowledge_manager'].process_knowledge.assert_awaited_once()
 
 @pytest.mark.asyncio
 async def test_run_processor_no_pending_items(mock_dependencies):
     """Test processor run with no pending items"""
     # Setup
-    mock_dependencies['queue_repo'].get_pending.return_value = []
+    mock_dependencies['queue_repo'].claim.return_value = []
     
     # Execute
     await run_processor()
@@ -161,7 +165,7 @@ async def test_run_processor_error(mock_dependencies):
     """Test error handling in processor run"""
     # Setup
     error_message = "Processor error"
-    mock_dependencies['queue_repo'].get_pending.side_effect = Exception(error_message)
+    mock_dependencies['queue_repo'].claim.side_effect = Exception(error_message)
     
     # Execute and assert exception is raised
     with pytest.raises(Exception, match=error_message):
@@ -170,4 +174,139 @@ async def test_run_processor_error(mock_dependencies):
     # Assert
     from app.api.knowledge import PROCESSOR_STATUS
     assert not PROCESSOR_STATUS["is_running"]
-    assert PROCESSOR_STATUS["error"] == error_message
\ No newline at end of file
+    assert PROCESSOR_STATUS["error"] == error_message
+
+@pytest.mark.asyncio
+async def test_process_queue_item_already_claimed(mock_dependencies, mock_queue_item):
+    """Test that an item claimed by another worker is not processed twice"""
+    # Setup
+    mock_dependencies['queue_repo'].claim.return_value = []
+
+    # Execute
+    await process_queue_item(mock_queue_item.id)
+
+    # Assert
+    mock_dependencies['knowledge_manager'].process_knowledge.assert_not_awaited()
+    assert mock_queue_item.status == QueueStatus.PENDING
+
+@pytest.mark.asyncio
+async def test_process_queue_item_lease_of_other_worker(mock_dependencies, mock_queue_item):
+    """Test that a worker skips items leased to another worker"""
+    # Setup
+    mock_queue_item.locked_by = "other-worker"
+
+    # Execute
+    await process_queue_item(mock_queue_item.id, worker_id="this-worker")
+
+    # Assert
+    mock_dependencies['knowledge_manager'].process_knowledge.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_process_queue_item_heartbeats_lease(mock_dependencies, mock_queue_item):
+    """Test that the lease is renewed while an item is processed"""
+    # Setup
+    mock_queue_item.locked_by = "this-worker"
+
+    async def slow_processing(item):
+        await asyncio.sleep(0.05)
+
+    mock_dependencies['knowledge_manager'].process_knowledge.side_effect = slow_processing
+
+    # Execute
+    with patch('app.workers.knowledge_processor.settings.KNOWLEDGE_QUEUE_HEARTBEAT_INTERVAL', 0.01):
+        await process_queue_item(mock_queue_item.id, worker_id="this-worker")
+
+    # Assert
+    assert mock_dependencies['queue_repo'].heartbeat.call_count >= 1
+    assert mock_dependencies['queue_repo'].heartbeat.call_args[0][:2] == (mock_queue_item.id, "this-worker")
+    mock_dependencies['queue_repo'].release.assert_called_once_with(mock_queue_item.id, "this-worker", QueueStatus.COMPLETED)
+
+@pytest.mark.asyncio
+async def test_process_queue_item_stops_when_lease_is_lost(mock_dependencies, mock_queue_item):
+    """Test that processing is cancelled, and the item left to its new owner, once the lease is lost"""
+    # Setup
+    mock_queue_item.locked_by = "this-worker"
+    mock_dependencies['queue_repo'].heartbeat.return_value = False
+    crawling = asyncio.Event()
+    finished = []
+
+    async def long_processing(item):
+        crawling.set()
+        await asyncio.sleep(5)
+        finished.append(item)
+
+    mock_dependencies['knowledge_manager'].process_knowledge.side_effect = long_processing
+
+    # Execute
+    with patch('app.workers.knowledge_processor.settings.KNOWLEDGE_QUEUE_HEARTBEAT_INTERVAL', 0.01):
+        await asyncio.wait_for(process_queue_item(mock_queue_item.id, worker_id="this-worker"), timeout=1)
+
+    # Assert
+    assert crawling.is_set()
+    assert not finished
+    mock_dependencies['queue_repo'].release.assert_not_called()
+    mock_dependencies['db'].add.assert_not_called()
+    mock_dependencies['fcm'].assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_process_queue_item_reclaimed_item_is_not_completed(mock_dependencies, mock_queue_item):
+    """Test that a worker whose lease was taken over does not notify about the item"""
+    # Setup
+    mock_queue_item.locked_by = "this-worker"
+    mock_dependencies['queue_repo'].release.return_value = False
+
+    # Execute
+    await process_queue_item(mock_queue_item.id, worker_id="this-worker")
+
+    # Assert
+    mock_dependencies['queue_repo'].release.assert_called_once_with(mock_queue_item.id, "this-worker", QueueStatus.COMPLETED)
+    mock_dependencies['db'].add.assert_not_called()
+    mock_dependencies['fcm'].assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_consumer_fills_free_slots(mock_dependencies):
+    """Test that the consumer claims only as many items as it has free slots"""
+    # Setup
+    consumer = KnowledgeQueueConsumer(concurrency=2, worker_id="this-worker")
+    blocker = asyncio.Event()
+    mock_dependencies['queue_repo'].claim.return_value = [MagicMock(id=1), MagicMock(id=2)]
+
+    async def blocked_processing(*args, **kwargs):
+        await blocker.wait()
+
+    with patch('app.workers.knowledge_processor.process_queue_item', side_effect=blocked_processing) as process:
+        # Execute
+        assert await consumer.run_once() == 2
+        assert await consumer.run_once() == 0
+        await asyncio.sleep(0.01)
+
+        # Assert
+        assert len(consumer._tasks) == 2
+        assert mock_dependencies['queue_repo'].claim.call_count == 1
+        assert mock_dependencies['queue_repo'].claim.call_args.kwargs['limit'] == 2
+        process.assert_any_call(1, worker_id="this-worker")
+        process.assert_any_call(2, worker_id="this-worker")
+
+        blocker.set()
+        await asyncio.sleep(0.01)
+        assert not consumer._tasks
+        assert consumer._wakeup.is_set()
+
+@pytest.mark.asyncio
+async def test_consumer_wakes_on_notification(mock_dependencies):
+    """Test that a notification wakes the consumer before the poll interval"""
+    # Setup
+    consumer = KnowledgeQueueConsumer(concurrency=1, poll_interval=60, worker_id="this-worker")
+    mock_dependencies['queue_repo'].claim.return_value = []
+
+    with patch('app.workers.knowledge_processor.get_listen_dsn', return_value=None):
+        # Execute
+        runner = asyncio.create_task(consumer.run())
+        await asyncio.sleep(0.05)
+        consumer.notify(None, 1234, "knowledge_queue", "42")
+        await asyncio.sleep(0.05)
+        consumer.stop()
+        await asyncio.wait_for(runner, timeout=1)
+
+    # Assert
+    assert mock_dependencies['queue_repo'].claim.call_count >= 2